@@ -18,6 +18,16 @@
     import AnimationBinder as AB
     AB.AnimBinderUI.Show()
 
+    Batch retargeting of mocap takes onto a bound rig, headless under mayapy :
+
+    mayapy -c "import sys;import Red9.core.AnimationBinder as AB;sys.exit(AB.main())" rig.ma take1.fbx take2.fbx
+        --bindRoot Bind_Skeleton|Hips --rigRoot Rig --output P:/retargets
+
+    main returns 1 if any take failed, pass it to sys.exit as above so that the mayapy
+    exit code can be checked by the farm / CI job, or run the module as a script :
+
+    mayapy AnimationBinder.py rig.ma take1.fbx take2.fbx --bindRoot Bind_Skeleton|Hips
+
     ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     I'll probably put this file and any updates to it on my blog in the
@@ -34,6 +44,11 @@
 
 from __future__ import print_function
 
+import os
+import sys
+import json
+import time
+
 import maya.cmds as cmds
 import pymel.core as pm
 import Red9_AnimationUtils as r9Anim
@@ -567,14 +582,20 @@ def get_bound_controls(rootNode=None):
     return [node for node in cmds.listRelatives(rootNode, ad=True, f=True)
              if cmds.attributeQuery(BAKE_MARKER, exists=True, node=node)]
 
-def bake_binder_data(rootNode=None, debugView=False, runFilter=True, ignoreInFilter=[]):
+def bake_binder_data(rootNode=None, debugView=False, runFilter=True, ignoreInFilter=[],
+                     controls=None, timerange=None, parallel=False):
     '''
     From a given Root Node search all children for the 'BoundCtr' attr marker. If none
     were found then search for the BindNode attr and use the message links to walk to
     the matching Controller.
     Those found are then baked out and the marker attribute is deleted
+
+    :param controls: the bound controls to bake, skips the marker search from the rootNode
+    :param timerange: (start, end) to bake, default is the playback range
+    :param parallel: bake with the evaluationManager in parallel rather than dropping to DG,
+        the cached playback is flushed over the baked range on exit
     '''
-    BoundCtrls = get_bound_controls(rootNode)
+    BoundCtrls = list(controls) if controls else get_bound_controls(rootNode)
 
     # Found no Ctrls, try and walk the message from the BndNodes
     if not BoundCtrls:
@@ -586,14 +607,26 @@ def bake_binder_data(rootNode=None, debugView=False, runFilter=True, ignoreInFil
             else:
                 log.info('Nothing connected to %s.%s' % (node, BNDNODE_MARKER))
 
+    if not timerange:
+        timerange = (cmds.playbackOptions(q=True, min=True), cmds.playbackOptions(q=True, max=True))
+    batch = r9Setup.mayaIsBatch()
     if BoundCtrls:
+        evalmode = None
         try:
-            if not debugView:
+            if not debugView and not batch:
                 cmds.refresh(su=True)
-            with r9General.AnimationContext():
+            if parallel:
+                if r9Setup.mayaVersion() >= 2016:
+                    evalmode = cmds.evaluationManager(q=True, mode=True)[0]
+                    if not evalmode == 'parallel':
+                        cmds.evaluationManager(mode='parallel')
+                context = r9General.AnimationContext(evalmanager=False, cached_eval=True, timerange=timerange)
+            else:
+                context = r9General.AnimationContext()
+            with context:
                 cmds.bakeResults(BoundCtrls, simulation=True,
                              sampleBy=1,
-                             time=(cmds.playbackOptions(q=True, min=True), cmds.playbackOptions(q=True, max=True)),
+                             time=tuple(timerange),
                              disableImplicitControl=True,
                              preserveOutsideKeys=True,
                              sparseAnimCurveBake=True,
@@ -615,8 +648,11 @@ def bake_binder_data(rootNode=None, debugView=False, runFilter=True, ignoreInFil
         except StandardError, error:
             raise StandardError(error)
         finally:
-            cmds.refresh(su=False)
-            cmds.refresh(f=True)
+            if evalmode and not evalmode == 'parallel':
+                cmds.evaluationManager(mode=evalmode)
+            if not batch:
+                cmds.refresh(su=False)
+                cmds.refresh(f=True)
     else:
         raise StandardError("Couldn't find any BinderMarkers in given hierarchy")
     return True
@@ -631,14 +667,17 @@ def match_given_hierarchys(source, dest):
     if not isinstance(dest, list):
         dest = [dest]
 
+    # first dest of each name wins, as the old nested loop did
+    destNames = {}
+    for dJnt in dest:
+        destNames.setdefault(dJnt.split('|')[-1].split(':')[-1], dJnt)
     for sJnt in source:
-        for dJnt in dest:
-            if sJnt.split('|')[-1].split(':')[-1] == dJnt.split('|')[-1].split(':')[-1]:
-                nameMatched.append((sJnt, dJnt))
-                break
+        dJnt = destNames.get(sJnt.split('|')[-1].split(':')[-1])
+        if dJnt is not None:
+            nameMatched.append((sJnt, dJnt))
     return nameMatched
 
-def bind_skeletons(source, dest, method='connect', scales=False, verbose=False, unlock=False, bindroot=True):
+def bind_skeletons(source, dest, method='connect', scales=False, verbose=False, unlock=False, bindroot=True, matched=None):
     '''
     From 2 given root joints search through each hierarchy for child joints, match
     them based on node name, then connect their trans/rots directly, or
@@ -649,10 +688,13 @@ def bind_skeletons(source, dest, method='connect', scales=False, verbose=False,
     :param method: the method used for the connection, either 'connect' or 'constrain'
     :param scale: do we bind the scales of the destination skel to the source??
     :param unlock: if True force unlock the required transform attrs on the destination skeleton first
+    :param matched: optional [(sourceJnt, destJnt)] pairs already matched, skips the name
+        matching of the hierarchies, see BatchRetarget
     '''
-
-    sourceJoints = cmds.listRelatives(source, ad=True, f=True, type='joint')
-    destJoints = cmds.listRelatives(dest, ad=True, f=True, type='joint')
+    if matched is None:
+        sourceJoints = cmds.listRelatives(source, ad=True, f=True, type='joint')
+        destJoints = cmds.listRelatives(dest, ad=True, f=True, type='joint')
+        matched = match_given_hierarchys(sourceJoints, destJoints)
 
     if verbose:
         result = cmds.confirmDialog(title='Bind Skeletons SCALES',
@@ -679,7 +721,7 @@ def bind_skeletons(source, dest, method='connect', scales=False, verbose=False,
     if unlock:
         r9Core.LockChannels().processState(dest, attrs=attrs, mode='fullkey', hierarchy=True)
 
-    for sJnt, dJnt in match_given_hierarchys(sourceJoints, destJoints):
+    for sJnt, dJnt in matched:
         if method == 'connect':
             for attr in attrs:
                 try:
@@ -761,3 +803,213 @@ def removeBindMarker(ctrls=None, *args):
         ctrls = cmds.ls(sl=True, l=True)
     for ctr in ctrls:
         cmds.deleteAttr('%s.%s' % (ctr, BAKE_MARKER))
+
+
+class BatchRetarget(object):
+    '''
+    Batch retarget of mocap takes through a rig that's already been bound with the
+    AnimationBinder, for running hundreds of takes headless under mayapy. For each take
+    the rig file is re-opened, so that the binder is in its bound state, the take is
+    imported into a namespace, bound to the rig's bind skeleton, baked and saved out.
+
+    The rig side of the work is only done once per rig, the matched joint hierarchy and
+    the bound controls are cached on the first take and re-used for the rest, so each
+    take only pays for a name lookup of its own joints. The bakes run in parallel
+    evaluation by default, see bake_binder_data.
+
+    Every take gets a stats dict with the per stage timings and some QA data, collected
+    in self.report and written to retarget_report.json in the outputDir:
+
+    * status : 'ok' or 'failed', 'error' holds the exception for failed takes
+    * timings : open, import, bind, bake and save in seconds
+    * range : the take's animation range that was baked
+    * joints : number of joints bound, unmatched : take joints with no match on the rig
+    * controls : number of controls baked, keys : total keys on them after the bake
+    * static : controls left with no animation at all after the bake
+
+    >>> batch = BatchRetarget('P:/rigs/hero_binder.ma', bindRoot='Bind_Skeleton|Hips',
+    >>>                       rigRoot='Rig', outputDir='P:/retargets')
+    >>> batch.run(['P:/mocap/walk.fbx', 'P:/mocap/run.fbx'])
+    '''
+    TAKE_TYPES = {'.fbx': 'FBX', '.ma': 'mayaAscii', '.mb': 'mayaBinary'}
+
+    def __init__(self, rigFile, bindRoot, rigRoot=None, sourceRoot=None, outputDir=None,
+                 method='connect', scales=False, namespace='TAKE', parallel=True,
+                 runFilter=True, ignoreInFilter=[]):
+        '''
+        :param rigFile: the rig scene, with the binder already setup and the controls bound
+        :param bindRoot: root joint of the bind skeleton in the rig scene that the takes are bound to
+        :param rigRoot: root node searched for the bound controls, see get_bound_controls
+        :param sourceRoot: name of the root joint in the takes, namespace stripped, if not
+            given the first top level joint imported is used
+        :param outputDir: folder for the retargeted scenes and report, default is next to the rigFile
+        :param method: bind method passed to bind_skeletons, 'connect' or 'constrain'
+        :param scales: bind the scales as well
+        :param namespace: namespace the takes are imported into
+        :param parallel: bake in parallel evaluation
+        :param runFilter: run the euler filter over the baked controls
+        :param ignoreInFilter: control names to skip in the filter
+        '''
+        self.rigFile = rigFile
+        self.bindRoot = bindRoot
+        self.rigRoot = rigRoot
+        self.sourceRoot = sourceRoot
+        self.outputDir = outputDir or os.path.dirname(rigFile)
+        self.method = method
+        self.scales = scales
+        self.namespace = namespace
+        self.parallel = parallel
+        self.runFilter = runFilter
+        self.ignoreInFilter = ignoreInFilter
+        self.report = []
+
+        self._matched = None  # [(take joint name, rig joint)] from the first take
+        self._controls = None  # bound controls from the first take
+
+    @staticmethod
+    def _stripName(node):
+        return node.split('|')[-1].split(':')[-1]
+
+    def _importTake(self, take):
+        '''
+        import the take into the namespace and return its root joint
+        '''
+        ext = os.path.splitext(take)[1].lower()
+        if ext == '.fbx' and not cmds.pluginInfo('fbxmaya', q=True, loaded=True):
+            cmds.loadPlugin('fbxmaya')
+        newNodes = cmds.file(take, i=True, type=self.TAKE_TYPES.get(ext, 'mayaAscii'), namespace=self.namespace,
+                             ignoreVersion=True, returnNewNodes=True, mergeNamespacesOnClash=False) or []
+        joints = cmds.ls(newNodes, type='joint', l=True)
+        if self.sourceRoot:
+            joints = [jnt for jnt in joints if self._stripName(jnt) == self.sourceRoot]
+        else:
+            joints = [jnt for jnt in joints if not cmds.listRelatives(jnt, p=True, type='joint')]
+        if not joints:
+            raise StandardError('No root joint found in take : %s' % take)
+        return joints[0]
+
+    def _match(self, sourceRoot):
+        '''
+        the take's joints matched to the bind skeleton, the name matching against the
+        rig is only run for the first take, later takes just look their joints up by name
+
+        :return: (matched pairs, unmatched take joints)
+        '''
+        sourceJoints = cmds.listRelatives(sourceRoot, ad=True, f=True, type='joint') or []
+        if self._matched is None:
+            destJoints = cmds.listRelatives(self.bindRoot, ad=True, f=True, type='joint') or []
+            self._matched = [(self._stripName(src), dest) for src, dest in
+                             match_given_hierarchys(sourceJoints, destJoints)]
+        names = {}
+        for jnt in sourceJoints:
+            names.setdefault(self._stripName(jnt), jnt)
+        matched = [(names[name], dest) for name, dest in self._matched if name in names]
+        found = set(name for name, _ in self._matched)
+        return matched, sorted(name for name in names if name not in found)
+
+    def _boundControls(self):
+        '''
+        the bound controls, cached from the first take as the rig is the same file every time
+        '''
+        if self._controls is None or not len(cmds.ls(self._controls)) == len(self._controls):
+            self._controls = get_bound_controls(self.rigRoot or cmds.ls(self.bindRoot, l=True)[0].split('|')[1])
+        return self._controls
+
+    def processTake(self, take):
+        '''
+        retarget a single take, return its stats dict
+        '''
+        name = os.path.splitext(os.path.basename(take))[0]
+        stats = {'take': take, 'status': 'failed', 'timings': {}}
+        timings = stats['timings']
+        try:
+            start = time.time()
+            cmds.file(self.rigFile, o=True, f=True, ignoreVersion=True)
+            timings['open'] = time.time() - start
+
+            start = time.time()
+            sourceRoot = self._importTake(take)
+            timings['import'] = time.time() - start
+
+            start = time.time()
+            matched, unmatched = self._match(sourceRoot)
+            bind_skeletons(sourceRoot, self.bindRoot, method=self.method, scales=self.scales, matched=matched)
+            stats['joints'] = len(matched)
+            stats['unmatched'] = unmatched
+            timings['bind'] = time.time() - start
+
+            start = time.time()
+            timerange = r9Anim.animRangeFromNodes([sourceRoot] + [src for src, _ in matched], setTimeline=True)
+            if not timerange:
+                raise StandardError('No animation found on the take skeleton')
+            controls = self._boundControls()
+            bake_binder_data(controls=controls, runFilter=self.runFilter, ignoreInFilter=self.ignoreInFilter,
+                             timerange=timerange, parallel=self.parallel)
+            stats['range'] = timerange
+            stats['controls'] = len(controls)
+            counts = [cmds.keyframe(ctrl, q=True, kc=True) or 0 for ctrl in controls]
+            stats['keys'] = sum(counts)
+            stats['static'] = [self._stripName(ctrl) for ctrl, count in zip(controls, counts) if not count]
+            timings['bake'] = time.time() - start
+
+            start = time.time()
+            cmds.namespace(removeNamespace=self.namespace, deleteNamespaceContent=True)
+            ext = os.path.splitext(self.rigFile)[1]
+            output = os.path.join(self.outputDir, '%s_retarget%s' % (name, ext))
+            cmds.file(rename=output)
+            cmds.file(save=True, f=True, type=self.TAKE_TYPES.get(ext.lower(), 'mayaAscii'))
+            stats['output'] = output
+            timings['save'] = time.time() - start
+            stats['status'] = 'ok'
+        except StandardError, error:
+            stats['error'] = str(error)
+            log.warning('BatchRetarget : %s failed : %s' % (take, error))
+        stats['time'] = sum(timings.values())
+        log.info('BatchRetarget : %s : %s in %0.2fs : %s' % (stats['status'], name, stats['time'],
+                 ', '.join('%s %0.2fs' % (key, timings[key]) for key in sorted(timings))))
+        return stats
+
+    def run(self, takes):
+        '''
+        retarget all the takes, returns the stats list and writes it to retarget_report.json
+        '''
+        if not os.path.exists(self.outputDir):
+            os.makedirs(self.outputDir)
+        self.report = []
+        start = time.time()
+        for take in takes:
+            self.report.append(self.processTake(take))
+        failed = [stats['take'] for stats in self.report if not stats['status'] == 'ok']
+        log.info('BatchRetarget : %i takes in %0.2fs, %i failed' % (len(takes), time.time() - start, len(failed)))
+        with open(os.path.join(self.outputDir, 'retarget_report.json'), 'w') as f:
+            json.dump(self.report, f, indent=4)
+        return self.report
+
+
+def main(args=None):
+    '''
+    command line entry point for the BatchRetarget runner, see the module docs
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Red9 AnimationBinder batch retarget')
+    parser.add_argument('rigFile', help='the bound rig scene')
+    parser.add_argument('takes', nargs='+', help='FBX / ma / mb takes to retarget')
+    parser.add_argument('--bindRoot', required=True, help='root joint of the bind skeleton in the rig scene')
+    parser.add_argument('--rigRoot', default=None, help='root node searched for the bound controls')
+    parser.add_argument('--sourceRoot', default=None, help='root joint name in the takes')
+    parser.add_argument('--output', default=None, help='output folder')
+    parser.add_argument('--method', default='connect', choices=['connect', 'constrain'])
+    parser.add_argument('--scales', action='store_true', help='bind the scales')
+    parser.add_argument('--dg', action='store_true', help='bake in DG rather than parallel evaluation')
+    parser.add_argument('--noFilter', action='store_true', help="don't euler filter the baked controls")
+    parsed = parser.parse_args(args)
+
+    batch = BatchRetarget(parsed.rigFile, parsed.bindRoot, rigRoot=parsed.rigRoot, sourceRoot=parsed.sourceRoot,
+                          outputDir=parsed.output, method=parsed.method, scales=parsed.scales,
+                          parallel=not parsed.dg, runFilter=not parsed.noFilter)
+    report = batch.run(parsed.takes)
+    return 1 if any(not stats['status'] == 'ok' for stats in report) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
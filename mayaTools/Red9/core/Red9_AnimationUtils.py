@@ -72,12 +72,17 @@ from __future__ import print_function
 
 import maya.cmds as cmds
 import maya.mel as mel
+import maya.OpenMaya as OpenMaya
+import maya.OpenMayaAnim as OpenMayaAnim
 
 import Red9.startup.setup as r9Setup
 import Red9_CoreUtils as r9Core
 import Red9_General as r9General
 import Red9_PoseSaver as r9Pose
+import Red9_PoseIndex as r9PoseIndex
 import Red9_Meta as r9Meta
+import Red9_CurveFilters as r9CurveFilters
+import Red9_ConfigIO as r9ConfigIO
 
 from functools import partial
 import os
@@ -85,6 +90,8 @@ import random
 import sys
 import re
 import shutil
+import time
+from array import array
 
 import Red9.packages.configobj as configobj
 # from Red9.startup.setup import ProPack_Error
@@ -105,6 +112,23 @@ RED_ANIMATION_UI = None
 global RED_ANIMATION_UI_OPENCALLBACKS
 RED_ANIMATION_UI_OPENCALLBACKS = []
 
+# bumped whenever the mirror markers are edited, invalidates the cached MirrorTables
+global RED9_MIRROR_SERIAL
+RED9_MIRROR_SERIAL = 0
+
+# scene AnimCurveBoundsIndex, built on first use
+global RED9_ANIMCURVE_BOUNDS
+RED9_ANIMCURVE_BOUNDS = None
+
+# scene TrajectoryCache, built on first use
+global RED9_TRAJECTORY_CACHE
+RED9_TRAJECTORY_CACHE = None
+
+# callbacks are kept over a module reload so that we don't bind them twice
+if 'RED9_ANIM_CALLBACKS' not in globals():
+    global RED9_ANIM_CALLBACKS
+    RED9_ANIM_CALLBACKS = {'BoundsIndex': [], 'TrajectoryCache': []}
+
 '''
 Callback globals so you can fire in commands prior to the UI opening,
 we use this internally to fire an asset sync call on our project pose library
@@ -465,7 +489,360 @@ def animCurveDrawStyle(style='simple', forceBuffer=True, showBufferCurves=False,
 #         self.current += self.step
 #         return self.current - self.step
 
-def animCurve_get_bounds(curve, bounds_only=False, skip_static=True):
+class AnimCurveBoundsIndex(object):
+    '''
+    Scene wide index of the animCurve key bounds. Rather than walking the history of
+    every node and querying cmds.keyframe per curve, every animCurve in the scene is
+    read in one API sweep for its first and last key, key count and type, and the nodes
+    each curve drives are mapped so a range query for a set of nodes is just a dict
+    lookup. The index is kept current by callbacks:
+
+    * animCurveEdited : the edited curves are re-read on the next query
+    * animCurve added / removed, curve connections made or broken : the node mapping
+      is rebuilt, again from a single sweep, on the next query
+    * scene new / open : the index is dropped
+
+    The node mapping follows the same rules as r9Core.FilterNode.lsAnimCurves(safe=True,
+    allow_ref=True), curves found up to 2 levels upstream of a node, 3 if the node is in an
+    animLayer, without passing through another dag node, skipping setDriven, animClip and
+    locked animLayer curves.
+
+    >>> index = AnimCurveBoundsIndex.get()
+    >>> index.nodesRange(cmds.ls(sl=True))
+    '''
+    def __init__(self):
+        self.curves = {}  # MObjectHandle.hashCode() : curve entry dict
+        self.nodeCurves = {}  # MObjectHandle.hashCode() of a driven node : {curve hashCode : levels upstream}
+        self._stale = {}  # hashCode : MObjectHandle of edited curves to re-read
+        self._intermediates = set()  # hashCodes of the non-dag nodes between the curves and the nodes they drive
+        self._graphDirty = True
+
+    @classmethod
+    def get(cls):
+        '''
+        the scene index, created and the callbacks bound on first use
+        '''
+        global RED9_ANIMCURVE_BOUNDS
+        if RED9_ANIMCURVE_BOUNDS is None:
+            RED9_ANIMCURVE_BOUNDS = cls()
+            _animCurveBoundsCallbacks()
+        return RED9_ANIMCURVE_BOUNDS
+
+    @staticmethod
+    def reset(*args):
+        '''
+        drop the scene index, bound to the scene new / open callbacks
+        '''
+        global RED9_ANIMCURVE_BOUNDS
+        RED9_ANIMCURVE_BOUNDS = None
+
+    @staticmethod
+    def invalidate():
+        '''
+        force a full sweep on the next query. Curve edits made through the API, MFnAnimCurve
+        and the undo / redo of an MAnimCurveChange, don't always fire the animCurveEdited
+        callback so the API writers in here call this once they're done
+        '''
+        if RED9_ANIMCURVE_BOUNDS is not None:
+            RED9_ANIMCURVE_BOUNDS.curves = {}
+            RED9_ANIMCURVE_BOUNDS._stale = {}
+            RED9_ANIMCURVE_BOUNDS._graphDirty = True
+
+    # callback handlers ------------------------------------------------------
+
+    def curvesEdited(self, curves):
+        for i in range(curves.length()):
+            handle = OpenMaya.MObjectHandle(curves[i])
+            self._stale[handle.hashCode()] = handle
+
+    def graphChanged(self):
+        self._graphDirty = True
+
+    # sweep ------------------------------------------------------------------
+
+    @staticmethod
+    def _readCurve(mObj):
+        fnCurve = OpenMayaAnim.MFnAnimCurve(mObj)
+        count = fnCurve.numKeys()
+        entry = {'handle': OpenMaya.MObjectHandle(mObj),
+                 'count': count,
+                 'type': fnCurve.typeName(),
+                 'first': None,
+                 'last': None,
+                 'animBounds': None,  # value change bounds, filled on demand
+                 'times': None}  # all key times, filled on demand
+        if count:
+            entry['first'] = fnCurve.time(0).asUnits(OpenMaya.MTime.kSeconds)
+            entry['last'] = fnCurve.time(count - 1).asUnits(OpenMaya.MTime.kSeconds)
+        # same rules as lsAnimCurves(safe=True), no setDrivens, clips or locked animLayer curves
+        safe = not fnCurve.findPlug('keyTimeValue', False).isLocked()
+        plugs = OpenMaya.MPlugArray()
+        fnCurve.getConnections(plugs)
+        connected = OpenMaya.MPlugArray()
+        for i in range(plugs.length()):
+            if not safe:
+                break
+            if plugs[i].isDestination():
+                safe = False
+            for isDest in (True, False):
+                plugs[i].connectedTo(connected, isDest, not isDest)
+                for c in range(connected.length()):
+                    if connected[c].node().hasFn(OpenMaya.MFn.kClipLibrary):
+                        safe = False
+        entry['safe'] = safe
+        return entry
+
+    @staticmethod
+    def _drivenNodes(mObj, depth=3):
+        '''
+        hashCodes of the nodes downstream of the curve, walking through non-dag nodes only,
+        the mirror of the listHistory(pdo=True, lv=depth) walk made by lsAnimCurves
+
+        :return: (driven, intermediates) dict of the hashCodes of all the nodes found to
+            the level they were first found at, and the set of hashCodes of those non-dag
+            nodes that were walked through
+        '''
+        driven = {}
+        intermediates = set()
+        current = [mObj]
+        plugs = OpenMaya.MPlugArray()
+        connected = OpenMaya.MPlugArray()
+        fnNode = OpenMaya.MFnDependencyNode()
+        for level in range(1, depth + 1):
+            next = []
+            for node in current:
+                fnNode.setObject(node)
+                fnNode.getConnections(plugs)
+                for i in range(plugs.length()):
+                    plugs[i].connectedTo(connected, False, True)
+                    for c in range(connected.length()):
+                        dest = connected[c].node()
+                        code = OpenMaya.MObjectHandle(dest).hashCode()
+                        if code in driven:
+                            continue
+                        driven[code] = level
+                        if not dest.hasFn(OpenMaya.MFn.kDagNode):
+                            intermediates.add(code)
+                            next.append(dest)
+            current = next
+        return driven, intermediates
+
+    def _update(self):
+        '''
+        bring the index up to date, re-reading any edited curves and, if the graph
+        changed, re-sweeping the scene curves and their driven node mapping
+        '''
+        if self._graphDirty:
+            curves = {}
+            nodeCurves = {}
+            intermediates = set()
+            it = OpenMaya.MItDependencyNodes(OpenMaya.MFn.kAnimCurve)
+            while not it.isDone():
+                mObj = it.thisNode()
+                code = OpenMaya.MObjectHandle(mObj).hashCode()
+                entry = self.curves.get(code)
+                if not entry or code in self._stale or not entry['handle'].isAlive():
+                    entry = self._readCurve(mObj)
+                curves[code] = entry
+                driven, walked = self._drivenNodes(mObj)
+                for node, level in driven.items():
+                    nodeCurves.setdefault(node, {})[code] = level
+                intermediates.update(walked)
+                it.next()
+            self.curves = curves
+            self.nodeCurves = nodeCurves
+            self._intermediates = intermediates
+            self._stale = {}
+            self._graphDirty = False
+        elif self._stale:
+            for code, handle in self._stale.items():
+                if handle.isAlive() and handle.isValid():
+                    self.curves[code] = self._readCurve(handle.object())
+                else:
+                    self.curves.pop(code, None)
+            self._stale = {}
+
+    # queries ----------------------------------------------------------------
+
+    @staticmethod
+    def _hashCodes(nodes):
+        selList = OpenMaya.MSelectionList()
+        for node in nodes:
+            try:
+                selList.add(node)
+            except RuntimeError:
+                log.debug('AnimCurveBoundsIndex : unable to find node %s' % node)
+        mObj = OpenMaya.MObject()
+        codes = []
+        for i in range(selList.length()):
+            selList.getDependNode(i, mObj)
+            codes.append(OpenMaya.MObjectHandle(mObj).hashCode())
+        return codes
+
+    def curveEntries(self, nodes, transforms_only=False):
+        '''
+        the index entries for the safe curves driving the given nodes
+        '''
+        self._update()
+        # as lsAnimCurves, the history is walked 2 levels up, 3 if the nodes are in animLayers
+        depth = 2
+        try:
+            if getAnimLayersFromGivenNodes(list(nodes)):
+                depth = 3
+        except:
+            pass
+        codes = set()
+        for node in self._hashCodes(nodes):
+            codes.update(code for code, level in self.nodeCurves.get(node, {}).items() if level <= depth)
+        entries = []
+        for code in codes:
+            entry = self.curves.get(code)
+            if not entry or not entry['safe'] or not entry['count']:
+                continue
+            if transforms_only and entry['type'] not in ['animCurveTL', 'animCurveTA']:
+                continue
+            entries.append(entry)
+        return entries
+
+    def _animBounds(self, entry):
+        '''
+        value change bounds as animCurve_get_bounds, in seconds, [] if the curve is static
+        '''
+        if entry['animBounds'] is None:
+            fnCurve = OpenMayaAnim.MFnAnimCurve(entry['handle'].object())
+            values = [fnCurve.value(i) for i in range(entry['count'])]
+            # compare in ui units, as the cmds.keyframe(vc=True) values animCurve_get_bounds uses
+            toUI, _ = _animCurveUnitConversion(fnCurve)
+            if toUI:
+                values = [toUI(v) for v in values]
+            first = 0
+            while first < entry['count'] - 1 and r9Core.floatIsEqual(values[0], values[first + 1], 0.001):
+                first += 1
+            last = entry['count'] - 1
+            while last > 0 and r9Core.floatIsEqual(values[-1], values[last - 1], 0.001):
+                last -= 1
+            if first == entry['count'] - 1:
+                entry['animBounds'] = []
+            else:
+                entry['animBounds'] = [fnCurve.time(first).asUnits(OpenMaya.MTime.kSeconds),
+                                       fnCurve.time(last).asUnits(OpenMaya.MTime.kSeconds)]
+        return entry['animBounds']
+
+    def entryBounds(self, entry, bounds_only=False, skip_static=True):
+        '''
+        bounds for an index entry in ui time units, see animCurve_get_bounds
+        '''
+        toUI = OpenMaya.MTime(1.0, OpenMaya.MTime.kSeconds).asUnits(OpenMaya.MTime.uiUnit())
+        # round off the float noise from the unit conversion, as keyTimes
+        keyBounds = [round(entry['first'] * toUI, 6), round(entry['last'] * toUI, 6)]
+        if bounds_only:
+            return keyBounds
+        bounds = self._animBounds(entry)
+        if not bounds:
+            log.debug('curve is static : %s' % OpenMaya.MFnDependencyNode(entry['handle'].object()).name())
+            if skip_static:
+                return []
+            return keyBounds
+        return [round(bounds[0] * toUI, 6), round(bounds[1] * toUI, 6)]
+
+    def curveBounds(self, curve, bounds_only=False, skip_static=True):
+        '''
+        animCurve_get_bounds via the index
+        '''
+        self._update()
+        codes = self._hashCodes([curve])
+        if not codes or codes[0] not in self.curves:
+            return False
+        entry = self.curves[codes[0]]
+        if not entry['count']:
+            return False
+        return self.entryBounds(entry, bounds_only=bounds_only, skip_static=skip_static)
+
+    def nodesRange(self, nodes, transforms_only=False, skip_static=True, bounds_only=True):
+        '''
+        (min, max) extent of the animation on the given nodes, None if there's no animation
+        '''
+        minBounds = []
+        maxBounds = []
+        for entry in self.curveEntries(nodes, transforms_only=transforms_only):
+            bounds = self.entryBounds(entry, bounds_only=bounds_only, skip_static=skip_static)
+            if bounds:
+                minBounds.append(bounds[0])
+                maxBounds.append(bounds[1])
+        if not minBounds:
+            return None
+        return min(minBounds), max(maxBounds)
+
+    def keyTimes(self, nodes, start=None, end=None):
+        '''
+        sorted, unique key times in ui units of all the curves driving the nodes, within start and end
+        '''
+        toUI = OpenMaya.MTime(1.0, OpenMaya.MTime.kSeconds).asUnits(OpenMaya.MTime.uiUnit())
+        times = set()
+        for entry in self.curveEntries(nodes):
+            if entry['times'] is None:
+                fnCurve = OpenMayaAnim.MFnAnimCurve(entry['handle'].object())
+                entry['times'] = array('d', [fnCurve.time(i).asUnits(OpenMaya.MTime.kSeconds) for i in range(entry['count'])])
+            times.update(entry['times'])
+        # round off the float noise from the unit conversion so that the frames compare cleanly
+        times = sorted(set(round(t * toUI, 6) for t in times))
+        if start is not None and end is not None:
+            times = [t for t in times if start <= t <= end]
+        return times
+
+
+def _animCurveBoundsCallbacks():
+    '''
+    bind the callbacks that keep the AnimCurveBoundsIndex current
+    '''
+    if RED9_ANIM_CALLBACKS['BoundsIndex']:
+        return
+    callbacks = RED9_ANIM_CALLBACKS['BoundsIndex']
+    callbacks.append(OpenMayaAnim.MAnimMessage.addAnimCurveEditedCallback(
+        lambda curves, *args: RED9_ANIMCURVE_BOUNDS and RED9_ANIMCURVE_BOUNDS.curvesEdited(curves)))
+    callbacks.append(OpenMaya.MDGMessage.addNodeAddedCallback(
+        lambda *args: RED9_ANIMCURVE_BOUNDS and RED9_ANIMCURVE_BOUNDS.graphChanged(), 'animCurve'))
+    callbacks.append(OpenMaya.MDGMessage.addNodeRemovedCallback(
+        lambda *args: RED9_ANIMCURVE_BOUNDS and RED9_ANIMCURVE_BOUNDS.graphChanged(), 'animCurve'))
+    callbacks.append(OpenMaya.MDGMessage.addConnectionCallback(_animCurveConnectionChanged))
+    callbacks.append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeNew, AnimCurveBoundsIndex.reset))
+    callbacks.append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeOpen, AnimCurveBoundsIndex.reset))
+    # changing the time unit can move the keys without firing the animCurveEdited callback
+    callbacks.append(OpenMaya.MEventMessage.addEventCallback('timeUnitChanged',
+                                                             lambda *args: AnimCurveBoundsIndex.invalidate()))
+
+def _animCurveConnectionChanged(srcPlug, destPlug, made, *args):
+    '''
+    connection callback, flags the index graph as dirty if a curve, or a node between
+    a curve and the node it drives, has been connected or disconnected
+    '''
+    if RED9_ANIMCURVE_BOUNDS is None or RED9_ANIMCURVE_BOUNDS._graphDirty:
+        return
+    node = srcPlug.node()
+    if node.hasFn(OpenMaya.MFn.kAnimCurve) or \
+            OpenMaya.MObjectHandle(node).hashCode() in RED9_ANIMCURVE_BOUNDS._intermediates:
+        RED9_ANIMCURVE_BOUNDS.graphChanged()
+
+def _apiCurvesUndoable(undoFunc, redoFunc):
+    '''
+    r9General.apiUndoable for API animCurve edits, the AnimCurveBoundsIndex and TrajectoryCache
+    are invalidated after the edit and again on each undo / redo of it
+    '''
+    def undo():
+        undoFunc()
+        AnimCurveBoundsIndex.invalidate()
+        TrajectoryCache.invalidate()
+
+    def redo():
+        redoFunc()
+        AnimCurveBoundsIndex.invalidate()
+        TrajectoryCache.invalidate()
+
+    AnimCurveBoundsIndex.invalidate()
+    TrajectoryCache.invalidate()
+    r9General.apiUndoable(undo, redo)
+
+def animCurve_get_bounds(curve, bounds_only=False, skip_static=True, use_index=True):
     '''
     from a given anim curve find it's upper and lower bounds. By default we examine the keyValues
     for change and return the upper and lower bounds for change.
@@ -475,7 +852,10 @@ def animCurve_get_bounds(curve, bounds_only=False, skip_static=True):
         else we look at the changing values to find the bounds
     :param skip_static: if True we ignore static curves and return [], else we return
         the key bounds for the static keys, ignoring the keyValues
+    :param use_index: answer from the scene AnimCurveBoundsIndex rather than querying the keys
     '''
+    if use_index:
+        return AnimCurveBoundsIndex.get().curveBounds(curve, bounds_only=bounds_only, skip_static=skip_static)
     keyList = cmds.keyframe(curve, q=True, vc=True, tc=True)
     if not keyList:
         return False
@@ -508,7 +888,7 @@ def animCurve_get_bounds(curve, bounds_only=False, skip_static=True):
             return [minV[0], maxV[0]]
     return bounds
 
-def animRangeFromNodes(nodes, setTimeline=True, decimals=-1, transforms_only=False, skip_static=True, bounds_only=True):
+def animRangeFromNodes(nodes, setTimeline=True, decimals=-1, transforms_only=False, skip_static=True, bounds_only=True, use_index=True):
     '''
     return the extent of the animation range for the given objects
     :param nodes: nodes to examine for animation data
@@ -519,24 +899,30 @@ def animRangeFromNodes(nodes, setTimeline=True, decimals=-1, transforms_only=Fal
         the key bounds for the static keys, ignoring the keyValues
     :param bounds_only: if True we only return the key bounds, first and last key times,
         else we look at the changing values to find the actual animated bounds via keyValue changes
+    :param use_index: answer from the scene AnimCurveBoundsIndex rather than walking the node
+        histories and querying the keys of each curve
     '''
-    minBounds = []
-    maxBounds = []
-    for anim in r9Core.FilterNode.lsAnimCurves(nodes, safe=True, allow_ref=True):
-        if transforms_only and not cmds.nodeType(anim) in ['animCurveTL', 'animCurveTA']:
-            continue
-        bounds = animCurve_get_bounds(anim, bounds_only=bounds_only, skip_static=skip_static)
-
-        if bounds:
-            minBounds.append(bounds[0])
-            maxBounds.append(bounds[1])
-#         count = cmds.keyframe(anim, q=True, kc=True)
-#         minBounds.append(cmds.keyframe(anim, q=True, index=[(0, 0)], tc=True)[0])
-#         maxBounds.append(cmds.keyframe(anim, q=True, index=[(count - 1, count - 1)], tc=True)[0])
-    if not minBounds and not maxBounds:
-        return
-    min_rng = min(minBounds)
-    max_rng = max(maxBounds)
+    if use_index:
+        rng = AnimCurveBoundsIndex.get().nodesRange(nodes, transforms_only=transforms_only,
+                                                     skip_static=skip_static, bounds_only=bounds_only)
+        if not rng:
+            return
+        min_rng, max_rng = rng
+    else:
+        minBounds = []
+        maxBounds = []
+        for anim in r9Core.FilterNode.lsAnimCurves(nodes, safe=True, allow_ref=True):
+            if transforms_only and not cmds.nodeType(anim) in ['animCurveTL', 'animCurveTA']:
+                continue
+            bounds = animCurve_get_bounds(anim, bounds_only=bounds_only, skip_static=skip_static, use_index=False)
+
+            if bounds:
+                minBounds.append(bounds[0])
+                maxBounds.append(bounds[1])
+        if not minBounds and not maxBounds:
+            return
+        min_rng = min(minBounds)
+        max_rng = max(maxBounds)
     if decimals >= 0:
         min_rng = round(min_rng, decimals)
         max_rng = round(max_rng, decimals)
@@ -584,7 +970,9 @@ def timeLineRangeProcess(start, end, step=1, incEnds=True, nodes=[]):
     startFrm = start
     endFrm = end
     if nodes:
-        keys = cmds.keyframe(nodes, q=True, time=(startFrm, endFrm))
+        if isinstance(nodes, basestring):
+            nodes = [nodes]
+        keys = AnimCurveBoundsIndex.get().keyTimes(nodes, min(startFrm, endFrm), max(startFrm, endFrm))
         if not keys:
             log.warning('Warning :  No key times extracted from the given nodes, timeLineRange reverted to base range!')
         else:
@@ -1944,41 +2332,28 @@ class AnimationUI(object):
     def buildPoseList(self, sortBy='name'):
         '''
         Get a list of poses from the PoseRootDir, this allows us to
-        filter much faster as it stops all the os calls, cached list instead
+        filter much faster as it stops all the os calls, cached list instead.
+        The list comes from the pose index, only the changed pose files are re-read
         '''
         self.poses = []
         if not os.path.exists(self.posePath):
             log.debug('posePath is invalid')
             return self.poses
-        files = os.listdir(self.posePath)
-        if files:
-            if sortBy == 'name':
-                files = r9Core.sortNumerically(files)
-                # files.sort()
-            elif sortBy == 'date':
-                files.sort(key=lambda x: os.stat(os.path.join(self.posePath, x)).st_mtime)
-                files.reverse()
-
-            for f in files:
-                if f.lower().endswith('.pose'):
-                    self.poses.append(f.split('.pose')[0])
+        self.poses = r9PoseIndex.listPoses(self.posePath, sortBy=sortBy)
         return self.poses
 
     def buildFilteredPoseList(self, searchFilter):
         '''
-        build the list of poses to show in the poseUI
-        TODO: hook up an order based by date in here as an option to tie into the UI
+        build the list of poses to show in the poseUI, in the order of self.poses.
+        Plain search strings are run on the pose index, regex filters through
+        r9Core.filterListByString
         '''
-        filteredPoses = self.poses
-        if searchFilter:
-            filteredPoses = []
-            filters = searchFilter.replace(' ', '').split(',')
-            for pose in self.poses:
-                for srch in filters:
-                    if srch and srch.upper() in pose.upper():
-                        if pose not in filteredPoses:
-                            filteredPoses.append(pose)
-        return filteredPoses
+        if not searchFilter:
+            return self.poses or []
+        if not r9PoseIndex.isIndexFilter(searchFilter):
+            return r9Core.filterListByString(self.poses, searchFilter, matchcase=False) or []
+        found = set(r9PoseIndex.searchPoses(self.posePath, searchFilter, sortBy=None))
+        return [pose for pose in self.poses if pose in found]
 
     def __validatePoseFunc(self, func):
         '''
@@ -2210,7 +2585,7 @@ class AnimationUI(object):
             if searchFilter:
                 cmds.scrollLayout(self.uiglPoseScroll, edit=True, sp='up')
 
-            for pose in r9Core.filterListByString(self.poses, searchFilter, matchcase=False) or []:  # self.buildFilteredPoseList(searchFilter):
+            for pose in self.buildFilteredPoseList(searchFilter):
                 cmds.textScrollList(self.uitslPoses, edit=True,
                                         append=pose,
                                         sc=partial(self.setPoseSelected))
@@ -2231,7 +2606,7 @@ class AnimationUI(object):
             except StandardError, error:
                 print(error)
 
-            for pose in r9Core.filterListByString(self.poses, searchFilter, matchcase=False) or []:  # self.buildFilteredPoseList(searchFilter):
+            for pose in self.buildFilteredPoseList(searchFilter):
                 try:
                     # :NOTE we prefix the buttons to get over the issue of non-numeric
                     # first characters which are stripped my Maya!
@@ -3259,6 +3634,821 @@ class AnimationUI(object):
 # Main AnimFunction code class
 # ===========================================================================
 
+class TrajectoryCache(object):
+    '''
+    Cache of the world space matrices of nodes over time. The matrices are evaluated
+    through an MDGContext so the timeline is never moved, and only the frames not
+    already held are evaluated. Solves that run repeatedly against the same nodes,
+    re-running the stabilizer with a different offset, the CameraTracker or the
+    SnapBakeSolver, then run as matrix maths against the cached data.
+
+    An entry is dropped when anything upstream of its node changes, tracked by callbacks
+    for animCurve edits, connections made or broken and reparenting. Static attr edits
+    don't fire any of those so as a last check the first cached frame is re-evaluated on
+    each query and the entry dropped if it no longer matches.
+
+    >>> cache = TrajectoryCache.get()
+    >>> worlds = cache.matrices('pCube1', range(1, 101))
+    >>> points = cache.positions('pCube1', range(1, 101))
+    '''
+    def __init__(self):
+        self.entries = {}  # (hashCode, plug, timeUnit) : entry dict
+
+    @classmethod
+    def get(cls):
+        '''
+        the scene cache, created and the callbacks bound on first use
+        '''
+        global RED9_TRAJECTORY_CACHE
+        if RED9_TRAJECTORY_CACHE is None:
+            RED9_TRAJECTORY_CACHE = cls()
+            _trajectoryCacheCallbacks()
+        return RED9_TRAJECTORY_CACHE
+
+    @staticmethod
+    def reset(*args):
+        '''
+        drop the scene cache, bound to the scene new / open callbacks
+        '''
+        global RED9_TRAJECTORY_CACHE
+        RED9_TRAJECTORY_CACHE = None
+
+    @staticmethod
+    def invalidate():
+        '''
+        clear all the cached data, called by the API curve writers that don't know
+        which nodes they've moved
+        '''
+        if RED9_TRAJECTORY_CACHE is not None:
+            RED9_TRAJECTORY_CACHE.entries = {}
+
+    def nodesChanged(self, nodes):
+        '''
+        drop the entries that have any of the given MObjects upstream of them
+        '''
+        changed = set(OpenMaya.MObjectHandle(node).hashCode() for node in nodes)
+        for key, entry in self.entries.items():
+            if entry['upstream'] & changed:
+                del self.entries[key]
+
+    @staticmethod
+    def _dagPath(node):
+        dagpath = OpenMaya.MDagPath()
+        selList = OpenMaya.MSelectionList()
+        selList.add(node)
+        selList.getDagPath(0, dagpath)
+        return dagpath
+
+    @staticmethod
+    def _upstream(mObj):
+        '''
+        hashCodes of every node driving the world matrix of the given node, walking the
+        incoming connections and the dag parents, including the node itself
+        '''
+        found = set()
+        walk = [mObj]
+        plugs = OpenMaya.MPlugArray()
+        sources = OpenMaya.MPlugArray()
+        while walk:
+            current = walk.pop()
+            hashCode = OpenMaya.MObjectHandle(current).hashCode()
+            if hashCode in found or current.hasFn(OpenMaya.MFn.kWorld):
+                continue
+            found.add(hashCode)
+            if current.hasFn(OpenMaya.MFn.kDagNode):
+                fnDag = OpenMaya.MFnDagNode(current)
+                for i in range(fnDag.parentCount()):
+                    walk.append(fnDag.parent(i))
+            OpenMaya.MFnDependencyNode(current).getConnections(plugs)
+            for i in range(plugs.length()):
+                plugs[i].connectedTo(sources, True, False)
+                for j in range(sources.length()):
+                    walk.append(sources[j].node())
+        return found
+
+    def _entry(self, node, plug):
+        '''
+        the valid cache entry for the node's plug, created if needed
+        '''
+        dagpath = self._dagPath(node)
+        handle = OpenMaya.MObjectHandle(dagpath.node())
+        key = (handle.hashCode(), plug, OpenMaya.MTime.uiUnit())
+        entry = self.entries.get(key)
+        if entry:
+            if not entry['handle'].isValid():
+                entry = None
+            elif entry['frames']:
+                t = entry['check']
+                context = OpenMaya.MDGContext(OpenMaya.MTime(t, OpenMaya.MTime.uiUnit()))
+                if not self._matrix(entry['plug'], context).isEquivalent(entry['frames'][t]):
+                    entry = None
+        if not entry:
+            fnDag = OpenMaya.MFnDagNode(dagpath)
+            entry = {'handle': handle,
+                     'plug': fnDag.findPlug(plug).elementByLogicalIndex(dagpath.instanceNumber()),
+                     'upstream': self._upstream(dagpath.node()),
+                     'frames': {},  # time : MMatrix
+                     'check': None}  # the frame re-evaluated to validate the entry
+            self.entries[key] = entry
+        return entry
+
+    @staticmethod
+    def _matrix(plug, context):
+        return OpenMaya.MFnMatrixData(plug.asMObject(context)).matrix()
+
+    def matrices(self, node, times, plug='worldMatrix'):
+        '''
+        the node's matrices at the given times
+
+        :param node: dag node to sample
+        :param times: frames, in ui units
+        :param plug: the matrix array plug to sample, worldMatrix, parentMatrix etc
+        :return: [MMatrix] in the same order as the times
+        '''
+        entry = self._entry(node, plug)
+        frames = entry['frames']
+        for t in times:
+            if t not in frames:
+                frames[t] = self._matrix(entry['plug'], OpenMaya.MDGContext(OpenMaya.MTime(t, OpenMaya.MTime.uiUnit())))
+                if entry['check'] is None:
+                    entry['check'] = t
+        return [frames[t] for t in times]
+
+    def positions(self, node, times):
+        '''
+        world space position of the node's rotatePivot at the given times, the same
+        point a pointConstraint or xform(q=True, ws=True, rp=True) gives, for arc and
+        trajectory tools
+
+        :return: [MPoint] in the same order as the times
+        '''
+        pivot = OpenMaya.MFnTransform(self._dagPath(node)).rotatePivot(OpenMaya.MSpace.kTransform)
+        return [pivot * matrix for matrix in self.matrices(node, times)]
+
+
+def _trajectoryCacheCallbacks():
+    '''
+    bind the callbacks that keep the TrajectoryCache current
+    '''
+    callbacks = RED9_ANIM_CALLBACKS.setdefault('TrajectoryCache', [])
+    if callbacks:
+        return
+    callbacks.append(OpenMayaAnim.MAnimMessage.addAnimCurveEditedCallback(_trajectoryCurvesEdited))
+    callbacks.append(OpenMaya.MDGMessage.addConnectionCallback(
+        lambda srcPlug, destPlug, *args: RED9_TRAJECTORY_CACHE and RED9_TRAJECTORY_CACHE.nodesChanged([destPlug.node()])))
+    callbacks.append(OpenMaya.MDagMessage.addAllDagChangesCallback(
+        lambda msgType, child, *args: RED9_TRAJECTORY_CACHE and RED9_TRAJECTORY_CACHE.nodesChanged([child.node()])))
+    callbacks.append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeNew, TrajectoryCache.reset))
+    callbacks.append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeOpen, TrajectoryCache.reset))
+
+def _trajectoryCurvesEdited(curves, *args):
+    if RED9_TRAJECTORY_CACHE is not None and RED9_TRAJECTORY_CACHE.entries:
+        RED9_TRAJECTORY_CACHE.nodesChanged([curves[i] for i in range(curves.length())])
+
+
+class SnapBakeSolver(object):
+    '''
+    Sample-then-solve bake used by AnimFunctions.snapTransform(batch=True). Rather than
+    stepping the timeline and running SnapTransforms / setKeyframe per node per frame
+    the bake is run in 3 passes:
+
+        * sample : the source world data for all frames is evaluated via an MDGContext,
+          the timeline itself is never moved. The matrices come from the TrajectoryCache
+        * solve : the destination translates / rotates are solved for all frames, parents
+          before children, so a snapped parent's new world matrix is carried down the chain
+          rather than relying on multiple iterations
+        * write : the results are pushed to the animCurves in one go via MFnAnimCurve, the
+          edits are held in an MDGModifier / MAnimCurveChange and go onto the undo queue as
+          a single step
+
+    As with SnapTransforms the destination's rotatePivot is placed on the source's rotatePivot
+    and the world rotations are matched.
+
+    Pairs whose source, or whose destination's un-snapped parents, are driven by any of
+    the other destinations can't be sampled up front as they move during the bake itself.
+    These are returned by bake() so they can be run through the standard timeline loop
+    once the batch data is on the curves.
+    '''
+    def __init__(self, pairs, times, snapTranslates=True, snapRotates=True, keyTimes=None):
+        '''
+        :param pairs: [(src, dest)] node pairs to process
+        :param times: frames to process
+        :param snapTranslates: solve the translates
+        :param snapRotates: solve the rotates
+        :param keyTimes: optional {node: set(times)}, the smartbake data. If a source is in this
+            dict we only key the frames it holds
+        '''
+        self.rawPairs = list(pairs)
+        self.pairs = [(cmds.ls(src, l=True)[0], cmds.ls(dest, l=True)[0]) for src, dest in pairs]
+        self.times = list(times)
+        self.snapTranslates = snapTranslates
+        self.snapRotates = snapRotates
+        self.keyTimes = keyTimes or {}
+        self.timings = {}
+        self.modifier = OpenMaya.MDGModifier()
+        self.curveChange = OpenMayaAnim.MAnimCurveChange()
+
+    @staticmethod
+    def _dagPath(node):
+        dagpath = OpenMaya.MDagPath()
+        selList = OpenMaya.MSelectionList()
+        selList.add(node)
+        selList.getDagPath(0, dagpath)
+        return dagpath
+
+    @staticmethod
+    def _ancestors(node):
+        parts = node.split('|')
+        return ['|'.join(parts[:i]) for i in range(len(parts) - 1, 1, -1)]
+
+    def _upstream(self, node, stops):
+        '''
+        all the DAG nodes driving the world transform of the given node, walking both the
+        DG connections and the parents. Nodes in stops are returned but not walked through.
+        '''
+        found = set()
+        walk = [node]
+        while walk:
+            current = walk.pop()
+            if current in found:
+                continue
+            found.add(current)
+            if current in stops and not current == node:
+                continue
+            walk.extend(self._ancestors(current)[:1])
+            graphIter = OpenMaya.MItDependencyGraph(self._dagPath(current).node(),
+                                                    OpenMaya.MItDependencyGraph.kUpstream,
+                                                    OpenMaya.MItDependencyGraph.kBreadthFirst,
+                                                    OpenMaya.MItDependencyGraph.kNodeLevel)
+            while not graphIter.isDone():
+                if graphIter.currentItem().hasFn(OpenMaya.MFn.kDagNode):
+                    walk.append(OpenMaya.MFnDagNode(graphIter.currentItem()).fullPathName())
+                graphIter.next()
+        found.discard(node)
+        return found
+
+    def dependencies(self):
+        '''
+        return the indexes of the pairs that can't be batched as they depend on other destinations
+        '''
+        dests = set(dest for _, dest in self.pairs)
+        dependent = set()
+        for src, dest in self.pairs:
+            if src in dests or self._upstream(src, dests) & dests:
+                dependent.add(dest)
+            elif (self._upstream(dest, dests) & dests) - set(self._ancestors(dest)):
+                dependent.add(dest)
+        # anything parented under a dependent destination moves with it
+        for _, dest in sorted(self.pairs, key=lambda x: x[1].count('|')):
+            if set(self._ancestors(dest)) & dependent:
+                dependent.add(dest)
+        return [i for i, (_, dest) in enumerate(self.pairs) if dest in dependent]
+
+    def _destData(self, dest):
+        '''
+        static data for the destination, read once at the current time
+        '''
+        dagpath = self._dagPath(dest)
+        fnTrans = OpenMaya.MFnTransform(dagpath)
+        data = {'fn': fnTrans,
+                'pivot': OpenMaya.MVector(fnTrans.rotatePivot(OpenMaya.MSpace.kTransform)) +
+                         fnTrans.rotatePivotTranslation(OpenMaya.MSpace.kTransform),
+                'rotateAxis': fnTrans.rotateOrientation(OpenMaya.MSpace.kTransform),
+                'jointOrient': OpenMaya.MQuaternion(),
+                'isJoint': dagpath.hasFn(OpenMaya.MFn.kJoint),
+                'rotateOrder': cmds.getAttr('%s.rotateOrder' % dest),
+                'transformation': fnTrans.transformation()}
+        if data['isJoint']:
+            OpenMayaAnim.MFnIkJoint(dagpath).getOrientation(data['jointOrient'])
+        euler = OpenMaya.MEulerRotation()
+        fnTrans.getRotation(euler)
+        data['euler'] = euler
+        return data
+
+    @staticmethod
+    def _vector(plug, context):
+        return OpenMaya.MVector(plug.child(0).asDouble(context),
+                                plug.child(1).asDouble(context),
+                                plug.child(2).asDouble(context))
+
+    def _sample(self, pairs, snappedAncestors, trajectories=None):
+        '''
+        evaluate all the data the solve needs for every frame through an MDGContext
+
+        :param trajectories: optional {src: [(worldMatrix, pivotPoint)]} already solved source
+            data, these sources aren't sampled
+        '''
+        cache = TrajectoryCache.get()
+        contexts = [OpenMaya.MDGContext(OpenMaya.MTime(t, OpenMaya.MTime.uiUnit())) for t in self.times]
+        samples = dict(trajectories or {})
+        for src, dest in pairs:
+            if src not in samples:
+                fnSrc = OpenMaya.MFnTransform(self._dagPath(src))
+                pivot = OpenMaya.MVector(fnSrc.rotatePivot(OpenMaya.MSpace.kTransform)) + \
+                        fnSrc.rotatePivotTranslation(OpenMaya.MSpace.kTransform)
+                translate = fnSrc.findPlug('translate')
+                samples[src] = [(world, OpenMaya.MPoint(pivot + self._vector(translate, ctx)) * parent)
+                                for world, parent, ctx in zip(cache.matrices(src, self.times),
+                                                              cache.matrices(src, self.times, 'parentMatrix'),
+                                                              contexts)]
+            fnDest = OpenMaya.MFnTransform(self._dagPath(dest))
+            samples[(dest, 'parent')] = cache.matrices(dest, self.times, 'parentMatrix')
+            if not self.snapTranslates:
+                translate = fnDest.findPlug('translate')
+                samples[(dest, 'translate')] = [self._vector(translate, ctx) for ctx in contexts]
+            if not self.snapRotates:
+                rotate = fnDest.findPlug('rotate')
+                samples[(dest, 'rotate')] = [self._vector(rotate, ctx) for ctx in contexts]
+        for ancestor in set(snappedAncestors.values()):
+            samples[(ancestor, 'world')] = cache.matrices(ancestor, self.times)
+        return samples
+
+    def _localMatrix(self, data, translate, euler):
+        '''
+        the destination's local matrix with the solved translate and rotate
+        '''
+        if data['isJoint']:
+            # joint : [S][RO][R][JO][T], inverse parent scale ignored
+            trans = OpenMaya.MTransformationMatrix()
+            trans.setTranslation(translate, OpenMaya.MSpace.kTransform)
+            return data['transformation'].asScaleMatrix() * data['rotateAxis'].asMatrix() * \
+                   euler.asMatrix() * data['jointOrient'].asMatrix() * trans.asMatrix()
+        transformation = OpenMaya.MTransformationMatrix(data['transformation'])
+        transformation.setTranslation(translate, OpenMaya.MSpace.kTransform)
+        transformation.rotateTo(euler)
+        return transformation.asMatrix()
+
+    def _solve(self, pairs, samples, destData, snappedAncestors):
+        '''
+        solve the destination translates and rotates for all frames, internal units
+        '''
+        results = dict((dest, ([], [])) for _, dest in pairs)
+        previous = dict((dest, destData[dest]['euler']) for _, dest in pairs)
+        for i in range(len(self.times)):
+            worlds = {}
+            for src, dest in pairs:
+                data = destData[dest]
+                srcWorld, srcPivot = samples[src][i]
+                parent = samples[(dest, 'parent')][i]
+                ancestor = snappedAncestors.get(dest)
+                if ancestor:
+                    # un-snapped chain between the dest and its snapped ancestor is rigid
+                    parent = parent * samples[(ancestor, 'world')][i].inverse() * worlds[ancestor]
+
+                if self.snapTranslates:
+                    translate = OpenMaya.MVector(srcPivot * parent.inverse()) - data['pivot']
+                else:
+                    translate = samples[(dest, 'translate')][i]
+
+                if self.snapRotates:
+                    rotation = data['rotateAxis'].inverse().asMatrix() * \
+                               OpenMaya.MTransformationMatrix(srcWorld).rotation().asMatrix() * \
+                               OpenMaya.MTransformationMatrix(parent).rotation().inverse().asMatrix() * \
+                               data['jointOrient'].inverse().asMatrix()
+                    euler = OpenMaya.MTransformationMatrix(rotation).eulerRotation()
+                    euler.reorderIt(data['rotateOrder'])
+                    euler.setToClosestSolution(previous[dest])
+                    previous[dest] = euler
+                else:
+                    rotate = samples[(dest, 'rotate')][i]
+                    euler = OpenMaya.MEulerRotation(rotate.x, rotate.y, rotate.z, data['rotateOrder'])
+
+                worlds[dest] = self._localMatrix(data, translate, euler) * parent
+                results[dest][0].append(translate)
+                results[dest][1].append(euler)
+        return results
+
+    def _writeCurve(self, plug, channel, times, values):
+        '''
+        key the given internal unit values onto the plug's animCurve, creating it if needed.
+        The edits go into self.modifier / self.curveChange, see _commit
+        '''
+        curves = OpenMaya.MObjectArray()
+        if plug.isDestination() and not OpenMayaAnim.MAnimUtil.findAnimation(plug, curves):
+            # driven through something other than a simple curve so key it the slow
+            # way, the values still need converting to ui units. These keys go onto the
+            # undo queue as commands, inside the bake's undo chunk, see _writeUndoable
+            for t, value in zip(times, values):
+                if '.rotate' in channel:
+                    value = OpenMaya.MAngle(value).asUnits(OpenMaya.MAngle.uiUnit())
+                else:
+                    value = OpenMaya.MDistance(value).asUnits(OpenMaya.MDistance.uiUnit())
+                cmds.setKeyframe(channel, t=t, v=value)
+            return
+        fnCurve = OpenMayaAnim.MFnAnimCurve()
+        if curves.length():
+            fnCurve.setObject(curves[0])
+        else:
+            fnCurve.create(plug, self.modifier)
+
+        mTimes = OpenMaya.MTimeArray()
+        mValues = OpenMaya.MDoubleArray()
+        for t, value in sorted(zip(times, values)):
+            mTime = OpenMaya.MTime(t, OpenMaya.MTime.uiUnit())
+            if fnCurve.numKeys():
+                index = fnCurve.findClosest(mTime)
+                if fnCurve.time(index) == mTime:
+                    fnCurve.setValue(index, value, self.curveChange)
+                    continue
+            mTimes.append(mTime)
+            mValues.append(value)
+        if mTimes.length():
+            fnCurve.addKeys(mTimes, mValues,
+                            OpenMayaAnim.MFnAnimCurve.kTangentGlobal,
+                            OpenMayaAnim.MFnAnimCurve.kTangentGlobal,
+                            True, self.curveChange)
+
+    def _write(self, pairs, rawPairs, results, destData):
+        channels = []
+        if self.snapTranslates:
+            channels.extend([('translateX', 0, 0), ('translateY', 0, 1), ('translateZ', 0, 2)])
+        if self.snapRotates:
+            channels.extend([('rotateX', 1, 0), ('rotateY', 1, 1), ('rotateZ', 1, 2)])
+        for (_, dest), (rawSrc, _) in zip(pairs, rawPairs):
+            frames = range(len(self.times))
+            if rawSrc in self.keyTimes:
+                frames = [i for i, t in enumerate(self.times) if t in self.keyTimes[rawSrc]]
+            times = [self.times[i] for i in frames]
+            fnDest = destData[dest]['fn']
+            for attr, block, axis in channels:
+                plug = fnDest.findPlug(attr)
+                if plug.isLocked():
+                    continue
+                self._writeCurve(plug, '%s.%s' % (dest, attr), times, [results[dest][block][i][axis] for i in frames])
+
+    def _commit(self):
+        '''
+        connect any new curves and push all the curve edits onto the undo queue as a single step
+        '''
+        self.modifier.doIt()
+        modifier = self.modifier
+        curveChange = self.curveChange
+
+        def undo():
+            curveChange.undoIt()
+            modifier.undoIt()
+
+        def redo():
+            modifier.doIt()
+            curveChange.redoIt()
+
+        _apiCurvesUndoable(undo, redo)
+        self.modifier = OpenMaya.MDGModifier()
+        self.curveChange = OpenMayaAnim.MAnimCurveChange()
+
+    def _writeUndoable(self, pairs, rawPairs, results, destData):
+        '''
+        write the curves in one undo chunk, the API edits and any fallback setKeyframe
+        calls are undone together
+        '''
+        cmds.undoInfo(openChunk=True)
+        try:
+            try:
+                self._write(pairs, rawPairs, results, destData)
+            finally:
+                self._commit()
+                self._written(destData)
+        finally:
+            cmds.undoInfo(closeChunk=True)
+
+    def bake(self):
+        '''
+        run the sample, solve and write passes for all the pairs that can be batched
+
+        :return: the (src, dest) pairs that couldn't be batched and still need processing
+        '''
+        start = time.time()
+        skipped = self.dependencies()
+        pairs = [pair for i, pair in enumerate(self.pairs) if i not in skipped]
+        rawPairs = [pair for i, pair in enumerate(self.rawPairs) if i not in skipped]
+        if skipped:
+            log.info('SnapBake : %i nodes depend on other snapped nodes and will use the timeline bake' % len(skipped))
+
+        # parents before children
+        order = sorted(range(len(pairs)), key=lambda i: pairs[i][1].count('|'))
+        pairs = [pairs[i] for i in order]
+        rawPairs = [rawPairs[i] for i in order]
+        dests = set(dest for _, dest in pairs)
+        snappedAncestors = {}
+        for _, dest in pairs:
+            for ancestor in self._ancestors(dest):
+                if ancestor in dests:
+                    snappedAncestors[dest] = ancestor
+                    break
+        destData = dict((dest, self._destData(dest)) for _, dest in pairs)
+        self.timings['dependencies'] = time.time() - start
+
+        start = time.time()
+        samples = self._sample(pairs, snappedAncestors)
+        self.timings['sample'] = time.time() - start
+
+        start = time.time()
+        results = self._solve(pairs, samples, destData, snappedAncestors)
+        self.timings['solve'] = time.time() - start
+
+        start = time.time()
+        self._writeUndoable(pairs, rawPairs, results, destData)
+        self.timings['write'] = time.time() - start
+        log.debug('SnapBake timings : %s' % self.timings)
+        return [pair for i, pair in enumerate(self.rawPairs) if i in skipped]
+
+    def solveTrajectories(self, trajectories):
+        '''
+        solve and key the destinations against world trajectories that have already been
+        built, rather than sampled from the source nodes. Used by the stabilizer and the
+        CameraTracker which build their targets from the TrajectoryCache. As there's no source
+        node there's no dependency test, the caller has to make sure the trajectories
+        don't depend on the destinations.
+
+        :param trajectories: [[(worldMatrix, pivotPoint)]], for each pair in turn one
+            entry per frame in self.times. The pivotPoint is where the destination's
+            rotatePivot is placed in world space
+        '''
+        start = time.time()
+        pairs = [(dest, dest) for _, dest in self.pairs]
+        destData = dict((dest, self._destData(dest)) for _, dest in pairs)
+        samples = self._sample(pairs, {}, dict((dest, trajectory) for (_, dest), trajectory in zip(pairs, trajectories)))
+        results = self._solve(pairs, samples, destData, {})
+        self._writeUndoable(pairs, self.rawPairs, results, destData)
+        self.timings['trajectories'] = time.time() - start
+
+    @staticmethod
+    def _written(destData):
+        '''
+        the API curve writes don't reliably fire the animCurve callbacks so flag the
+        destinations as changed ourselves
+        '''
+        AnimCurveBoundsIndex.invalidate()
+        if RED9_TRAJECTORY_CACHE is not None:
+            RED9_TRAJECTORY_CACHE.nodesChanged([data['fn'].object() for data in destData.values()])
+
+
+class AnimCurveTransfer(object):
+    '''
+    Direct curve to curve key transfer used by AnimFunctions.copyKeys. Rather than running
+    each node pair through Maya's keyframe clipboard (copyKey / pasteKey) the keys, tangents
+    and weights are read from the source MFnAnimCurves into arrays and written straight
+    into the destination curves, creating them if they don't exist. The edits for all the
+    pairs are held in one MDGModifier / MAnimCurveChange and go onto the undo queue as a
+    single step when commit() is called.
+
+    Only the 'replace', 'replaceCompletely' and 'merge' pasteKey options are handled here,
+    the others (insert, scale*, fit*) are based on the clipboard range so still need to go
+    through pasteKey. Pairs whose channels aren't directly driven by animCurves (animLayers,
+    driven keys, constraints) are rejected by transfer() so the caller can fall back to the
+    clipboard for just those nodes:
+
+    >>> transfer = AnimCurveTransfer(time=(1, 100), pasteKey='replace', timeOffset=10)
+    >>> for src, dest in pairs:
+    >>>     if not transfer.transfer(src, dest):
+    >>>         cmds.copyKey(src, time=(1, 100))
+    >>>         cmds.pasteKey(dest, option='replace', timeOffset=10)
+    >>> transfer.commit()
+    '''
+    pasteOptions = ['replace', 'replaceCompletely', 'merge']
+
+    def __init__(self, time=(), pasteKey='replace', timeOffset=0):
+        '''
+        :param time: (start, end) only transfer the keys in this range, in ui time units
+        :param pasteKey: 'replace', 'replaceCompletely' or 'merge'
+        :param timeOffset: offset the keys by this many frames on the destination
+        '''
+        self.time = time
+        self.pasteKey = pasteKey
+        self.timeOffset = timeOffset
+        self.modifier = OpenMaya.MDGModifier()
+        self.curveChange = OpenMayaAnim.MAnimCurveChange()
+        self.transferred = []  # (src, dest) pairs processed by this instance
+        self._edited = False  # anything written since the last commit
+
+    @property
+    def isSupported(self):
+        return self.pasteKey in self.pasteOptions
+
+    @staticmethod
+    def _plug(channel):
+        selList = OpenMaya.MSelectionList()
+        selList.add(channel)
+        plug = OpenMaya.MPlug()
+        selList.getPlug(0, plug)
+        return plug
+
+    @staticmethod
+    def _animCurve(plug):
+        '''
+        the animCurve driving the plug, None if it isn't connected or False
+        if it's driven by anything other than a time based animCurve
+        '''
+        if not plug.isDestination():
+            return None
+        plugs = OpenMaya.MPlugArray()
+        plug.connectedTo(plugs, True, False)
+        if plugs.length() and plugs[0].node().hasFn(OpenMaya.MFn.kAnimCurve):
+            if not OpenMayaAnim.MFnAnimCurve(plugs[0].node()).isUnitlessInput():
+                return plugs[0].node()
+        return False
+
+    @staticmethod
+    def _getTangent(fnCurve, index, inTangent):
+        angle = OpenMaya.MAngle()
+        util = OpenMaya.MScriptUtil()
+        util.createFromDouble(0.0)
+        weight = util.asDoublePtr()
+        fnCurve.getTangent(index, angle, weight, inTangent)
+        return angle.asRadians(), OpenMaya.MScriptUtil.getDouble(weight)
+
+    def _readCurve(self, curve):
+        '''
+        read the keys, within the time range, from the given animCurve into flat arrays
+        '''
+        fnCurve = OpenMayaAnim.MFnAnimCurve(curve)
+        uiUnit = OpenMaya.MTime.uiUnit()
+        data = {'type': fnCurve.animCurveType(),
+                'weighted': fnCurve.isWeighted(),
+                'preInfinity': fnCurve.preInfinityType(),
+                'postInfinity': fnCurve.postInfinityType(),
+                'times': array('d'),
+                'values': array('d'),
+                'inTypes': array('i'),
+                'outTypes': array('i'),
+                'inTangents': array('d'),
+                'inWeights': array('d'),
+                'outTangents': array('d'),
+                'outWeights': array('d'),
+                'flags': array('B')}  # bit 1 = tangents locked, 2 = weights locked, 4 = breakdown
+        for i in range(fnCurve.numKeys()):
+            t = fnCurve.time(i).asUnits(uiUnit)
+            if self.time and not self.time[0] <= t <= self.time[1]:
+                continue
+            data['times'].append(t)
+            data['values'].append(fnCurve.value(i))
+            data['inTypes'].append(fnCurve.inTangentType(i))
+            data['outTypes'].append(fnCurve.outTangentType(i))
+            angle, weight = self._getTangent(fnCurve, i, True)
+            data['inTangents'].append(angle)
+            data['inWeights'].append(weight)
+            angle, weight = self._getTangent(fnCurve, i, False)
+            data['outTangents'].append(angle)
+            data['outWeights'].append(weight)
+            data['flags'].append(fnCurve.tangentsLocked(i) | fnCurve.weightsLocked(i) << 1 | fnCurve.isBreakdown(i) << 2)
+        return data
+
+    def _writeCurve(self, plug, curve, data, pasteRange):
+        '''
+        write the key arrays to the destination, curve is None if the plug isn't keyed yet
+        '''
+        change = self.curveChange
+        uiUnit = OpenMaya.MTime.uiUnit()
+        fnCurve = OpenMayaAnim.MFnAnimCurve()
+        if curve is None:
+            fnCurve.create(plug, data['type'], self.modifier)
+        else:
+            fnCurve.setObject(curve)
+
+        if curve is None or self.pasteKey == 'replaceCompletely':
+            fnCurve.setIsWeighted(data['weighted'], change)
+            fnCurve.setPreInfinityType(data['preInfinity'], change)
+            fnCurve.setPostInfinityType(data['postInfinity'], change)
+
+        # clear the keys we're pasting over
+        if curve is not None:
+            pasteTimes = set(round(t + self.timeOffset, 4) for t in data['times'])
+            for i in reversed(range(fnCurve.numKeys())):
+                t = fnCurve.time(i).asUnits(uiUnit)
+                if self.pasteKey == 'replaceCompletely' or \
+                        (self.pasteKey == 'replace' and pasteRange[0] <= t <= pasteRange[1]) or \
+                        round(t, 4) in pasteTimes:
+                    fnCurve.remove(i, change)
+
+        fixed = OpenMayaAnim.MFnAnimCurve.kTangentFixed
+        scale = -1 if data.get('inverse') else 1
+        for k in range(len(data['times'])):
+            index = fnCurve.addKey(OpenMaya.MTime(data['times'][k] + self.timeOffset, uiUnit),
+                                   data['values'][k] * scale,
+                                   data['inTypes'][k],
+                                   data['outTypes'][k],
+                                   change)
+            flags = data['flags'][k]
+            fnCurve.setTangentsLocked(index, False, change)
+            fnCurve.setWeightsLocked(index, False, change)
+            if data['inTypes'][k] == fixed:
+                fnCurve.setTangent(index, OpenMaya.MAngle(data['inTangents'][k] * scale), data['inWeights'][k], True, change)
+            if data['outTypes'][k] == fixed:
+                fnCurve.setTangent(index, OpenMaya.MAngle(data['outTangents'][k] * scale), data['outWeights'][k], False, change)
+            if flags & 4:
+                fnCurve.setIsBreakdown(index, True, change)
+            fnCurve.setTangentsLocked(index, bool(flags & 1), change)
+            fnCurve.setWeightsLocked(index, bool(flags & 2), change)
+
+    def transfer(self, src, dest, attributes=None):
+        '''
+        transfer the keys from src to dest
+
+        :param src: source node
+        :param dest: destination node
+        :param attributes: only transfer these attrs, long or short names
+        :return: False if the pair can't be handled here and needs to go through the clipboard
+        '''
+        blocks = self.collect(src, dest, attributes)
+        if blocks is False:
+            return False
+        self.write(blocks)
+        self.transferred.append((src, dest))
+        return True
+
+    def collect(self, src, dest, attributes=None, inverse=()):
+        '''
+        read the curve data to transfer from src to dest without writing anything. Used
+        directly when the reads have to be done before any writes, ie the mirror swapping
+        the left and right data over.
+
+        :param src: source node
+        :param dest: destination node
+        :param attributes: only transfer these attrs, long or short names
+        :param inverse: attrs, long or short names, whose values are inversed on the dest
+        :return: the blocks of curve data to pass to write(), or False if the pair
+            can't be handled here and needs to go through the clipboard
+        '''
+        if not self.isSupported:
+            return False
+        selList = OpenMaya.MSelectionList()
+        selList.add(src)
+        srcNode = OpenMaya.MObject()
+        selList.getDependNode(0, srcNode)
+        plugs = OpenMaya.MPlugArray()
+        OpenMayaAnim.MAnimUtil.findAnimatedPlugs(srcNode, plugs)
+
+        blocks = []
+        for i in range(plugs.length()):
+            plug = plugs[i]
+            if attributes and not plug.partialName(False, False, False, False, False, True) in attributes \
+                    and not plug.partialName() in attributes:
+                continue
+            curve = self._animCurve(plug)
+            if curve is False:
+                return False
+            if not curve:
+                continue
+            try:
+                destPlug = self._plug('%s.%s' % (dest, plug.partialName(False, True, True, False, False, True)))
+            except RuntimeError:
+                log.debug('copyKeys : %s has no attr matching %s' % (dest, plug.name()))
+                continue
+            if destPlug.isLocked():
+                continue
+            destCurve = self._animCurve(destPlug)
+            if destCurve is False:
+                return False
+            data = self._readCurve(curve)
+            data['inverse'] = bool(inverse) and (plug.partialName(False, False, False, False, False, True) in inverse
+                                                 or plug.partialName() in inverse)
+            if data['times']:
+                blocks.append((destPlug, destCurve, data))
+        return blocks
+
+    def write(self, blocks):
+        '''
+        write the blocks returned by collect() to their destination curves
+        '''
+        if not blocks:
+            return
+        # the pasteKey 'replace' range is the whole copied range, not per curve
+        if self.time:
+            pasteRange = self.time
+        else:
+            pasteRange = (min(data['times'][0] for _, _, data in blocks),
+                          max(data['times'][-1] for _, _, data in blocks))
+        pasteRange = (pasteRange[0] + self.timeOffset, pasteRange[1] + self.timeOffset)
+
+        for destPlug, destCurve, data in blocks:
+            self._writeCurve(destPlug, destCurve, data, pasteRange)
+        self._edited = True
+
+    def commit(self):
+        '''
+        connect any new curves and push the whole transfer onto the undo queue as one step,
+        nothing is pushed if no keys were written
+        '''
+        if not self._edited:
+            return
+        self.modifier.doIt()
+        modifier = self.modifier
+        curveChange = self.curveChange
+
+        def undo():
+            curveChange.undoIt()
+            modifier.undoIt()
+
+        def redo():
+            modifier.doIt()
+            curveChange.redoIt()
+
+        _apiCurvesUndoable(undo, redo)
+        self.modifier = OpenMaya.MDGModifier()
+        self.curveChange = OpenMayaAnim.MAnimCurveChange()
+        self._edited = False
+
+
 class AnimFunctions(object):
     '''
     Most of the main Animation Functions take a settings object which is
@@ -3320,7 +4510,7 @@ class AnimFunctions(object):
     # ===========================================================================
 
     def copyKeys_ToMultiHierarchy(self, nodes=None, time=(), pasteKey='replace',
-                 attributes=None, filterSettings=None, matchMethod=None, mergeLayers=True, **kws):
+                 attributes=None, filterSettings=None, matchMethod=None, mergeLayers=True, directTransfer=True, **kws):
         '''
         This isn't the best way by far to do this, but as a quick wrapper
         it works well enough. Really we need to process the nodes more intelligently
@@ -3341,11 +4531,12 @@ class AnimFunctions(object):
                           filterSettings=filterSettings,
                           toMany=False,
                           matchMethod=matchMethod,
-                          mergeLayers=mergeLayers)
+                          mergeLayers=mergeLayers,
+                          directTransfer=directTransfer)
 
     # @r9General.Timer
     def copyKeys(self, nodes=None, time=(), pasteKey='replace', attributes=None,
-                 filterSettings=None, toMany=False, matchMethod=None, mergeLayers=False, timeOffset=0, **kws):
+                 filterSettings=None, toMany=False, matchMethod=None, mergeLayers=False, timeOffset=0, directTransfer=True, **kws):
         '''
         Copy Keys is a Hi-Level wrapper function to copy animation data between
         filtered nodes, either in hierarchies or just selected pairs.
@@ -3367,6 +4558,10 @@ class AnimFunctions(object):
         :param matchMethod: arg passed to the match code, sets matchMethod used to match 2 node names
         :param mergeLayers: this pre-processes animLayers so that we have a single, temporary merged
             animLayer to extract a compiled version of the animData from. This gets deleted afterwards.
+        :param timeOffset: offset the pasted keys by this many frames
+        :param directTransfer: copy the curve data directly via the AnimCurveTransfer rather than through
+            the keyframe clipboard. Used for the 'replace', 'replaceCompletely' and 'merge' pasteKey methods,
+            any other method, or nodes driven through animLayers, still go through copyKey / pasteKey
 
         TODO: this needs to support 'skipAttrs' param like the copyAttrs does - needed for the snapTransforms calls
         '''
@@ -3393,12 +4588,19 @@ class AnimFunctions(object):
         # Manage AnimLayers - note to Autodesk, this should be internal to the cmds!
         with AnimationLayerContext(srcNodes, mergeLayers=mergeLayers, restoreOnExit=True):
             if nodeList:
+                transfer = None
+                if directTransfer:
+                    transfer = AnimCurveTransfer(time=time, pasteKey=pasteKey, timeOffset=timeOffset)
+                    if not transfer.isSupported:
+                        transfer = None
                 with r9General.HIKContext([d for _, d in nodeList]):
                     for src, dest in nodeList:
                         try:
                             if logging_is_debug():
                                 log.debug('copyKeys : %s > %s' % (r9Core.nodeNameStrip(dest),
                                                                     r9Core.nodeNameStrip(src)))
+                            if transfer and transfer.transfer(src, dest, attributes=attributes):
+                                continue
                             if attributes:
                                 # copy only specific attributes
                                 for attr in attributes:
@@ -3409,6 +4611,8 @@ class AnimFunctions(object):
                                     cmds.pasteKey(dest, option=pasteKey, timeOffset=timeOffset)
                         except:
                             log.debug('Failed to copyKeys between : %s >> %s' % (src, dest))
+                    if transfer:
+                        transfer.commit()
             else:
                 raise StandardError('Nothing found by the Hierarchy Code to process')
         return True
@@ -3519,7 +4723,7 @@ class AnimFunctions(object):
 #     @r9General.evalManager_idleAction
     def snapTransform(self, nodes=None, time=(), step=1, preCopyKeys=1, preCopyAttrs=1, filterSettings=None,
                       iterations=1, matchMethod=None, prioritySnapOnly=False, snapRotates=True, snapTranslates=True,
-                      additionalCalls=[], cutkeys=False, smartbake=False, smartBakeRef=[], additionalCalls_pre=[], **kws):
+                      additionalCalls=[], cutkeys=False, smartbake=False, smartBakeRef=[], additionalCalls_pre=[], batch=False, **kws):
         '''
         Snap objects over a timeRange. This wraps the default hierarchy filters
         so it's capable of multiple hierarchy filtering and matching methods.
@@ -3557,6 +4761,9 @@ class AnimFunctions(object):
             are then respected during the process
         :param smartBakeRef: smartbake=True if given, used as reference nodes to extract keytimes from, else we look at all nodes about to be
             processed which isn't always what we want. If we still find no keytimes we revert to base range times with step given
+        :param batch: when processing over time, sample the sources and solve the destinations for all frames without
+            stepping the timeline, writing whole curves at the end, see SnapBakeSolver. Nodes that depend on other
+            snapped nodes, and all nodes if additionalCalls or iterations are used, run through the standard loop.
 
         .. note::
             you can also pass the CopyKey kws in to the preCopy call, see copyKeys above
@@ -3630,7 +4837,7 @@ class AnimFunctions(object):
                     for node in self.nodesToSnap:
                         _smartBakeRef.extend(node)  # have to take both as the src may have no keys, it may be driven
                 for node in _smartBakeRef:
-                    _smartBake_nodekeys[node] = timeLineRangeProcess(time[0], time[1], step, incEnds=True, nodes=node)
+                    _smartBake_nodekeys[node] = set(timeLineRangeProcess(time[0], time[1], step, incEnds=True, nodes=node))
                 if not _smartBakeRef:
                     raise IOError("ABORTED : SmartBake couldn't find any reference nodes with keys to base the data on!")
 
@@ -3655,8 +4862,22 @@ class AnimFunctions(object):
                                 if snapRotates:
                                     cmds.cutKey(dest, at='rotate', time=time)
 
+                        frames = timeLineRangeProcess(time[0], time[1], step, incEnds=True, nodes=_smartBakeRef)
+                        loopPairs = self.nodesToSnap
+                        if batch:
+                            if iterations > 1 or additionalCalls or additionalCalls_pre:
+                                log.info('snapTransform : batch mode bypassed, additionalCalls and iterations require the timeline to be stepped')
+                            else:
+                                solver = SnapBakeSolver(self.nodesToSnap, frames,
+                                                        snapTranslates=snapTranslates,
+                                                        snapRotates=snapRotates,
+                                                        keyTimes=_smartBake_nodekeys)
+                                loopPairs = solver.bake()
+                                if not loopPairs:
+                                    frames = []
+
                         with progressBar:
-                            for t in timeLineRangeProcess(time[0], time[1], step, incEnds=True, nodes=_smartBakeRef):
+                            for t in frames:
                                 if progressBar.isCanceled():
                                     cancelled = True
                                     break
@@ -3675,9 +4896,9 @@ class AnimFunctions(object):
                                             log.debug('Additional Pre-Snap Func Called : %s' % func)
                                             func()
 
-                                    for src, dest in self.nodesToSnap:
+                                    for src, dest in loopPairs:
                                         # verify the src node has a key at the given accumulated keytime (if smartbake)
-                                        if _smartBake_nodekeys and src in _smartBake_nodekeys.keys() and t not in _smartBake_nodekeys[src]:
+                                        if _smartBake_nodekeys and src in _smartBake_nodekeys and t not in _smartBake_nodekeys[src]:
                                             if logging_is_debug():
                                                 log.debug('skipping time : %s : node : %s' % (t, r9Core.nodeNameStrip(src)))
                                         else:
@@ -3776,7 +4997,7 @@ class AnimFunctions(object):
             cmds.SnapTransforms(source=nodes[0], destination=node, snapTranslates=snapTranslates, snapRotates=snapRotates, timeEnabled=False)
 
     @staticmethod
-    def stabilizer(nodes=None, time=(), step=1, trans=True, rots=True):
+    def stabilizer(nodes=None, time=(), step=1, trans=True, rots=True, batch=False):
         '''
         This is designed with 2 specific functionalities:
         If you have a single node selected it will stabilize it regardless
@@ -3791,6 +5012,10 @@ class AnimFunctions(object):
         :param step: int value for frame advance between process runs
         :param trans: track translates
         :param rots: track rotates
+        :param batch: when processing over time, solve all the frames against the reference's
+            cached world matrices, see TrajectoryCache, and write the curves in one go rather
+            than stepping the timeline. Re-running against the same reference only evaluates
+            it once.
         '''
         # destObj = None  #Main Object being manipulated and keyed
         # snapRef = None  #Tracking ReferenceObject Used to Pass the transforms over
@@ -3847,7 +5072,22 @@ class AnimFunctions(object):
                     # Stabilizer Mode - take the reference from the node position itself
                     cmds.SnapTransforms(source=destObj, destination=snapRef, snapTranslates=trans, snapRotates=rots)
 
-                if time:
+                if time and batch:
+                    if len(nodes) == 2 and SnapBakeSolver([(offsetRef, destObj)], timeRange).dependencies():
+                        log.info('Stabilizer : batch mode bypassed, the reference is driven by the tracked node')
+                        batch = False
+                if time and batch:
+                    # solve against the reference trajectory, snapRef has no pivots so its
+                    # world origin is where the destination's rotatePivot goes
+                    # ==========================================================
+                    local = OpenMaya.MFnTransform(SnapBakeSolver._dagPath(snapRef)).transformation().asMatrix()
+                    if len(nodes) == 2:
+                        worlds = [local * matrix for matrix in TrajectoryCache.get().matrices(offsetRef, timeRange)]
+                    else:
+                        worlds = [local] * len(timeRange)
+                    SnapBakeSolver([(destObj, destObj)], timeRange, trans, rots).solveTrajectories(
+                        [[(world, OpenMaya.MPoint() * world) for world in worlds]])
+                elif time:
                     # Now run the snap against the reference node we've just made
                     # ==========================================================
                     progressBar = r9General.ProgressBarContext(duration, step=step, ismain=True)
@@ -4092,6 +5332,34 @@ class curveModifierContext(object):
         return True
 
 
+def _getAnimCurveFn(curve):
+    '''
+    MFnAnimCurve for the given animCurve name
+    '''
+    selList = OpenMaya.MSelectionList()
+    selList.add(curve)
+    node = OpenMaya.MObject()
+    selList.getDependNode(0, node)
+    return OpenMayaAnim.MFnAnimCurve(node)
+
+def _animCurveUnitConversion(fnCurve):
+    '''
+    the curves store angles in radians and distances in cm where as anything the
+    user enters is in ui units, return the (toUI, fromUI) conversion funcs for the
+    curve, (None, None) if the curve is unitless
+    '''
+    curveType = fnCurve.animCurveType()
+    if curveType in (OpenMayaAnim.MFnAnimCurve.kAnimCurveTA, OpenMayaAnim.MFnAnimCurve.kAnimCurveUA):
+        unit = OpenMaya.MAngle.uiUnit()
+        return (lambda v: OpenMaya.MAngle(v).asUnits(unit),
+                lambda v: OpenMaya.MAngle(v, unit).asRadians())
+    if curveType in (OpenMayaAnim.MFnAnimCurve.kAnimCurveTL, OpenMayaAnim.MFnAnimCurve.kAnimCurveUL):
+        unit = OpenMaya.MDistance.uiUnit()
+        return (lambda v: OpenMaya.MDistance(v).asUnits(unit),
+                lambda v: OpenMaya.MDistance(v, unit).asCentimeters())
+    return None, None
+
+
 class RandomizeKeys(object):
     '''
     This is a simple implementation of a Key Randomizer, designed to add
@@ -4105,20 +5373,29 @@ class RandomizeKeys(object):
         self.contextManager = curveModifierContext
         self.dragActive = False
         self.toggledState = False
+        self.seed = None  # seed used by the last addNoise call
+        self._interactiveCache = {}  # original key values cached over the interactive slider drags
+
+        self.displayTangents = True
+        self.displayActiveKeyTangents = False
+        self.showBufferCurves = False
+        if r9Setup.mayaIsBatch():
+            return
 
         # catch the current state of the GrapthEditor so that the toggle respects it
         self.displayTangents = cmds.animCurveEditor('graphEditor1GraphEd', q=True, displayTangents=True)
         self.displayActiveKeyTangents = cmds.animCurveEditor('graphEditor1GraphEd', q=True, displayActiveKeyTangents=True)
         if cmds.animCurveEditor('graphEditor1GraphEd', q=True, showBufferCurves=True) == 'on':
             self.showBufferCurves = True
-        else:
-            self.showBufferCurves = False
 
-    def noiseFunc(self, initialValue, randomRange, damp):
+    def noiseFunc(self, initialValue, randomRange, damp, generator=random):
         '''
-        really simple noise func, maybe I'll flesh this out at somepoint
+        really simple noise func, maybe I'll flesh this out at somepoint. Called per value
+        by noiseArray so overload this to change the noise
+
+        :param generator: random.Random instance, seeded so the results can be reproduced
         '''
-        return initialValue + (random.uniform(randomRange[0], randomRange[1]) * damp)
+        return initialValue + (generator.uniform(randomRange[0], randomRange[1]) * damp)
 
     @classmethod
     def showOptions(cls):
@@ -4172,7 +5449,8 @@ class RandomizeKeys(object):
                                     pre=2,
                                     value=0,
                                     columnWidth=[(1, 40), (2, 100)],
-                                    dc=self.interactiveWrapper)
+                                    dc=self.interactiveWrapper,
+                                    cc=self.interactiveCommit)
             cmds.floatField('ffg_rand_intMax', v=1, precision=2, cc=self.__uicb_setRanges)
             cmds.text(label=LANGUAGE_MAP._Generic_.max)
             cmds.setParent('..')
@@ -4279,14 +5557,143 @@ class RandomizeKeys(object):
             return [-1, 1]
 
     def interactiveWrapper(self, *args):
-        with self.contextManager(self.dragActive, undoFuncCache=['interactiveWrapper']):
-            self.dragActive = True
-            self.addNoise(cmds.keyframe(q=True, sl=True, n=True), time=(), step=1,
-                          currentKeys=True,
-                          damp=cmds.floatSliderGrp('fsg_randfloatValue', q=True, v=True),
-                          percent=cmds.checkBox('cb_rand_percent', q=True, v=True))
+        '''
+        slider drag callback. The original key values are cached on the first tick and each
+        tick after that rebuilds the noise from them with the same seed, so the slider just
+        scales a fixed noise pattern rather than undoing and re-randomizing every call
+
+        :param args: the slider value passed in by the dc / cc callbacks, else read from the UI
+        '''
+        curves = cmds.keyframe(q=True, sl=True, n=True)
+        if not curves:
+            return
+        if not self.__interactiveCacheValid(curves):
+            keyData = self.getKeyData(curves, time=())
+            originals = dict((curve, values) for curve, (_, values) in keyData.items())
+            self._interactiveCache = {'curves': list(curves),
+                                      'seed': random.randint(0, sys.maxint),
+                                      'keys': keyData,
+                                      'committed': originals,  # values at the last undo step
+                                      'written': originals}  # values currently on the curves
+        cache = self._interactiveCache
+        if args:
+            damp = args[0]
+        else:
+            damp = cmds.floatSliderGrp('fsg_randfloatValue', q=True, v=True)
+        percent = False
+        if not r9Setup.mayaIsBatch():
+            percent = cmds.checkBox('cb_rand_percent', q=True, v=True)
+        cache['written'] = self.addNoise(curves, currentKeys=True, damp=damp, percent=percent,
+                                         seed=cache['seed'], keyData=cache['keys'], undoable=False)
+        self.dragActive = True
+
+    def interactiveCommit(self, *args):
+        '''
+        slider release callback, pushes the change from the cached original values to the
+        current noise onto the undo queue as a single step
+        '''
+        # make sure the final slider value is applied, cc also fires on typed values
+        self.interactiveWrapper(*args)
+        cache = self._interactiveCache
+        self.dragActive = False
+        if not cache:
+            return
+        keys = cache['keys']
+        committed = cache['committed']
+        written = cache['written']
+
+        def undo():
+            for curve, values in committed.items():
+                self.setKeyValues(curve, keys[curve][0], values)
+
+        def redo():
+            for curve, values in written.items():
+                self.setKeyValues(curve, keys[curve][0], values)
+
+        _apiCurvesUndoable(undo, redo)
+        # the noise is still built from the cached originals if the user drags again
+        # without changing the selection, undo steps back to this committed state
+        cache['committed'] = written
+
+    def __interactiveCacheValid(self, curves):
+        '''
+        the cache is only valid if the curve selection is unchanged and the curves still
+        hold the values we last wrote to them, ie nothing else has edited them since
+        '''
+        cache = self._interactiveCache
+        if not cache or not cache['curves'] == list(curves):
+            return False
+        for curve, (indices, _) in cache['keys'].items():
+            try:
+                current = self.getKeyValues(curve, indices)
+            except StandardError:
+                return False
+            if any(abs(a - b) > 1e-6 for a, b in zip(current, cache['written'][curve])):
+                return False
+        return True
+
+    def getKeyValues(self, curve, indices):
+        '''
+        :return: array of the ui unit values for the given key indices
+        '''
+        fnCurve = _getAnimCurveFn(curve)
+        toUI, _ = _animCurveUnitConversion(fnCurve)
+        values = array('d', [fnCurve.value(i) for i in indices])
+        if toUI:
+            values = array('d', [toUI(v) for v in values])
+        return values
+
+    def setKeyValues(self, curve, indices, values, change=None):
+        '''
+        bulk set the key values on the curve, values in ui units
+
+        :param change: optional MAnimCurveChange to cache the edit for undo
+        '''
+        fnCurve = _getAnimCurveFn(curve)
+        _, fromUI = _animCurveUnitConversion(fnCurve)
+        if fromUI:
+            values = [fromUI(v) for v in values]
+        if change:
+            for i, v in zip(indices, values):
+                fnCurve.setValue(i, v, change)
+        else:
+            for i, v in zip(indices, values):
+                fnCurve.setValue(i, v)
+
+    def getKeyData(self, curves, time=()):
+        '''
+        fetch the keys to process for each curve in one query per curve. If keys
+        are selected on a curve only those are returned, else all the keys in the time.
+
+        :return: {curve: (key indices, key values)}
+        '''
+        keyData = {}
+        for curve in curves:
+            indices = cmds.keyframe(curve, q=True, iv=True, sl=True)
+            if not indices:
+                if time:
+                    indices = cmds.keyframe(curve, q=True, iv=True, t=time)
+                else:
+                    indices = cmds.keyframe(curve, q=True, iv=True)
+            if indices:
+                indices = array('i', indices)
+                keyData[curve] = (indices, self.getKeyValues(curve, indices))
+        return keyData
+
+    def noiseArray(self, values, randomRange, damp, generator=random):
+        '''
+        noise for a whole curve in one call, each value is run through noiseFunc
+
+        :param values: array of the initial values
+        :param randomRange: range [lower, upper] bounds passed to the randomizer
+        :param damp: damping passed into the randomizer
+        :param generator: random.Random instance, seeded so the results can be reproduced
+        '''
+        noiseFunc = self.noiseFunc
+        return array('d', [noiseFunc(v, randomRange, damp, generator) for v in values])
 
-    def addNoise(self, curves, time=(), step=1, currentKeys=True, randomRange=[-1, 1], damp=1, percent=False, keepKeys=False):
+    def addNoise(self, curves, time=(), step=1, currentKeys=True, randomRange=[-1, 1], damp=1, percent=False, keepKeys=False,
+                 seed=None, keyData=None, undoable=True):
         '''
         Simple noise function designed to add noise to keyframed animation data.
 
@@ -4297,48 +5704,83 @@ class RandomizeKeys(object):
         :param randomRange: range [upper, lower] bounds passed to teh randomizer
         :param damp: damping passed into the randomizer
         :param keepkeys: if True maintain current keys
-        '''
-        keyTimes = []
+        :param seed: seed for the random generator, the same seed and inputs give the same noise.
+            If None a new seed is generated and stored on self.seed
+        :param keyData: currentKeys only, pre-fetched {curve: (indices, values)} to add the noise to,
+            as returned by getKeyData. Used by the interactive mode to work from cached values
+        :param undoable: push the edit to the undo queue as a single step
+        :return: {curve: values} the values written, currentKeys mode only
+        '''
+        if seed is None:
+            seed = random.randint(0, sys.maxint)
+        self.seed = seed
+        generator = random.Random(seed)
+        change = None
+        if undoable:
+            change = OpenMayaAnim.MAnimCurveChange()
+        written = {}
         if percent:
-            damp = damp / 100
+            damp = damp / 100.0
         if currentKeys:
+            if keyData is None:
+                keyData = self.getKeyData(curves, time)
             for curve in curves:
-                # if keys/curves are already selected, process those only
-                selectedKeys = cmds.keyframe(curve, q=True, vc=True, tc=True, sl=True)
-                if selectedKeys:
-                    keyData = selectedKeys
-                else:
-                    # else process all keys inside the time
-                    keyData = cmds.keyframe(curve, q=True, vc=True, tc=True, t=time)
-                for t, v in zip(keyData[::2], keyData[1::2]):
-                    if percent:
-                        # figure the upper and lower value bounds
-                        randomRange = self.__calcualteRangeValue(keyData[1::2])
-                        log.debug('Percent data : randomRange=%f>%f, percentage=%f' % (randomRange[0], randomRange[1], damp))
-                    value = self.noiseFunc(v, randomRange, damp)
-                    cmds.setKeyframe(curve, v=value, t=t)
+                if curve not in keyData:
+                    continue
+                indices, values = keyData[curve]
+                if percent:
+                    # figure the upper and lower value bounds
+                    randomRange = self.__calcualteRangeValue(values)
+                    log.debug('Percent data : randomRange=%f>%f, percentage=%f' % (randomRange[0], randomRange[1], damp))
+                written[curve] = self.noiseArray(values, randomRange, damp, generator)
+                self.setKeyValues(curve, indices, written[curve], change)
         else:  # allow to ADD keys at 'step' frms
             if not time:
                 selectedKeyTimes = sorted(list(set(cmds.keyframe(q=True, tc=True))))
                 if selectedKeyTimes:
                     time = (selectedKeyTimes[0], selectedKeyTimes[-1])
+            uiUnit = OpenMaya.MTime.uiUnit()
+            frames = timeLineRangeProcess(time[0], time[1], step, incEnds=True)
             for curve in curves:
+                fnCurve = _getAnimCurveFn(curve)
+                toUI, fromUI = _animCurveUnitConversion(fnCurve)
+                times = frames
                 if keepKeys:
-                    keyTimes = cmds.keyframe(curve, q=True)
+                    keyTimes = set(cmds.keyframe(curve, q=True) or [])
+                    times = [t for t in frames if t not in keyTimes]
+                if not times:
+                    continue
                 if percent:
                     # figure the upper and lower value bounds
                     randomRange = self.__calcualteRangeValue(cmds.keyframe(curve, q=True, vc=True, t=time))
                     log.debug('Percent data : randomRange=%f>%f, percentage=%f' % (randomRange[0], randomRange[1], damp))
 
-                connection = [con for con in cmds.listConnections(curve, source=False, d=True, p=True)
-                              if not cmds.nodeType(con) == 'hyperLayout'][0]
-
-                for t in timeLineRangeProcess(time[0], time[1], step, incEnds=True):
-                    if keepKeys:
-                        if t in keyTimes:
-                            continue
-                    value = self.noiseFunc(cmds.getAttr(connection, t=t), randomRange, damp)
-                    cmds.setKeyframe(connection, v=value, t=t)
+                # sample the whole curve before we start writing to it
+                mTimes = [OpenMaya.MTime(t, uiUnit) for t in times]
+                values = array('d', [fnCurve.evaluate(mTime) for mTime in mTimes])
+                if toUI:
+                    values = array('d', [toUI(v) for v in values])
+                values = self.noiseArray(values, randomRange, damp, generator)
+                if fromUI:
+                    values = array('d', [fromUI(v) for v in values])
+
+                index = OpenMaya.MScriptUtil()
+                index.createFromInt(0)
+                indexPtr = index.asUintPtr()
+                for mTime, value in zip(mTimes, values):
+                    if fnCurve.find(mTime, indexPtr):
+                        if change:
+                            fnCurve.setValue(OpenMaya.MScriptUtil.getUint(indexPtr), value, change)
+                        else:
+                            fnCurve.setValue(OpenMaya.MScriptUtil.getUint(indexPtr), value)
+                    elif change:
+                        fnCurve.addKey(mTime, value, OpenMayaAnim.MFnAnimCurve.kTangentGlobal,
+                                       OpenMayaAnim.MFnAnimCurve.kTangentGlobal, change)
+                    else:
+                        fnCurve.addKey(mTime, value)
+        if change:
+            _apiCurvesUndoable(change.undoIt, change.redoIt)
+        return written
 
     def curveMenuFunc(self, *args):
         self.__storePrefs()
@@ -4373,6 +5815,172 @@ class RandomizeKeys(object):
                       percent=percent)
 
 
+class AnimCurveFilter(object):
+    '''
+    Bulk curve filtering on top of the Red9_CurveFilters library. The keys in the time
+    range are pulled from each curve in one pass, filtered as arrays and written
+    back in one edit per curve, all the curves going onto the undo queue as a single step.
+    After each filter self.report holds, per curve, the number of keys processed and
+    removed and the maximum error, measured by evaluating the filtered curve at the
+    original key times.
+
+    >>> curveFilter = AnimCurveFilter(cmds.keyframe(q=True, sl=True, n=True), time=(1, 1000))
+    >>> curveFilter.reduceKeys(tolerance=0.05)
+    >>> curveFilter.printReport()
+    '''
+    def __init__(self, curves, time=()):
+        '''
+        :param curves: animCurves to process, if nodes are passed in their animCurves are used
+        :param time: only process the keys in this range
+        '''
+        if not type(curves) == list:
+            curves = [curves]
+        self.curves = [curve for curve in cmds.ls(curves, type='animCurve')]
+        nodes = [node for node in curves if node not in self.curves]
+        if nodes:
+            self.curves.extend([curve for curve in cmds.keyframe(nodes, q=True, n=True) or []
+                                if curve not in self.curves])
+        self.time = time
+        self.report = {}
+        self._change = None
+
+    def _read(self, curve):
+        '''
+        read the key indices, times and ui unit values in the time range from the curve
+        '''
+        fnCurve = _getAnimCurveFn(curve)
+        toUI, fromUI = _animCurveUnitConversion(fnCurve)
+        uiUnit = OpenMaya.MTime.uiUnit()
+        indices = array('i')
+        times = array('d')
+        values = array('d')
+        for i in range(fnCurve.numKeys()):
+            t = fnCurve.time(i).asUnits(uiUnit)
+            if self.time and not self.time[0] <= t <= self.time[1]:
+                continue
+            indices.append(i)
+            times.append(t)
+            values.append(fnCurve.value(i))
+        if toUI:
+            values = array('d', [toUI(v) for v in values])
+        return fnCurve, fromUI, toUI, indices, times, values
+
+    def _evaluate(self, fnCurve, toUI, times):
+        uiUnit = OpenMaya.MTime.uiUnit()
+        values = array('d', [fnCurve.evaluate(OpenMaya.MTime(t, uiUnit)) for t in times])
+        if toUI:
+            values = array('d', [toUI(v) for v in values])
+        return values
+
+    def _process(self, func):
+        '''
+        run the func over every curve and commit the edits as a single undo step
+
+        :param func: func(fnCurve, fromUI, toUI, indices, times, values) making its edits
+            through self._change and returning the number of keys removed
+        '''
+        self.report = {}
+        self._change = OpenMayaAnim.MAnimCurveChange()
+        for curve in self.curves:
+            fnCurve, fromUI, toUI, indices, times, values = self._read(curve)
+            if len(indices) < 3:
+                continue
+            removed = func(fnCurve, fromUI, toUI, indices, times, values)
+            self.report[curve] = {'keys': len(indices),
+                                  'removed': removed,
+                                  'maxError': r9CurveFilters.maxError(values, self._evaluate(fnCurve, toUI, times))}
+        _apiCurvesUndoable(self._change.undoIt, self._change.redoIt)
+        self._change = None
+        return self.report
+
+    def _setValues(self, fnCurve, fromUI, indices, values):
+        if fromUI:
+            values = [fromUI(v) for v in values]
+        for i, v in zip(indices, values):
+            fnCurve.setValue(i, v, self._change)
+
+    def reduceKeys(self, tolerance):
+        '''
+        remove keys that can be dropped without the curve moving more than the tolerance.
+        The reduction is checked by evaluating the edited curve, with its recomputed
+        tangents, at the original key times and keys are put back until it's within
+        the tolerance, so the report's maxError is bounded by it.
+        '''
+        uiUnit = OpenMaya.MTime.uiUnit()
+        globalTangent = OpenMayaAnim.MFnAnimCurve.kTangentGlobal
+
+        def _reduce(fnCurve, fromUI, toUI, indices, times, values):
+            present = set(range(len(indices)))
+
+            def _evaluate(keep):
+                # sync the curve to the keep list, the keys before the range are untouched
+                # so a key's current index is the first index plus the keys present before it.
+                # Removing from the end down leaves the earlier positions valid
+                keep = set(keep)
+                position = dict((k, j) for j, k in enumerate(sorted(present)))
+                for i in sorted(present - keep, reverse=True):
+                    fnCurve.remove(indices[0] + position[i], self._change)
+                    present.discard(i)
+                for i in sorted(keep - present):
+                    value = fromUI(values[i]) if fromUI else values[i]
+                    fnCurve.addKey(OpenMaya.MTime(times[i], uiUnit), value, globalTangent, globalTangent, self._change)
+                    present.add(i)
+                return self._evaluate(fnCurve, toUI, times)
+
+            keep = r9CurveFilters.reduceKeys(times, values, tolerance, evaluate=_evaluate)
+            return len(indices) - len(keep)
+        return self._process(_reduce)
+
+    def lowPass(self, cutoff, keepEnds=True):
+        '''
+        Butterworth low-pass on the key values, cutoff in Hz at the current scene fps.
+        Designed for dense, key per frame, curves.
+        '''
+        sampleRate = mel.eval('currentTimeUnitToFPS()')
+
+        def _lowPass(fnCurve, fromUI, toUI, indices, times, values):
+            self._setValues(fnCurve, fromUI, indices,
+                            r9CurveFilters.lowPass(values, cutoff, sampleRate, keepEnds=keepEnds))
+            return 0
+        return self._process(_lowPass)
+
+    def despike(self, window=5, threshold=None):
+        '''
+        median filter the key values, with a threshold only the spikes further than that
+        from the median of their window are changed
+        '''
+        def _despike(fnCurve, fromUI, toUI, indices, times, values):
+            self._setValues(fnCurve, fromUI, indices, r9CurveFilters.despike(values, window, threshold))
+            return 0
+        return self._process(_despike)
+
+    def resample(self, step=1, snapToFrame=False):
+        '''
+        replace the keys in the range with keys at the given frame step, sampled from the original curve.
+        Note the report's removed count goes negative if this adds keys
+        '''
+        uiUnit = OpenMaya.MTime.uiUnit()
+        globalTangent = OpenMayaAnim.MFnAnimCurve.kTangentGlobal
+
+        def _resample(fnCurve, fromUI, toUI, indices, times, values):
+            newTimes = r9CurveFilters.resampleTimes(times[0], times[-1], step, snapToFrame)
+            newValues = [fnCurve.evaluate(OpenMaya.MTime(t, uiUnit)) for t in newTimes]
+            for index in reversed(indices):
+                fnCurve.remove(index, self._change)
+            for t, v in zip(newTimes, newValues):
+                fnCurve.addKey(OpenMaya.MTime(t, uiUnit), v, globalTangent, globalTangent, self._change)
+            return len(indices) - len(newTimes)
+        return self._process(_resample)
+
+    def printReport(self):
+        keys = sum(data['keys'] for data in self.report.values())
+        removed = sum(data['removed'] for data in self.report.values())
+        worst = max([data['maxError'] for data in self.report.values()] or [0])
+        for curve, data in sorted(self.report.items()):
+            log.info('%s : keys=%i, removed=%i, maxError=%f' % (curve, data['keys'], data['removed'], data['maxError']))
+        log.info('AnimCurveFilter : %i curves, %i keys, %i removed, maxError=%f' % (len(self.report), keys, removed, worst))
+
+
 class FilterCurves(object):
 
     def __init__(self):
@@ -4474,6 +6082,31 @@ class FilterCurves(object):
                     ann=LANGUAGE_MAP._CurveFilters_.single_process_ann,
                     command=self.simplifyWrapper)
         cmds.setParent('..')
+        cmds.separator(h=25, style='in')
+
+        cmds.text(label=LANGUAGE_MAP._CurveFilters_.curve_cleanup)
+        cmds.separator(h=5, style='none')
+        cmds.rowColumnLayout(numberOfColumns=3, cw=((1, 180), (2, 100), (3, 100)), cs=((1, 10), (2, 10), (3, 10)))
+        cmds.floatFieldGrp('ffg_reduceTolerance', label=LANGUAGE_MAP._CurveFilters_.reduce_tolerance,
+                           v1=0.05, pre=3, cw2=(110, 60))
+        cmds.button(label=LANGUAGE_MAP._CurveFilters_.reduce_keys,
+                    ann=LANGUAGE_MAP._CurveFilters_.reduce_keys_ann,
+                    command=self.reduceKeys)
+        cmds.text(label='')
+        cmds.floatFieldGrp('ffg_lowPassCutoff', label=LANGUAGE_MAP._CurveFilters_.lowpass_cutoff,
+                           v1=6.0, pre=2, cw2=(110, 60))
+        cmds.button(label=LANGUAGE_MAP._CurveFilters_.lowpass,
+                    ann=LANGUAGE_MAP._CurveFilters_.lowpass_ann,
+                    command=self.lowPass)
+        cmds.text(label='')
+        cmds.floatFieldGrp('ffg_despikeThreshold', label=LANGUAGE_MAP._CurveFilters_.despike_threshold,
+                           v1=1.0, pre=2, cw2=(110, 60))
+        cmds.button(label=LANGUAGE_MAP._CurveFilters_.despike,
+                    ann=LANGUAGE_MAP._CurveFilters_.despike_ann,
+                    command=self.despike)
+        cmds.intField('if_despikeWindow', v=5, min=3, step=2,
+                      ann=LANGUAGE_MAP._CurveFilters_.despike_window_ann)
+        cmds.setParent('..')
 
         cmds.separator(h=20, style="in")
         cmds.rowColumnLayout(numberOfColumns=2, cw=((1, 200), (2, 200)))
@@ -4489,7 +6122,7 @@ class FilterCurves(object):
                                  h=22, w=220)
         cmds.separator(h=20, style="none")
         cmds.showWindow(self.win)
-        cmds.window(self.win, e=True, widthHeight=(410, 300))
+        cmds.window(self.win, e=True, widthHeight=(410, 400))
 
         # set close event to restore standard GraphEditor curve status
         cmds.scriptJob(runOnce=True, uiDeleted=[self.win, lambda *x:animCurveDrawStyle(style='full', forceBuffer=False,
@@ -4574,13 +6207,58 @@ class FilterCurves(object):
         # print step
         curves = cmds.keyframe(q=True, sl=True, n=True)
         if not curves:
+            # nodes may be driven by more than just curves so these still go through bakeResults
             curves = cmds.ls(sl=True, l=True)
-            time = ()
+            with self.contextManager(True, undoFuncCache=self.undoFuncCache):
+                cmds.bakeResults(curves, t=(), sb=step, pok=True)
         else:
             keys = sorted(cmds.keyframe(curves, sl=True, q=True, tc=True))
             time = (int(keys[0]), keys[-1])  # note the int conversion in case first key is on a sub-frame
-        with self.contextManager(True, undoFuncCache=self.undoFuncCache):
-            cmds.bakeResults(curves, t=time, sb=step, pok=True)
+            with self.contextManager(True, undoFuncCache=self.undoFuncCache):
+                AnimCurveFilter(curves, time=time).resample(step, snapToFrame=True)
+
+    def __selectedCurves(self):
+        '''
+        selected curves and the range of the selected keys, or the curves on the selected nodes
+        '''
+        curves = cmds.keyframe(q=True, sl=True, n=True)
+        if curves:
+            keys = sorted(cmds.keyframe(curves, sl=True, q=True, tc=True))
+            return curves, (keys[0], keys[-1])
+        curves = cmds.keyframe(cmds.ls(sl=True, l=True), q=True, n=True)
+        if not curves:
+            raise StandardError('No Keys, Anim curves or animated nodes selected!')
+        return curves, ()
+
+    def reduceKeys(self, *args):
+        '''
+        tolerance bound key reduction over the selected curves, see AnimCurveFilter.reduceKeys
+        '''
+        curves, time = self.__selectedCurves()
+        curveFilter = AnimCurveFilter(curves, time=time)
+        curveFilter.reduceKeys(cmds.floatFieldGrp('ffg_reduceTolerance', q=True, v1=True))
+        curveFilter.printReport()
+
+    def lowPass(self, *args):
+        '''
+        Butterworth low-pass over the selected curves, see AnimCurveFilter.lowPass
+        '''
+        curves, time = self.__selectedCurves()
+        curveFilter = AnimCurveFilter(curves, time=time)
+        curveFilter.lowPass(cmds.floatFieldGrp('ffg_lowPassCutoff', q=True, v1=True))
+        curveFilter.printReport()
+
+    def despike(self, *args):
+        '''
+        median despike over the selected curves, see AnimCurveFilter.despike
+        '''
+        curves, time = self.__selectedCurves()
+        window = cmds.intField('if_despikeWindow', q=True, v=True)
+        if not window % 2:
+            window += 1
+        curveFilter = AnimCurveFilter(curves, time=time)
+        curveFilter.despike(window, cmds.floatFieldGrp('ffg_despikeThreshold', q=True, v1=True))
+        curveFilter.printReport()
 
     def snapAnimCurvesToFrms(self, *args):
         '''
@@ -4590,6 +6268,215 @@ class FilterCurves(object):
             cmds.snapKey(timeMultiple=1)
 
 
+def _plugValue(plug):
+    '''
+    read a simple numeric plug through the API
+
+    :return: (valueType, value) where valueType is 'double', 'int' or 'bool', and doubles are
+        in internal units. (None, None) for anything that isn't a simple numeric channel
+    '''
+    attr = plug.attribute()
+    if plug.isCompound() or plug.isArray():
+        return None, None
+    if attr.hasFn(OpenMaya.MFn.kUnitAttribute):
+        return 'double', plug.asDouble()
+    if attr.hasFn(OpenMaya.MFn.kEnumAttribute):
+        return 'int', plug.asInt()
+    if attr.hasFn(OpenMaya.MFn.kNumericAttribute):
+        unitType = OpenMaya.MFnNumericAttribute(attr).unitType()
+        if unitType == OpenMaya.MFnNumericData.kBoolean:
+            return 'bool', plug.asBool()
+        if unitType in (OpenMaya.MFnNumericData.kDouble, OpenMaya.MFnNumericData.kFloat):
+            return 'double', plug.asDouble()
+        if unitType in (OpenMaya.MFnNumericData.kInt, OpenMaya.MFnNumericData.kShort,
+                        OpenMaya.MFnNumericData.kLong, OpenMaya.MFnNumericData.kByte,
+                        OpenMaya.MFnNumericData.kChar):
+            return 'int', plug.asInt()
+    return None, None
+
+def _mirrorMarkersChanged():
+    '''
+    bump the mirror serial, invalidating all the cached MirrorTables. Called by all
+    the MirrorHierarchy calls that edit the mirror markers
+    '''
+    global RED9_MIRROR_SERIAL
+    RED9_MIRROR_SERIAL += 1
+
+
+class MirrorTable(object):
+    '''
+    Compiled mirror lookup for a set of nodes. The mirrorSide, mirrorIndex and mirrorAxis
+    markers for all the nodes are read in one pass through the API rather than a getAttr
+    per attr, per node, and held keyed by the compiled mirror ID, 'Left_4' etc, as returned
+    by MirrorHierarchy.getMirrorCompiledID.
+
+    The table is cached by MirrorHierarchy and so by the MetaRig.MirrorClass binding.
+    It's invalidated whenever the markers are edited through the MirrorHierarchy calls and
+    isValid also re-reads the raw marker values, so markers set, added or deleted directly
+    with setAttr / addAttr / deleteAttr are picked up too.
+
+    >>> table = MirrorTable(nodes)
+    >>> table.ids['Left_4']['node']
+    >>> table.opposite(node)
+    '''
+    def __init__(self, nodes, mirrorSide='mirrorSide', mirrorIndex='mirrorIndex', mirrorAxis='mirrorAxis',
+                 defaultMirrorAxis=['translateX', 'rotateY', 'rotateZ']):
+        self.mirrorSide = mirrorSide
+        self.mirrorIndex = mirrorIndex
+        self.mirrorAxis = mirrorAxis
+        self.defaultMirrorAxis = defaultMirrorAxis
+        self.serial = RED9_MIRROR_SERIAL
+        self.nodes = set()
+        self.ids = {}  # compiledID : {'node', 'side', 'index', 'axis', 'axisAttr'}
+        self.nodeIDs = {}  # node : compiledID
+        self.unresolved = {}  # compiledID : [nodes], clashing ids, the first node found wins
+        self.unmarked = set()  # nodes checked and found to have no markers, dropped with the table on a serial bump
+        self._markers = []  # (MObjectHandle, raw marker values) for every node, checked by isValid
+        self._read(nodes)
+
+    def _readMarkers(self, fnNode):
+        '''
+        the raw (mirrorSide, mirrorIndex, mirrorAxis) plug values of the node, mirrorAxis is
+        None if the attr isn't there, None if the node has no side / index markers
+        '''
+        if not fnNode.hasAttribute(self.mirrorSide) or not fnNode.hasAttribute(self.mirrorIndex):
+            return None
+        axis = None
+        if fnNode.hasAttribute(self.mirrorAxis):
+            axis = fnNode.findPlug(self.mirrorAxis, False).asString()
+        return (fnNode.findPlug(self.mirrorSide, False).asShort(),
+                fnNode.findPlug(self.mirrorIndex, False).asInt(),
+                axis)
+
+    @staticmethod
+    def _iterNodes(nodes):
+        '''
+        yield (node, mObj) for the given nodes, node is the long name for dag nodes
+        '''
+        selList = OpenMaya.MSelectionList()
+        for node in nodes:
+            try:
+                selList.add(node)
+            except RuntimeError:
+                log.debug('MirrorTable : unable to find node %s' % node)
+        dagPath = OpenMaya.MDagPath()
+        for i in range(selList.length()):
+            mObj = OpenMaya.MObject()
+            selList.getDependNode(i, mObj)
+            if mObj.hasFn(OpenMaya.MFn.kDagNode):
+                selList.getDagPath(i, dagPath)
+                yield dagPath.fullPathName(), mObj
+            else:
+                yield OpenMaya.MFnDependencyNode(mObj).name(), mObj
+
+    def _read(self, nodes):
+        fnNode = OpenMaya.MFnDependencyNode()
+        for node, mObj in self._iterNodes(nodes):
+            if node in self.nodes:
+                continue
+            fnNode.setObject(mObj)
+            self.nodes.add(node)
+            markers = self._readMarkers(fnNode)
+            self._markers.append((OpenMaya.MObjectHandle(mObj), markers))
+            if not markers:
+                self.unmarked.add(node)
+                continue
+            sidePlug = fnNode.findPlug(self.mirrorSide, False)
+            side = OpenMaya.MFnEnumAttribute(sidePlug.attribute()).fieldName(markers[0])
+            index = markers[1]
+            axisAttr = markers[2] is not None
+            if axisAttr:
+                # make sure we remove any trailing ',' also so we don't end up with empty entries
+                axis = markers[2].rstrip(',').split(',') if markers[2] else []
+            else:
+                axis = list(self.defaultMirrorAxis)
+            compiledID = '%s_%s' % (side, index)
+            if compiledID in self.ids:
+                if compiledID not in self.unresolved:
+                    self.unresolved[compiledID] = [self.ids[compiledID]['node']]
+                self.unresolved[compiledID].append(node)
+                continue
+            self.ids[compiledID] = {'node': node, 'side': side, 'index': index, 'axis': axis, 'axisAttr': axisAttr}
+            self.nodeIDs[node] = compiledID
+
+    def isValid(self, nodes=None):
+        '''
+        is the table still current, ie no mirror markers have been changed, through the
+        MirrorHierarchy calls or directly on the attrs, since it was built and, if given,
+        all the nodes are in it. Given nodes without any markers are recorded in the
+        table as unmarked, so they don't force a rebuild on every call
+        '''
+        if not self.serial == RED9_MIRROR_SERIAL:
+            return False
+        fnNode = OpenMaya.MFnDependencyNode()
+        for handle, markers in self._markers:
+            if not handle.isValid():
+                return False
+            fnNode.setObject(handle.object())
+            if not self._readMarkers(fnNode) == markers:
+                return False
+        if nodes:
+            missing = set(cmds.ls(nodes, l=True)).difference(self.nodes)
+            if missing:
+                return self._addUnmarked(missing)
+        return True
+
+    def _addUnmarked(self, nodes):
+        '''
+        add nodes that aren't in the table as unmarked entries, False if any of them
+        carry mirror markers, in which case the table has to be rebuilt
+        '''
+        fnNode = OpenMaya.MFnDependencyNode()
+        unmarked = []
+        for node, mObj in self._iterNodes(nodes):
+            fnNode.setObject(mObj)
+            if self._readMarkers(fnNode):
+                return False
+            unmarked.append((node, mObj))
+        for node, mObj in unmarked:
+            self.nodes.add(node)
+            self.unmarked.add(node)
+            self._markers.append((OpenMaya.MObjectHandle(mObj), None))
+        return True
+
+    def getData(self, node):
+        '''
+        mirror data for the node, None if the node isn't in the mirror system
+        '''
+        compiledID = self.nodeIDs.get(node)
+        if not compiledID:
+            longName = cmds.ls(node, l=True)
+            compiledID = longName and self.nodeIDs.get(longName[0])
+        if compiledID:
+            return self.ids[compiledID]
+
+    def opposite(self, node):
+        '''
+        the node on the opposite side with the same mirrorIndex. Centre nodes return
+        themselves, None if the node isn't in the mirror system or has no opposite
+        '''
+        data = self.getData(node)
+        if not data:
+            return
+        if data['side'] == 'Centre':
+            return data['node']
+        opposite = self.ids.get('%s_%s' % ({'Left': 'Right', 'Right': 'Left'}[data['side']], data['index']))
+        if opposite:
+            return opposite['node']
+
+    def mirrorDict(self):
+        '''
+        the table in the MirrorHierarchy.mirrorDict format,
+        {'Centre':{id:data,},'Left':{id:data,},'Right':{id:data,}}, NOTE index is cast to string!
+        '''
+        mirrorDict = {'Centre': {}, 'Left': {}, 'Right': {}}
+        for data in self.ids.values():
+            mirrorDict.setdefault(data['side'], {})[str(data['index'])] = {'node': data['node'],
+                                                                          'axis': data['axis'],
+                                                                          'axisAttr': data['axisAttr']}
+        return mirrorDict
+
+
 class MirrorHierarchy(object):
 
     '''
@@ -4639,6 +6526,7 @@ class MirrorHierarchy(object):
         self.mirrorIndex = 'mirrorIndex'
         self.mirrorAxis = 'mirrorAxis'
         self.mirrorDict = {'Centre': {}, 'Left': {}, 'Right': {}}
+        self.mirrorTable = None  # compiled MirrorTable built by getMirrorSets
         self.mergeLayers = True
         self.indexednodes = []  # all nodes to process - passed to the Animlayer context
         self.kws = kws  # allows us to pass kws into the copyKey and copyAttr call if needed, ie, pasteMethod!
@@ -4769,6 +6657,7 @@ class MirrorHierarchy(object):
             if mClass.hasAttr(self.mirrorAxis):
                 delattr(mClass, self.mirrorAxis)
         del(mClass)  # cleanup
+        _mirrorMarkersChanged()
 
     def deleteMirrorIDs(self, node):
         '''
@@ -4788,6 +6677,7 @@ class MirrorHierarchy(object):
         except:
             pass
         del(mClass)
+        _mirrorMarkersChanged()
 
     def copyMirrorIDs(self, src, dest):
         '''
@@ -4817,6 +6707,7 @@ class MirrorHierarchy(object):
             current = self.getMirrorIndex(node)
             if current:
                 cmds.setAttr('%s.%s' % (node, self.mirrorIndex), (int(current) + offset))
+        _mirrorMarkersChanged()
 
     def getNodes(self):
         '''
@@ -4904,36 +6795,24 @@ class MirrorHierarchy(object):
         if not self.indexednodes:
             raise StandardError('No mirrorMarkers found from the given node list/hierarchy')
 
-        for node in set(self.indexednodes):
-            try:
-                side = self.getMirrorSide(node)
-                index = self.getMirrorIndex(node)
-                axis = self.getMirrorAxis(node)
-                if logging_is_debug():
-                    log.debug('Side : %s Index : %s>> node %s' %
-                              (side, index, r9Core.nodeNameStrip(node)))
-                # self.mirrorDict[side][str(index)]=node #NOTE index is cast to string!
-                if str(index) in self.mirrorDict[side]:
-                    log.warning('Mirror index ( %s : %i ) already assigned : currently node : %s,  duplicate node : %s' %
-                                    (side, index,
-                                     r9Core.nodeNameStrip(self.mirrorDict[side][str(index)]['node']),
-                                     r9Core.nodeNameStrip(node)))
-                    if not str(index) in self.unresolved[side]:
-                        self.unresolved[side][str(index)] = [self.mirrorDict[side][str(index)]['node']]
-                    self.unresolved[side][str(index)].append(node)
-                    continue
-
-                self.mirrorDict[side][str(index)] = {}
-                self.mirrorDict[side][str(index)]['node'] = node
-                self.mirrorDict[side][str(index)]['axis'] = axis
-                if cmds.attributeQuery(self.mirrorAxis, node=node, exists=True):
-                    self.mirrorDict[side][str(index)]['axisAttr'] = True
-                else:
-                    self.mirrorDict[side][str(index)]['axisAttr'] = False
-
-            except StandardError, error:
-                log.debug(error)
-                log.info('Failed to add Node to Mirror System : %s' % r9Core.nodeNameStrip(node))
+        # one bulk read of all the mirror markers
+        self.mirrorTable = MirrorTable(self.indexednodes,
+                                       mirrorSide=self.mirrorSide,
+                                       mirrorIndex=self.mirrorIndex,
+                                       mirrorAxis=self.mirrorAxis,
+                                       defaultMirrorAxis=self.defaultMirrorAxis)
+        self.mirrorDict = self.mirrorTable.mirrorDict()
+        for compiledID, clashing in self.mirrorTable.unresolved.items():
+            data = self.mirrorTable.ids[compiledID]
+            log.warning('Mirror index ( %s : %i ) already assigned : currently node : %s,  duplicate nodes : %s' %
+                        (data['side'], data['index'],
+                         r9Core.nodeNameStrip(data['node']),
+                         ', '.join([r9Core.nodeNameStrip(n) for n in clashing[1:]])))
+            self.unresolved.setdefault(data['side'], {})[str(data['index'])] = clashing
+        if logging_is_debug():
+            for compiledID, data in self.mirrorTable.ids.items():
+                log.debug('Side : %s Index : %s>> node %s' %
+                          (data['side'], data['index'], r9Core.nodeNameStrip(data['node'])))
 
         return self.indexednodes
 
@@ -4998,7 +6877,134 @@ class MirrorHierarchy(object):
 #         if objs:
 #             cmds.select(objs)
 
-    def makeSymmetrical(self, nodes=None, mode='Anim', primeAxis='Left'):
+    def _batchAnim(self, groups, inversions):
+        '''
+        batched anim mirror. All the curve data is read up front then written back
+        through an AnimCurveTransfer with the axis inversions applied to the values
+        and tangents as they're written, so the whole mirror is a single curve edit.
+
+        :param groups: [[(src, dest, destAxis),],] transfers to run, each group either all goes
+            through the batch or is returned to be run through the clipboard calls
+        :param inversions: [(node, axis),] in place axis inversions
+        :return: (groups, inversions) that couldn't be batched
+        '''
+        transfer = AnimCurveTransfer(time=self.kws.get('time', ()), pasteKey=self.kws.get('pasteKey', 'replace'))
+        if not transfer.isSupported or self.kws.get('attributes'):
+            return groups, inversions
+        # in place inversions act over the whole curve, as the scaleKey calls did
+        inverter = AnimCurveTransfer(pasteKey='replace')
+        failedGroups = []
+        failedInversions = []
+        transfers = []
+        inverts = []
+        for group in groups:
+            blocks = []
+            for src, dest, axis in group:
+                data = transfer.collect(src, dest, inverse=axis)
+                if data is False:
+                    break
+                blocks.append(data)
+                # dest curves on the axis that aren't being replaced still need inversing
+                covered = set()
+                for plug, _, _ in data:
+                    covered.add(plug.partialName(False, False, False, False, False, True))
+                    covered.add(plug.partialName())
+                missing = [attr for attr in axis if attr not in covered]
+                if missing:
+                    data = inverter.collect(dest, dest, attributes=missing, inverse=missing)
+                    if data is False:
+                        break
+                    inverts.append(data)
+            else:
+                transfers.extend(blocks)
+                continue
+            failedGroups.append(group)
+        for node, axis in inversions:
+            if not axis:
+                continue
+            data = inverter.collect(node, node, attributes=axis, inverse=axis)
+            if data is False:
+                failedInversions.append((node, axis))
+            else:
+                inverts.append(data)
+        # everything is read, now write
+        for blocks in transfers:
+            transfer.write(blocks)
+        for blocks in inverts:
+            inverter.write(blocks)
+        transfer.commit()
+        inverter.commit()
+        return failedGroups, failedInversions
+
+    def _batchPose(self, groups, inversions):
+        '''
+        batched pose mirror. All the channel values for both sides are read up front
+        through the API, the axis inversions applied and the values written back in
+        a single MDGModifier.
+
+        :param groups: [[(src, dest, destAxis),],] transfers to run
+        :param inversions: [(node, axis),] in place axis inversions
+        :return: (groups, inversions) that couldn't be batched, always empty here
+        '''
+        attributes = self.kws.get('attributes')
+        skipAttrs = self.kws.get('skipAttrs')
+        writes = []
+        for group in groups:
+            for src, dest, axis in group:
+                attrs = attributes
+                if not attrs:
+                    attrs = getSettableChannels(src, incStatics=True) or []
+                    if skipAttrs:
+                        attrs = set(attrs) - set(skipAttrs)
+                for attr in attrs:
+                    writes.append(('%s.%s' % (src, attr), '%s.%s' % (dest, attr), attr in axis))
+        for node, axis in inversions:
+            for attr in axis:
+                writes.append(('%s.%s' % (node, attr), '%s.%s' % (node, attr), True))
+
+        modifier = OpenMaya.MDGModifier()
+        fallback = []
+        values = []
+        for src, dest, inverse in writes:
+            try:
+                srcPlug = AnimCurveTransfer._plug(src)
+                destPlug = AnimCurveTransfer._plug(dest)
+            except RuntimeError:
+                continue
+            if destPlug.isLocked() or AnimCurveTransfer._animCurve(destPlug) is False:
+                continue
+            valueType, value = _plugValue(srcPlug)
+            if not valueType:
+                fallback.append((src, dest, inverse))
+                continue
+            if inverse and not valueType == 'bool':
+                value = value * -1
+            values.append((destPlug, valueType, value))
+        # all the reads are done before we write anything
+        for destPlug, valueType, value in values:
+            if valueType == 'double':
+                modifier.newPlugValueDouble(destPlug, value)
+            elif valueType == 'int':
+                modifier.newPlugValueInt(destPlug, value)
+            else:
+                modifier.newPlugValueBool(destPlug, value)
+        fallbackValues = []
+        for src, dest, inverse in fallback:
+            try:
+                value = cmds.getAttr(src)
+                fallbackValues.append((dest, value * -1 if inverse else value))
+            except StandardError:
+                log.debug('failed to mirror %s > %s' % (src, dest))
+        modifier.doIt()
+        r9General.apiUndoable(modifier.undoIt, modifier.doIt)
+        for dest, value in fallbackValues:
+            try:
+                cmds.setAttr(dest, value)
+            except StandardError:
+                log.debug('failed to set %s' % dest)
+        return [], []
+
+    def makeSymmetrical(self, nodes=None, mode='Anim', primeAxis='Left', batch=True):
         '''
         similar to the mirrorData except this is designed to take the data from an object in
         one side of the mirrorDict and pass that data to the opposite matching node, thus
@@ -5009,6 +7015,9 @@ class MirrorHierarchy(object):
             on the initial nodes past to the class
         :param mode: 'Anim' ot 'Pose' process as a single pose or an animation
         :param primeAxis: 'Left' or 'Right' whether to take the data from the left or right side of the setup
+        :param batch: read all the data up front and write it back in one batched edit rather than
+            copying pair by pair. Anim pairs the batch can't handle (animLayers, insert/scale pasteKey
+            methods) still go through the copyKeys calls
         '''
         self.getMirrorSets(nodes)
 
@@ -5032,23 +7041,30 @@ class MirrorHierarchy(object):
             slaveAxis = 'Left'
 
         with AnimationLayerContext(self.indexednodes, mergeLayers=self.mergeLayers, restoreOnExit=False):
+            pairs = []
             for index, masterSide in self.mirrorDict[masterAxis].items():
                 if index not in self.mirrorDict[slaveAxis].keys():
                     log.warning('No matching Index Key found for %s mirrorIndex : %s >> %s' %
                                 (masterAxis, index, r9Core.nodeNameStrip(masterSide['node'])))
                 else:
-                    slaveData = self.mirrorDict[slaveAxis][index]
-                    if logging_is_debug():
-                        log.debug('SymmetricalPairs : %s >> %s' % (r9Core.nodeNameStrip(masterSide['node']),
-                                             r9Core.nodeNameStrip(slaveData['node'])))
-                    transferCall([masterSide['node'], slaveData['node']], **self.kws)
-                    if logging_is_debug():
-                        log.debug('Symmetrical Axis Inversion: %s' % ','.join(slaveData['axis']))
-                    if slaveData['axis']:
-                        inverseCall(slaveData['node'], slaveData['axis'])
+                    pairs.append((masterSide, self.mirrorDict[slaveAxis][index]))
+            if batch:
+                batchCall = self._batchAnim if mode == 'Anim' else self._batchPose
+                groups = [[(master['node'], slave['node'], slave['axis'])] for master, slave in pairs]
+                failed, _ = batchCall(groups, [])
+                pairs = [pair for pair, group in zip(pairs, groups) if group in failed]
+            for masterSide, slaveData in pairs:
+                if logging_is_debug():
+                    log.debug('SymmetricalPairs : %s >> %s' % (r9Core.nodeNameStrip(masterSide['node']),
+                                         r9Core.nodeNameStrip(slaveData['node'])))
+                transferCall([masterSide['node'], slaveData['node']], **self.kws)
+                if logging_is_debug():
+                    log.debug('Symmetrical Axis Inversion: %s' % ','.join(slaveData['axis']))
+                if slaveData['axis']:
+                    inverseCall(slaveData['node'], slaveData['axis'])
 
     # @r9General.Timer
-    def mirrorData(self, nodes=None, mode='Anim'):
+    def mirrorData(self, nodes=None, mode='Anim', batch=True):
         '''
         Using the FilterSettings obj find all nodes in the return that have
         the mirrorSide attr, then process the lists into Side and Index slots
@@ -5058,6 +7074,10 @@ class MirrorHierarchy(object):
         :param nodes: optional specific list of nodes to process, else we run the filterSetting code
             on the initial nodes past to the class
         :param mode: 'Anim' or 'Pose' process as a single pose or an animation
+        :param batch: read both sides up front and write the swapped, inversed data back in one
+            batched edit rather than switching pair by pair through temp nodes. Anim pairs the
+            batch can't handle (animLayers, insert/scale pasteKey methods) still go through the
+            copyKeys calls
 
         TODO: Issue where if nodeA on Left has NO key data at all, and nodeB on right
         does, then nodeB will be left incorrect. We need to clean the data if there
@@ -5087,27 +7107,40 @@ class MirrorHierarchy(object):
 
         with r9General.AnimationContext(**context_kws):
             with AnimationLayerContext(self.indexednodes, mergeLayers=self.mergeLayers, restoreOnExit=False):
-                # Switch Pairs on the Left and Right and inverse the channels
+                pairs = []
                 for index, leftData in self.mirrorDict['Left'].items():
                     if index not in self.mirrorDict['Right'].keys():
                         log.warning('No matching Index Key found for Left mirrorIndex : %s >> %s' % (index, r9Core.nodeNameStrip(leftData['node'])))
                     else:
-                        rightData = self.mirrorDict['Right'][index]
-                        if logging_is_debug():
-                            log.debug('SwitchingPairs : %s >> %s' % (r9Core.nodeNameStrip(leftData['node']),
-                                                                     r9Core.nodeNameStrip(rightData['node'])))
-                        self.switchPairData(leftData['node'], rightData['node'], mode=mode)
-
-                        if logging_is_debug():
-                            log.debug('Axis Inversions: left: %s' % ','.join(leftData['axis']))
-                            log.debug('Axis Inversions: right: %s' % ','.join(rightData['axis']))
-                        if leftData['axis']:
-                            inverseCall(leftData['node'], leftData['axis'])
-                        if rightData['axis']:
-                            inverseCall(rightData['node'], rightData['axis'])
+                        pairs.append((leftData, self.mirrorDict['Right'][index]))
+                centres = self.mirrorDict['Centre'].values()
+
+                if batch:
+                    batchCall = self._batchAnim if mode == 'Anim' else self._batchPose
+                    groups = [[(right['node'], left['node'], left['axis']),
+                               (left['node'], right['node'], right['axis'])] for left, right in pairs]
+                    inversions = [(data['node'], data['axis']) for data in centres]
+                    failed, failedInversions = batchCall(groups, inversions)
+                    pairs = [pair for pair, group in zip(pairs, groups) if group in failed]
+                    centres = [data for data, inversion in zip(centres, inversions) if inversion in failedInversions]
+
+                # Switch Pairs on the Left and Right and inverse the channels
+                for leftData, rightData in pairs:
+                    if logging_is_debug():
+                        log.debug('SwitchingPairs : %s >> %s' % (r9Core.nodeNameStrip(leftData['node']),
+                                                                 r9Core.nodeNameStrip(rightData['node'])))
+                    self.switchPairData(leftData['node'], rightData['node'], mode=mode)
+
+                    if logging_is_debug():
+                        log.debug('Axis Inversions: left: %s' % ','.join(leftData['axis']))
+                        log.debug('Axis Inversions: right: %s' % ','.join(rightData['axis']))
+                    if leftData['axis']:
+                        inverseCall(leftData['node'], leftData['axis'])
+                    if rightData['axis']:
+                        inverseCall(rightData['node'], rightData['axis'])
 
                 # Inverse the Centre Nodes
-                for data in self.mirrorDict['Centre'].values():
+                for data in centres:
                     inverseCall(data['node'], data['axis'])
 
     def saveMirrorSetups(self, filepath):
@@ -5116,10 +7149,7 @@ class MirrorHierarchy(object):
         '''
         self.getMirrorSets()
         self.printMirrorDict()
-        ConfigObj = configobj.ConfigObj(indent_type='\t')
-        ConfigObj['mirror'] = self.mirrorDict
-        ConfigObj.filename = filepath
-        ConfigObj.write()
+        r9ConfigIO.write(filepath, {'mirror': self.mirrorDict})
 
     def loadMirrorSetups(self, filepath=None, nodes=None, clearCurrent=True, matchMethod='base'):  # 'stripPrefix'):  # used to be 'base' for some reason??
         '''
@@ -5133,7 +7163,7 @@ class MirrorHierarchy(object):
         if filepath:
             if not os.path.exists(filepath):
                 raise IOError('invalid filepath given')
-            self.mirrorDict = configobj.ConfigObj(filepath)['mirror']
+            self.mirrorDict = r9ConfigIO.read(filepath)['mirror']
 
         nodesToMap = nodes
         if not nodesToMap:
@@ -5535,7 +7565,7 @@ class CameraTracker():
         self.poseButtonHighLight = r9Setup.red9ButtonBGC('green')
 
     @staticmethod
-    def cameraTrackView(start=None, end=None, step=None, fixed=True, keepOffset=False, cam=None, static=False):
+    def cameraTrackView(start=None, end=None, step=None, fixed=True, keepOffset=False, cam=None, static=False, batch=False):
         '''
         CameraTracker is a simple wrap over the internal viewFit call but this manages the data
         over time. Works by taking the current camera, in the current 3dView, and fitting it to
@@ -5548,6 +7578,10 @@ class CameraTracker():
         :param keepOffset: keep the current camera offset rather than doing a full viewFit
         :param cam: if given use this camera else we use the current modelEditors camera
         :param static: if true we DON'T track, we just do a single frame - hook for the ProPack Playblast management
+        :param batch: fixed (panning) mode only, aim the camera at the selection's bounding box centre
+            for all frames from the cached world matrices, see TrajectoryCache, rather than stepping
+            the timeline and running viewLookAt per frame. The selection's shapes are treated
+            as rigid.
 
         TODO: add option for cloning the camera rather than using the current directly
         '''
@@ -5592,6 +7626,13 @@ class CameraTracker():
                 shifted = cmds.getAttr('%s.translate' % cam)[0]
                 offset = [(cachedTransform[0] - shifted[0]), (cachedTransform[1] - shifted[1]), (cachedTransform[2] - shifted[2])]
 
+        if batch and fixed:
+            targets = cmds.ls(sl=True, l=True, type='transform')
+            if len(targets) == len(cmds.ls(sl=True)):
+                CameraTracker._panSolve(cam, targets, timeLineRangeProcess(start, end, step, incEnds=True))
+                return
+            log.info('CameraTracker : batch mode bypassed, only supported for transform selections')
+
         if not static:
             with r9General.AnimationContext(eval_mode='anim'):
                 for i in timeLineRangeProcess(start, end, step, incEnds=True):
@@ -5610,6 +7651,52 @@ class CameraTracker():
                     cmds.setKeyframe(cam, t=i)
                 cmds.filterCurve(cam)
 
+    @staticmethod
+    def _panSolve(cam, targets, frames):
+        '''
+        batched panning track, the camera's world position and the targets' world matrices
+        come from the TrajectoryCache, the aim is solved per frame and the camera's rotates
+        keyed in one curve write
+
+        :param cam: the camera
+        :param targets: transforms to keep framed, their object space bounding boxes are
+            carried by the cached world matrices
+        :param frames: frames to key
+        '''
+        if cmds.nodeType(cam) == 'camera':
+            cam = cmds.listRelatives(cam, p=True, f=True)[0]
+        cam = cmds.ls(cam, l=True)[0]
+        cache = TrajectoryCache.get()
+        bounds = [(OpenMaya.MFnDagNode(SnapBakeSolver._dagPath(node)).boundingBox(), cache.matrices(node, frames))
+                  for node in targets]
+        up = OpenMaya.MGlobal.upAxis()
+        trajectory = []
+        axes = None
+        for i, world in enumerate(cache.matrices(cam, frames)):
+            eye = OpenMaya.MPoint() * world
+            bbox = None
+            for box, matrices in bounds:
+                box = OpenMaya.MBoundingBox(box)
+                box.transformUsing(matrices[i])
+                if bbox is None:
+                    bbox = box
+                else:
+                    bbox.expand(box)
+            # cameras look down -Z
+            zAxis = (eye - bbox.center()).normal()
+            xAxis = up ^ zAxis
+            if xAxis.length() > 1e-6 or not axes:
+                xAxis.normalize()
+                axes = (xAxis, zAxis ^ xAxis, zAxis)
+            aim = OpenMaya.MMatrix()
+            OpenMaya.MScriptUtil.createMatrixFromList([axes[0].x, axes[0].y, axes[0].z, 0,
+                                                       axes[1].x, axes[1].y, axes[1].z, 0,
+                                                       axes[2].x, axes[2].y, axes[2].z, 0,
+                                                       eye.x, eye.y, eye.z, 1], aim)
+            trajectory.append((aim, eye))
+        SnapBakeSolver([(cam, cam)], frames, snapTranslates=False, snapRotates=True).solveTrajectories([trajectory])
+        cmds.filterCurve(cam)
+
     @classmethod
     def show(cls):
         cls()._showUI()
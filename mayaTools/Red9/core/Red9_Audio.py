@@ -26,11 +26,10 @@ import Red9_General as r9General
 import Red9.startup.setup as r9Setup
 import Red9_Meta as r9Meta
 import Red9_CoreUtils as r9Core
+import Red9_AudioMixer as r9AudioMixer
+import Red9_AudioCache as r9AudioCache
 
 
-import wave
-import contextlib
-
 import logging
 logging.basicConfig()
 log = logging.getLogger(__name__)
@@ -461,13 +460,17 @@ class AudioHandler(object):
 #                 else:
 #                     raise IOError('Combined Audio path is already imported into Maya')
 
-    def combineAudio(self, filepath):
+    def combineAudio(self, filepath, blockSize=32768):
         '''
         Combine audio tracks into a single wav file. This by-passes
         the issues with Maya not playblasting multiple audio tracks.
 
+        The mixdown is streamed, see r9AudioMixer.AudioMixer, each wav is read in blocks
+        and only the tracks active in a block are summed, so memory stays bounded however
+        many audio nodes are in the scene. 24bit wavs are now supported.
+
         :param filepath: filepath to store the combined audioTrack
-        TODO: Deal with offset start and end data + silence
+        :param blockSize: number of audio frames mixed per block
         '''
         status = True
         failed = []
@@ -486,14 +489,15 @@ class AudioHandler(object):
                 else:
                     raise IOError('Combined Audio path is already imported into Maya')
 
+        fps = float(r9General.getCurrentFPS())
         frmrange = self.getOverallRange()
         neg_adjustment = 0
         if frmrange[0] < 0:
             neg_adjustment = frmrange[0]
 
-        duration = ((frmrange[1] + abs(neg_adjustment)) / r9General.getCurrentFPS()) * 1000
-        log.info('Audio BaseTrack duration = %f' % duration)
-        baseTrack = audio_segment.AudioSegment.silent(duration)
+        duration = (frmrange[1] + abs(neg_adjustment)) / fps
+        log.info('Audio BaseTrack duration = %f' % (duration * 1000))
+        mixer = r9AudioMixer.AudioMixer(blockSize=blockSize)
 
         for audio in self.audioNodes:
             if not os.path.exists(audio.path):
@@ -504,19 +508,21 @@ class AudioHandler(object):
             # deal with any trimming of the audio node in Maya
             sourceStart = cmds.getAttr(audio.audioNode + '.sourceStart')
             sourceEnd = cmds.getAttr(audio.audioNode + '.sourceEnd')
-            sound = audio_segment.AudioSegment.from_wav(audio.path)[(sourceStart / r9General.getCurrentFPS()) * 1000:(sourceEnd / r9General.getCurrentFPS()) * 1000]
-            # sound = audio_segment.AudioSegment.from_wav(audio.path)
-            if sound.sample_width not in [1, 2, 4]:
-                log.warning('24bit Audio is NOT supported in Python audioop lib!  : "%s" == %i' % (audio.audioNode, sound.sample_width))
+            insertFrame = (audio.startFrame + abs(neg_adjustment))
+            try:
+                mixer.addTrack(audio.path, position=insertFrame / fps,
+                               sourceStart=sourceStart / fps, sourceEnd=sourceEnd / fps)
+            except (IOError, ValueError), err:
+                log.warning('Unable to mix audio : "%s" == %s' % (audio.audioNode, err))
                 status = False
                 failed.append(audio)
                 continue
-            insertFrame = (audio.startFrame + abs(neg_adjustment))
             log.info('inserting sound : %s at %f adjusted to %f' %
                      (audio.audioNode, audio.startFrame, insertFrame))
-            baseTrack = baseTrack.overlay(sound, position=(insertFrame / r9General.getCurrentFPS()) * 1000)
 
-        baseTrack.export(filepath, format="wav")
+        if not mixer.tracks:
+            raise StandardError('combine failed, none of the audio could be mixed: see script Editor for details')
+        mixer.mixdown(filepath, duration=duration)
         compiled = AudioNode(filepath=filepath)
         compiled.importAndActivate()
         compiled.stampCompiled(self.mayaNodes)
@@ -641,23 +647,31 @@ class AudioNode(object):
         return data
 
     # ---------------------------------------------------------------------------------
-    # pyDub inspect calls ---
+    # wav inspect calls, served from the r9AudioCache ---
     # ---------------------------------------------------------------------------------
-    # https://github.com/jiaaro/pydub/blob/master/API.markdown
+
+    @property
+    def audioInfo(self):
+        '''
+        the cached r9AudioCache.AudioInfo for the wav, the header is read on first use and
+        the levels and peaks when they're first asked for. The cache is keyed on the wav's
+        path, mtime and size so edits to the file are always picked up
+        '''
+        return r9AudioCache.getAudioInfo(self.path)
 
     @property
     def sampleRate(self):
         '''
         sample rate in milliseconds
         '''
-        return audio_segment.AudioSegment.from_wav(self.path).frame_rate
+        return self.audioInfo.sampleRate
 
     @property
     def sample_width(self):
         '''
         bytes per sample, is converted by the sample_bits into bitrate
         '''
-        return audio_segment.AudioSegment.from_wav(self.path).sample_width
+        return self.audioInfo.sampleWidth
 
     @property
     def sample_bits(self):
@@ -665,21 +679,21 @@ class AudioNode(object):
         bit rate taken from the bytes per sample : 4,8,16,24 bit
         '''
         data = {'1': 8, '2': 16, '3': 24, '4': 32}
-        return data[str(audio_segment.AudioSegment.from_wav(self.path).sample_width)]
+        return data[str(self.audioInfo.sampleWidth)]
 
     @property
     def channels(self):
         '''
         number of channels 1=mone, 2=stereo
         '''
-        return audio_segment.AudioSegment.from_wav(self.path).channels
+        return self.audioInfo.channels
 
     @property
     def dBFS(self):
         '''
         loudness of the AudioSegment in dBFS (db relative to the maximum possible loudness)
         '''
-        return audio_segment.AudioSegment.from_wav(self.path).dBFS
+        return self.audioInfo.dBFS
 
     @property
     def max_dBFS(self):
@@ -687,16 +701,25 @@ class AudioNode(object):
         The highest amplitude of any sample in the AudioSegment,
         in dBFS (relative to the highest possible amplitude value).
         '''
-        return audio_segment.AudioSegment.from_wav(self.path).max_dBFS
+        return self.audioInfo.max_dBFS
 
     @property
     def duration(self):
         '''
         return the duration of the wav from the file directly
         '''
-        return audio_segment.AudioSegment.from_wav(self.path).duration_seconds
+        return self.audioInfo.duration
+
+    def peaks(self, samplesPerPixel=None):
+        '''
+        min/max waveform peaks for drawing, see r9AudioCache.AudioInfo.peaks
+
+        :param samplesPerPixel: frames of audio per pixel drawn
+        :return: (bucketFrames, array of interleaved min, max values per bucket)
+        '''
+        return self.audioInfo.peaks(samplesPerPixel)
 
-    # pyDub end ---
+    # inspect end ---
 
     @property
     def startFrame(self):
@@ -794,7 +817,7 @@ class AudioNode(object):
         : PRO_PACK : validate if the given source Wav is a BWav or not
         '''
         if self.pro_bwav:
-            return self.pro_bwav.isBwav()
+            return self.audioInfo.bwav is not None
         else:
             raise r9Setup.ProPack_Error()
 
@@ -813,7 +836,7 @@ class AudioNode(object):
         : PRO_PACK : read the internal timecode reference from the bwav and convert that number into milliseconds
         '''
         if self.pro_bwav:
-            return self.pro_bwav.bwav_timecodeMS()
+            return self.audioInfo.timecodeMS
         else:
             raise r9Setup.ProPack_Error()
 
@@ -822,7 +845,8 @@ class AudioNode(object):
         : PRO_PACK : if is BWaw return the internal timeReference
         '''
         if self.pro_bwav:
-            return self.pro_bwav.bwav_timecodeReference()
+            if self.audioInfo.bwav:
+                return self.audioInfo.bwav['TimeReference']
         else:
             raise r9Setup.ProPack_Error()
 
@@ -849,11 +873,11 @@ class AudioNode(object):
             ie, we set the timecodebase to '01:00:00:00' therefore day 1 timecode is stripped from
             all the calculations and a bwav who's timecode is '00:00:00:10' is set to frame 10
         '''
-        if self.isLoaded and self.pro_bwav and self.pro_bwav.isBwav():
+        if self.isLoaded and self.pro_bwav and self.isBwav():
             if timecodebase:
                 offset = offset - self.pro_audio.timecode_to_frame(timecodebase)
                 # print 'new timecode base given : %s : new offset = %s' % (timecodebase,offset)
-            self.startFrame = self.pro_audio.milliseconds_to_frame(self.pro_bwav.bwav_timecodeMS()) + offset
+            self.startFrame = self.pro_audio.milliseconds_to_frame(self.bwav_timecodeMS()) + offset
         else:
             raise r9Setup.ProPack_Error()
 
@@ -864,7 +888,7 @@ class AudioNode(object):
         stamped with the Red9 timecode attrs. This also supports multiple timecode takes within the
         same node
         '''
-        if self.isLoaded and self.pro_bwav and self.pro_bwav.isBwav():
+        if self.isLoaded and self.pro_bwav and self.isBwav():
             _timecode = self.pro_audio.Timecode(tc_node)
             if not bounds:
                 bounds = _timecode.getTimecode_bounds()
@@ -964,11 +988,7 @@ class AudioNode(object):
         This uses the wav itself bypassing the Maya handling, why?
         In maya.standalone the audio isn't loaded correctly and always is of length 1!
         '''
-        with contextlib.closing(wave.open(self.path, 'r')) as f:
-            frames = f.getnframes()
-            rate = f.getframerate()
-            duration = frames / float(rate)
-            return (duration) * r9General.getCurrentFPS()
+        return self.audioInfo.duration * r9General.getCurrentFPS()
 
     def setTimeline(self, full=False):
         '''
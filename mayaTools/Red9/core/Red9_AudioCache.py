@@ -0,0 +1,486 @@
+'''
+..
+    Red9 Studio Pack: Maya Pipeline Solutions
+    Author: Mark Jackson
+    email: rednineinfo@gmail.com
+
+    Red9 blog : http://red9-consultancy.blogspot.co.uk/
+    MarkJ blog: http://markj3d.blogspot.co.uk
+
+
+Per file metadata and waveform peak cache used by r9Audio.AudioNode.
+
+Every property on the AudioNode used to decode the full wav through pydub, so
+gatherInfo, inspect_wav and the bwav timecode syncs were reading each file many
+times over. Instead each wav gets an AudioInfo, held in memory and saved to a cache
+dir, keyed on the path and validated against the file's mtime and size so any
+edit to the wav drops the cached data.
+
+Only the RIFF header and the bext chunk are parsed up front, that's a couple of
+small reads regardless of the length of the file. The rms / peak levels and the
+min/max peak pyramid used for waveform drawing need the sample data, so they're
+worked out lazily, in a single streamed pass over the file, the first time any of
+them is asked for and then saved with the rest of the cache.
+
+    >>> info = AudioCache.get().info('dialogue_01.wav')
+    >>> info.sampleRate, info.duration, info.bwav['TimeReference']
+    >>> info.dBFS
+    >>> bucketFrames, minmax = info.peaks(samplesPerPixel=2048)
+
+The cache is a json file per wav holding the header, bext and stats, with the
+peak pyramid in a binary sidecar next to it, both named from an md5 of the path.
+
+.. note::
+    there are no Maya imports in here so the cache can be run and tested from
+    a standard python shell.
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import math
+import json
+import struct
+import audioop
+import hashlib
+import tempfile
+from array import array
+from operator import mul
+
+import Red9_AudioMixer as r9AudioMixer
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+global RED9_AUDIO_CACHE
+RED9_AUDIO_CACHE = None
+
+CACHE_VERSION = 1
+PEAK_BASE_FRAMES = 256  # frames per min/max bucket at the finest level of the pyramid
+PEAK_MIN_BUCKETS = 64  # stop halving the pyramid once a level is down to this many buckets
+READ_BUCKETS = 256  # base buckets read from disk per block in the analysis pass
+
+# fixed part of the EBU Tech 3285 bext chunk, the coding history that follows is ignored
+BEXT_FORMAT = '<256s32s32s10s8sIIH'
+BEXT_KEYS = ['Description', 'Originator', 'OriginatorReference', 'OriginationDate',
+             'OriginationTime', 'TimeReference', 'TimeReferenceHigh', 'BextVersion']
+
+# array typecodes for the signed sample widths audioop works on
+_TYPECODES = {1: 'b', 2: 'h', 4: 'i'}
+
+
+def readBext(filepath, chunks):
+    '''
+    read the broadcast wav bext chunk
+
+    :param chunks: the {chunkId: (offset, size)} from r9AudioMixer.readWavHeader
+    :return: dict of the BEXT_KEYS, TimeReference being the full 64bit sample count,
+        or None if the wav isn't a bwav. The text fields are returned as unicode, the
+        spec says ascii but latin-1 is common from DAWs so anything that isn't valid
+        utf-8 is decoded as latin-1
+    '''
+    if 'bext' not in chunks:
+        return None
+    offset, size = chunks['bext']
+    length = struct.calcsize(BEXT_FORMAT)
+    if size < length:
+        log.warning('bext chunk is truncated : %s' % filepath)
+        return None
+    with open(filepath, 'rb') as f:
+        f.seek(offset)
+        values = list(struct.unpack(BEXT_FORMAT, f.read(length)))
+    for i in range(5):
+        text = values[i].split('\x00')[0].strip()
+        try:
+            values[i] = text.decode('utf-8')
+        except UnicodeDecodeError:
+            values[i] = text.decode('latin-1')
+    bext = dict(zip(BEXT_KEYS, values))
+    bext['TimeReference'] += bext['TimeReferenceHigh'] << 32
+    return bext
+
+def ratioToDb(value, maxValue):
+    '''
+    20 * log10 of value relative to maxValue, as pydub's ratio_to_db, silence is -inf
+    '''
+    if not value:
+        return -float('inf')
+    return 20 * math.log10(float(value) / maxValue)
+
+def reducePeaks(peaks):
+    '''
+    halve the resolution of an interleaved min, max array, merging neighbouring buckets
+    '''
+    mins = peaks[0::2]
+    maxs = peaks[1::2]
+    if len(mins) % 2:
+        mins.append(mins[-1])
+        maxs.append(maxs[-1])
+    reduced = array('i', [0]) * len(mins)
+    reduced[0::2] = array('i', map(min, mins[0::2], mins[1::2]))
+    reduced[1::2] = array('i', map(max, maxs[0::2], maxs[1::2]))
+    return reduced
+
+
+class AudioInfo(object):
+    '''
+    cached data for a single wav. The header fields are read on init, the stats
+    and the peak pyramid are only worked out the first time they're asked for
+    '''
+    def __init__(self, filepath, cache=None, data=None):
+        '''
+        :param filepath: wav to inspect
+        :param cache: AudioCache this info is saved to
+        :param data: previously cached data to restore, only passed in by the AudioCache
+        '''
+        self.path = filepath
+        self.cache = cache
+        self._peakLevels = None
+        if data:
+            self.data = data
+        else:
+            stat = os.stat(filepath)
+            header = r9AudioMixer.readWavHeader(filepath)
+            self.data = {'version': CACHE_VERSION,
+                         'path': filepath,
+                         'mtime': stat.st_mtime,
+                         'size': stat.st_size,
+                         'header': header,
+                         'bwav': readBext(filepath, header['chunks']),
+                         'stats': None,
+                         'peaks': None}
+
+    def isValid(self):
+        '''
+        does the cached data still match the file on disk
+        '''
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return stat.st_mtime == self.data['mtime'] and stat.st_size == self.data['size']
+
+    # header data, always available ---
+
+    @property
+    def header(self):
+        return self.data['header']
+
+    @property
+    def sampleRate(self):
+        return self.header['sampleRate']
+
+    @property
+    def sampleWidth(self):
+        return self.header['sampleWidth']
+
+    @property
+    def channels(self):
+        return self.header['channels']
+
+    @property
+    def frames(self):
+        return self.header['frames']
+
+    @property
+    def duration(self):
+        '''
+        length of the wav in seconds
+        '''
+        return self.frames / float(self.sampleRate)
+
+    @property
+    def bwav(self):
+        '''
+        the bext chunk data, None if the wav isn't a bwav
+        '''
+        return self.data['bwav']
+
+    @property
+    def timecodeMS(self):
+        '''
+        the bwav TimeReference converted to milliseconds
+        '''
+        if self.bwav:
+            return self.bwav['TimeReference'] / float(self.sampleRate) * 1000
+
+    # lazy data, from the sample data ---
+
+    @property
+    def stats(self):
+        if self.data['stats'] is None:
+            self.analyse()
+        return self.data['stats']
+
+    @property
+    def rms(self):
+        return self.stats['rms']
+
+    @property
+    def peak(self):
+        return self.stats['peak']
+
+    @property
+    def dBFS(self):
+        '''
+        loudness in dB relative to the maximum possible amplitude, as pydub's AudioSegment.dBFS
+        '''
+        return ratioToDb(self.rms, self.stats['maxAmplitude'])
+
+    @property
+    def max_dBFS(self):
+        '''
+        highest sample amplitude in dB relative to the maximum possible, as pydub's AudioSegment.max_dBFS
+        '''
+        return ratioToDb(self.peak, self.stats['maxAmplitude'])
+
+    def analyse(self):
+        '''
+        single streamed pass over the sample data for the rms, peak and the base level of the
+        peak pyramid, the coarser levels being reduced from that. The cache is then saved.
+
+        The levels match pydub, including its quirks, so the cached values are interchangeable
+        with the AudioSegment properties the AudioNode used to call. 8bit rms is measured on
+        the data widened to 16bit and the peak on the raw, unsigned, data. 24bit, which pydub
+        can't handle, is measured at its native scale.
+        '''
+        header = self.header
+        width = header['sampleWidth']
+        if not header['format'] == r9AudioMixer.WAVE_FORMAT_PCM or width not in [1, 2, 3, 4]:
+            raise ValueError('Only PCM wav data can be analysed, format %i, width %i : %s' % (header['format'], width, self.path))
+        readWidth = 4 if width == 3 else width
+        bucketSize = PEAK_BASE_FRAMES * header['blockAlign']
+        step = PEAK_BASE_FRAMES * readWidth * header['channels']  # bucket size once converted
+        remaining = header['dataSize'] - header['dataSize'] % header['blockAlign']
+        sumSquares = 0
+        samples = 0
+        peak = 0
+        base = array('i')
+        with open(self.path, 'rb') as f:
+            f.seek(header['dataOffset'])
+            while remaining > 0:
+                data = f.read(min(remaining, bucketSize * READ_BUCKETS))
+                if not data:
+                    break
+                remaining -= len(data)
+                data = data[:len(data) - len(data) % header['blockAlign']]
+                samples += len(data) // width
+                if width == 1:
+                    peak = max(peak, audioop.max(data, 1))
+                    data = audioop.bias(data, 1, -128)
+                elif width == 3:
+                    data = r9AudioMixer.toMixWidth(data, 3)
+                    peak = max(peak, audioop.max(data, 4) >> 8)
+                else:
+                    peak = max(peak, audioop.max(data, width))
+                values = array(_TYPECODES[readWidth])
+                values.fromstring(data)
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                sumSquares += sum(map(mul, values, values))
+
+                for i in range(0, len(data), step):
+                    base.extend(audioop.minmax(data[i:i + step], readWidth))
+
+        if width == 1:
+            sumSquares *= 65536  # widened to 16bit as pydub measures it
+            maxAmplitude = 1 << 7
+        elif width == 3:
+            sumSquares //= 65536  # back from 32bit left justified
+            base = array('i', [v >> 8 for v in base])
+            maxAmplitude = 1 << 23
+        else:
+            maxAmplitude = 1 << (8 * width - 1)
+        self.data['stats'] = {'rms': int(math.sqrt(float(sumSquares) / samples)) if samples else 0,
+                              'peak': peak,
+                              'maxAmplitude': maxAmplitude}
+
+        levels = [base]
+        while len(levels[-1]) > PEAK_MIN_BUCKETS * 2:
+            levels.append(reducePeaks(levels[-1]))
+        self._peakLevels = levels
+        table = []
+        offset = 0
+        for i, level in enumerate(levels):
+            table.append([PEAK_BASE_FRAMES << i, offset, len(level)])
+            offset += len(level)
+        self.data['peaks'] = table
+        if self.cache:
+            self.cache.save(self)
+
+    def peakLevels(self):
+        '''
+        all the levels of the peak pyramid, finest first, each an array of interleaved
+        min, max values, one pair per bucket over all the channels
+        '''
+        if self._peakLevels is None:
+            if self.data['peaks'] is not None and self.cache:
+                self._peakLevels = self.cache.loadPeaks(self)
+            if self._peakLevels is None:
+                self.analyse()
+        return self._peakLevels
+
+    def peaks(self, samplesPerPixel=None):
+        '''
+        min/max peaks for waveform drawing, returns the coarsest level of the pyramid whose
+        buckets are still no larger than the requested samplesPerPixel
+
+        :param samplesPerPixel: frames of audio drawn per pixel, None for the finest level
+        :return: (bucketFrames, array of interleaved min, max values per bucket)
+        '''
+        levels = self.peakLevels()
+        index = 0
+        if samplesPerPixel:
+            while index + 1 < len(levels) and PEAK_BASE_FRAMES << (index + 1) <= samplesPerPixel:
+                index += 1
+        return PEAK_BASE_FRAMES << index, levels[index]
+
+
+class AudioCache(object):
+    '''
+    AudioInfo registry, in memory and saved to disk in the cacheDir
+    '''
+    def __init__(self, cacheDir=None):
+        '''
+        :param cacheDir: folder the cache files are written to, by default Red9_AudioCache
+            in the system temp dir. If it can't be written to the cache is memory only
+        '''
+        if not cacheDir:
+            cacheDir = os.path.join(tempfile.gettempdir(), 'Red9_AudioCache')
+        self.cacheDir = cacheDir
+        self.infos = {}  # normalized path : AudioInfo
+
+    @classmethod
+    def get(cls):
+        '''
+        the shared cache, created on first use
+        '''
+        global RED9_AUDIO_CACHE
+        if RED9_AUDIO_CACHE is None:
+            RED9_AUDIO_CACHE = cls()
+        return RED9_AUDIO_CACHE
+
+    @staticmethod
+    def key(filepath):
+        return os.path.normcase(os.path.abspath(filepath))
+
+    def cacheFile(self, filepath, ext='.json'):
+        key = self.key(filepath)
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return os.path.join(self.cacheDir, hashlib.md5(key).hexdigest() + ext)
+
+    def info(self, filepath):
+        '''
+        the AudioInfo for the given wav, from memory, the cacheDir or, if neither are
+        valid for the file as it is on disk, a new one from the file's header
+        '''
+        key = self.key(filepath)
+        info = self.infos.get(key)
+        if info and info.isValid():
+            return info
+        info = self.load(filepath)
+        if not info:
+            info = AudioInfo(filepath, cache=self)
+            self.save(info)
+        self.infos[key] = info
+        return info
+
+    def load(self, filepath):
+        '''
+        load the cached AudioInfo from the cacheDir, None if there isn't one or it's out of date
+        '''
+        cacheFile = self.cacheFile(filepath)
+        if not os.path.exists(cacheFile):
+            return None
+        try:
+            with open(cacheFile, 'r') as f:
+                data = json.load(f)
+        except (IOError, ValueError), err:
+            log.debug('failed to read the audio cache : %s : %s' % (cacheFile, err))
+            return None
+        if not data.get('version') == CACHE_VERSION or not self.key(data['path']) == self.key(filepath):
+            return None
+        # json has no tuples, put the chunk spans back as they came from the header
+        data['header']['chunks'] = dict((str(k), tuple(v)) for k, v in data['header']['chunks'].items())
+        info = AudioInfo(filepath, cache=self, data=data)
+        if not info.isValid():
+            return None
+        return info
+
+    def loadPeaks(self, info):
+        '''
+        read the peak pyramid levels of the info from the cacheDir
+        '''
+        peaks = array('i')
+        try:
+            with open(self.cacheFile(info.path, '.peaks'), 'rb') as f:
+                peaks.fromstring(f.read())
+        except IOError:
+            return None
+        if sys.byteorder == 'big':
+            peaks.byteswap()
+        if not sum(level[2] for level in info.data['peaks']) == len(peaks):
+            return None
+        return [peaks[offset:offset + count] for _, offset, count in info.data['peaks']]
+
+    def save(self, info):
+        '''
+        write the info, and its peaks if they've been worked out, to the cacheDir. The files
+        are written under a temp name and then renamed so a failed write never leaves a
+        partial cache behind. Failures are only logged
+        '''
+        try:
+            if not os.path.exists(self.cacheDir):
+                os.makedirs(self.cacheDir)
+            if info._peakLevels is not None:
+                peaks = array('i')
+                for level in info._peakLevels:
+                    peaks.extend(level)
+                if sys.byteorder == 'big':
+                    peaks.byteswap()
+                self._write(self.cacheFile(info.path, '.peaks'), peaks.tostring())
+            self._write(self.cacheFile(info.path), json.dumps(info.data, indent=1))
+        except StandardError, err:
+            # the cache is only an optimization, the info is still valid in memory
+            log.warning('unable to write the audio cache to %s : %s' % (self.cacheDir, err))
+
+    @staticmethod
+    def _write(filepath, data):
+        temp = filepath + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(data)
+        if os.path.exists(filepath):
+            os.remove(filepath)  # windows won't rename over an existing file
+        os.rename(temp, filepath)
+
+    def remove(self, filepath):
+        '''
+        drop the given wav from the cache, memory and disk
+        '''
+        self.infos.pop(self.key(filepath), None)
+        for ext in ['.json', '.peaks']:
+            cacheFile = self.cacheFile(filepath, ext)
+            if os.path.exists(cacheFile):
+                os.remove(cacheFile)
+
+    def clear(self):
+        '''
+        drop everything in the cache
+        '''
+        self.infos = {}
+        if os.path.isdir(self.cacheDir):
+            for name in os.listdir(self.cacheDir):
+                if os.path.splitext(name)[1] in ['.json', '.peaks', '.tmp']:
+                    os.remove(os.path.join(self.cacheDir, name))
+
+
+def getAudioInfo(filepath):
+    '''
+    the AudioInfo for a wav from the shared cache
+    '''
+    return AudioCache.get().info(filepath)
@@ -0,0 +1,327 @@
+'''
+..
+    Red9 Studio Pack: Maya Pipeline Solutions
+    Author: Mark Jackson
+    email: rednineinfo@gmail.com
+
+    Red9 blog : http://red9-consultancy.blogspot.co.uk/
+    MarkJ blog: http://markj3d.blogspot.co.uk
+
+
+Streaming multi-track wav mixer used by r9Audio.AudioHandler.combineAudio.
+
+Rather than decoding every source into memory and overlaying each one onto a full
+length base track, the mixdown is run block by block. For each block only the tracks
+active in it are read from disk, converted to the mix format, summed and the block
+written straight out to the combined wav, so peak memory is bounded by the block size
+times the number of active tracks, not by the length of the scene.
+
+The mix format follows what pydub's overlay gave us, the highest sample rate, channel
+count and sample width of the sources. Tracks are summed at 32bit, with clipping, and
+converted to the output width on write, which is also how 24bit sources are supported
+as audioop itself doesn't handle 3 byte samples.
+
+    >>> mixer = AudioMixer()
+    >>> mixer.addTrack('dialogue_01.wav', position=1.5)
+    >>> mixer.addTrack('dialogue_02.wav', position=4.0, sourceStart=0.25, sourceEnd=2.0)
+    >>> mixer.mixdown('combined.wav', duration=10.0)
+
+.. note::
+    there are no Maya imports in here so the mixer can be run and tested from
+    a standard python shell.
+'''
+
+from __future__ import print_function
+
+import struct
+import audioop
+import wave
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+MIX_WIDTH = 4  # internal mix sample width, 32bit left justified
+
+
+def readWavHeader(filepath):
+    '''
+    parse the RIFF chunks of a wav for the format and the position of the sample data.
+    Unlike the wave module this also accepts WAVE_FORMAT_EXTENSIBLE files, as written by
+    most DAWs for 24bit and multi-channel audio, and any chunk order.
+
+    :return: dict with the keys format, channels, sampleRate, sampleWidth, blockAlign,
+        dataOffset, dataSize, frames and chunks, the {chunkId: (offset, size)} of every chunk
+    '''
+    header = {'chunks': {}}
+    with open(filepath, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or not riff[:4] == 'RIFF' or not riff[8:12] == 'WAVE':
+            raise IOError('File is not a RIFF wav : %s' % filepath)
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            chunkId, size = struct.unpack('<4sI', chunk)
+            offset = f.tell()
+            header['chunks'][chunkId] = (offset, size)
+            if chunkId == 'fmt ':
+                fmt = f.read(size)
+                audioFormat, channels, sampleRate, _, blockAlign, bits = struct.unpack('<HHIIHH', fmt[:16])
+                if audioFormat == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                    audioFormat = struct.unpack('<H', fmt[24:26])[0]
+                header.update({'format': audioFormat,
+                               'channels': channels,
+                               'sampleRate': sampleRate,
+                               'sampleWidth': (bits + 7) // 8,
+                               'blockAlign': blockAlign})
+            # chunks are word aligned
+            f.seek(offset + size + (size & 1))
+
+    if 'fmt ' not in header['chunks'] or 'data' not in header['chunks']:
+        raise IOError('wav is missing its fmt or data chunk : %s' % filepath)
+    header['dataOffset'], header['dataSize'] = header['chunks']['data']
+    header['frames'] = header['dataSize'] // header['blockAlign'] if header['blockAlign'] else 0
+    return header
+
+def toMixWidth(data, width):
+    '''
+    convert little-endian PCM samples of the given width to 32bit left justified samples
+    '''
+    if width == MIX_WIDTH:
+        return data
+    if width == 3:
+        # audioop can't handle 24bit so pad each sample out to 32bit by hand
+        src = bytearray(data)
+        count = len(src) // 3
+        out = bytearray(count * 4)
+        out[1::4] = src[0:count * 3:3]
+        out[2::4] = src[1:count * 3:3]
+        out[3::4] = src[2:count * 3:3]
+        return str(out)
+    if width == 1:
+        # 8bit wav data is unsigned
+        data = audioop.bias(data, 1, -128)
+    return audioop.lin2lin(data, width, MIX_WIDTH)
+
+def fromMixWidth(data, width):
+    '''
+    convert 32bit left justified samples back to little-endian PCM of the given width
+    '''
+    if width == MIX_WIDTH:
+        return data
+    if width == 3:
+        src = bytearray(data)
+        count = len(src) // 4
+        out = bytearray(count * 3)
+        out[0::3] = src[1::4]
+        out[1::3] = src[2::4]
+        out[2::3] = src[3::4]
+        return str(out)
+    data = audioop.lin2lin(data, MIX_WIDTH, width)
+    if width == 1:
+        data = audioop.bias(data, 1, 128)
+    return data
+
+
+class MixTrack(object):
+    '''
+    a single source in the mix, read from disk in blocks and converted to the mix format
+    on demand. Times are all in seconds.
+    '''
+    def __init__(self, filepath, position=0.0, sourceStart=0.0, sourceEnd=None):
+        '''
+        :param filepath: wav to mix in
+        :param position: time in the mix the start of the (trimmed) source lands at, can be negative
+        :param sourceStart: trim the start of the source to this time
+        :param sourceEnd: trim the end of the source to this time, None is the end of the file
+        '''
+        self.filepath = filepath
+        self.header = readWavHeader(filepath)
+        if not self.header['format'] == WAVE_FORMAT_PCM:
+            raise ValueError('Only PCM wav data can be mixed, format %i : %s' % (self.header['format'], filepath))
+        if self.header['sampleWidth'] not in [1, 2, 3, 4]:
+            raise ValueError('Unsupported sample width %i : %s' % (self.header['sampleWidth'], filepath))
+        self.position = position
+        self.sourceStart = max(0.0, sourceStart)
+        self.sourceEnd = sourceEnd
+        self._file = None
+
+    @property
+    def sampleRate(self):
+        return self.header['sampleRate']
+
+    @property
+    def channels(self):
+        return self.header['channels']
+
+    @property
+    def sampleWidth(self):
+        return self.header['sampleWidth']
+
+    @property
+    def duration(self):
+        '''
+        length of the trimmed source in seconds
+        '''
+        end = float(self.header['frames']) / self.sampleRate
+        if self.sourceEnd is not None:
+            end = min(end, self.sourceEnd)
+        return max(0.0, end - self.sourceStart)
+
+    def open(self, rate, channels, start=0):
+        '''
+        start streaming the track, converted to the given mix rate and channels
+
+        :param start: number of mix frames into the track to start from, used when
+            the track starts before the beginning of the mix
+        '''
+        if channels != self.channels and not (self.channels == 1 and channels == 2):
+            raise ValueError('Unable to mix %i channels into %i : %s' % (self.channels, channels, self.filepath))
+        self.rate = rate
+        self.mixChannels = channels
+        self._ratecv = None
+        self._buffer = ''
+        firstFrame = int(round(self.sourceStart * self.sampleRate)) + int(round(start * float(self.sampleRate) / rate))
+        lastFrame = self.header['frames']
+        if self.sourceEnd is not None:
+            lastFrame = min(lastFrame, int(round(self.sourceEnd * self.sampleRate)))
+        self._remaining = max(0, lastFrame - firstFrame)
+        self._file = open(self.filepath, 'rb')
+        self._file.seek(self.header['dataOffset'] + firstFrame * self.header['blockAlign'])
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        self._file = None
+        self._buffer = ''
+
+    def _decode(self, frames):
+        '''
+        read the next frames from disk and convert them to the mix format
+        '''
+        data = self._file.read(frames * self.header['blockAlign'])
+        self._remaining -= frames
+        data = toMixWidth(data, self.sampleWidth)
+        if self.sampleRate != self.rate:
+            data, self._ratecv = audioop.ratecv(data, MIX_WIDTH, self.channels, self.sampleRate, self.rate, self._ratecv)
+        if self.channels != self.mixChannels:
+            data = audioop.tostereo(data, MIX_WIDTH, 1, 1)
+        return data
+
+    def read(self, frames):
+        '''
+        return the next number of mix frames, padded with silence once the source runs out
+        '''
+        size = frames * MIX_WIDTH * self.mixChannels
+        while len(self._buffer) < size and self._remaining > 0:
+            chunk = min(self._remaining, int(frames * float(self.sampleRate) / self.rate) + 1)
+            self._buffer += self._decode(chunk)
+        data = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        if len(data) < size:
+            data += '\x00' * (size - len(data))
+        return data
+
+
+class AudioMixer(object):
+    '''
+    Streaming mixdown of any number of wav tracks into a single wav
+    '''
+    def __init__(self, blockSize=32768):
+        '''
+        :param blockSize: number of frames mixed per block
+        '''
+        self.blockSize = blockSize
+        self.tracks = []
+
+    def addTrack(self, filepath, position=0.0, sourceStart=0.0, sourceEnd=None):
+        '''
+        add a source to the mix, see MixTrack. Raises IOError or ValueError if the
+        wav can't be mixed, including a channel count that can't be mixed with the
+        tracks already added
+        '''
+        track = MixTrack(filepath, position=position, sourceStart=sourceStart, sourceEnd=sourceEnd)
+        self._checkChannels([t.channels for t in self.tracks] + [track.channels], filepath)
+        self.tracks.append(track)
+        return track
+
+    @staticmethod
+    def _checkChannels(channels, filepath=''):
+        '''
+        tracks are mixed at their own channel count, only mono can be mixed up into stereo
+        '''
+        channels = set(channels)
+        if len(channels) > 1 and not channels == set([1, 2]):
+            raise ValueError('Unable to mix %s channels together : %s' % (sorted(channels), filepath))
+
+    def mixFormat(self):
+        '''
+        the (sampleRate, channels, sampleWidth) of the mixdown, the max of all the tracks.
+        The sampleWidth is never less than 16bit, as the old pydub mix onto a silent base
+        '''
+        if not self.tracks:
+            raise ValueError('No tracks to mix')
+        self._checkChannels([t.channels for t in self.tracks])
+        return (max(t.sampleRate for t in self.tracks),
+                max(t.channels for t in self.tracks),
+                max([2] + [t.sampleWidth for t in self.tracks]))
+
+    def mixdown(self, filepath, duration=None):
+        '''
+        mix all the tracks and write the result to the given wav, block by block
+
+        :param filepath: wav to write
+        :param duration: length of the mix in seconds, by default it runs to the end of the last track.
+            Tracks running past the duration are cut
+        :return: the mix format (sampleRate, channels, sampleWidth)
+        '''
+        rate, channels, width = self.mixFormat()
+        if duration is None:
+            duration = max(t.position + t.duration for t in self.tracks)
+        totalFrames = int(round(duration * rate))
+
+        # mix frame ranges of each track, clipped to the mix
+        spans = []
+        for track in self.tracks:
+            start = int(round(track.position * rate))
+            end = min(totalFrames, start + int(round(track.duration * rate)))
+            if end > max(0, start):
+                spans.append([track, start, end])
+        spans.sort(key=lambda x: x[1])
+
+        frameSize = MIX_WIDTH * channels
+        writer = wave.open(filepath, 'wb')
+        try:
+            writer.setnchannels(channels)
+            writer.setsampwidth(width)
+            writer.setframerate(rate)
+            active = []
+            pending = list(spans)
+            for blockStart in range(0, totalFrames, self.blockSize):
+                blockEnd = min(totalFrames, blockStart + self.blockSize)
+                while pending and pending[0][1] < blockEnd:
+                    span = pending.pop(0)
+                    span[0].open(rate, channels, start=max(0, -span[1]))
+                    active.append(span)
+                block = '\x00' * ((blockEnd - blockStart) * frameSize)
+                for span in list(active):
+                    track, start, end = span
+                    a = max(start, blockStart) - blockStart
+                    b = min(end, blockEnd) - blockStart
+                    data = track.read(b - a)
+                    block = block[:a * frameSize] + audioop.add(block[a * frameSize:b * frameSize], data, MIX_WIDTH) + block[b * frameSize:]
+                    if end <= blockEnd:
+                        track.close()
+                        active.remove(span)
+                writer.writeframesraw(fromMixWidth(block, width))
+        finally:
+            for span in spans:
+                span[0].close()
+            writer.close()
+        log.info('Mixed %i tracks to : %s' % (len(spans), filepath))
+        return rate, channels, width
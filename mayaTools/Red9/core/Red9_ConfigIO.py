@@ -0,0 +1,376 @@
+'''
+..
+    Red9 Studio Pack: Maya Pipeline Solutions
+    Author: Mark Jackson
+    email: rednineinfo@gmail.com
+
+    Red9 blog : http://red9-consultancy.blogspot.co.uk/
+    MarkJ blog: http://markj3d.blogspot.co.uk
+
+
+Fast reader / writer for the ConfigObj files written by the Red9 tools, pose files
+in the 'config' format, FilterNode_Settings, LockChannels maps and mirror setups.
+
+ConfigObj itself runs each line through several regexes and builds nested Section
+objects, tracking comments and defaults for every key, which makes loading large
+files slow. The files our tools write only use a small subset of the syntax,
+indented key = value lines, nested [section] markers and comma separated lists,
+so these are handled in a single pass using string methods into plain dicts.
+Anything outside that subset, quoted keys and values, comments, triple quoted
+multi-line values, falls back to ConfigObj's own regexes so the values returned
+are always the same as ConfigObj would give.
+
+The writer follows ConfigObj.write exactly, scalars before sub-sections, the
+same quoting rules and line endings, so the files are byte for byte the same as
+before and still load in anything that uses ConfigObj.
+
+    >>> data = read('T_Pose.pose', encoding='utf-8')
+    >>> data['poseData']['L_Wrist_Ctr']['attrs']['rotateX']
+    >>> # lazy, only the sections asked for are parsed, the rest of the file is skipped
+    >>> settings = read('T_Pose.pose', sections=['filterNode_settings'])
+    >>> write('T_Pose.pose', OrderedDict([('info', infoDict), ('poseData', poseDict)]), encoding='utf-8')
+
+.. note::
+    there are no Maya imports in here so the files can be read and written from
+    a standard python shell.
+'''
+
+from __future__ import print_function
+
+import os
+import sys
+import codecs
+
+try:
+    import Red9.packages.configobj as configobj
+except ImportError:
+    # running outside of Maya, use the configobj package shipped with Red9 directly
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'packages'))
+    import configobj
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+# ConfigObj's own regexes, only used for lines outside the fast path
+_KEYWORD = configobj.ConfigObj._keyword
+_SECTIONMARKER = configobj.ConfigObj._sectionmarker
+_VALUEEXP = configobj.ConfigObj._valueexp
+_LISTVALUEEXP = configobj.ConfigObj._listvalueexp
+_TRIPLE_QUOTE = configobj.ConfigObj._triple_quote
+
+# the regexes' \s, unicode strip() would also take \x1c-\x1f, \x85, \u2028 etc
+_WHITESPACE = ' \t\n\r\x0b\x0c'
+
+# characters that, at either end of a value, mean it has to be quoted
+WSPACE_PLUS = ' \r\n\v\t\'"'
+
+
+def _unquote(value):
+    if not value:
+        raise SyntaxError()
+    if value[0] == value[-1] and value[0] in ('"', "'"):
+        value = value[1:-1]
+    return value
+
+def _parseValue(value):
+    '''
+    value string, from after the '=', to a string or a list of strings. Plain values
+    and lists are split directly, anything quoted or commented goes through the same
+    regexes ConfigObj uses. Raises SyntaxError on a badly formed value
+    '''
+    if '"' not in value and "'" not in value and '#' not in value:
+        value = value.rstrip(_WHITESPACE)
+        if ',' not in value:
+            return value
+        if value == ',':
+            return []
+        items = [item.strip(_WHITESPACE) for item in value.split(',')]
+        if not items[-1]:
+            items.pop()  # trailing comma, a single item list
+        if all(items):
+            return items
+
+    # outside the fast path, the same handling as ConfigObj._handle_value
+    mat = _VALUEEXP.match(value)
+    if mat is None:
+        raise SyntaxError()
+    (listValues, single, emptyList, _) = mat.groups()
+    if listValues == '' and single is None:
+        raise SyntaxError()
+    if emptyList is not None:
+        return []
+    if single is not None:
+        if listValues and not single:
+            single = None
+        else:
+            single = _unquote(single or '""')
+    if listValues == '':
+        return single
+    items = [_unquote(item) for item in _LISTVALUEEXP.findall(listValues)]
+    if single is not None:
+        items.append(single)
+    return items
+
+def _parseMarker(line, sline):
+    '''
+    section marker line to (depth, name), None if the line isn't a valid marker
+    '''
+    name = sline.lstrip('[')
+    depth = len(sline) - len(name)
+    name = name.rstrip(']')
+    close = len(sline) - depth - len(name)
+    if close and name and name == name.strip(_WHITESPACE) and not [c for c in '[]#\'"' if c in name]:
+        if not close == depth:
+            return depth, None
+        return depth, name
+    mat = _SECTIONMARKER.match(line)
+    if mat is None:
+        return None
+    (_, sectOpen, name, sectClose, _) = mat.groups()
+    depth = sectOpen.count('[')
+    if not depth == sectClose.count(']'):
+        return depth, None
+    return depth, _unquote(name)
+
+def _multiline(value, lines, index, count):
+    '''
+    triple quoted value, maybe running over several lines
+
+    :return: (value, index of the line after the value)
+    '''
+    quot = value[:3]
+    singleLine, multiLine = _TRIPLE_QUOTE[quot]
+    mat = singleLine.match(value)
+    if mat is not None:
+        return mat.group(1), index
+    newvalue = value[3:]
+    if newvalue.find(quot) != -1:
+        raise SyntaxError()
+    while index < count:
+        line = lines[index]
+        index += 1
+        newvalue += '\n'
+        if line.find(quot) == -1:
+            newvalue += line
+        else:
+            break
+    else:
+        raise SyntaxError()
+    mat = multiLine.match(line)
+    if mat is None:
+        raise SyntaxError()
+    return newvalue + mat.group(1), index
+
+def _error(errorClass, message, lineNumber, line):
+    return errorClass(message % lineNumber, lineNumber, line)
+
+def parse(infile, encoding=None, sections=None, dictType=dict):
+    '''
+    parse ConfigObj data into nested dicts, values are strings or lists of strings
+    exactly as ConfigObj returns them
+
+    :param infile: the file contents or a list of lines
+    :param encoding: decode the data with this encoding, as the ConfigObj encoding arg
+    :param sections: lazy mode, only parse these top level sections, the lines of any
+        other sections are skipped without being parsed. Top level keys are always returned
+    :param dictType: type used for the sections, pass in an OrderedDict to keep the
+        order of the file, so it writes back out exactly as it was read
+    :return: dictType of the data, raises the configobj error classes, ParseError,
+        NestingError or DuplicateError, on invalid data
+    '''
+    if isinstance(infile, basestring):
+        if infile.startswith(codecs.BOM_UTF8) and (not encoding or configobj.match_utf8(encoding)):
+            infile = infile[len(codecs.BOM_UTF8):]
+        elif not encoding and infile[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+            infile = infile.decode('utf_16')
+        if encoding and isinstance(infile, str):
+            infile = infile.decode(encoding)
+        # split as ConfigObj does, keeping any unicode line break other than \r\n in the line
+        lines = [line.rstrip('\r\n') for line in infile.splitlines(True)]
+    else:
+        lines = [line.rstrip('\r\n') for line in infile]
+        if encoding:
+            lines = [line.decode(encoding) if isinstance(line, str) else line for line in lines]
+
+    root = dictType()
+    stack = [root]  # the section at each depth
+    current = root
+    skip = False
+    count = len(lines)
+    index = 0
+    while index < count:
+        line = lines[index]
+        index += 1
+        sline = line.strip()
+        if not sline or sline[0] == '#':
+            continue
+        sline = line.strip(_WHITESPACE)
+
+        if sline[0] == '[':
+            marker = _parseMarker(line, sline)
+            if marker is not None:
+                depth, name = marker
+                if name is None:
+                    raise _error(configobj.NestingError, 'Cannot compute the section depth at line %s.', index, line)
+                if depth > len(stack):
+                    raise _error(configobj.NestingError, 'Section too nested at line %s.', index, line)
+                if depth == 1:
+                    skip = sections is not None and name not in sections
+                del stack[depth:]
+                parent = stack[-1]
+                current = dictType()
+                if not skip:
+                    if name in parent:
+                        raise _error(configobj.DuplicateError, 'Duplicate section name at line %s.', index, line)
+                    parent[name] = current
+                stack.append(current)
+                continue
+
+        # key = value line, when skipping only multi-line values need following
+        if skip and '"""' not in line and "'''" not in line:
+            continue
+        key = None
+        split = line.find('=')
+        if not sline[0] in '"\'' and split != -1:
+            key = line[:split].strip(_WHITESPACE)
+            value = line[split + 1:].lstrip(_WHITESPACE)
+        if not key:
+            mat = _KEYWORD.match(line)
+            if mat is None:
+                raise _error(configobj.ParseError, 'Invalid line at line "%s".', index, line)
+            try:
+                key = _unquote(mat.group(2))
+            except SyntaxError:
+                raise _error(configobj.ParseError, 'Invalid line at line "%s".', index, line)
+            value = mat.group(3)
+        lineNumber = index
+        try:
+            if value[:3] in ('"""', "'''"):
+                value, index = _multiline(value, lines, index, count)
+            else:
+                value = _parseValue(value)
+        except SyntaxError:
+            raise _error(configobj.ParseError, 'Parse error in value at line %s.', lineNumber, line)
+        if skip:
+            continue
+        if key in current:
+            raise _error(configobj.DuplicateError, 'Duplicate keyword name at line %s.', lineNumber, line)
+        current[key] = value
+    return root
+
+def read(filepath, encoding=None, sections=None, dictType=dict):
+    '''
+    read a ConfigObj file, see parse for the args
+    '''
+    with open(filepath, 'rb') as f:
+        return parse(f.read(), encoding=encoding, sections=sections, dictType=dictType)
+
+
+def _getSingleQuote(value):
+    if "'" in value and '"' in value:
+        raise configobj.ConfigObjError('Value "%s" cannot be safely quoted.' % value)
+    elif '"' in value:
+        return "'%s'"
+    return '"%s"'
+
+def _getTripleQuote(value):
+    if value.find('"""') != -1 and value.find("'''") != -1:
+        raise configobj.ConfigObjError('Value "%s" cannot be safely quoted.' % value)
+    if value.find('"""') == -1:
+        return "'''%s'''"
+    return '"""%s"""'
+
+def quote(value, multiline=True):
+    '''
+    value to its string in the file, the same rules as ConfigObj._quote with the
+    defaults our tools write with. Non-string values are written as str(value),
+    lists and tuples as comma separated lists. multiline is False for keys,
+    section names and list members
+    '''
+    if multiline and isinstance(value, (list, tuple)):
+        if not value:
+            return ','
+        elif len(value) == 1:
+            return quote(value[0], multiline=False) + ','
+        return ', '.join([quote(val, multiline=False) for val in value])
+    if not isinstance(value, basestring):
+        value = str(value)
+    if not value:
+        return '""'
+    if multiline and (('\n' in value) or ("'" in value and '"' in value)):
+        quot = _getTripleQuote(value)
+    elif '\n' in value:
+        raise configobj.ConfigObjError('Value "%s" cannot be safely quoted.' % value)
+    elif value[0] not in WSPACE_PLUS and value[-1] not in WSPACE_PLUS and ',' not in value:
+        if '#' not in value:
+            return value
+        quot = _getSingleQuote(value)
+    else:
+        quot = _getSingleQuote(value)
+    return quot % value
+
+def _decode(value, encoding):
+    '''
+    str values to unicode when writing with an encoding, as ConfigObj._decode_element
+    '''
+    if not encoding:
+        return value
+    if isinstance(value, str):
+        return value.decode(encoding)
+    if isinstance(value, (list, tuple)):
+        return [_decode(val, encoding) for val in value]
+    return value
+
+def _writeSection(out, section, depth, indent, template, encoding=None):
+    indentString = indent * depth
+    subSections = []
+    for key, value in section.items():
+        if not isinstance(key, basestring):
+            raise ValueError('The key "%s" is not a string.' % key)
+        key = _decode(key, encoding)
+        if isinstance(value, dict):
+            subSections.append((key, value))
+        else:
+            out.append(template % (indentString, quote(key, multiline=False), quote(_decode(value, encoding))))
+    for key, value in subSections:
+        out.append('%s%s%s%s' % (indentString, '[' * (depth + 1), quote(key, multiline=False), ']' * (depth + 1)))
+        _writeSection(out, value, depth + 1, indent, template, encoding)
+
+def dumps(data, indent='\t', encoding=None, newline=None):
+    '''
+    the file contents ConfigObj would write for the given data
+
+    :param data: dict of the data, dict values become sections. Section order follows the
+        dict so pass in an OrderedDict where the order matters, as ConfigObj keeps the
+        order the top level keys were set in
+    :param indent: indent_type, our tools all write with tabs
+    :param encoding: encode the output with this encoding, as the ConfigObj encoding arg
+    :param newline: line ending, defaults to os.linesep as ConfigObj
+    '''
+    if newline is None:
+        newline = os.linesep
+    template = '%s%s = %s'
+    if encoding:
+        template = u'%s%s = %s'
+    out = []
+    _writeSection(out, data, 0, indent, template, encoding)
+    if encoding:
+        # join and encode as unicode, the newline check runs on the encoded bytes
+        output = unicode(newline).join(out).encode(encoding)
+        newline = newline.encode(encoding) if isinstance(newline, unicode) else newline
+    else:
+        output = newline.join(out)
+    if not output.endswith(newline):
+        output += newline
+    return output
+
+def write(filepath, data, indent='\t', encoding=None, newline=None):
+    '''
+    write the data to a ConfigObj file, see dumps for the args
+    '''
+    output = dumps(data, indent=indent, encoding=encoding, newline=newline)
+    with open(filepath, 'wb') as f:
+        f.write(output)
@@ -20,13 +20,14 @@ import maya.OpenMaya as OpenMaya
 from functools import partial
 import re
 import random
+import time
 import math
 import os
 
-import Red9.packages.configobj as configobj
 import Red9.startup.setup as r9Setup
 
 import Red9_General as r9General
+import Red9_ConfigIO as r9ConfigIO
 import Red9_Audio as r9Audio
 import Red9_AnimationUtils as r9Anim
 import Red9_Meta as r9Meta
@@ -502,10 +503,7 @@ class FilterNode_Settings(object):
 
         :param filepath: file path to write the configFile out to
         '''
-        ConfigObj = configobj.ConfigObj(indent_type='\t')
-        ConfigObj['filterNode_settings'] = self.__dict__
-        ConfigObj.filename = filepath
-        ConfigObj.write()
+        r9ConfigIO.write(filepath, {'filterNode_settings': self.__dict__})
 
     def read(self, filepath):
         '''
@@ -524,7 +522,8 @@ class FilterNode_Settings(object):
             if os.path.exists(os.path.join(r9Setup.red9Presets(), filepath)):
                 filepath = os.path.join(r9Setup.red9Presets(), filepath)
 
-        for key, val in configobj.ConfigObj(filepath)['filterNode_settings'].items():
+        # only the settings block is parsed, so this is also quick when given a pose file
+        for key, val in r9ConfigIO.read(filepath, sections=['filterNode_settings'])['filterNode_settings'].items():
             # because config is built from string data
             # we need to deal with specific types here
             try:
@@ -754,6 +753,7 @@ class FilterNode(object):
         self.foundPattern = []  # Matched NodeName pattern list from lsSearchNamePattern
         self.intersectionData = []
         self.characterSetMembers = []  # Character Set member list from lsCharacterMembers
+        self.filterTimings = {}  # per stage timings from the last processFilter call
         # root objects to filter NOTE: This also switches Processing Mode to suit
         if roots:
             self.rootNodes = roots
@@ -1155,6 +1155,35 @@ class FilterNode(object):
     # Attribute Management Block
     # ---------------------------------------------------------------------------------
 
+    @staticmethod
+    def compileSearchAttrs(searchAttrs):
+        '''
+        split the searchAttrs filter into include and exclude dicts, {attr: [valueTest, value]}
+        handling the 'NOT:' and '=' operators, used by lsSearchAttributes and the FilterPlan
+
+        :param searchAttrs: list or string of attributes to search for
+        '''
+        # ensure we're passing a list
+        if not isinstance(searchAttrs, list):
+            searchAttrs = [searchAttrs]
+
+        includeAttrs = {}
+        excludeAttrs = {}
+        for pattern in searchAttrs:
+            val = [None, None]  # why?? so that a value of False or 0 is still a value and not ignored!
+            pattern = pattern.replace(" ", "")  # strip whiteSpaces
+            attr = pattern
+            if '=' in pattern:
+                # print 'pattern has ='
+                val = [True, decodeString(pattern.split('=')[-1])]
+                attr = pattern.split('=')[0]
+            if 'NOT:' in pattern:
+                # print 'pattern NOT ='
+                excludeAttrs[(attr.split('NOT:')[-1])] = val
+            else:
+                includeAttrs[attr] = val
+        return includeAttrs, excludeAttrs
+
     # @r9General.Timer
     def lsSearchAttributes(self, searchAttrs, nodes=None, incRoots=True, returnValues=False):
         '''
@@ -1188,26 +1217,8 @@ class FilterNode(object):
             log.debug('lsSearchAttributes : params : searchAttrs=%s, nodes=%s, incRoots=%i, returnValues=%i'
                    % (searchAttrs, nodes, incRoots, returnValues))
 
-        # ensure we're passing a list
-        if not isinstance(searchAttrs, list):
-            searchAttrs = [searchAttrs]
-
         # Process and split the input list into 2 dicts
-        includeAttrs = {}
-        excludeAttrs = {}
-        for pattern in searchAttrs:
-            val = [None, None]  # why?? so that a value of False or 0 is still a value and not ignored!
-            pattern = pattern.replace(" ", "")  # strip whiteSpaces
-            attr = pattern
-            if '=' in pattern:
-                # print 'pattern has ='
-                val = [True, decodeString(pattern.split('=')[-1])]
-                attr = pattern.split('=')[0]
-            if 'NOT:' in pattern:
-                # print 'pattern NOT ='
-                excludeAttrs[(attr.split('NOT:')[-1])] = val
-            else:
-                includeAttrs[attr] = val
+        includeAttrs, excludeAttrs = self.compileSearchAttrs(searchAttrs)
 
         if logging_is_debug():
             log.debug('includes : %s' % includeAttrs.items())
@@ -1306,6 +1317,31 @@ class FilterNode(object):
     # Name Management Block
     # ---------------------------------------------------------------------------------
 
+    @staticmethod
+    def compileSearchPattern(searchPattern):
+        '''
+        compile the searchPattern filter into the include and exclude regex's, the
+        exclude is None if no 'NOT:' operators were given
+
+        :param searchPattern: string/list patterns to match node names against
+        '''
+        include = []
+        exclude = []
+        if not isinstance(searchPattern, list):
+            searchPattern = [searchPattern]
+        for pattern in searchPattern:
+            pattern = pattern.replace(" ", "")  # strip whiteSpaces
+            if 'NOT:' in pattern:
+                exclude.append(pattern.split(':')[-1])
+            else:
+                include.append(pattern)
+
+        incRegex = re.compile('(' + '|'.join(include) + ')')  # convert into a regularExpression
+        excRegex = None
+        if exclude:
+            excRegex = re.compile('(' + '|'.join(exclude) + ')')
+        return incRegex, excRegex
+
     # @r9General.Timer
     def lsSearchNamePattern(self, searchPattern, nodes=None, incRoots=True):
         '''
@@ -1322,24 +1358,12 @@ class FilterNode(object):
             ['Ctrl','NOT:My'] where Ctrl finds it, but the 'NOT:My' tells the filter to skip it if found
         '''
         self.foundPattern = []
-        include = []
-        exclude = []
         if not isinstance(searchPattern, list):
             searchPattern = [searchPattern]
 
         # Build the Regex funcs
-        for pattern in searchPattern:
-            pattern = pattern.replace(" ", "")  # strip whiteSpaces
-            if 'NOT:' in pattern:
-                exclude.append(pattern.split(':')[-1])
-            else:
-                include.append(pattern)
-
-        includePattern = '|'.join(n for n in include)
-        incRegex = re.compile('(' + includePattern + ')')  # convert into a regularExpression
-        if exclude:
-            excludePattern = '|'.join(n for n in exclude)
-            excRegex = re.compile('(' + excludePattern + ')')  # convert into a regularExpression
+        incRegex, excRegex = self.compileSearchPattern(searchPattern)
+        exclude = excRegex is not None
 
         # Node block
         log.debug('lsSearchNamePattern : params : searchPattern=%s, nodes=%s, incRoots=%i'
@@ -1354,7 +1378,7 @@ class FilterNode(object):
 
         # Actual Search calls
         if exclude:
-            log.debug('Exclude SearchPattern found : %s' % exclude)
+            log.debug('Exclude SearchPattern found : %s' % excRegex.pattern)
             for node in nodes:
                 if incRegex.search(nodeNameStrip(node)) and not excRegex.search(nodeNameStrip(node)):
                     self.foundPattern.append(node)
@@ -1471,7 +1495,7 @@ class FilterNode(object):
         return self.processFilter()
 
     # @r9General.Timer
-    def processFilter(self):
+    def processFilter(self, compiled=True):
             '''
             Uses intersection to allow you to process multiple search flags for
             more accurate filtering.
@@ -1482,11 +1506,17 @@ class FilterNode(object):
             :param settings.searchPattern: name pattern to match on child nodes
             :param settings.transformClamp: Clamp the return to the Transform nodes.
             :param settings.incRoots: Include the given root nodes in the search.
+            :param compiled: if the roots and settings support it, run the filter as a compiled
+                FilterPlan, a single DAG walk rather than the chained ls calls per stage
 
             :return: all nodes which match ALL the given keyword filter searches
+
+            .. note::
+                the time taken by each stage of the filter is stored in self.filterTimings
             '''
             log.debug(self.settings.__dict__)
             self.intersectionData = []
+            self.filterTimings = {}
 
             # wrap the intersector call
             def addToIntersection(nodes):
@@ -1505,61 +1535,419 @@ class FilterNode(object):
             if not self.settings.filterIsActive:
                 return self.rootNodes
 
+            # Compiled single pass filter -------------------
+            if compiled and FilterPlan.isSupported(self):
+                plan = FilterPlan(self.settings)
+                self.intersectionData = plan.run(self)
+                self.filterTimings = plan.timings
+                return self.intersectionData
+
             # Straight Hierarchy Filter ----------------------
             if self.settings.hierarchy:
+                start = time.time()
                 nodes = self.lsHierarchy(incRoots=self.settings.incRoots,
                                          transformClamp=self.settings.transformClamp)
                 addToIntersection(nodes)
+                self.filterTimings['hierarchy'] = time.time() - start
                 if not nodes:
                     return []
 
             # MetaClass Filter ------------------------------
             if self.settings.metaRig:
+                start = time.time()
                 # run the main getChildren calls for hierarchy structure
                 nodes = self.lsMetaRigControllers(incMain=self.settings.incRoots)
                 addToIntersection(nodes)
+                self.filterTimings['metaRig'] = time.time() - start
                 if not nodes:
                     return []
 
             # NodeTypes Filter -------------------------------
             if self.settings.nodeTypes:
+                start = time.time()
                 nodes = self.lsSearchNodeTypes(self.settings.nodeTypes,
                                                nodes=self.intersectionData,
                                                incRoots=self.settings.incRoots,
                                                transformClamp=self.settings.transformClamp)
                 addToIntersection(nodes)
+                self.filterTimings['nodeTypes'] = time.time() - start
                 if not nodes:
                     return []
 
             # Attribute Filter -------------------------------
             if self.settings.searchAttrs:
+                start = time.time()
                 nodes = self.lsSearchAttributes(self.settings.searchAttrs,
                                                 nodes=self.intersectionData,
                                                 incRoots=self.settings.incRoots)
                 addToIntersection(nodes)
+                self.filterTimings['searchAttrs'] = time.time() - start
                 if not nodes:
                     return []
 
             # NodeName Filter --------------------------------
             if self.settings.searchPattern:
+                start = time.time()
                 nodes = self.lsSearchNamePattern(self.settings.searchPattern,
                                                  nodes=self.intersectionData,
                                                  incRoots=self.settings.incRoots)
                 addToIntersection(nodes)
+                self.filterTimings['searchPattern'] = time.time() - start
                 if not nodes:
                     return []
 
             # use the prioritizeNodeList call to order the list based on a given set of priority's
             if self.settings.filterPriority:
+                start = time.time()
                 # note we reverse here as hierarchies are returned in reverse order
                 # in Maya and the prioritize inserts at the beginning
                 self.intersectionData.reverse()
                 self.intersectionData = prioritizeNodeList(self.intersectionData, self.settings.filterPriority)
                 self.intersectionData.reverse()
+                self.filterTimings['filterPriority'] = time.time() - start
                 # [log.debug('%i = %s' % (i, nodeNameStrip(n))) for i,n in enumerate(self.intersectionData)]
 
             return self.intersectionData
 
+
+class FilterPlan(object):
+    '''
+    A FilterNode_Settings object compiled down to a single pass filter for FilterNode.processFilter.
+
+    Rather than each stage of the filter issuing it's own listRelatives, nodeType and
+    attributeQuery calls over the hierarchy and then intersecting the returned lists,
+    the plan walks each root hierarchy ONCE with an MItDag, caching the path, nodeType and
+    MObject of every node. The nodeTypes, searchAttrs, searchPattern and filterPriority
+    stages then run over that cached data with set based intersections. Results, including
+    the order of the return, match the chained filter calls.
+
+    >>> plan = FilterPlan(filterNode.settings)
+    >>> if plan.isSupported(filterNode):
+    >>>     nodes = plan.run(filterNode)
+    >>>     print(plan.timings)  # {'hierarchy': 0.002, 'nodeTypes': 0.001,...}
+
+    .. note::
+        the plan only runs on DAG root hierarchies or metaRig searches, characterSet and
+        objectSet roots, scene level searches and blendShape nodeTypes still go through
+        the original chained filter calls.
+    '''
+    def __init__(self, settings):
+        self.settings = settings
+        self.nodeTypes = settings.nodeTypes
+        if self.nodeTypes and not isinstance(self.nodeTypes, list):
+            self.nodeTypes = [self.nodeTypes]
+        self.shapeTypes = []
+        if self.nodeTypes:
+            self.shapeTypes = list(set(self.nodeTypes).intersection(set(FilterNode.knownShapes())))
+        self.includeAttrs, self.excludeAttrs = {}, {}
+        if settings.searchAttrs:
+            self.includeAttrs, self.excludeAttrs = FilterNode.compileSearchAttrs(settings.searchAttrs)
+        self.incRegex, self.excRegex = None, None
+        if settings.searchPattern:
+            self.incRegex, self.excRegex = FilterNode.compileSearchPattern(settings.searchPattern)
+
+        self.timings = {}  # stage : time taken
+        self._walked = None  # root : [descendants, children before parents]
+        self._nodeData = {}  # node : [MObject, nodeType, isTransform, isShape, parent, children]
+        self._inheritedTypes = {}
+
+    @staticmethod
+    def isSupported(filterNode):
+        '''
+        can the given filterNode's settings and roots be run through a compiled plan
+
+        :param filterNode: FilterNode instance to test
+        '''
+        settings = filterNode.settings
+        roots = filterNode.rootNodes
+        if filterNode.processMode != 'Selected' or not roots:
+            return False
+        if settings.metaRig and not settings.hierarchy:
+            # sourced from the metaRig controllers, no hierarchy walk required
+            return not [root for root in roots if cmds.nodeType(root) in ['character', 'objectSet']]
+        if not settings.hierarchy and settings.nodeTypes:
+            # nodeType searches are a straight listRelatives call on the roots
+            if len(roots) > 1 or 'blendShape' in settings.nodeTypes:
+                return False
+        for root in roots:
+            if not cmds.objExists(root) or 'dagNode' not in cmds.nodeType(root, inherited=True):
+                return False
+        return True
+
+    def _inherited(self, nodeType):
+        if nodeType not in self._inheritedTypes:
+            self._inheritedTypes[nodeType] = cmds.nodeType(nodeType, isTypeName=True, inherited=True) or [nodeType]
+        return self._inheritedTypes[nodeType]
+
+    def _isOfType(self, node, nodeTypes):
+        '''
+        inherited type test, as the type flag in the listRelatives calls
+        '''
+        return any(nType in nodeTypes for nType in self._inherited(self._getData(node)[1]))
+
+    def _getData(self, node):
+        data = self._nodeData.get(node)
+        if data is None:
+            # node outside the walked hierarchies, metaRig controllers for example
+            mSel = OpenMaya.MSelectionList()
+            mSel.add(node)
+            mObj = OpenMaya.MObject()
+            mSel.getDependNode(0, mObj)
+            data = [mObj, OpenMaya.MFnDependencyNode(mObj).typeName(),
+                    mObj.hasFn(OpenMaya.MFn.kTransform), mObj.hasFn(OpenMaya.MFn.kShape), None, None]
+            self._nodeData[node] = data
+        return data
+
+    def _parent(self, node):
+        data = self._getData(node)
+        if data[4] is None:
+            data[4] = cmds.listRelatives(node, f=True, p=True)[0]
+        return data[4]
+
+    def _childShapes(self, node):
+        data = self._getData(node)
+        if data[5] is None:
+            return cmds.listRelatives(node, type=self.shapeTypes, f=True) or []
+        return [child for child in data[5] if self._isOfType(child, self.shapeTypes)]
+
+    def walk(self, roots):
+        '''
+        the single DAG iteration, caches the data for every node under the given roots
+
+        :param roots: root dag nodes to walk
+        '''
+        self._walked = {}
+        dagIter = OpenMaya.MItDag()
+        dagPath = OpenMaya.MDagPath()
+        for root in roots:
+            mSel = OpenMaya.MSelectionList()
+            mSel.add(root)
+            rootPath = OpenMaya.MDagPath()
+            try:
+                mSel.getDagPath(0, rootPath)
+            except RuntimeError:
+                # not a dag node, metaRig roots for example, so no hierarchy
+                self._walked[root] = []
+                continue
+            dagIter.reset(rootPath, OpenMaya.MItDag.kDepthFirst, OpenMaya.MFn.kInvalid)
+            descendants = []
+            stack = []  # open nodes [(depth, node)], a node is closed once all its children are walked
+            while not dagIter.isDone():
+                dagIter.getPath(dagPath)
+                depth = dagIter.depth()
+                node = dagPath.fullPathName()
+                mObj = dagPath.node()
+                while stack and stack[-1][0] >= depth:
+                    descendants.append(stack.pop()[1])
+                self._nodeData[node] = [mObj, OpenMaya.MFnDependencyNode(mObj).typeName(),
+                                        mObj.hasFn(OpenMaya.MFn.kTransform), mObj.hasFn(OpenMaya.MFn.kShape),
+                                        node.rsplit('|', 1)[0], []]
+                if stack:
+                    self._nodeData[stack[-1][1]][5].append(node)
+                stack.append((depth, node))
+                dagIter.next()
+            while stack:
+                descendants.append(stack.pop()[1])
+            # last node closed is the root itself, also bind it's data to the name given
+            self._nodeData[root] = self._nodeData[descendants.pop()]
+            self._walked[root] = descendants
+
+    def hierarchy(self, roots, incRoots=True, transformClamp=False, nodeTypes=None):
+        '''
+        lsHierarchy / listRelatives(ad=True) equivalent from the walked data, note that
+        as with listRelatives, children are returned before their parents
+
+        :param roots: root dag nodes
+        :param incRoots: include the roots in the return
+        :param transformClamp: only return transform nodes
+        :param nodeTypes: only return nodes of the given types, matching inherited types
+        '''
+        if self._walked is None:
+            self.walk(roots)
+        nodes = []
+        for root in roots:
+            if incRoots:
+                nodes.append(root)
+            for node in self._walked[root]:
+                if transformClamp and not self._nodeData[node][2]:
+                    continue
+                if nodeTypes and not self._isOfType(node, nodeTypes):
+                    continue
+                nodes.append(node)
+        return nodes
+
+    def filterNodeTypes(self, nodes, roots, incRoots=True, transformClamp=False):
+        '''
+        lsSearchNodeTypes equivalent, if nodes are given they're tested directly else
+        the roots hierarchy is searched for the nodeTypes
+
+        :param nodes: nodes to test
+        :param roots: the filters root nodes
+        :param incRoots: include the roots if they match the nodeTypes
+        :param transformClamp: return the transform of any matched shape nodes
+        '''
+        typeMatched = []
+        if nodes:
+            for node in nodes:
+                data = self._getData(node)
+                if data[1] in self.nodeTypes:
+                    typeMatched.append(node)
+                elif self.shapeTypes and data[2]:
+                    typeMatched.extend(self._childShapes(node))
+        else:
+            typeMatched = self.hierarchy(roots, incRoots=False, nodeTypes=self.nodeTypes)
+        if not typeMatched:
+            return []
+
+        if not transformClamp:
+            found = typeMatched
+        else:
+            # matched shapes have their transform inserted at the front of the list
+            parents = []
+            found = []
+            added = set()
+            for node in typeMatched:
+                if self._getData(node)[3]:
+                    node = self._parent(node)
+                    if node not in added:
+                        parents.append(node)
+                        added.add(node)
+                elif node not in added:
+                    found.append(node)
+                    added.add(node)
+            found = parents[::-1] + found
+
+        if incRoots:
+            for root in roots:
+                if self._getData(root)[1] in self.nodeTypes and root not in found:
+                    found.append(root)
+        else:
+            for root in roots:
+                if root not in found:
+                    break
+                found.remove(root)
+        return found
+
+    def testAttrs(self, node):
+        '''
+        lsSearchAttributes test for a single node
+
+        :param node: node to test against the compiled searchAttrs
+        '''
+        mFn = OpenMaya.MFnDependencyNode(self._getData(node)[0])
+        add = not self.includeAttrs
+        for attr, val in self.includeAttrs.items():
+            if mFn.hasAttribute(attr):
+                add = not val[0] or self._valueTest(node, attr, val[1])
+                if not add:
+                    break
+        for attr, val in self.excludeAttrs.items():
+            if mFn.hasAttribute(attr):
+                if not val[0] or self._valueTest(node, attr, val[1]):
+                    add = False
+                break
+        return add
+
+    @staticmethod
+    def _valueTest(node, attr, value):
+        if type(value) == float:
+            return floatIsEqual(cmds.getAttr('%s.%s' % (node, attr)), value)
+        return cmds.getAttr('%s.%s' % (node, attr)) == value
+
+    def testName(self, node):
+        '''
+        lsSearchNamePattern test for a single node
+
+        :param node: node to test against the compiled searchPattern
+        '''
+        name = nodeNameStrip(node)
+        return bool(self.incRegex.search(name)) and not (self.excRegex and self.excRegex.search(name))
+
+    def run(self, filterNode):
+        '''
+        run the plan against the given FilterNode's rootNodes, the found data
+        is also pushed back to the filterNode as per the chained filter calls
+
+        :param filterNode: FilterNode instance to process
+        '''
+        settings = self.settings
+        roots = filterNode.rootNodes
+        self.timings = {}
+        intersection = []
+
+        def intersect(nodes, intersection):
+            if not intersection:
+                return nodes
+            current = set(intersection)
+            return [node for node in nodes if node in current]
+
+        if settings.hierarchy:
+            start = time.time()
+            filterNode.hierarchy = self.hierarchy(roots, incRoots=settings.incRoots,
+                                                  transformClamp=settings.transformClamp)
+            intersection = filterNode.hierarchy
+            self.timings['hierarchy'] = time.time() - start
+            if not intersection:
+                return []
+
+        if settings.metaRig:
+            start = time.time()
+            nodes = filterNode.lsMetaRigControllers(incMain=settings.incRoots)
+            intersection = intersect(nodes, intersection)
+            self.timings['metaRig'] = time.time() - start
+            if not nodes:
+                return []
+
+        if self.nodeTypes:
+            start = time.time()
+            filterNode.foundNodeTypes = self.filterNodeTypes(intersection, roots,
+                                                             incRoots=settings.incRoots,
+                                                             transformClamp=settings.transformClamp)
+            intersection = intersect(filterNode.foundNodeTypes, intersection)
+            self.timings['nodeTypes'] = time.time() - start
+            if not filterNode.foundNodeTypes:
+                log.info('lsSearchNodeTypes matched no nodes')
+                return []
+
+        if self.includeAttrs or self.excludeAttrs:
+            start = time.time()
+            nodes = intersection or self.hierarchy(roots, incRoots=settings.incRoots)
+            if not nodes:
+                raise StandardError('No nodes found to process')
+            filterNode.foundAttributes = []
+            added = set()
+            for node in nodes:
+                if node not in added and self.testAttrs(node):
+                    filterNode.foundAttributes.append(node)
+                    added.add(node)
+            intersection = filterNode.foundAttributes
+            self.timings['searchAttrs'] = time.time() - start
+            if not intersection:
+                return []
+
+        if self.incRegex:
+            start = time.time()
+            nodes = intersection or self.hierarchy(roots, incRoots=settings.incRoots)
+            if not nodes:
+                raise StandardError('No nodes found to process')
+            filterNode.foundPattern = [node for node in nodes if self.testName(node)]
+            intersection = filterNode.foundPattern
+            self.timings['searchPattern'] = time.time() - start
+            if not intersection:
+                return []
+
+        if settings.filterPriority:
+            start = time.time()
+            intersection = list(reversed(intersection))
+            intersection = prioritizeNodeList(intersection, settings.filterPriority)
+            intersection.reverse()
+            self.timings['filterPriority'] = time.time() - start
+
+        if logging_is_debug():
+            log.debug('FilterPlan timings : %s' % self.timings)
+        return intersection
+
+
 def getBlendTargetsFromMesh(node, asList=True, returnAll=False, levels=4, indexes=False):  # levels=1)
     '''
     quick func to return the blendshape targets found from a give mesh's connected blendshape's
@@ -1614,6 +2002,97 @@ def getBlendTargetIndex(blendNode, targetName):
 # -------------------------------------------------------------------------------------
 # Node Matching ------
 # -------------------------------------------------------------------------------------
+class NodeMatchIndex(object):
+    '''
+    Index over the B side of a matchNodeLists call. Every lookup returns the FIRST
+    still unmatched B node (in the order given) that satisfies the match, exactly as
+    the original nested loop did, but via hash / trie lookups rather than re-running
+    the string compares over every B node for every A node.
+
+    * keys : exact key > [B indexes], used for 'base', 'mirrorIndex' and 'metaData'
+    * suffix trie : built over the reversed keys, each trie node holds the B indexes
+      whose key ends with that suffix (subtree) and those whose key IS that
+      suffix (terminal), used for the relaxed 'stripPrefix' endswith() compare
+
+    Index lists are built in B order so they're already sorted, matched B nodes are
+    skipped lazily via a per-list read position so each list is only walked once.
+    '''
+    def __init__(self, keys, suffixTrie=False):
+        self.keys = keys
+        self.matched = set()
+        self.exact = {}
+        for i, key in enumerate(keys):
+            self.exact.setdefault(key, [0]).append(i)
+        self.trie = None
+        if suffixTrie:
+            # trie node = [children, subtree list, terminal list], lists hold [readPos, indexes...]
+            self.trie = [{}, [0], [0]]
+            for i, key in enumerate(keys):
+                node = self.trie
+                node[1].append(i)
+                for char in reversed(key):
+                    node = node[0].setdefault(char, [{}, [0], [0]])
+                    node[1].append(i)
+                node[2].append(i)
+
+    def _first(self, indexes):
+        '''
+        first unmatched index in an index list, advancing its read position
+        '''
+        if not indexes:
+            return None
+        pos = indexes[0] + 1
+        while pos < len(indexes) and indexes[pos] in self.matched:
+            pos += 1
+        indexes[0] = pos - 1
+        if pos < len(indexes):
+            return indexes[pos]
+
+    def match(self, index):
+        self.matched.add(index)
+
+    def exactMatch(self, key):
+        return self._first(self.exact.get(key))
+
+    def suffixMatch(self, key):
+        '''
+        first unmatched B where keyA.endswith(keyB) or keyB.endswith(keyA)
+        '''
+        found = []
+        node = self.trie
+        first = self._first(node[2])  # empty B keys match anything
+        if first is not None:
+            found.append(first)
+        for char in reversed(key):
+            node = node[0].get(char)
+            if node is None:
+                break
+            # B key is a suffix of A
+            first = self._first(node[2])
+            if first is not None:
+                found.append(first)
+        else:
+            # A key is a suffix of all B keys in this subtree
+            first = self._first(node[1])
+            if first is not None:
+                found.append(first)
+        if found:
+            return min(found)
+
+
+def _hashableMetaMap(data):
+    '''
+    hashable key from a getNodeConnectionMetaDataMap return
+    '''
+    if not data:
+        return None
+    try:
+        key = tuple(sorted(data.items()))
+        hash(key)
+        return key
+    except TypeError:
+        return repr(sorted(data.items()))
+
 @r9General.Timer
 def matchNodeLists(nodeListA, nodeListB, matchMethod='stripPrefix', returnfails=False):
     '''
@@ -1636,18 +2115,16 @@ def matchNodeLists(nodeListA, nodeListB, matchMethod='stripPrefix', returnfails=
         | * matchMethod="metaData" : match the nodes based on their wiring connections to the MetaData framework
 
     :return: matched pairs of tuples for processing [(a1,b2),[(a2,b2)]
+
+    .. note::
+        the B list is indexed once (see NodeMatchIndex) so the matching is no longer
+        O(A x B), the results are identical to the original nested loop matching.
     '''
     infoPrint = ""
     matchedData = []
     unmatched = []
-    # print 'MatchMethod : ', matchedData
     # take a copy of B as we modify the data here
     hierarchyB = list(nodeListB)
-    if matchMethod == 'mirrorIndex':
-        getMirrorID = r9Anim.MirrorHierarchy().getMirrorCompiledID
-    if matchMethod == 'metaData':
-        getMetaDict = r9Meta.MetaClass.getNodeConnectionMetaDataMap  # optimisation
-        metaDictB = {}  # a cache of the connections so we don't re-process unless we have to
 
     if matchMethod == 'index':
         matchedData = zip(nodeListA, nodeListB)
@@ -1656,69 +2133,41 @@ def matchNodeLists(nodeListA, nodeListB, matchMethod='stripPrefix', returnfails=
         nodeListB.reverse()
         matchedData = zip(nodeListA, nodeListB)
     else:
-        for nodeA in nodeListA:
-            if matchMethod == 'mirrorIndex':
-                indexA = getMirrorID(nodeA)
-            if matchMethod == 'metaData':
-                metaDictA = getMetaDict(nodeA)
+        # build the index over B, the key funcs are only ever run once per node
+        if matchMethod == 'mirrorIndex':
+            getKey = r9Anim.MirrorHierarchy().getMirrorCompiledID
+        elif matchMethod == 'metaData':
+            getMetaDict = r9Meta.MetaClass.getNodeConnectionMetaDataMap  # optimisation
+            getKey = lambda node: _hashableMetaMap(getMetaDict(node))
+        else:
+            getKey = lambda node: nodeNameStrip(node).upper()
+        index = NodeMatchIndex([getKey(nodeB) for nodeB in hierarchyB],
+                               suffixTrie=matchMethod == 'stripPrefix')
 
-            matched = False
+        for nodeA in nodeListA:
+            keyA = getKey(nodeA)
+            matchB = None
 
             # BaseMatch is a direct compare ONLY
             # note that for 'stripPrefix' method we now FIRST do a base name
             # test to match like for like if we can if successful we don't
             # progress to the stripPrefix block itself
-            if matchMethod == 'base' or matchMethod == 'stripPrefix':
-                strippedA = nodeNameStrip(nodeA).upper()
-                for nodeB in hierarchyB:
-                    strippedB = nodeNameStrip(nodeB).upper()
-                    if strippedA == strippedB:
-                        if logging_is_debug():
-                            infoPrint += '\nMatch Method : %s : %s == %s' % \
-                                    (matchMethod, nodeA.split('|')[-1], nodeB.split('|')[-1])
-                        matchedData.append((nodeA, nodeB))
-                        hierarchyB.remove(nodeB)
-                        matched = True
-                        break
+            if matchMethod in ['base', 'stripPrefix', 'mirrorIndex', 'metaData']:
+                if keyA or matchMethod in ['base', 'stripPrefix']:
+                    matchB = index.exactMatch(keyA)
 
-            if not matchMethod == 'base':
-                for nodeB in hierarchyB:
-                    strippedB = nodeNameStrip(nodeB).upper()
-                    # Compare allowing for prefixing which is stripped off
-                    if matchMethod == 'stripPrefix' and not matched:
-                        if strippedA.endswith(strippedB) \
-                            or strippedB.endswith(strippedA):
-                            if logging_is_debug():
-                                infoPrint += '\nMatch Method : %s : %s == %s' % \
-                                         (matchMethod, nodeA.split('|')[-1], nodeB.split('|')[-1])
-                            matchedData.append((nodeA, nodeB))
-                            hierarchyB.remove(nodeB)
-                            matched = True
-                            break
+            # Compare allowing for prefixing which is stripped off
+            if matchMethod == 'stripPrefix' and matchB is None:
+                matchB = index.suffixMatch(keyA)
 
-                    # Compare using the nodes internal mirrorIndex if found
-                    elif matchMethod == 'mirrorIndex':
-                        if indexA and indexA == getMirrorID(nodeB):
-                            if logging_is_debug():
-                                infoPrint += '\nMatch Method : %s : %s == %s' % \
-                                        (matchMethod, nodeA.split('|')[-1], nodeB.split('|')[-1])
-                            matchedData.append((nodeA, nodeB))
-                            hierarchyB.remove(nodeB)
-                            matched = True
-                            break
-
-                    elif matchMethod == 'metaData':
-                        if nodeB not in metaDictB.keys():
-                            metaDictB[nodeB] = getMetaDict(nodeB)
-                        if metaDictA and metaDictA == metaDictB[nodeB]:  # getMetaDict(nodeB):
-                            if logging_is_debug():
-                                infoPrint += '\nMatch Method : %s : %s == %s' % \
-                                        (matchMethod, nodeA.split('|')[-1], nodeB.split('|')[-1])
-                            matchedData.append((nodeA, nodeB))
-                            hierarchyB.remove(nodeB)
-                            matched = True
-                            break
-            if not matched:
+            if matchB is not None:
+                index.match(matchB)
+                nodeB = hierarchyB[matchB]
+                if logging_is_debug():
+                    infoPrint += '\nMatch Method : %s : %s == %s' % \
+                            (matchMethod, nodeA.split('|')[-1], nodeB.split('|')[-1])
+                matchedData.append((nodeA, nodeB))
+            else:
                 unmatched.append(nodeA)
 
         if unmatched and logging_is_debug():
@@ -2124,10 +2573,7 @@ class LockChannels(object):
 
         self._buildAttrStateDict(nodes)
         if filepath:
-            ConfigObj = configobj.ConfigObj(indent_type='\t')
-            ConfigObj['channelMap'] = self.statusDict
-            ConfigObj.filename = filepath
-            ConfigObj.write()
+            r9ConfigIO.write(filepath, {'channelMap': self.statusDict})
         elif serializeNode:
             node = r9Meta.MetaClass(serializeNode)
             if not node.hasAttr('attrMap'):
@@ -2166,7 +2612,7 @@ class LockChannels(object):
             # Filter the selection for children including the selected roots
             nodes = FilterNode(nodes).lsHierarchy(incRoots=True, transformClamp=True)
         if filepath:
-            self.statusDict = configobj.ConfigObj(filepath)['channelMap']
+            self.statusDict = r9ConfigIO.read(filepath)['channelMap']
         elif serializeNode:
             serializeNode = r9Meta.MetaClass(serializeNode)
             if serializeNode.hasAttr('attrMap'):
@@ -0,0 +1,229 @@
+'''
+..
+    Red9 Studio Pack: Maya Pipeline Solutions
+    Author: Mark Jackson
+    email: rednineinfo@gmail.com
+
+    Red9 blog : http://red9-consultancy.blogspot.co.uk/
+    MarkJ blog: http://markj3d.blogspot.co.uk
+
+
+Curve filter library used by the interactive CurveFilter UI (r9Anim.FilterCurves)
+and r9Anim.AnimCurveFilter. These all work on flat sequences of key times and
+values, pulled from the animCurves in bulk, rather than on the curves themselves
+so there's no Maya dependency in here and the filters can be tested and tuned
+outside of Maya.
+
+* reduceKeys : Ramer-Douglas-Peucker key reduction bounded by a value tolerance,
+  optionally checked against the evaluated curve
+* lowPass : zero phase, 2nd order Butterworth low-pass
+* despike : median filter, optionally only replacing values outside a threshold
+* resampleTimes / interpolate : resample to a regular frame step
+
+.. note::
+    these are written against the array module rather than numpy as numpy isn't
+    shipped with all the Maya versions we support.
+'''
+
+import math
+from array import array
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+def reduceKeys(times, values, tolerance, evaluate=None):
+    '''
+    Ramer-Douglas-Peucker reduction. Error is measured as the value distance from the
+    line between the kept keys at that time, not the perpendicular distance, as time
+    and value aren't in the same units on an animCurve.
+
+    The line isn't what the curve does between the kept keys once their tangents are
+    recomputed, so pass in an evaluate func to bound the real curve. The reduction is
+    then checked against it and, in each span where it's out by more than the tolerance,
+    the worst key is put back, repeated until every span is within the tolerance.
+
+    :param times: key times
+    :param values: key values
+    :param tolerance: max value error allowed between the kept keys
+    :param evaluate: optional func(keep) returning the values of the reduced curve,
+        keyed at just the keep indices, at all the given times
+    :return: sorted list of the indices of the keys to keep, first and last are always kept
+    '''
+    count = len(times)
+    if count < 3:
+        return range(count)
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        t0, v0 = times[first], values[first]
+        span = float(times[last] - t0)
+        slope = (values[last] - v0) / span if span else 0.0
+        worst = tolerance
+        index = None
+        for i in range(first + 1, last):
+            error = abs(values[i] - (v0 + (times[i] - t0) * slope))
+            if error > worst:
+                worst = error
+                index = i
+        if index is not None:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    kept = [i for i in range(count) if keep[i]]
+    if evaluate is None:
+        return kept
+    while True:
+        curve = evaluate(kept)
+        restore = []
+        for first, last in zip(kept, kept[1:]):
+            worst = tolerance
+            index = None
+            for i in range(first + 1, last):
+                error = abs(values[i] - curve[i])
+                if error > worst:
+                    worst = error
+                    index = i
+            if index is not None:
+                restore.append(index)
+        if not restore:
+            return kept
+        kept = sorted(kept + restore)
+
+
+def _biquad(values, b0, b1, b2, a1, a2):
+    '''
+    single pass of a biquad filter. The state is seeded as if the signal had been
+    running along the line through the first two values forever, the steady state
+    output of a ramp is the input delayed by the filter's DC group delay, so there's
+    no start up transient on flat or linear starts
+    '''
+    out = array('d', values)
+    slope = values[1] - values[0] if len(values) > 1 else 0.0
+    delay = (b1 + 2.0 * b2) / (b0 + b1 + b2) - (a1 + 2.0 * a2) / (1.0 + a1 + a2)
+    x1 = values[0] - slope
+    x2 = values[0] - 2.0 * slope
+    y1 = x1 - slope * delay
+    y2 = x2 - slope * delay
+    for i, x in enumerate(values):
+        y = b0 * x + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+        x2, x1 = x1, x
+        y2, y1 = y1, y
+        out[i] = y
+    return out
+
+
+def lowPass(values, cutoff, sampleRate=1.0, keepEnds=True):
+    '''
+    2nd order Butterworth low-pass run forward then backward over the data, so
+    the result has no phase shift. Assumes the values are evenly spaced in time,
+    ie a key per frame mocap curve.
+
+    :param values: the values to filter
+    :param cutoff: cutoff frequency, in the same units as the sampleRate. So with sampleRate
+        set to the scene fps the cutoff is in Hz
+    :param sampleRate: samples per unit time
+    :param keepEnds: keep the first and last values as they were
+    '''
+    count = len(values)
+    if count < 3:
+        return array('d', values)
+    if not 0 < cutoff < sampleRate * 0.5:
+        raise ValueError('cutoff must be between 0 and half the sampleRate : %s' % (sampleRate * 0.5))
+    k = math.tan(math.pi * cutoff / sampleRate)
+    norm = 1.0 / (1.0 + math.sqrt(2.0) * k + k * k)
+    b0 = k * k * norm
+    coefficients = (b0, 2.0 * b0, b0, 2.0 * (k * k - 1.0) * norm, (1.0 - math.sqrt(2.0) * k + k * k) * norm)
+
+    # pad the ends with an odd reflection so the curve leaves the filter on the same slope
+    pad = min(count - 1, 12)
+    start = [2.0 * values[0] - values[i] for i in range(pad, 0, -1)]
+    end = [2.0 * values[-1] - values[-1 - i] for i in range(1, pad + 1)]
+    data = array('d', start) + array('d', values) + array('d', end)
+
+    data = _biquad(data, *coefficients)
+    data.reverse()
+    data = _biquad(data, *coefficients)
+    data.reverse()
+    result = data[pad:pad + count]
+    if keepEnds:
+        result[0] = values[0]
+        result[-1] = values[-1]
+    return result
+
+
+def despike(values, window=5, threshold=None):
+    '''
+    median filter. With a threshold this becomes a despike, only values that are more
+    than threshold away from the median of their window are replaced, the rest of
+    the data is left untouched.
+
+    :param values: the values to filter
+    :param window: size of the median window, odd numbers only
+    :param threshold: only replace values further than this from the median
+    '''
+    if window < 3 or not window % 2:
+        raise ValueError('window must be an odd number >= 3')
+    count = len(values)
+    half = window // 2
+    result = array('d', values)
+    for i in range(count):
+        block = sorted(values[max(0, i - half):min(count, i + half + 1)])
+        median = block[len(block) // 2]
+        if threshold is None or abs(values[i] - median) > threshold:
+            result[i] = median
+    return result
+
+
+def resampleTimes(start, end, step=1, snapToFrame=False):
+    '''
+    the times to resample a curve at, start to end at the given step, end is always included
+
+    :param snapToFrame: round the start to the nearest whole frame first
+    '''
+    if step <= 0:
+        raise ValueError('step must be greater than 0')
+    if snapToFrame:
+        start = float(int(round(start)))
+    times = array('d')
+    count = int(math.floor((end - start) / float(step) + 1e-6))
+    for i in range(count + 1):
+        times.append(start + i * step)
+    if end - times[-1] > 1e-6:
+        times.append(end)
+    return times
+
+
+def interpolate(times, values, sampleTimes):
+    '''
+    linear interpolation of the data at the given, sorted, sampleTimes. Times outside
+    the data hold the first / last value
+    '''
+    result = array('d')
+    count = len(times)
+    i = 0
+    for t in sampleTimes:
+        while i < count - 2 and times[i + 1] < t:
+            i += 1
+        if t <= times[0]:
+            result.append(values[0])
+        elif t >= times[-1]:
+            result.append(values[-1])
+        else:
+            span = float(times[i + 1] - times[i])
+            blend = (t - times[i]) / span if span else 0.0
+            result.append(values[i] + (values[i + 1] - values[i]) * blend)
+    return result
+
+
+def maxError(values, newValues):
+    '''
+    largest absolute difference between the two sets of values
+    '''
+    if not len(values):
+        return 0.0
+    return max(abs(a - b) for a, b in zip(values, newValues))
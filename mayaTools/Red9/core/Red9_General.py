@@ -608,6 +608,33 @@ class AnimationContext(object):
         # https://stackoverflow.com/questions/43946416/return-value-of-exit
         return self.suppress_exceptions or exc_type is None
 
+
+# API edits waiting to be pushed to Maya's undo queue by the RedApiUndo command, see apiUndoable
+RED9_API_UNDO = []
+
+
+def apiUndoable(undoFunc, redoFunc):
+    '''
+    Push a block of edits already made through the API (MDGModifier, MAnimCurveChange etc)
+    onto Maya's undo queue as a single step. The RedApiUndo command in the SnapRuntime
+    plug-in picks up the funcs and calls them on undo / redo.
+
+    :param undoFunc: func called when the step is undone
+    :param redoFunc: func called when the step is redone, NOT called now
+    :return: True if the step made it to the undo queue
+    '''
+    RED9_API_UNDO.append((undoFunc, redoFunc))
+    try:
+        if not cmds.pluginInfo('SnapRuntime.py', query=True, loaded=True):
+            cmds.loadPlugin('SnapRuntime.py')
+        cmds.RedApiUndo()
+        return True
+    except StandardError, err:
+        RED9_API_UNDO.remove((undoFunc, redoFunc))
+        log.warning('API edits could not be added to the undo queue : %s' % err)
+    return False
+
+
 class undoContext(object):
     """
     CONTEXT MANAGER : Simple Context Manager for chunking the undoState
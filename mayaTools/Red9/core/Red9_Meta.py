@@ -40,12 +40,19 @@ import maya.mel as mel
 import maya.OpenMaya as OpenMaya
 from functools import partial
 from functools import wraps
+from collections import OrderedDict
+import collections
+from contextlib import contextmanager
+import copy
 import sys
 import os
 import uuid
 import types
 import inspect
 import traceback
+import zlib
+import base64
+import array
 
 
 import Red9.startup.setup as r9Setup
@@ -81,8 +88,8 @@ except:
     # import Red9.packages.simplejson as json
 
 
-global RED9_META_NODECACHE
-RED9_META_NODECACHE = {}
+global RED9_META_NODECACHE_MAXSIZE
+RED9_META_NODECACHE_MAXSIZE = 5000
 
 global __RED9_META_NODESTORE__
 __RED9_META_NODESTORE__ = []
@@ -101,8 +108,10 @@ else:
     RED9_META_CALLBACKS = {}
     RED9_META_CALLBACKS['Open'] = []
     RED9_META_CALLBACKS['New'] = []
-    # RED9_META_CALLBACKS['DuplicatePre'] = []
-    # RED9_META_CALLBACKS['DuplicatePost'] = []
+    RED9_META_CALLBACKS['NodeRemoved'] = []
+    RED9_META_CALLBACKS['NameChanged'] = []
+    RED9_META_CALLBACKS['DuplicatePre'] = []
+    RED9_META_CALLBACKS['DuplicatePost'] = []
 
 
 '''
@@ -337,6 +346,178 @@ def generateUUID():
     '''
     return str(uuid.uuid4()).upper()
 
+class MetaNodeCache(dict):
+    '''
+    The MetaNode cache itself, a dict subclass so that all the existing calls
+    that treat RED9_META_NODECACHE as a dict still work. Keys are Maya's native
+    node UUID (2016 onwards), or the UUID attr / node name on older systems.
+
+    On top of the main key > mNode mapping we store a reverse map of the
+    MObjectHandle.hashCode() > key so that the node callbacks (deleted, renamed)
+    and removeFromCache can find an entry in O(1) without re-scanning the cache.
+
+    The cache is bounded by maxSize, when full the least recently used entry
+    that isn't referenced anywhere else in Python is evicted. Hits, misses and
+    evictions are counted so we can see how well the cache is performing.
+
+    .. note::
+        entries are removed by the MDGMessage / MNodeMessage callbacks bound at
+        the bottom of this module rather than by polling isValidMObject() on
+        every entry, cleanCache() is still there as a safety sweep.
+    '''
+    def __init__(self, maxSize=None):
+        dict.__init__(self)
+        self.maxSize = maxSize
+        self._lru = OrderedDict()  # key > None, held in least to most recently used order
+        self._handles = {}  # MObjectHandle.hashCode() > key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _handleHash(mNode):
+        '''
+        hashCode of the mNodes MObjectHandle, None if it's not yet been bound
+        '''
+        try:
+            mobjHandle = object.__getattribute__(mNode, '_MObjectHandle')
+            if mobjHandle:
+                return mobjHandle.hashCode()
+        except:
+            pass
+
+    def __setitem__(self, key, mNode):
+        if key in self:
+            self.__delitem__(key)
+        dict.__setitem__(self, key, mNode)
+        self._lru[key] = None
+        _hash = self._handleHash(mNode)
+        if _hash is not None:
+            self._handles[_hash] = key
+        if self.maxSize and len(self) > self.maxSize:
+            self.evict()
+
+    def __delitem__(self, key):
+        mNode = dict.pop(self, key)
+        self._lru.pop(key, None)
+        _hash = self._handleHash(mNode)
+        if _hash is not None and self._handles.get(_hash) == key:
+            del self._handles[_hash]
+
+    def pop(self, key, *args):
+        if key not in self:
+            if args:
+                return args[0]
+            raise KeyError(key)
+        mNode = dict.__getitem__(self, key)
+        self.__delitem__(key)
+        return mNode
+
+    def clear(self):
+        dict.clear(self)
+        self._lru.clear()
+        self._handles.clear()
+
+    def lookup(self, key):
+        '''
+        return the cached mNode for the given key, or None, updating the
+        LRU order and the hit / miss counters
+        '''
+        mNode = dict.get(self, key)
+        if mNode is None:
+            self.misses += 1
+            return
+        self.hits += 1
+        self._lru.pop(key, None)
+        self._lru[key] = None
+        return mNode
+
+    def keyFromMObject(self, mobj):
+        '''
+        reverse lookup, return the cache key bound to the given MObject
+        '''
+        return self._handles.get(OpenMaya.MObjectHandle(mobj).hashCode())
+
+    def removeMObject(self, mobj):
+        '''
+        O(1) removal of the entry bound to the given MObject
+        '''
+        key = self.keyFromMObject(mobj)
+        if key is not None and key in self:
+            self.__delitem__(key)
+            return key
+
+    def removeInstance(self, mNode):
+        '''
+        O(1) removal of the given instantiated mNode
+        '''
+        _hash = self._handleHash(mNode)
+        key = self._handles.get(_hash)
+        if key is None:
+            try:
+                key = object.__getattribute__(mNode, '_lastUUID')
+            except:
+                return
+        if key in self and dict.__getitem__(self, key) is mNode:
+            self.__delitem__(key)
+            return key
+
+    def rekey(self, mobj, newKey):
+        '''
+        move a name keyed entry to a new key, used by the rename callback
+        for nodes that aren't cached against a UUID
+        '''
+        key = self.keyFromMObject(mobj)
+        if key is None or key == newKey or key not in self:
+            return
+        mNode = self.pop(key)
+        self[newKey] = mNode
+
+    def evict(self):
+        '''
+        evict least recently used entries until we're back within maxSize.
+        Only entries with no references outside of the cache are removed,
+        any mNode still held in Python is left alone.
+        '''
+        if not self.maxSize:
+            return
+        needed = len(self) - self.maxSize
+        if needed <= 0:
+            return
+        evict = []
+        for key in self._lru:
+            # 3 refs = the cache dict, the local 'mNode' and getrefcount's own arg
+            mNode = dict.__getitem__(self, key)
+            if sys.getrefcount(mNode) <= 3:
+                evict.append(key)
+                if len(evict) == needed:
+                    break
+        mNode = None
+        for key in evict:
+            self.__delitem__(key)
+            self.evictions += 1
+
+    def stats(self):
+        '''
+        return the cache counters as a dict
+        '''
+        total = self.hits + self.misses
+        return {'size': len(self),
+                'maxSize': self.maxSize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hitRatio': float(self.hits) / total if total else 0.0}
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+global RED9_META_NODECACHE
+RED9_META_NODECACHE = MetaNodeCache(maxSize=RED9_META_NODECACHE_MAXSIZE)
+
+
 def registerMClassNodeCache(mNode):
     '''
     Add a given mNode to the global RED9_META_NODECACHE cache of currently instantiated
@@ -344,13 +525,12 @@ def registerMClassNodeCache(mNode):
 
     :param mNode: instantiated mNode to add
     '''
-    global RED9_META_NODECACHE
     version = r9Setup.mayaVersion()
 
     # Maya 2016 onwards UUID management  ---------
     if version >= 2016:
         UUID = cmds.ls(mNode.mNode, uuid=True)[0]
-        if UUID in RED9_META_NODECACHE.keys():
+        if UUID in RED9_META_NODECACHE:
             # log.debug('CACHE : UUID is already registered in cache')
             if not mNode == RED9_META_NODECACHE[UUID]:
                 log.debug('CACHE : %s : UUID is registered to a different node : modifying UUID: %s' % (UUID, mNode.mNode))
@@ -363,7 +543,7 @@ def registerMClassNodeCache(mNode):
             if not UUID:
                 # log.debug('CACHE : generating fresh UUID')
                 UUID = mNode.setUUID()
-            elif UUID in RED9_META_NODECACHE.keys():
+            elif UUID in RED9_META_NODECACHE:
                 # log.debug('CACHE : UUID is already registered in cache')
                 if not mNode == RED9_META_NODECACHE[UUID]:
                     log.debug('CACHE : %s : UUID is registered to a different node : modifying UUID: %s' % (UUID, mNode.mNode))
@@ -373,43 +553,14 @@ def registerMClassNodeCache(mNode):
 
     else:
         # log.debug('CACHE : UUID attr not bound to this node, must be an older system')
-        if RED9_META_NODECACHE or mNode.mNode not in RED9_META_NODECACHE.keys():
-            # log.debug('CACHE : Adding to MetaNode Cache : %s' % mNode.mNode)
-            RED9_META_NODECACHE[mNode.mNode] = mNode
-            return
-
-    if RED9_META_NODECACHE or UUID not in RED9_META_NODECACHE.keys():
-        # log.debug('CACHE : Adding to MetaNode UUID Cache : %s > %s' % (mNode.mNode, UUID))
-        RED9_META_NODECACHE[UUID] = mNode
+        # log.debug('CACHE : Adding to MetaNode Cache : %s' % mNode.mNode)
+        RED9_META_NODECACHE[mNode.mNode] = mNode
+        return
 
+    # log.debug('CACHE : Adding to MetaNode UUID Cache : %s > %s' % (mNode.mNode, UUID))
+    RED9_META_NODECACHE[UUID] = mNode
     mNode._lastUUID = UUID
 
-#    if mNode.hasAttr('UUID') or version>=2016:
-#        try:
-#            if version<2016:
-#                UUID=mNode.UUID
-#                if not UUID:
-#                    log.debug('CACHE : generating fresh UUID')
-#                    UUID=mNode.setUUID()
-#                elif UUID in RED9_META_NODECACHE.keys():
-#                    log.debug('CACHE : UUID is already registered in cache')
-#                    if not mNode.mNode == RED9_META_NODECACHE[UUID]:
-#                        log.debug('CACHE : %s : UUID is registered to a different node : modifying UUID: %s' % (UUID, mNode.mNode))
-#                        UUID=mNode.setUUID()
-#            else:
-#                UUID=cmds.ls(mNode.mNode, uuid=True)[0]
-#            if RED9_META_NODECACHE or not UUID in RED9_META_NODECACHE.keys():
-#                log.debug('CACHE : Adding to MetaNode UUID Cache : %s > %s' % (mNode.mNode, UUID))
-#                RED9_META_NODECACHE[UUID]=mNode
-#        except StandardError, err:
-#            #print err
-#            log.debug('CACHE : Failed to set UUID for mNode : %s' % mNode.mNode)
-#    else:
-#        log.debug('CACHE : UUID attr not bound to this node, must be an older system')
-#        if RED9_META_NODECACHE or not mNode.mNode in RED9_META_NODECACHE.keys():
-#            log.debug('CACHE : Adding to MetaNode Cache : %s' % mNode.mNode)
-#            RED9_META_NODECACHE[mNode.mNode]=mNode
-
 
 def getMetaFromCache(mNode):
     '''
@@ -424,33 +575,33 @@ def getMetaFromCache(mNode):
         else:
             UUID = cmds.ls(mNode, uuid=True)[0]
 
-        if UUID in RED9_META_NODECACHE.keys():
+        cached = RED9_META_NODECACHE.lookup(UUID)
+        if cached is not None:
             try:
-                if RED9_META_NODECACHE[UUID].isValidMObject():
-                    if not RED9_META_NODECACHE[UUID]._MObject == getMObject(mNode):
+                if cached.isValidMObject():
+                    if not cached._MObject == getMObject(mNode):
                         log.debug('CACHE ABORTED : %s : UUID is already registered but to a different node : %s' % (UUID, mNode))
-                        mNode.setUUID()
                         return
                     # log.debug('CACHE : %s Returning mNode from UUID cache! = %s' % (mNode, UUID))
-                    return RED9_META_NODECACHE[UUID]
+                    return cached
                 else:
                     # log.debug('%s being Removed from the cache due to invalid MObject' % mNode)
-                    cleanCache()
+                    RED9_META_NODECACHE.pop(UUID, None)
             except:
                 log.debug('CACHE : inspection failure')
     except:
-        if mNode in RED9_META_NODECACHE.keys():
+        cached = RED9_META_NODECACHE.lookup(mNode)
+        if cached is not None:
             try:
-                if RED9_META_NODECACHE[mNode].isValidMObject():
-                    if not RED9_META_NODECACHE[mNode]._MObject == getMObject(mNode):
+                if cached.isValidMObject():
+                    if not cached._MObject == getMObject(mNode):
                         # log.debug('CACHE : %s : ID is already registered but MObjects are different, node may have been renamed' % mNode)
                         return
-                    # print 'namebased returned from cache ', mNode
                     # log.debug('CACHE : %s Returning mNode from nameBased cache!' % mNode)
-                    return RED9_META_NODECACHE[mNode]
+                    return cached
                 else:
                     # log.debug('%s being Removed from the cache due to invalid MObject' % mNode)
-                    cleanCache()
+                    RED9_META_NODECACHE.pop(mNode, None)
             except:
                 log.debug('CACHE : inspection failure')
 
@@ -491,11 +642,30 @@ def printMetaCacheRegistry():
     cleanCache()
     for k, v in RED9_META_NODECACHE.items():
         print('%s : %s : %s' % (k, r9Core.nodeNameStrip(v.mNode), v))
+    print('CACHE STATS : %s' % getMetaCacheStats())
+
+def getMetaCacheStats():
+    '''
+    return the hit / miss / eviction counters for the MetaNode cache
+    '''
+    return RED9_META_NODECACHE.stats()
+
+def setMetaCacheSize(maxSize):
+    '''
+    set the maximum number of entries held in the MetaNode cache,
+    None or 0 removes the bound completely.
+    '''
+    RED9_META_NODECACHE.maxSize = maxSize
+    RED9_META_NODECACHE.evict()
 
 def cleanCache():
     '''
     Run through the current cache of metaNodes and confirm that they're
     all still valid by testing the MObjectHandles.
+
+    .. note::
+        the cache is now kept in sync by the node deleted / renamed callbacks
+        so this is only a safety sweep and no longer needed in general use
     '''
     for k, v in RED9_META_NODECACHE.items():
         try:
@@ -509,24 +679,23 @@ def removeFromCache(mNodes):
     '''
     remove instanciated mNodes from the cache
     '''
-    for k, v in RED9_META_NODECACHE.items():
-        if not type(mNodes) == list:
-            mNodes = [mNodes]
-        if v and v in mNodes:
-            try:
-                RED9_META_NODECACHE.pop(k)
-                if logging_is_debug():
-                    log.debug('CACHE : %s being Removed from the cache >> %s' % (r9Core.nodeNameStrip(k),
-                                                                             r9Core.nodeNameStrip(v.mNode)))
-            except:
-                log.debug('CACHE : Failed to remove %s from cache')
+    if not type(mNodes) == list:
+        mNodes = [mNodes]
+    for mNode in mNodes:
+        if not mNode:
+            continue
+        try:
+            k = RED9_META_NODECACHE.removeInstance(mNode)
+            if k and logging_is_debug():
+                log.debug('CACHE : %s being Removed from the cache' % r9Core.nodeNameStrip(k))
+        except:
+            log.debug('CACHE : Failed to remove %s from cache' % mNode)
 
 def resetCache(*args):
     '''
     reset the global cache, called after SceneOpen or NewScene
     '''
-    global RED9_META_NODECACHE
-    RED9_META_NODECACHE = {}
+    RED9_META_NODECACHE.clear()
 
 def resetCacheOnSceneNew(*args):
     resetCache()
@@ -540,7 +709,7 @@ def getMClassNodeCache():
 
 def __preDuplicateCache(*args):
     '''
-    DEPRICATED : PRE-DUPLICATE : on the duplicate call in Maya (bound to a callback) pre-store all current mNodes
+    PRE-DUPLICATE : Maya 2015 and below only, on the duplicate call in Maya (bound to a callback) pre-store all current mNodes
     '''
     global __RED9_META_NODESTORE__
     __RED9_META_NODESTORE__ = getMetaNodes(dataType='dag')
@@ -548,7 +717,7 @@ def __preDuplicateCache(*args):
 
 def __poseDuplicateCache(*args):
     '''
-    DEPRICATED : POST-DUPLICATE : if we find the duplicate node in the cache re-generate it's UUID
+    POST-DUPLICATE : Maya 2015 and below only, if we find the duplicate node in the cache re-generate it's UUID
     '''
     global __RED9_META_NODESTORE__
 
@@ -564,6 +733,45 @@ def __poseDuplicateCache(*args):
             cmds.setAttr('%s.UUID' % node, generateUUID(), type='string')
     # print 'post-callback : nodelist :', newNodes
 
+def __nodeRemovedCache(node, *args):
+    '''
+    NODE-REMOVED : bound to the MDGMessage nodeRemoved callback, drops the
+    deleted node from the cache via the MObjectHandle reverse map
+    '''
+    if not RED9_META_NODECACHE:
+        return
+    try:
+        key = RED9_META_NODECACHE.removeMObject(node)
+        if key and logging_is_debug():
+            log.debug('CACHE : %s removed from the cache by nodeDeleted callback' % key)
+    except:
+        log.debug('CACHE : nodeRemoved callback failure')
+
+def __nodeRenamedCache(node, prevName, *args):
+    '''
+    NODE-RENAMED : bound to the MNodeMessage nameChanged callback, nodes cached
+    against a UUID need nothing doing, but name keyed entries (wrapped nodes on
+    older systems) are re-keyed to the new name
+    '''
+    if not RED9_META_NODECACHE:
+        return
+    try:
+        key = RED9_META_NODECACHE.keyFromMObject(node)
+        if key is None:
+            return
+        mNode = RED9_META_NODECACHE.get(key)
+        if mNode is None or object.__getattribute__(mNode, '_lastUUID') == key:
+            return
+        if node.hasFn(OpenMaya.MFn.kDagNode):
+            dPath = OpenMaya.MDagPath()
+            OpenMaya.MDagPath.getAPathTo(node, dPath)
+            newName = dPath.fullPathName()
+        else:
+            newName = OpenMaya.MFnDependencyNode(node).name()
+        RED9_META_NODECACHE.rekey(node, newName)
+    except:
+        log.debug('CACHE : nameChanged callback failure')
+
 def getMObject(node):
     '''
     base wrapper to get the MObject from node
@@ -638,6 +846,273 @@ def pymelHandler(func):
     return wrapper
 
 
+# ----------------------------------------------------------------------------
+# --- Attribute Codecs --- -------------------
+# ----------------------------------------------------------------------------
+
+'''
+Complex data (dicts, lists) is serialized to string attrs on the mNodes. By default
+this is plain JSON, but large payloads are pushed through a registered codec which
+tags the string with its prefix so that the read can detect the codec automatically.
+Any string without a registered prefix is treated as JSON so existing data still loads.
+Register your own codecs with registerMetaCodec().
+'''
+
+global RED9_META_CODEC_THRESHOLD
+RED9_META_CODEC_THRESHOLD = 32000  # JSON strings shorter than this are left as plain, human readable JSON
+
+RED9_META_LAZY_DECODE = False  # LazyDictCodec data is returned as a LazyDecodeDict Mapping rather than a dict
+
+global RED9_META_CODECS
+RED9_META_CODECS = []
+
+
+class MetaAttrCodec(object):
+    '''
+    Base codec, subclass and register via registerMetaCodec(). The prefix is written
+    at the start of the encoded string and is what the decoder keys off.
+    '''
+    prefix = None
+
+    def accepts(self, data):
+        '''
+        return True if this codec can encode the given data
+        '''
+        return False
+
+    def encode(self, data):
+        raise NotImplementedError
+
+    def decode(self, data):
+        '''
+        :param data: the encoded string with the prefix already stripped
+        '''
+        raise NotImplementedError
+
+    @staticmethod
+    def _pack(data):
+        return base64.b64encode(zlib.compress(data, 6))
+
+    @staticmethod
+    def _unpack(data):
+        return zlib.decompress(base64.b64decode(data))
+
+
+class ZlibJsonCodec(MetaAttrCodec):
+    '''
+    zlib compressed JSON, base64 encoded so it's safe in a string attr.
+    Accepts anything JSON can serialize.
+    '''
+    prefix = 'r9zj:'
+
+    def accepts(self, data):
+        return True
+
+    def encode(self, data):
+        return self.prefix + self._pack(json.dumps(data))
+
+    def decode(self, data):
+        return json.loads(self._unpack(data))
+
+
+class NumericArrayCodec(MetaAttrCodec):
+    '''
+    typed numeric arrays, either flat lists of floats / ints or lists of equal length
+    vectors (positions, weights etc). Values are stored as a packed little-endian
+    array rather than text, compressed and base64 encoded.
+
+    format: prefix + typecode + ':' + vector length (0 for flat) + ':' + payload
+    '''
+    prefix = 'r9na:'
+
+    @staticmethod
+    def _typecode(values):
+        '''
+        'd' (float64) for all floats, 'i' (int32) for all ints in range, else None.
+        Mixed lists are rejected so that the decode returns exactly what JSON would.
+        '''
+        if not values:
+            return
+        if all(type(v) == float for v in values):
+            return 'd'
+        if all(type(v) in (int, long) and -2147483648 <= v <= 2147483647 for v in values):
+            return 'i'
+
+    def _flatten(self, data):
+        if not data or not type(data) in (list, tuple):
+            return None, None
+        if type(data[0]) in (list, tuple):
+            size = len(data[0])
+            if not size or not all(type(v) in (list, tuple) and len(v) == size for v in data):
+                return None, None
+            return [x for v in data for x in v], size
+        return list(data), 0
+
+    def accepts(self, data):
+        flat, size = self._flatten(data)
+        return flat is not None and self._typecode(flat) is not None
+
+    def encode(self, data):
+        flat, size = self._flatten(data)
+        typecode = self._typecode(flat)
+        packed = array.array(typecode, flat)
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        return '%s%s:%i:%s' % (self.prefix, typecode, size, self._pack(packed.tostring()))
+
+    def decode(self, data):
+        typecode, size, payload = data.split(':', 2)
+        size = int(size)
+        packed = array.array(typecode)
+        packed.fromstring(self._unpack(payload))
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        flat = packed.tolist()
+        if not size:
+            return flat
+        return [flat[i:i + size] for i in range(0, len(flat), size)]
+
+
+class LazyDecodeDict(collections.MutableMapping):
+    '''
+    read view returned by the LazyDictCodec when RED9_META_LAZY_DECODE is on. The
+    encoded payloads are held in a side table and each is only decoded, into the
+    backing dict, the first time that key is accessed. This is a Mapping, not a dict,
+    so dict(x), update(x) and **x all run through __getitem__ and get decoded values.
+    '''
+    def __init__(self, encoded):
+        self._data = {}
+        self._pending = dict(encoded)
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            self._data[key] = decodeAttrData(self._pending.pop(key))
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._pending.pop(key, None)
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        if key in self._pending:
+            del self._pending[key]
+        else:
+            del self._data[key]
+
+    def __iter__(self):
+        for key in self._data.keys() + self._pending.keys():
+            yield key
+
+    def __len__(self):
+        return len(self._data) + len(self._pending)
+
+    def __contains__(self, key):
+        return key in self._data or key in self._pending
+
+    def __repr__(self):
+        return repr(self.decoded())
+
+    def copy(self):
+        return self.decoded()
+
+    def lazyCopy(self):
+        '''
+        copy that keeps the un-accessed values as their encoded payloads
+        '''
+        new = LazyDecodeDict(self._pending)
+        new._data = copy.deepcopy(self._data)
+        return new
+
+    def decoded(self):
+        '''
+        return a standard dict with all values decoded
+        '''
+        return dict(self)
+
+
+class LazyDictCodec(MetaAttrCodec):
+    '''
+    dicts where each value is encoded individually (so large numeric lists still get
+    the NumericArrayCodec) and the whole map compressed. The decode returns a plain
+    dict, or with RED9_META_LAZY_DECODE a LazyDecodeDict so a value is only parsed
+    when its key is accessed.
+    '''
+    prefix = 'r9ld:'
+
+    def accepts(self, data):
+        return type(data) in (dict, LazyDecodeDict) and all(r9General.is_basestring(k) for k in data.keys())
+
+    def encode(self, data):
+        encoded = dict((key, encodeAttrData(value, threshold=0)) for key, value in data.items())
+        return self.prefix + self._pack(json.dumps(encoded))
+
+    def decode(self, data):
+        encoded = json.loads(self._unpack(data))
+        if RED9_META_LAZY_DECODE:
+            return LazyDecodeDict(encoded)
+        return dict((key, decodeAttrData(value)) for key, value in encoded.items())
+
+
+def registerMetaCodec(codec, index=0):
+    '''
+    register an attribute codec, codecs are tested in order during the encode
+    so by default the new codec is inserted at the front of the list
+
+    :param codec: an instance of a MetaAttrCodec subclass, its prefix must be unique
+    :param index: position in the codec list
+    '''
+    global RED9_META_CODECS
+    if not codec.prefix:
+        raise ValueError('codec must define a unique prefix : %s' % codec)
+    RED9_META_CODECS = [c for c in RED9_META_CODECS if not c.prefix == codec.prefix]
+    RED9_META_CODECS.insert(index, codec)
+
+def getMetaCodecs():
+    return RED9_META_CODECS
+
+registerMetaCodec(ZlibJsonCodec())
+registerMetaCodec(LazyDictCodec())
+registerMetaCodec(NumericArrayCodec())
+
+def encodeAttrData(data, threshold=None):
+    '''
+    serialize complex data for a string attr. Plain JSON is returned if it's
+    under the threshold, else the data is passed to the first registered codec
+    that accepts it
+
+    :param data: data to encode
+    :param threshold: JSON length over which a codec is used, default RED9_META_CODEC_THRESHOLD
+    '''
+    if isinstance(data, LazyDecodeDict):
+        data = data.decoded()
+    if threshold is None:
+        threshold = RED9_META_CODEC_THRESHOLD
+    jsonData = json.dumps(data)
+    if len(jsonData) <= threshold:
+        return jsonData
+    for codec in RED9_META_CODECS:
+        if codec.accepts(data):
+            encoded = codec.encode(data)
+            if len(encoded) < len(jsonData):
+                return encoded
+    return jsonData
+
+def decodeAttrData(data):
+    '''
+    deserialize a string attr, detecting the codec from its prefix, with
+    anything un-prefixed passed through the JSON decoder
+
+    :param data: the string to decode, raises if it's not valid JSON or codec data
+    '''
+    if type(data) == unicode:
+        data = str(data)
+    if data[:1] == 'r':
+        for codec in RED9_META_CODECS:
+            if data.startswith(codec.prefix):
+                return codec.decode(data[len(codec.prefix):])
+    return json.loads(data)
+
+
 # ----------------------------------------------------------------------------
 # --- MetaData Utilities --- -------------------
 # ----------------------------------------------------------------------------
@@ -661,7 +1136,7 @@ def attributeDataType(val):
     if issubclass(type(val), float):
         # log.debug('Val : %s : is a float')
         return 'float'
-    if issubclass(type(val), dict):
+    if issubclass(type(val), (dict, LazyDecodeDict)):
         # log.debug('Val : %s : is a dict')
         return 'complex'
     if issubclass(type(val), list):
@@ -807,8 +1282,148 @@ def isMetaNodeClassGrp(node, mClassGrps=[]):
         except:
             log.debug('mNode has no MClassGrp attr, must be a legacy system and needs updating!! %s' % node)
 
+class MetaNodeIndex(object):
+    '''
+    Bulk metaData scanner. Reads the mClass, mClassGrp, mNodeID and mSystemRoot
+    attrs for every candidate node in a single pass through the API (MSelectionList
+    and MFnDependencyNode plug reads) and builds an in-memory index keyed by the
+    resolved mClass and the raw mClassGrp. Queries against the index are then
+    just dictionary lookups rather than N x getAttr calls per node.
+
+    >>> index = MetaNodeIndex()
+    >>> index.query(mInstances='MetaRig', mClassGrps='MetaRig')
+
+    .. note::
+        the index is a snapshot of the scene at the time it was built, if you're
+        doing multiple searches without changing the scene, build one index and
+        pass it into getMetaNodes(index=index) to avoid re-scanning.
+    '''
+    def __init__(self, nTypes=None, byname=[]):
+        self.nodes = []  # [(node, mClass, mClassGrp, mNodeID, mSystemRoot)] in cmds.ls order
+        self.byNode = {}  # node : index
+        self.byMClass = {}  # resolved mClass : [index]
+        self.byClassGrp = {}  # raw mClassGrp : [index]
+        self.scan(nTypes=nTypes, byname=byname)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @staticmethod
+    def _readPlug(mfn, attr, asBool=False):
+        if not mfn.hasAttribute(attr):
+            return None
+        try:
+            plug = mfn.findPlug(attr, False)
+            if asBool:
+                return plug.asBool()
+            return plug.asString()
+        except:
+            return None
+
+    @staticmethod
+    def resolveMClass(mClass, mClassGrp, nodeType):
+        '''
+        resolve the mClass to instantiate from the raw attr data, this mirrors
+        getMClassDataFromNode but without any Maya calls
+        '''
+        if mClass is not None:
+            if mClass in RED9_META_REGISTERY:
+                return mClass
+            if mClassGrp is not None:
+                if mClassGrp in RED9_META_REGISTERY:
+                    return mClassGrp
+                return
+        # Node has no mClass attr BUT in certain circumstances we can register
+        # default node Types to Meta (HIK for example) so we need to check
+        if 'Meta%s' % nodeType in RED9_META_REGISTERY:
+            return 'Meta%s' % nodeType
+        for key in RED9_META_REGISTERY.keys():
+            if key.lower() == nodeType.lower():
+                return key
+
+    def scan(self, nTypes=None, byname=[]):
+        '''
+        single pass over all nodes of the registered metaNode types (or nTypes)
+
+        :param nTypes: only inspect nodes of a given Type, default is getMClassNodeTypes()
+        :param byname: [] a specific list of node names to search for
+        '''
+        self.nodes = []
+        self.byNode = {}
+        self.byMClass = {}
+        self.byClassGrp = {}
+        if not nTypes:
+            nTypes = getMClassNodeTypes()
+        if byname:
+            nodes = cmds.ls(byname, type=nTypes, l=True)
+        else:
+            nodes = cmds.ls(type=nTypes, l=True)
+        if not nodes:
+            return
+
+        selList = OpenMaya.MSelectionList()
+        for node in nodes:
+            selList.add(node)
+        mfn = OpenMaya.MFnDependencyNode()
+        mobj = OpenMaya.MObject()
+        for i, node in enumerate(nodes):
+            selList.getDependNode(i, mobj)
+            mfn.setObject(mobj)
+            mClass = self._readPlug(mfn, 'mClass')
+            mClassGrp = self._readPlug(mfn, 'mClassGrp')
+            mNodeID = self._readPlug(mfn, 'mNodeID')
+            mSystemRoot = self._readPlug(mfn, 'mSystemRoot', asBool=True)
+            resolved = self.resolveMClass(mClass, mClassGrp, mfn.typeName())
+
+            self.nodes.append((node, resolved, mClassGrp, mNodeID, mSystemRoot))
+            self.byNode[node] = i
+            if resolved:
+                self.byMClass.setdefault(resolved, []).append(i)
+            if mClassGrp is not None:
+                self.byClassGrp.setdefault(mClassGrp, []).append(i)
+
+    def query(self, mTypes=[], mInstances=[], mClassGrps=[], mSystemRoot=False):
+        '''
+        return the node names matching the search, args as per getMetaNodes
+
+        :param mSystemRoot: if True only return nodes flagged as mSystemRoot
+        '''
+        if mInstances:
+            # inheritance is tested once per registered mClass, not per node
+            instances = mTypesToRegistryKey(mInstances)
+            mClasses = [mClass for mClass in self.byMClass
+                        if any(inst in RED9_META_INHERITANCE_MAP[mClass]['short'] for inst in instances)]
+        elif mTypes:
+            mClasses = [mClass for mClass in mTypesToRegistryKey(mTypes) if mClass in self.byMClass]
+        else:
+            mClasses = self.byMClass.keys()
+
+        indexes = set()
+        for mClass in mClasses:
+            indexes.update(self.byMClass[mClass])
+
+        if mClassGrps:
+            if r9General.is_basestring(mClassGrps):
+                mClassGrps = [mClassGrps]
+            grpIndexes = set()
+            for grp in mClassGrps:
+                grpIndexes.update(self.byClassGrp.get(grp, []))
+            indexes &= grpIndexes
+
+        if mSystemRoot:
+            indexes = [i for i in indexes if self.nodes[i][4]]
+        return [self.nodes[i][0] for i in sorted(indexes)]
+
+    def getData(self, node):
+        '''
+        return the scanned data for a given node (long name) as a dict
+        '''
+        if node in self.byNode:
+            _, mClass, mClassGrp, mNodeID, mSystemRoot = self.nodes[self.byNode[node]]
+            return {'mClass': mClass, 'mClassGrp': mClassGrp, 'mNodeID': mNodeID, 'mSystemRoot': mSystemRoot}
+
 @r9General.Timer
-def getMetaNodes(mTypes=[], mInstances=[], mClassGrps=[], mAttrs=None, dataType='mClass', nTypes=None, mSystemRoot=False, byname=[], **kws):
+def getMetaNodes(mTypes=[], mInstances=[], mClassGrps=[], mAttrs=None, dataType='mClass', nTypes=None, mSystemRoot=False, byname=[], index=None, **kws):
     '''
     Get all mClass nodes in scene and return as mClass objects if possible
     :param mTypes: only return meta nodes of a given type
@@ -822,37 +1437,12 @@ def getMetaNodes(mTypes=[], mInstances=[], mClassGrps=[], mAttrs=None, dataType=
                 the correct class object. If not then return the Maya node itself
     :param nTypes: only inspect nodes of a given Type
     :param byname: [] a specific list of node names to search for
+    :param index: an already built MetaNodeIndex to query, if not given one is
+                built for this call (nTypes and byname are then ignored)
     '''
-    mNodes = []
-    if not nTypes:
-        if byname:
-            nodes = cmds.ls(byname, type=getMClassNodeTypes(), l=True)
-        else:
-            nodes = cmds.ls(type=getMClassNodeTypes(), l=True)
-    else:
-        if byname:
-            nodes = cmds.ls(byname, type=nTypes, l=True)
-        else:
-            nodes = cmds.ls(type=nTypes, l=True)
-    if not nodes:
-        return mNodes
-    for node in nodes:
-        mNode = False
-        if not mInstances:
-            if isMetaNode(node, mTypes=mTypes):
-                mNode = True
-        else:
-            if isMetaNodeInherited(node, mInstances):
-                mNode = True
-        if mNode:
-            if mClassGrps:
-#                 if not hasattr(mClassGrps, '__iter__'):
-                if r9General.is_basestring(mClassGrps):
-                    mClassGrps = [mClassGrps]
-                if isMetaNodeClassGrp(node, mClassGrps):
-                    mNodes.append(node)
-            else:
-                mNodes.append(node)
+    if index is None:
+        index = MetaNodeIndex(nTypes=nTypes, byname=byname)
+    mNodes = index.query(mTypes=mTypes, mInstances=mInstances, mClassGrps=mClassGrps)
     if not mNodes:
         return mNodes
     if mAttrs:
@@ -925,9 +1515,167 @@ def getUnregisteredMetaNodes():
     return [node for node in cmds.ls('*.mClass', l=True, o=True) if node not in mNodes]
 
 
+class MetaGraphWalker(object):
+    '''
+    Graph traversal engine for message linked networks. Connections are found by
+    iterating the node plugs through the API (MFnDependencyNode.getConnections)
+    rather than a cmds.listConnections per registered nodeType followed by a
+    getAttr(type=True) per returned plug. Only connections made via message attrs
+    on the inspected node are followed, nodeTypes are filtered as we go and the
+    mClass data of every node found is read from the same MFnDependencyNode, so
+    any meta filtering afterwards is done in memory.
+
+    A single walker can be re-used across multiple calls (getChildMetaNodes does
+    this) so that the per node mClass and nodeType data is only ever read once.
+
+    :param nTypes: only return nodes of the given types (inherited types match),
+        default is getMClassNodeTypes()
+    :param source: follow connections where the inspected node is the destination
+    :param destination: follow connections where the inspected node is the source
+    '''
+    _inheritedTypes = {}  # typeName : set(inherited types) shared across all walkers
+
+    def __init__(self, nTypes=None, source=True, destination=True):
+        if not nTypes:
+            nTypes = getMClassNodeTypes()
+        if r9General.is_basestring(nTypes):
+            nTypes = [nTypes]
+        self.nTypes = set(nTypes)
+        self.source = source
+        self.destination = destination
+        self.mClassData = {}  # nodeName : resolved mClass, filled as nodes are visited
+        self._typeMatch = {}  # typeName : bool
+        self._mfn = OpenMaya.MFnDependencyNode()
+
+    def _isValidType(self, typeName):
+        if typeName not in self._typeMatch:
+            if typeName not in MetaGraphWalker._inheritedTypes:
+                inherited = cmds.nodeType(typeName, isTypeName=True, inherited=True) or []
+                MetaGraphWalker._inheritedTypes[typeName] = set(inherited + [typeName])
+            self._typeMatch[typeName] = bool(self.nTypes & MetaGraphWalker._inheritedTypes[typeName])
+        return self._typeMatch[typeName]
+
+    @staticmethod
+    def _nodeName(mobj):
+        if mobj.hasFn(OpenMaya.MFn.kDagNode):
+            dPath = OpenMaya.MDagPath()
+            OpenMaya.MDagPath.getAPathTo(mobj, dPath)
+            return dPath.partialPathName()
+        return OpenMaya.MFnDependencyNode(mobj).name()
+
+    def _connectedMObjects(self, mobj):
+        '''
+        generator of connected MObjects via message plugs on the given node
+        '''
+        self._mfn.setObject(mobj)
+        plugs = OpenMaya.MPlugArray()
+        try:
+            self._mfn.getConnections(plugs)
+        except RuntimeError:
+            return
+        connected = OpenMaya.MPlugArray()
+        for i in range(plugs.length()):
+            plug = plugs[i]
+            if not plug.attribute().hasFn(OpenMaya.MFn.kMessageAttribute):
+                continue
+            plug.connectedTo(connected, self.source, self.destination)
+            for c in range(connected.length()):
+                yield connected[c].node()
+
+    def connections(self, nodes):
+        '''
+        return the unique nodes directly connected to the given nodes,
+        in the order they were found
+
+        :param nodes: Maya node or list of nodes to inspect
+        '''
+        if r9General.is_basestring(nodes):
+            nodes = [nodes]
+        selList = OpenMaya.MSelectionList()
+        for node in nodes:
+            selList.add(node)
+        found = []
+        visited = set()
+        mobj = OpenMaya.MObject()
+        for i in range(selList.length()):
+            selList.getDependNode(i, mobj)
+            for connected in self._connectedMObjects(mobj):
+                _hash = OpenMaya.MObjectHandle(connected).hashCode()
+                if _hash in visited:
+                    continue
+                visited.add(_hash)
+                mfn = OpenMaya.MFnDependencyNode(connected)
+                if not self._isValidType(mfn.typeName()):
+                    continue
+                name = self._nodeName(connected)
+                if name not in self.mClassData:
+                    self.mClassData[name] = MetaNodeIndex.resolveMClass(MetaNodeIndex._readPlug(mfn, 'mClass'),
+                                                                        MetaNodeIndex._readPlug(mfn, 'mClassGrp'),
+                                                                        mfn.typeName())
+                found.append(name)
+        return found
+
+    def walk(self, nodes, depth=None, filterFunc=None):
+        '''
+        breadth first walk of the network from the given nodes, returning every
+        node reached in the order found. Each node is visited once so the cost is
+        linear in the number of connections walked.
+
+        :param nodes: Maya node or list of nodes to start the walk from, these are
+            not included in the return
+        :param depth: optional limit on the number of connections walked from the
+            start nodes, None walks the full network
+        :param filterFunc: optional func(walker, node) -> bool, nodes failing the
+            filter are not returned and the walk doesn't continue through them
+        '''
+        if r9General.is_basestring(nodes):
+            nodes = [nodes]
+        visited = set(nodes)
+        found = []
+        frontier = list(nodes)
+        level = 0
+        while frontier and (depth is None or level < depth):
+            nextFrontier = []
+            for node in frontier:
+                for child in self.connections(node):
+                    if child in visited:
+                        continue
+                    visited.add(child)
+                    if filterFunc and not filterFunc(self, child):
+                        continue
+                    found.append(child)
+                    nextFrontier.append(child)
+            frontier = nextFrontier
+            level += 1
+        return found
+
+    def isMetaNode(self, node, mTypes=[]):
+        '''
+        in memory equivalent of isMetaNode for nodes already found by this walker
+        '''
+        mClass = self.mClassData.get(node)
+        if not mClass:
+            return False
+        if mTypes:
+            return mClass in mTypesToRegistryKey(mTypes)
+        return True
+
+    def isMetaNodeInherited(self, node, mInstances=[]):
+        '''
+        in memory equivalent of isMetaNodeInherited for nodes already found by this walker
+        '''
+        mClass = self.mClassData.get(node)
+        if not mClass or mClass not in RED9_META_INHERITANCE_MAP:
+            return False
+        for inst in mTypesToRegistryKey(mInstances):
+            if inst in RED9_META_INHERITANCE_MAP[mClass]['short']:
+                return True
+        return False
+
+
 @r9General.Timer
 def getConnectedMetaNodes(nodes, source=True, destination=True, mTypes=[], mInstances=[],
-                          mAttrs=None, dataType='mClass', nTypes=None, skipTypes=[], skipInstances=[], **kws):
+                          mAttrs=None, dataType='mClass', nTypes=None, skipTypes=[], skipInstances=[], walker=None, **kws):
     '''
     From a given set of Maya Nodes return all connected mNodes
     Default return is mClass objects
@@ -947,44 +1695,33 @@ def getConnectedMetaNodes(nodes, source=True, destination=True, mTypes=[], mInst
         search WITHOUT instantiating their mNodes
     :param skipInstances: if given this is a list of specific mNode mInstances types that will be skipped during the
         search WITHOUT instantiating their mNodes
+    :param walker: an existing MetaGraphWalker to use, must have been built with the same
+        source, destination and nTypes args. Used when making repeat calls whilst walking a network
     '''
     mNodes = []
-    connections = []
-
-    if not nTypes:
-        nTypes = getMClassNodeTypes()
-    # if mTypes and not type(mTypes)==list:mTypes=[mTypes]
-    for nType in nTypes:
-        cons = cmds.listConnections(nodes, type=nType, s=source, d=destination, c=True, shapes=True)  # modified 07/02/19 shapes flag for imageplane support
-        if cons:
-            # NOTE we're only interested in connected nodes via message linked attrs
-            for plug, node in zip(cons[::2], cons[1::2]):
-                if cmds.getAttr(plug, type=True) == 'message':
-                    if node not in connections:
-                        connections.append(node)
-                        # log.debug(node)
+    if walker is None:
+        walker = MetaGraphWalker(nTypes=nTypes, source=source, destination=destination)
+    connections = walker.connections(nodes)
     if not connections:
         return mNodes
 
     for node in connections:
         addNode = False
         if not mInstances:
-            if isMetaNode(node, mTypes=mTypes):
+            if walker.isMetaNode(node, mTypes=mTypes):
                 addNode = True
-                # mNodes.append(node)
         else:
-            if isMetaNodeInherited(node, mInstances):
+            if walker.isMetaNodeInherited(node, mInstances):
                 addNode = True
-                # mNodes.append(node)
         if skipTypes:
-            if isMetaNode(node, mTypes=skipTypes):
+            if walker.isMetaNode(node, mTypes=skipTypes):
                 if logging_is_debug():
-                    log.debug('skipping node mType found >> %s = %s' % (node, getMClassDataFromNode(node)))
+                    log.debug('skipping node mType found >> %s = %s' % (node, walker.mClassData.get(node)))
                 addNode = False
         if skipInstances:
-            if isMetaNodeInherited(node, skipInstances):
+            if walker.isMetaNodeInherited(node, skipInstances):
                 if logging_is_debug():
-                    log.debug('skipping node mInstance found >> %s = %s' % (node, getMClassDataFromNode(node)))
+                    log.debug('skipping node mInstance found >> %s = %s' % (node, walker.mClassData.get(node)))
                 addNode = False
         if addNode:
             mNodes.append(node)
@@ -1618,6 +2355,139 @@ class MClassNodeUI(object):
 # --- Main Meta Class --- ------
 # ----------------------------------------------------------------------------
 
+class MetaReadCache(object):
+    '''
+    Snapshot of all the user-defined attrs on a given mNode, read along with
+    their types in a single pass through the API. Whilst a snapshot is active
+    on an mNode (see MetaClass.cachedReads / cachedReads) the __getattribute__
+    call serves attr reads from here rather than the cmds.objExists and 2 x
+    cmds.getAttr calls per read. String attrs are JSON decoded once, on first
+    read, and the decoded value is cached.
+
+    Attrs the snapshot can't represent exactly as cmds.getAttr would return them
+    (message, multi, unit, matrix attrs etc) aren't stored and so fall through to
+    the standard cmds handling. Any write via the mNode's __setattr__, addAttr
+    or delAttr invalidates that attr's entry.
+
+    .. note::
+        this is a snapshot, changes made directly via cmds, or via a different
+        instance wrapping the same node, whilst it's active won't be seen.
+    '''
+    _numericTypes = {OpenMaya.MFnNumericData.kBoolean: ('bool', 'asBool'),
+                     OpenMaya.MFnNumericData.kLong: ('long', 'asInt'),
+                     OpenMaya.MFnNumericData.kShort: ('short', 'asShort'),
+                     OpenMaya.MFnNumericData.kByte: ('byte', 'asInt'),
+                     OpenMaya.MFnNumericData.kChar: ('char', 'asInt'),
+                     OpenMaya.MFnNumericData.kFloat: ('float', 'asFloat'),
+                     OpenMaya.MFnNumericData.kDouble: ('double', 'asDouble')}
+
+    def __init__(self, mNode, copyComplex=True):
+        '''
+        :param mNode: the instantiated mNode to snapshot
+        :param copyComplex: if True dict / list values decoded from JSON strings are
+            returned as copies so that modifying the return can't corrupt the cache
+        '''
+        self.copyComplex = copyComplex
+        self.data = {}  # attr : [attrType, value, decoded]
+        self.hits = 0
+        self.snapshot(mNode)
+
+    def _readPlug(self, plug, attrObj):
+        '''
+        return (attrType, value) matching cmds.getAttr, or None if we can't
+        represent the attr exactly
+        '''
+        if attrObj.hasFn(OpenMaya.MFn.kEnumAttribute):
+            return 'enum', plug.asShort()
+        if attrObj.hasFn(OpenMaya.MFn.kTypedAttribute):
+            if OpenMaya.MFnTypedAttribute(attrObj).attrType() == OpenMaya.MFnData.kString:
+                value = plug.asString()
+                if value:  # empty strings are returned by cmds as None, leave those to cmds
+                    return 'string', value.decode('utf-8')
+            return
+        if attrObj.hasFn(OpenMaya.MFn.kNumericAttribute):
+            unitType = OpenMaya.MFnNumericAttribute(attrObj).unitType()
+            if unitType in self._numericTypes:
+                attrType, func = self._numericTypes[unitType]
+                return attrType, getattr(plug, func)()
+            if unitType == OpenMaya.MFnNumericData.k3Double:
+                return 'double3', tuple(plug.child(i).asDouble() for i in range(3))
+            if unitType == OpenMaya.MFnNumericData.k3Float:
+                return 'float3', tuple(plug.child(i).asFloat() for i in range(3))
+
+    def snapshot(self, mNode):
+        '''
+        single pass over the dynamic attrs on the node
+        '''
+        self.data = {}
+        mobj = object.__getattribute__(mNode, '_MObject')
+        mfn = OpenMaya.MFnDependencyNode(mobj)
+        for i in range(mfn.attributeCount()):
+            attrObj = mfn.attribute(i)
+            mfnAttr = OpenMaya.MFnAttribute(attrObj)
+            if mfnAttr.isDynamic() is False or mfnAttr.isArray() or not mfnAttr.parent().isNull():
+                continue
+            try:
+                result = self._readPlug(OpenMaya.MPlug(mobj, attrObj), attrObj)
+            except RuntimeError:
+                continue
+            if result:
+                self.data[mfnAttr.name()] = [result[0], result[1], False]
+
+    def read(self, attr, decoder):
+        '''
+        return (True, value) if the attr is held in the snapshot, else (False, None)
+
+        :param decoder: func used to decode string attrs, only run on the first read
+        '''
+        entry = self.data.get(attr)
+        if entry is None:
+            return False, None
+        self.hits += 1
+        if entry[0] == 'string' and not entry[2]:
+            try:
+                entry[1] = decoder(entry[1])
+            except:
+                log.debug('string is not JSON deserializable')
+            entry[2] = True
+        if self.copyComplex:
+            if isinstance(entry[1], LazyDecodeDict):
+                return True, entry[1].lazyCopy()
+            if type(entry[1]) in (dict, list):
+                return True, copy.deepcopy(entry[1])
+        return True, entry[1]
+
+    def invalidate(self, attr=None):
+        '''
+        drop the given attr from the snapshot, or everything if attr is None
+        '''
+        if attr is None:
+            self.data = {}
+        else:
+            self.data.pop(attr, None)
+
+@contextmanager
+def cachedReads(mNodes, copyComplex=True):
+    '''
+    context manager to snapshot the attrs of multiple mNodes in one go, inside the
+    scope all attr reads on those nodes are served from their MetaReadCache
+
+    >>> with r9Meta.cachedReads(mCtrls):
+    >>>     data = [(mCtrl.mirrorSide, mCtrl.mirrorIndex) for mCtrl in mCtrls]
+    '''
+    if issubclass(type(mNodes), MetaClass):
+        mNodes = [mNodes]
+    previous = []
+    for mNode in mNodes:
+        previous.append(object.__getattribute__(mNode, '_readCache'))
+        object.__setattr__(mNode, '_readCache', MetaReadCache(mNode, copyComplex=copyComplex))
+    try:
+        yield
+    finally:
+        for mNode, readCache in zip(mNodes, previous):
+            object.__setattr__(mNode, '_readCache', readCache)
+
+
 class MetaInstanceError(Exception):
     '''
     exception thrown if the mClass object instance is no longer valid
@@ -1640,7 +2510,8 @@ class MetaClass(object):
                    'lockState',
                    '_forceAsMeta',
                    '_lastDagPath',
-                   '_lastUUID']
+                   '_lastUUID',
+                   '_readCache']
 
     def __new__(cls, *args, **kws):
 
@@ -1721,6 +2592,7 @@ class MetaClass(object):
         object.__setattr__(self, '_lastUUID', '')  # . ..NEW...stored on caching of node
         object.__setattr__(self, '_lockState', False)  # by default all mNode's are unlocked, manage this in any subclass if needed
         object.__setattr__(self, '_forceAsMeta', False)  # force all getAttr calls to return mClass objects even for standard Maya nodes
+        object.__setattr__(self, '_readCache', None)  # MetaReadCache snapshot, only bound inside a cachedReads scope
 
         if not node:
 #             if not name:
@@ -2059,6 +2931,27 @@ class MetaClass(object):
     # Attribute Management block
     # -----------------------------------------------------------------------------------
 
+    @contextmanager
+    def cachedReads(self, copyComplex=True):
+        '''
+        context manager that snapshots all the user-defined attrs on this mNode
+        so that attr reads inside the scope don't hit Maya, see MetaReadCache
+
+        >>> with mNode.cachedReads():
+        >>>     for attr in attrs:
+        >>>         data[attr] = getattr(mNode, attr)
+        '''
+        with cachedReads([self], copyComplex=copyComplex):
+            yield object.__getattribute__(self, '_readCache')
+
+    def __invalidateReadCache(self, attr=None):
+        try:
+            readCache = object.__getattribute__(self, '_readCache')
+        except AttributeError:
+            return
+        if readCache is not None:
+            readCache.invalidate(attr)
+
     def __setEnumAttr__(self, attr, value):
         '''
         Enums : I'm allowing you to set value by either the index or the display text
@@ -2098,6 +2991,7 @@ class MetaClass(object):
         object.__setattr__(self, attr, value)
 
         if attr not in MetaClass.UNMANAGED and not attr == 'UNMANAGED':
+            self.__invalidateReadCache(attr)
             if self.hasAttr(attr):
                 locked = False
                 if self.attrIsLocked(attr) and force:
@@ -2211,6 +3105,15 @@ class MetaClass(object):
             # private class attr only
             if attr in MetaClass.UNMANAGED:
                 return data
+            # inside a cachedReads scope serve the value from the snapshot
+            try:
+                readCache = object.__getattribute__(self, '_readCache')
+            except AttributeError:
+                readCache = None
+            if readCache is not None:
+                found, attrVal = readCache.read(attr, self.__deserializeComplex)
+                if found:
+                    return attrVal
             # stops recursion, do not getAttr on mNode here
             mNode = object.__getattribute__(self, "mNode")
             if not mNode or not cmds.objExists(mNode):
@@ -2257,7 +3160,8 @@ class MetaClass(object):
 
     def __serializeComplex(self, data):
         '''
-        Serialize complex data such as dicts to a JSON string
+        Serialize complex data such as dicts to a JSON string, or for large
+        payloads via the registered attribute codecs, see encodeAttrData
 
         Test the len of the string, anything over 32000 (16bit) gets screwed by the
         Maya attribute template and truncated IF you happened to select the string in the
@@ -2265,18 +3169,17 @@ class MetaClass(object):
         bit thanks to MarkJ for that as it was doing my head in!!
         http://markj3d.blogspot.co.uk/2012/11/maya-string-attr-32k-limit.html
         '''
-        if len(data) > 32700:
+        encoded = encodeAttrData(data)
+        if len(encoded) > 32700:
             log.debug('Warning >> Length of string is over 16bit Maya Attr Template limit - lock this after setting it!')
-        return json.dumps(data)
+        return encoded
 
     def __deserializeComplex(self, data):
         '''
-        Deserialize data from a JSON string back to it's original complex data
+        Deserialize data from a JSON or codec encoded string back to it's original complex data
         '''
         # log.debug('deserializing data via JSON')
-        if type(data) == unicode:
-            return json.loads(str(data))
-        return json.loads(data)
+        return decodeAttrData(data)
 
     @nodeLockManager
     def __delattr__(self, attr):
@@ -2284,6 +3187,7 @@ class MetaClass(object):
             if logging_is_debug():
                 log.debug('attribute delete  : %s , %s' % (self, attr))
             object.__delattr__(self, attr)
+            self.__invalidateReadCache(attr)
             if self.hasAttr(attr):
                 cmds.setAttr('%s.%s' % (self.mNode, attr), l=False)
                 cmds.deleteAttr('%s.%s' % (self.mNode, attr))
@@ -2367,12 +3271,14 @@ class MetaClass(object):
         wrap over cmds.renameAttr
         '''
         cmds.renameAttr('%s.%s' % (self.mNode, currentAttr), newName)
+        self.__invalidateReadCache(currentAttr)
 
     @nodeLockManager
     def delAttr(self, attr, force=False):
         '''
         delete a given attr
         '''
+        self.__invalidateReadCache(attr)
         if self.hasAttr(attr):
             try:
                 if force:
@@ -2410,6 +3316,7 @@ class MetaClass(object):
             max values for int is 2,147,483,647 (int32)
         '''
         added = False
+        self.__invalidateReadCache(attr)
         if attrType and attrType == 'enum' and 'enumName' not in kws:
             raise ValueError('enum attrType must be passed with "enumName" keyword in args')
 
@@ -3159,16 +4066,18 @@ class MetaClass(object):
             if not any(['mTypes' in kws, 'mInstances' in kws, mAttrs]):
                 # no flags passed so the stepover flag is redundant
                 stepover = False
+            # one walker for the entire walk so node data is only read once
+            walker = MetaGraphWalker(nTypes=kws.get('nTypes'), source=False, destination=True)
             if stepover:
                 # if we're stepping over unmatched children then we remove the kws and deal with the match later
-                children = getConnectedMetaNodes(self.mNode, source=False, destination=True, dataType='unicode')  # , **kws)
+                children = getConnectedMetaNodes(self.mNode, source=False, destination=True, dataType='unicode', walker=walker)  # , **kws)
             else:
-                children = getConnectedMetaNodes(self.mNode, source=False, destination=True, mAttrs=mAttrs, dataType='unicode', **kws)
+                children = getConnectedMetaNodes(self.mNode, source=False, destination=True, mAttrs=mAttrs, dataType='unicode', walker=walker, **kws)
 
             if children:
                 runaways = 0
                 depth = 0
-                processed = []
+                processed = set()
                 extendedChildren = []
                 while children and runaways <= 1000:
                     for child in children:
@@ -3186,13 +4095,13 @@ class MetaClass(object):
                             continue
                             # log.info('mNode added to metaNodes : %s' % mNode)
                         children.remove(child)
-                        processed.append(mNode)
+                        processed.add(mNode)
                         # log.info( 'connections too : %s' % mNode)
                         if stepover:
                             # if we're stepping over unmatched children then we remove the kws and deal with the match later
-                            extendedChildren.extend(getConnectedMetaNodes(mNode, source=False, destination=True, dataType='unicode'))  # , **kws))
+                            extendedChildren.extend(getConnectedMetaNodes(mNode, source=False, destination=True, dataType='unicode', walker=walker))  # , **kws))
                         else:
-                            extendedChildren.extend(getConnectedMetaNodes(mNode, source=False, destination=True, mAttrs=mAttrs, dataType='unicode', **kws))
+                            extendedChildren.extend(getConnectedMetaNodes(mNode, source=False, destination=True, mAttrs=mAttrs, dataType='unicode', walker=walker, **kws))
                         # log.info('left to process : %s' % ','.join([c.mNode for c in children]))
                         if not children:
                             if extendedChildren:
@@ -3922,6 +4831,13 @@ class MetaRig(MetaClass):
             log.warning('No Mirror Markers found on the rig')
         return self.MirrorClass
 
+    def _mirrorClassValid(self, nodes=None):
+        '''
+        is the cached MirrorClass binding still current, ie its compiled MirrorTable hasn't been
+        invalidated by any mirror markers being edited and, if given, contains all the nodes
+        '''
+        return bool(self.MirrorClass and self.MirrorClass.mirrorTable and self.MirrorClass.mirrorTable.isValid(nodes))
+
     def loadMirrorDataMap(self, mirrorMap):
         '''
         load a mirror setup onto this rig from a stored mirrorMap file
@@ -3952,22 +4868,21 @@ class MetaRig(MetaClass):
         left[4] mirror node and visa versa. Centre controllers pass straight through
 
         :param nodes: nodes to get the opposites from
-        :param forceRefresh: forces the mirrorDic (which is cached) to be updated
+        :param forceRefresh: forces the mirrorDic (which is cached) to be updated. The cache is
+            rebuilt automatically whenever the mirror marker attrs change
         '''
-        if not self.MirrorClass or forceRefresh:
+        nodes = cmds.ls(nodes, l=True)
+        if forceRefresh or not self._mirrorClassValid(nodes):
             self.MirrorClass = self.getMirrorData()
         oppositeNodes = []
+        table = self.MirrorClass.mirrorTable
+        if not table:
+            return oppositeNodes
 
         for node in nodes:
-            side = self.MirrorClass.getMirrorSide(node)
-            if not side:
-                continue
-            if side == 'Left':
-                oppositeNodes.append(self.MirrorClass.mirrorDict['Right'][str(self.MirrorClass.getMirrorIndex(node))]['node'])
-            if side == 'Right':
-                oppositeNodes.append(self.MirrorClass.mirrorDict['Left'][str(self.MirrorClass.getMirrorIndex(node))]['node'])
-            if side == 'Centre':
-                oppositeNodes.append(node)
+            opposite = table.opposite(node)
+            if opposite:
+                oppositeNodes.append(opposite)
         return oppositeNodes
 
     def getMirror_ctrlSets(self, set='Centre', forceRefresh=False):
@@ -3984,7 +4899,7 @@ class MetaRig(MetaClass):
 #             ctrls.extend(node.getChildren())
 #         return ctrls
         ctrls = []
-        if not self.MirrorClass or forceRefresh:
+        if forceRefresh or not self._mirrorClassValid():
             self.MirrorClass = self.getMirrorData()
         for _, value in self.MirrorClass.mirrorDict[set].items():
             ctrls.append(value['node'])
@@ -3997,7 +4912,7 @@ class MetaRig(MetaClass):
         :param side: side to check, valid = 'Left' ,'Right', 'Centre'
         :param forceRefresh: forces the mirrorDic (which is cached) to be updated
         '''
-        if not self.MirrorClass or forceRefresh:
+        if forceRefresh or not self._mirrorClassValid():
             self.MirrorClass = self.getMirrorData()
         if side in self.MirrorClass.mirrorDict.keys() and self.MirrorClass.mirrorDict[side]:
             return max([int(m) for m in self.MirrorClass.mirrorDict[side].keys()])
@@ -4019,7 +4934,7 @@ class MetaRig(MetaClass):
         :param nodes: nodes to mirror, if None then we process the entire rig
         :param mode: either 'Anim' or 'Pose'
         '''
-        if not self.MirrorClass:
+        if not self._mirrorClassValid():
             self.MirrorClass = self.getMirrorData()
         self.MirrorClass.mirrorData(nodes, mode)
 
@@ -5563,9 +6478,19 @@ if not RED9_META_CALLBACKS['Open']:
 if not RED9_META_CALLBACKS['New']:
     RED9_META_CALLBACKS['New'].append(OpenMaya.MSceneMessage.addCallback(OpenMaya.MSceneMessage.kBeforeNew, metaData_sceneCleanups))
 
-# if r9Setup.mayaVersion()<=2015:
-#     #dulplicate cache callbacks so the UUIDs are managed correctly
-#     if not RED9_META_CALLBACKS['DuplicatePre']:
-#         RED9_META_CALLBACKS['DuplicatePre'].append(OpenMaya.MModelMessage.addBeforeDuplicateCallback(__preDuplicateCache))
-#     if not RED9_META_CALLBACKS['DuplicatePost']:
-#         RED9_META_CALLBACKS['DuplicatePost'].append(OpenMaya.MModelMessage.addAfterDuplicateCallback(__poseDuplicateCache))
+
+# Node level callbacks to keep the cache in sync rather than polling it
+for _cbKey in ['NodeRemoved', 'NameChanged', 'DuplicatePre', 'DuplicatePost']:
+    RED9_META_CALLBACKS.setdefault(_cbKey, [])
+if not RED9_META_CALLBACKS['NodeRemoved']:
+    RED9_META_CALLBACKS['NodeRemoved'].append(OpenMaya.MDGMessage.addNodeRemovedCallback(__nodeRemovedCache, 'dependNode'))
+if not RED9_META_CALLBACKS['NameChanged']:
+    RED9_META_CALLBACKS['NameChanged'].append(OpenMaya.MNodeMessage.addNameChangedCallback(OpenMaya.MObject(), __nodeRenamedCache))
+
+if r9Setup.mayaVersion() <= 2015:
+    # duplicate cache callbacks so the UUIDs are managed correctly, from 2016
+    # Maya generates a fresh native UUID on duplicate so these aren't needed
+    if not RED9_META_CALLBACKS['DuplicatePre']:
+        RED9_META_CALLBACKS['DuplicatePre'].append(OpenMaya.MModelMessage.addBeforeDuplicateCallback(__preDuplicateCache))
+    if not RED9_META_CALLBACKS['DuplicatePost']:
+        RED9_META_CALLBACKS['DuplicatePost'].append(OpenMaya.MModelMessage.addAfterDuplicateCallback(__poseDuplicateCache))
@@ -0,0 +1,327 @@
+'''
+..
+    Red9 Studio Pack: Maya Pipeline Solutions
+    Author: Mark Jackson
+    email: rednineinfo@gmail.com
+
+    Red9 blog : http://red9-consultancy.blogspot.co.uk/
+    MarkJ blog: http://markj3d.blogspot.co.uk
+
+
+Array based pose comparison, the engine behind r9Pose.PoseCompare. Rather than walking
+the nested pose dicts and testing each attr in turn, both poses are flattened, for the
+matched node keys, into aligned value arrays with one slot per node.attr. All the linear
+and angular deltas are then worked out in a single pass over those arrays and the result
+is a structured diff, max / mean error per node and the list of out of tolerance attrs,
+that CI jobs can dump straight to JSON.
+
+.. note::
+    this module is free of any Maya imports so poses saved in any of the DataMap
+    formats, 'config', 'json' or 'binary', can be compared from a standard python shell:
+
+    >>> python Red9_PoseDiff.py current.pose reference.pose
+    >>> python Red9_PoseDiff.py current.pose reference.pose --block skeletonDict --report diff.json
+'''
+
+from __future__ import print_function
+
+import sys
+import ast
+import json
+import struct
+from array import array
+
+import Red9_ConfigIO as r9ConfigIO
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+POSE_BINARY_MAGIC = 'r9POSEB1'  # matches Red9_PoseSaver.BINARY_POSE_MAGIC
+ANGULAR_ATTRS = ['rotateX', 'rotateY', 'rotateZ', 'jointOrientX', 'jointOrientY', 'jointOrientZ']
+
+
+def decodeValue(val):
+    '''
+    attr values come back from ConfigObj as strings, decode them the same way
+    r9Core.decodeString does so the compare keeps PoseCompare's old semantics.
+    Lists, tuples and dicts are decoded with ast.literal_eval rather than eval and,
+    as decodeString, anything that fails to decode, or an empty string, is None
+    '''
+    if not isinstance(val, basestring):
+        return val
+    if not val:
+        return None
+    if val in ['True', 'False', 'None']:
+        return {'True': True, 'False': False, 'None': None}[val]
+    if (val[0], val[-1]) in [('[', ']'), ('(', ')'), ('{', '}')]:
+        try:
+            return ast.literal_eval(val)
+        except (ValueError, SyntaxError):
+            return None
+    for cast in (int, float):
+        try:
+            return cast(val)
+        except ValueError:
+            pass
+    return val
+
+def stripNamespaces(dagpath):
+    '''
+    remove the namespaces from every node in a dagpath
+    '''
+    return '|'.join(node.split(':')[-1] for node in dagpath.split('|'))
+
+def readPoseBlocks(filepath):
+    '''
+    read the poseData, skeletonDict and info blocks from a pose file. Handles the
+    'config', 'json' and 'binary' DataMap formats.
+
+    :return: {'poseDict': {}, 'skeletonDict': {}, 'infoDict': {}}
+    '''
+    blocks = {'poseDict': {}, 'skeletonDict': {}, 'infoDict': {}}
+    with open(filepath, 'rb') as f:
+        if f.read(len(POSE_BINARY_MAGIC)) == POSE_BINARY_MAGIC:
+            # see Red9_PoseSaver.PoseBinaryFile for the layout
+            length = struct.unpack('<I', f.read(4))[0]
+            header = json.loads(f.read(length))
+            buf = f.read()
+            attrTable = header['attrTable']
+            for key, nodeData, extras, offset, count, world in header['nodes']:
+                indices = array('I')
+                indices.fromstring(buf[offset:offset + count * 4])
+                kinds = buf[offset + count * 4:offset + count * 5]
+                values = array('d')
+                values.fromstring(buf[offset + count * 5:offset + count * 13])
+                if sys.byteorder == 'big':
+                    indices.byteswap()
+                    values.byteswap()
+                casts = {0: float, 1: int, 2: bool}
+                attrs = dict((attrTable[index], casts[ord(kinds[i])](values[i])) for i, index in enumerate(indices))
+                attrs.update((attr, val) for attr, val in extras.items() if not attr == 'attrs_kWorld')
+                blocks['poseDict'][key] = dict(nodeData, attrs=attrs)
+            blocks['skeletonDict'] = header.get('skeletonDict', {})
+            blocks['infoDict'] = header.get('info', {})
+            return blocks
+
+    with open(filepath, 'r') as f:
+        isJson = f.read(256).lstrip().startswith('{')
+    if isJson:
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+    else:
+        data = r9ConfigIO.read(filepath, encoding='utf-8')
+    blocks['poseDict'] = data.get('poseData', {})
+    blocks['skeletonDict'] = data.get('skeletonDict', {})
+    blocks['infoDict'] = data.get('info', {})
+    return blocks
+
+def _gimbalError(delta):
+    '''
+    angular error allowing for gimbal equivalent values, the same test as
+    r9Core.floatIsEqual(allowGimbal=True), the delta is also accepted at a
+    multiple of 180 and at an odd multiple of 90
+    '''
+    mod = delta % 180.0
+    return min(delta, mod, abs(180.0 - mod), abs(90.0 - mod))
+
+
+class PoseDiff(object):
+    '''
+    Compare 2 poses, either pose files or the node dicts (poseDict / skeletonDict)
+    themselves, and build a structured diff of the results.
+
+    >>> diff = PoseDiff('current.pose', 'reference.pose')
+    >>> diff.compare()  # >> bool, True = same
+    >>> diff.report['nodes']['L_Wrist_Ctrl']  # {'maxError':, 'meanError':, 'attrs':, 'failed':}
+    >>> diff.report['failedAttrs']  # [{'node':, 'attr':, 'current':, 'reference':, 'error':, 'tolerance':}]
+
+    After compare() the flattened data is left on the instance, self.slots holds the
+    (key, attr) of each array slot, self.current / self.reference the values and
+    self.errors the per slot error.
+    '''
+    def __init__(self, currentPose, referencePose, angularTolerance=0.1, linearTolerance=0.01,
+                 compareDict='poseDict', filterMap=[], ignoreStrings=[], ignoreAttrs=[], longName=False,
+                 angularAttrs=None):
+        '''
+        :param currentPose: pose filepath or node dict
+        :param referencePose: pose filepath or node dict
+        :param angularTolerance: tolerance used for the angularAttrs
+        :param linearTolerance: tolerance used for all the other float attrs
+        :param compareDict: the block compared when given pose files, 'poseDict' or 'skeletonDict'
+        :param filterMap: if given only these keys are compared
+        :param ignoreStrings: skip keys containing any of these strings
+        :param ignoreAttrs: attrs to skip
+        :param longName: compare the longName dagpaths of the nodes, namespaces stripped
+        :param angularAttrs: attrs compared as angles, with gimbal handling, default ANGULAR_ATTRS
+        '''
+        self.compareDict = compareDict
+        self.angularTolerance = angularTolerance
+        self.linearTolerance = linearTolerance
+        self.angularAttrs = angularAttrs if angularAttrs is not None else ANGULAR_ATTRS
+        self.filterMap = filterMap
+        self.ignoreStrings = ignoreStrings
+        self.ignoreAttrs = ignoreAttrs
+        self.longName = longName
+        self.currentDict = self._nodeDict(currentPose)
+        self.referenceDict = self._nodeDict(referencePose)
+        self.report = {}
+
+    def _nodeDict(self, pose):
+        if isinstance(pose, basestring):
+            return readPoseBlocks(pose)[self.compareDict]
+        return pose
+
+    def _skipKey(self, key):
+        if self.filterMap and key not in self.filterMap:
+            return True
+        return any(istr in key for istr in self.ignoreStrings)
+
+    def flatten(self):
+        '''
+        build the aligned arrays for all the float attrs of the matched keys, anything that
+        can't go in the arrays is tested directly and recorded in the report
+        '''
+        report = self.report
+        self.slots = []
+        self.current = array('d')
+        self.reference = array('d')
+        self.angular = array('B')
+        for key in sorted(self.currentDict.keys()):
+            if self._skipKey(key):
+                continue
+            if key not in self.referenceDict:
+                report['missingKeys'].append(key)
+                continue
+            block = self.currentDict[key]
+            refBlock = self.referenceDict[key]
+            if self.longName and 'longName' in block and 'longName' in refBlock:
+                if not stripNamespaces(block['longName']) == stripNamespaces(refBlock['longName']):
+                    report['dagMismatch'].append(key)
+            if 'attrs' not in block:
+                continue
+            refAttrs = refBlock.get('attrs', {})
+            for attr, value in block['attrs'].items():
+                if attr in self.ignoreAttrs:
+                    continue
+                if attr not in refAttrs:
+                    report['missingAttrs'].setdefault(key, []).append(attr)
+                    continue
+                value = decodeValue(value)
+                refValue = decodeValue(refAttrs[attr])
+                # as PoseCompare, only float data is compared with tolerance
+                if type(value) == float and isinstance(refValue, (float, int, long)) and not isinstance(refValue, bool):
+                    self.slots.append((key, attr))
+                    self.current.append(value)
+                    self.reference.append(refValue)
+                    self.angular.append(attr in self.angularAttrs)
+                elif not value == refValue:
+                    report['failedAttrs'].append({'node': key, 'attr': attr, 'current': value,
+                                                  'reference': refValue, 'error': None, 'tolerance': None})
+
+    def compare(self):
+        '''
+        run the compare, returns True if the poses match, the details are in self.report
+        '''
+        self.report = {'compareDict': self.compareDict,
+                       'missingKeys': [],
+                       'missingAttrs': {},
+                       'dagMismatch': [],
+                       'failedAttrs': [],
+                       'nodes': {}}
+        self.flatten()
+        report = self.report
+
+        # all the deltas in one pass, angular slots then get the gimbal test
+        self.errors = array('d', map(lambda a, b: abs(a - b), self.current, self.reference))
+        tolerances = (self.linearTolerance, self.angularTolerance)
+        for i, angular in enumerate(self.angular):
+            if angular:
+                self.errors[i] = _gimbalError(self.errors[i])
+
+        maxErrors = [0.0, 0.0]
+        nodes = report['nodes']
+        for i, (key, attr) in enumerate(self.slots):
+            error = self.errors[i]
+            angular = self.angular[i]
+            if error > maxErrors[angular]:
+                maxErrors[angular] = error
+            if key not in nodes:
+                nodes[key] = {'maxError': 0.0, 'meanError': 0.0, 'attrs': 0, 'failed': 0}
+            node = nodes[key]
+            node['attrs'] += 1
+            node['meanError'] += error
+            if error > node['maxError']:
+                node['maxError'] = error
+            if not error < tolerances[angular]:
+                node['failed'] += 1
+                report['failedAttrs'].append({'node': key, 'attr': attr, 'current': self.current[i],
+                                              'reference': self.reference[i], 'error': error,
+                                              'tolerance': tolerances[angular]})
+        for node in nodes.values():
+            node['meanError'] /= node['attrs']
+        for failed in report['failedAttrs']:
+            if failed['error'] is None:
+                nodes.setdefault(failed['node'], {'maxError': 0.0, 'meanError': 0.0, 'attrs': 0, 'failed': 0})
+                nodes[failed['node']]['failed'] += 1
+
+        report['compared'] = len(self.slots)
+        report['maxLinearError'] = maxErrors[0]
+        report['maxAngularError'] = maxErrors[1]
+        report['status'] = not any([report['missingKeys'], report['missingAttrs'],
+                                    report['dagMismatch'], report['failedAttrs']])
+        return report['status']
+
+    def printReport(self, limit=20):
+        '''
+        print a summary of the diff, the worst nodes first
+        '''
+        report = self.report
+        print('PoseDiff : %s : %s : %i attrs compared, max linear error %f, max angular error %f' %
+              (report['compareDict'], 'PASSED' if report['status'] else 'FAILED', report['compared'],
+               report['maxLinearError'], report['maxAngularError']))
+        for key in report['missingKeys']:
+            print('\tmissing key : %s' % key)
+        for key in report['dagMismatch']:
+            print('\thierarchy mismatch : %s' % key)
+        for key, attrs in sorted(report['missingAttrs'].items()):
+            print('\tmissing attrs : %s : %s' % (key, ', '.join(sorted(attrs))))
+        failedNodes = sorted([key for key, node in report['nodes'].items() if node['failed']],
+                             key=lambda key: report['nodes'][key]['maxError'], reverse=True)
+        for key in failedNodes[:limit]:
+            node = report['nodes'][key]
+            print('\t%s : %i / %i attrs failed, max error %f, mean error %f' %
+                  (key, node['failed'], node['attrs'], node['maxError'], node['meanError']))
+        if len(failedNodes) > limit:
+            print('\t... %i more failed nodes' % (len(failedNodes) - limit))
+
+
+def main(args=None):
+    '''
+    command line entry point, compare 2 pose files, returns 0 if they match
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Red9 pose compare')
+    parser.add_argument('current', help='pose file to test')
+    parser.add_argument('reference', help='pose file to test against')
+    parser.add_argument('--block', default='poseDict', choices=['poseDict', 'skeletonDict'])
+    parser.add_argument('--angularTolerance', type=float, default=0.1)
+    parser.add_argument('--linearTolerance', type=float, default=0.01)
+    parser.add_argument('--longName', action='store_true', help='also compare the node dagpaths')
+    parser.add_argument('--report', default=None, help='write the full diff to this JSON file')
+    parsed = parser.parse_args(args)
+
+    diff = PoseDiff(parsed.current, parsed.reference, angularTolerance=parsed.angularTolerance,
+                    linearTolerance=parsed.linearTolerance, compareDict=parsed.block, longName=parsed.longName)
+    status = diff.compare()
+    diff.printReport()
+    if parsed.report:
+        with open(parsed.report, 'w') as f:
+            json.dump(diff.report, f, indent=4)
+    return 0 if status else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,581 @@
+'''
+..
+    Red9 Studio Pack: Maya Pipeline Solutions
+    Author: Mark Jackson
+    email: rednineinfo@gmail.com
+
+    Red9 blog : http://red9-consultancy.blogspot.co.uk/
+    MarkJ blog: http://markj3d.blogspot.co.uk
+
+
+Persistent on-disk index for pose libraries. The pose UI's used to re-list and
+re-stat the pose directories on every refresh, and any metadata shown had to be read
+back from the pose files themselves. Here each pose root gets a small SQLite catalog
+holding the path, mtime, size, metaRig identity, node list, info block and thumbnail
+of every .pose file under it. The catalog is updated incrementally, only files whose
+stat has changed are re-read, and all the searching and sorting is run against the
+catalog without touching the pose files.
+
+Browsing a library from the UI never writes into the pose folders themselves, new
+indexes go into a per user cache in the temp dir. Studio libraries can share a single
+index by building it in the library root, either with the command line update below
+or by setting POSE_INDEX_IN_LIBRARY, any index found in a pose folder or its parents
+is then used by everyone. If that shared index isn't writable for the user it falls
+back to their local cache.
+
+.. note::
+    this module is deliberately free of any Maya imports so that libraries can be
+    rebuilt or verified from a standard python shell or a farm job:
+
+    >>> python Red9_PoseIndex.py update P:/poses/Rigs
+    >>> python Red9_PoseIndex.py verify P:/poses/Rigs
+    >>> python Red9_PoseIndex.py search P:/poses/Rigs "^walk,run" --sort date
+'''
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import json
+import time
+import getpass
+import struct
+import hashlib
+import sqlite3
+import tempfile
+
+import Red9_ConfigIO as r9ConfigIO
+
+import logging
+logging.basicConfig()
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+POSE_INDEX_FILENAME = '.r9PoseIndex.db'
+POSE_INDEX_VERSION = 1
+POSE_EXT = '.pose'
+POSE_THUMB_EXT = '.bmp'
+POSE_BINARY_MAGIC = 'r9POSEB1'  # matches Red9_PoseSaver.BINARY_POSE_MAGIC
+
+# build new indexes in the pose library rather than the users cache, opt-in as this
+# writes a POSE_INDEX_FILENAME into every pose folder browsed that isn't already indexed
+POSE_INDEX_IN_LIBRARY = False
+
+# searchFilter terms the index can run, anything else is regex for r9Core.filterListByString
+POSE_INDEX_SEARCHTERM = re.compile(r'^\^?[\w\-]*$')
+
+# indexed info block fields, these get their own columns for searching
+POSE_INDEX_INFOKEYS = ['author', 'date', 'metaRigNode', 'metaRigNodeID', 'rigType', 'version']
+
+# open indexes, keyed by the index filepath
+global RED9_POSE_INDEXES
+RED9_POSE_INDEXES = {}
+
+
+def _sortNumerically(data, key=None):
+    '''
+    human sort, matching r9Core.sortNumerically used in the pose UI's
+    '''
+    convert = lambda text: int(text) if text.isdigit() else text
+    if not key:
+        key = lambda x: x
+    return sorted(data, key=lambda x: [convert(c) for c in re.split('([0-9]+)', key(x))])
+
+def readPoseHeader(filepath):
+    '''
+    read the info block and node list from a pose file without parsing the
+    poseData itself. Handles the 'config', 'json' and 'binary' DataMap formats.
+
+    :param filepath: pose file to read
+    :return: (infoDict, nodes)
+    '''
+    with open(filepath, 'rb') as f:
+        if f.read(len(POSE_BINARY_MAGIC)) == POSE_BINARY_MAGIC:
+            # binary header, see Red9_PoseSaver.PoseBinaryFile
+            length = struct.unpack('<I', f.read(4))[0]
+            header = json.loads(f.read(length))
+            return dict(header.get('info', {})), [node[0] for node in header['nodes']]
+
+    with open(filepath, 'r') as f:
+        first = f.read(256).lstrip()
+        f.seek(0)
+        if first.startswith('{'):
+            data = json.load(f)
+            return data.get('info', {}), sorted(data.get('poseData', {}).keys())
+
+        header = []
+        nodes = []
+        section = None
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith('[') and not stripped.startswith('[['):
+                section = stripped.strip('[]').strip('"\'')
+                if section not in ['info', 'filterNode_settings', 'poseData']:
+                    # skeletonDict / hikDict blocks after the poseData, we're done
+                    break
+            if section == 'poseData':
+                # only the first level subsections, the node keys
+                if stripped.startswith('[[') and not stripped.startswith('[[['):
+                    nodes.append(stripped.strip('[]').strip('"\''))
+            elif section == 'info':
+                header.append(line.rstrip('\r\n'))
+    info = {}
+    if header:
+        info = r9ConfigIO.parse(header, encoding='utf-8').get('info', {})
+    return info, nodes
+
+def cachedIndexPath(poseRoot):
+    '''
+    the users local index filepath for the given pose root, used when the index
+    can't, or shouldn't, be written into the pose library itself
+    '''
+    poseRoot = os.path.abspath(poseRoot)
+    if isinstance(poseRoot, unicode):
+        poseRoot = poseRoot.encode('utf-8')
+    return os.path.join(tempfile.gettempdir(), 'r9PoseIndex_%s_%s.db' %
+                        (getpass.getuser(), hashlib.md5(poseRoot).hexdigest()))
+
+def _findPoseIndex(posePath):
+    '''
+    (poseRoot, indexPath) of the index covering the posePath, checking the library
+    then the users cache at each level up the directories, else (None, None)
+    '''
+    path = os.path.abspath(posePath)
+    while True:
+        for indexPath in [os.path.join(path, POSE_INDEX_FILENAME), cachedIndexPath(path)]:
+            if os.path.exists(indexPath):
+                return path, indexPath
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None, None
+        path = parent
+
+def findPoseIndex(posePath):
+    '''
+    return the index filepath that covers the given posePath, walking up the directories
+    until we find an existing index, either in the library or the users cache, else None
+
+    :param posePath: pose directory
+    '''
+    return _findPoseIndex(posePath)[1]
+
+def getPoseIndex(posePath, create=True):
+    '''
+    return the PoseLibraryIndex object that covers the given posePath, if no index is found
+    in the posePath or any of its parent folders, one is made for the posePath in the
+    users cache, or in the posePath itself if POSE_INDEX_IN_LIBRARY is set
+
+    :param posePath: pose directory
+    :param create: if no index exists make one rooted at the posePath
+    :return: (PoseLibraryIndex, folder) where folder is the posePath relative to the index root
+    '''
+    root, indexPath = _findPoseIndex(posePath)
+    if not root:
+        if not create:
+            return None, None
+        root = os.path.abspath(posePath)
+        if not POSE_INDEX_IN_LIBRARY:
+            indexPath = cachedIndexPath(root)
+    index = PoseLibraryIndex(root, indexPath=indexPath)
+    if index.indexPath in RED9_POSE_INDEXES:
+        index = RED9_POSE_INDEXES[index.indexPath]
+    else:
+        RED9_POSE_INDEXES[index.indexPath] = index
+    folder = os.path.relpath(os.path.abspath(posePath), index.poseRoot).replace('\\', '/')
+    if folder == '.':
+        folder = ''
+    return index, folder
+
+def listPoses(posePath, sortBy='name'):
+    '''
+    the pose UI's list call, returns the pose names (no extension) in the given posePath
+    from the covering index, syncing just that folder first. If the index can't be
+    used we fall back to a straight directory listing.
+
+    :param posePath: pose directory to list
+    :param sortBy: 'name' (human numeric sort) or 'date' (newest first)
+    '''
+    try:
+        index, folder = getPoseIndex(posePath)
+        index.update(folder=folder, recursive=False)
+        return index.poseNames(folder=folder, sortBy=sortBy)
+    except sqlite3.Error, err:
+        log.warning('PoseIndex : index failed, reverting to a directory listing : %s' % err)
+    files = [f for f in os.listdir(posePath) if f.lower().endswith(POSE_EXT)]
+    if sortBy == 'date':
+        files.sort(key=lambda x: os.stat(os.path.join(posePath, x)).st_mtime, reverse=True)
+    else:
+        files = _sortNumerically(files)
+    return [os.path.splitext(f)[0] for f in files]
+
+def isIndexFilter(searchFilter):
+    '''
+    can the searchFilter be run on the index, plain comma separated search strings with
+    an optional '^' prefix. Anything else is regex that's left to r9Core.filterListByString
+    '''
+    return all(POSE_INDEX_SEARCHTERM.match(term) for term in searchFilter.split(','))
+
+def searchPoses(posePath, searchFilter, sortBy='name'):
+    '''
+    the pose UI's search call, the pose names in the given posePath matching the
+    searchFilter, see PoseLibraryIndex.search. Runs on the index as last synced by
+    listPoses so no files are touched, falls back to the directory listing if the
+    index can't be used.
+
+    :param posePath: pose directory to search
+    :param searchFilter: comma separated search strings, see isIndexFilter
+    :param sortBy: 'name', 'date' or None
+    '''
+    try:
+        index, folder = getPoseIndex(posePath)
+        return index.poseNames(folder=folder, searchFilter=searchFilter, sortBy=sortBy)
+    except sqlite3.Error, err:
+        log.warning('PoseIndex : index failed, reverting to a directory listing : %s' % err)
+    terms = [term.upper() for term in searchFilter.replace(' ', '').split(',') if term]
+    return [pose for pose in listPoses(posePath, sortBy=sortBy or 'name') if not terms or
+            any(pose.upper().startswith(term[1:]) if term.startswith('^') else term in pose.upper()
+                for term in terms)]
+
+
+class PoseLibraryIndex(object):
+    '''
+    SQLite backed catalog of all the pose files under a given pose root.
+
+    >>> index = PoseLibraryIndex('P:/poses/Rigs')
+    >>> index.update()  # stat diff the library, re-reading only changed poses
+    >>> {'added': 2, 'updated': 1, 'removed': 0, 'unchanged': 14205}
+    >>> index.poseNames(folder='Hands', searchFilter='^fist,grab', sortBy='date')
+    >>> ['fist_tight', 'grab_01', 'fist_loose']
+    >>> index.getPose('Hands/fist_tight.pose')['nodes']
+
+    .. note::
+        by default the index file is written into the pose root, if that or the index
+        isn't writable (read-only studio libraries) we fall back to a per user index
+        in the temp dir, see cachedIndexPath
+    '''
+    def __init__(self, poseRoot, indexPath=None):
+        self.poseRoot = os.path.abspath(poseRoot)
+        if not indexPath:
+            indexPath = os.path.join(self.poseRoot, POSE_INDEX_FILENAME)
+            if not os.access(self.poseRoot, os.W_OK) and not os.path.exists(indexPath):
+                indexPath = cachedIndexPath(self.poseRoot)
+        self.indexPath = indexPath
+        self._conn = None
+
+    def __repr__(self):
+        return '%s(poseRoot=%s)' % (self.__class__.__name__, self.poseRoot)
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            try:
+                self._connect()
+            except sqlite3.OperationalError, err:
+                # shared index we can't write to, or a read-only share
+                cached = cachedIndexPath(self.poseRoot)
+                if self.indexPath == cached:
+                    raise
+                log.warning('PoseIndex : index not writable, using the local cache : %s : %s' % (self.indexPath, err))
+                if self._conn is not None:
+                    self._conn.close()
+                self.indexPath = cached
+                self._connect()
+        return self._conn
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self.indexPath)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.text_factory = str
+        self._initTables()
+
+    def _initTables(self):
+        cursor = self._conn.cursor()
+        cursor.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        cursor.execute("SELECT value FROM meta WHERE key='version'")
+        row = cursor.fetchone()
+        if row and int(row[0]) != POSE_INDEX_VERSION:
+            log.info('PoseIndex : version mismatch, rebuilding index : %s' % self.indexPath)
+            cursor.execute('DROP TABLE IF EXISTS poses')
+        cursor.execute('''CREATE TABLE IF NOT EXISTS poses (
+                            path TEXT PRIMARY KEY, folder TEXT, name TEXT,
+                            mtime REAL, size INTEGER, thumbnail TEXT,
+                            author TEXT, date TEXT, metaRigNode TEXT, metaRigNodeID TEXT,
+                            rigType TEXT, version TEXT, nodes TEXT, info TEXT)''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS poses_folder ON poses (folder)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS poses_name ON poses (name)')
+        cursor.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(POSE_INDEX_VERSION),))
+        self._conn.commit()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        for key, index in RED9_POSE_INDEXES.items():
+            if index is self:
+                RED9_POSE_INDEXES.pop(key)
+
+    # Disk scanning ---------------------------------------------------------------
+
+    def _relPath(self, filepath):
+        return os.path.relpath(filepath, self.poseRoot).replace('\\', '/')
+
+    def scanDisk(self, folder='', recursive=True):
+        '''
+        stat all the pose files on disk
+
+        :param folder: sub folder relative to the poseRoot to scan
+        :param recursive: walk the sub folders
+        :return: {relpath: (mtime, size, thumbnail)}
+        '''
+        found = {}
+        start = os.path.join(self.poseRoot, folder) if folder else self.poseRoot
+        for root, dirs, files in os.walk(start):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            thumbs = set([f for f in files if f.lower().endswith(POSE_THUMB_EXT)])
+            for f in files:
+                if not f.lower().endswith(POSE_EXT):
+                    continue
+                filepath = os.path.join(root, f)
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    continue
+                thumb = '%s%s' % (os.path.splitext(f)[0], POSE_THUMB_EXT)
+                found[self._relPath(filepath)] = (stat.st_mtime, stat.st_size,
+                                                  self._relPath(os.path.join(root, thumb)) if thumb in thumbs else '')
+            if not recursive:
+                break
+        return found
+
+    def _indexed(self, folder='', recursive=True):
+        '''
+        {relpath: (mtime, size, thumbnail)} of the currently indexed poses
+        '''
+        query = 'SELECT path, mtime, size, thumbnail FROM poses'
+        args = ()
+        if folder or not recursive:
+            if recursive:
+                query += " WHERE folder = ? OR folder LIKE ? ESCAPE '\\'"
+                args = (folder, '%s/%%' % self._escapeLike(folder))
+            else:
+                query += ' WHERE folder = ?'
+                args = (folder,)
+        return dict((row[0], (row[1], row[2], row[3])) for row in self.conn.execute(query, args))
+
+    def _readPoseRow(self, path, mtime, size, thumbnail):
+        try:
+            info, nodes = readPoseHeader(os.path.join(self.poseRoot, path))
+        except StandardError, err:
+            log.warning('PoseIndex : failed to read pose header : %s : %s' % (path, err))
+            info, nodes = {}, []
+        folder, name = os.path.split(path)
+        row = [path, folder, os.path.splitext(name)[0], mtime, size, thumbnail]
+        row.extend([unicode(info.get(key, '')) for key in POSE_INDEX_INFOKEYS])
+        row.extend([json.dumps(nodes), json.dumps(info)])
+        return row
+
+    def update(self, folder='', recursive=True, force=False):
+        '''
+        bring the index in sync with the disk. Files are stat'd and only those whose
+        mtime or size have changed, or are new, are re-read
+
+        :param folder: sub folder relative to the poseRoot to sync, default is the entire library
+        :param recursive: sync the sub folders of the given folder
+        :param force: re-read all the pose files regardless of their stat
+        :return: dict of counts {'added', 'updated', 'removed', 'unchanged'}
+        '''
+        start = time.time()
+        folder = folder.replace('\\', '/').strip('/')
+        ondisk = self.scanDisk(folder, recursive)
+        indexed = self._indexed(folder, recursive)
+        report = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+
+        rows = []
+        for path, stat in ondisk.items():
+            current = indexed.get(path)
+            if current and not force and current[0] == stat[0] and current[1] == stat[1]:
+                if current[2] != stat[2]:
+                    # thumbnail added or removed, no need to re-read the pose
+                    self.conn.execute('UPDATE poses SET thumbnail=? WHERE path=?', (stat[2], path))
+                report['unchanged'] += 1
+                continue
+            report['updated' if current else 'added'] += 1
+            rows.append(self._readPoseRow(path, *stat))
+        removed = [(path,) for path in indexed if path not in ondisk]
+        report['removed'] = len(removed)
+
+        if rows:
+            self.conn.executemany('INSERT OR REPLACE INTO poses VALUES (%s)' % ','.join(['?'] * 14), rows)
+        if removed:
+            self.conn.executemany('DELETE FROM poses WHERE path=?', removed)
+        self.conn.commit()
+        log.debug('PoseIndex : update %s : %s : %0.3fs' % (self.poseRoot, report, time.time() - start))
+        return report
+
+    def rebuild(self):
+        '''
+        clear and rebuild the entire index
+        '''
+        self.conn.execute('DELETE FROM poses')
+        self.conn.commit()
+        return self.update(force=True)
+
+    def verify(self, folder='', recursive=True):
+        '''
+        compare the index to the disk WITHOUT modifying it
+
+        :return: dict {'missing': [], 'stale': [], 'removed': []} where missing are poses on disk
+            not in the index, stale are indexed poses changed on disk and removed are indexed
+            poses no longer on disk
+        '''
+        folder = folder.replace('\\', '/').strip('/')
+        ondisk = self.scanDisk(folder, recursive)
+        indexed = self._indexed(folder, recursive)
+        return {'missing': sorted([path for path in ondisk if path not in indexed]),
+                'stale': sorted([path for path, stat in ondisk.items()
+                                 if path in indexed and indexed[path] != stat]),
+                'removed': sorted([path for path in indexed if path not in ondisk])}
+
+    # Searching ---------------------------------------------------------------
+
+    @staticmethod
+    def _escapeLike(text):
+        return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    def _rowToDict(self, row):
+        data = dict(zip(row.keys(), row))
+        data['nodes'] = json.loads(data['nodes'])
+        data['info'] = json.loads(data['info'])
+        data['filepath'] = os.path.join(self.poseRoot, data['path'])
+        return data
+
+    def search(self, searchFilter=None, folder='', recursive=False, sortBy='name', metaRig=None,
+               fields=('name',), columns=None):
+        '''
+        search the index, no pose files are touched
+
+        :param searchFilter: comma separated search strings, substring match by default,
+            a '^' prefix makes that term a prefix match. Matching is case insensitive
+        :param folder: sub folder relative to the poseRoot
+        :param recursive: include poses in sub folders of the given folder
+        :param sortBy: 'name' (human numeric sort), 'date' (newest first), 'size' or None
+        :param metaRig: only return poses saved from this metaRig, matched against
+            either the stored metaRigNode or metaRigNodeID
+        :param fields: indexed columns the searchFilter is run against, ie ('name', 'author', 'rigType')
+        :param columns: columns to return, default is all
+        :return: list of dicts, one per pose
+        '''
+        where = []
+        args = []
+        folder = folder.replace('\\', '/').strip('/')
+        if recursive:
+            if folder:
+                where.append("(folder = ? OR folder LIKE ? ESCAPE '\\')")
+                args.extend([folder, '%s/%%' % self._escapeLike(folder)])
+        else:
+            where.append('folder = ?')
+            args.append(folder)
+        if searchFilter:
+            terms = []
+            for term in searchFilter.replace(' ', '').split(','):
+                if not term:
+                    continue
+                pattern = '%s%%' % self._escapeLike(term[1:]) if term.startswith('^') \
+                          else '%%%s%%' % self._escapeLike(term)
+                for field in fields:
+                    terms.append("%s LIKE ? ESCAPE '\\'" % field)
+                    args.append(pattern)
+            if terms:
+                where.append('(%s)' % ' OR '.join(terms))
+        if metaRig:
+            where.append('(metaRigNode = ? OR metaRigNodeID = ?)')
+            args.extend([metaRig, metaRig])
+
+        query = 'SELECT %s FROM poses' % (','.join(columns) if columns else '*')
+        if where:
+            query += ' WHERE %s' % ' AND '.join(where)
+        if sortBy == 'date':
+            query += ' ORDER BY mtime DESC'
+        elif sortBy == 'size':
+            query += ' ORDER BY size DESC'
+        rows = self.conn.execute(query, args).fetchall()
+        if columns:
+            results = [dict(zip(row.keys(), row)) for row in rows]
+        else:
+            results = [self._rowToDict(row) for row in rows]
+        if sortBy == 'name':
+            results = _sortNumerically(results, key=lambda x: os.path.basename(x['path']))
+        return results
+
+    def poseNames(self, folder='', searchFilter=None, sortBy='name'):
+        '''
+        the pose UI's list call, pose names (no extension) in the given folder
+
+        :param folder: sub folder relative to the poseRoot
+        :param searchFilter: see search()
+        :param sortBy: 'name' or 'date'
+        '''
+        return [os.path.splitext(os.path.basename(row['path']))[0] for row in
+                self.search(searchFilter, folder=folder, sortBy=sortBy, columns=['path', 'mtime'])]
+
+    def getPose(self, path):
+        '''
+        return the indexed data for a single pose
+
+        :param path: pose path, either relative to the poseRoot or a full filepath
+        '''
+        if os.path.isabs(path):
+            path = self._relPath(path)
+        row = self.conn.execute('SELECT * FROM poses WHERE path=?', (path.replace('\\', '/'),)).fetchone()
+        if row:
+            return self._rowToDict(row)
+
+    def folders(self):
+        '''
+        all the folders in the index that contain poses
+        '''
+        return _sortNumerically([row[0] for row in self.conn.execute('SELECT DISTINCT folder FROM poses')])
+
+
+def main(args=None):
+    '''
+    command line entry point to update, rebuild, verify or search a pose library index
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(description='Red9 pose library index')
+    parser.add_argument('command', choices=['update', 'rebuild', 'verify', 'search'])
+    parser.add_argument('poseRoot', help='root directory of the pose library')
+    parser.add_argument('searchFilter', nargs='?', default=None,
+                        help='search : comma separated search strings, prefix with ^ for a prefix match')
+    parser.add_argument('--folder', default='', help='sub folder relative to the poseRoot')
+    parser.add_argument('--sort', default='name', choices=['name', 'date', 'size'])
+    parser.add_argument('--index', default=None, help='optional index filepath')
+    parsed = parser.parse_args(args)
+
+    index = PoseLibraryIndex(parsed.poseRoot, indexPath=parsed.index)
+    start = time.time()
+    if parsed.command == 'update':
+        print(index.update(folder=parsed.folder))
+    elif parsed.command == 'rebuild':
+        print(index.rebuild())
+    elif parsed.command == 'verify':
+        report = index.verify(folder=parsed.folder)
+        for key in ['missing', 'stale', 'removed']:
+            for path in report[key]:
+                print('%s : %s' % (key, path))
+        print('verify : %s' % dict((key, len(val)) for key, val in report.items()))
+        index.close()
+        return 1 if any(report.values()) else 0
+    elif parsed.command == 'search':
+        for pose in index.search(parsed.searchFilter, folder=parsed.folder, recursive=True,
+                                 sortBy=parsed.sort, columns=['path', 'mtime', 'size']):
+            print(pose['path'])
+    print('%s : %0.3fs' % (parsed.command, time.time() - start))
+    index.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -26,15 +26,21 @@ import Red9_CoreUtils as r9Core
 import Red9_General as r9General
 import Red9_AnimationUtils as r9Anim
 import Red9_Meta as r9Meta
+import Red9_PoseDiff as r9PoseDiff
+import Red9_ConfigIO as r9ConfigIO
 import maya.OpenMaya as OpenMaya
 
 
 import maya.cmds as cmds
 import os
-import Red9.packages.configobj as configobj
 import time
+import tempfile
 import getpass
 import json
+import sys
+import struct
+from array import array
+from collections import OrderedDict
 
 
 import logging
@@ -63,6 +69,237 @@ def getFolderPoseHandler(posePath):
     return poseHandler
 
 
+BINARY_POSE_MAGIC = 'r9POSEB1'
+
+class PoseBinaryFile(object):
+    '''
+    Packed binary storage used by the DataMap when dataformat='binary'. The file is laid out as:
+
+        magic (8 bytes) | header length (uint32) | json header | packed node blocks
+
+    The json header carries the info, filterNode_settings, skeletonDict and hikDict blocks,
+    a shared attribute name table and the node table. Each node table entry is the
+    poseDict key, the non value data for that node (ID, longName, mirrorID, metaData),
+    any attrs that aren't numeric, and the offset, count and kWorld flag of its block.
+    A node block is the attr indices (uint32), the value types (uint8), the values (float64)
+    and, if stored, 10 doubles for the kWorld translation, quaternion and euler.
+    All blocks are written little-endian.
+
+    Because the node table is in the header the poseDict keys can be matched against the
+    scene before any values are read, and only the matched nodes are then pulled from disk:
+
+    >>> binary = PoseBinaryFile(filepath)
+    >>> poseDict = binary.readHeader()  # keys, ID, longName, mirrorID, metaData only
+    >>> binary.readNodes(['L_Wrist_Ctrl', 'R_Wrist_Ctrl'], poseDict)
+    '''
+    _kinds = {0: float, 1: int, 2: bool}
+    _worldSize = 10
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.header = {}
+        self.attrTable = []
+        self.nodes = {}
+        self.dataStart = 0
+        self._stat = None
+
+    @staticmethod
+    def isBinary(filepath):
+        '''
+        is the given file a binary pose
+        '''
+        try:
+            with open(filepath, 'rb') as f:
+                return f.read(len(BINARY_POSE_MAGIC)) == BINARY_POSE_MAGIC
+        except IOError:
+            return False
+
+    @staticmethod
+    def _toFile(data):
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return data.tostring()
+
+    @staticmethod
+    def _fromFile(typecode, buf):
+        data = array(typecode)
+        data.fromstring(buf)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return data
+
+    @classmethod
+    def write(cls, filepath, poseDict, infoDict=None, settings=None, skeletonDict=None, hikDict=None):
+        '''
+        write the given poseDict and blocks to file
+
+        :param filepath: file to write
+        :param poseDict: the DataMap.poseDict, values may be native or the strings returned from ConfigObj
+        :param infoDict: the [info] block
+        :param settings: the filterNode_settings dict
+        :param skeletonDict: optional [skeletonDict] block
+        :param hikDict: optional [hikDict] block
+        '''
+        attrTable = []
+        attrIndex = {}
+        nodeTable = []
+        blocks = []
+        offset = 0
+
+        for key in sorted(poseDict.keys()):
+            data = poseDict[key]
+            indices = array('I')
+            kinds = array('B')
+            values = array('d')
+            extras = {}
+            for attr, val in data.get('attrs', {}).items():
+                if isinstance(val, basestring):
+                    val = r9Core.decodeString(val)
+                if isinstance(val, bool):
+                    kind = 2
+                elif isinstance(val, (int, long)):
+                    kind = 1
+                elif isinstance(val, float):
+                    kind = 0
+                else:
+                    extras[attr] = val
+                    continue
+                if attr not in attrIndex:
+                    attrIndex[attr] = len(attrTable)
+                    attrTable.append(attr)
+                indices.append(attrIndex[attr])
+                kinds.append(kind)
+                values.append(val)
+
+            world = False
+            worldData = data.get('attrs_kWorld')
+            if worldData:
+                try:
+                    values.extend([float(v) for v in list(worldData['translation']) +
+                                   list(worldData['quaternion']) +
+                                   list(worldData['euler'])])
+                    world = True
+                except (KeyError, TypeError, ValueError):
+                    extras['attrs_kWorld'] = worldData
+
+            block = cls._toFile(indices) + cls._toFile(kinds) + cls._toFile(values)
+            nodeData = dict((k, v) for k, v in data.items() if k not in ['attrs', 'attrs_kWorld'])
+            nodeTable.append([key, nodeData, extras, offset, len(indices), world])
+            blocks.append(block)
+            offset += len(block)
+
+        header = {'version': 1,
+                  'info': infoDict or {},
+                  'filterNode_settings': settings or {},
+                  'attrTable': attrTable,
+                  'nodes': nodeTable}
+        if skeletonDict:
+            header['skeletonDict'] = skeletonDict
+        if hikDict:
+            header['hikDict'] = hikDict
+        header = json.dumps(header)
+        if isinstance(header, unicode):
+            header = header.encode('utf-8')
+
+        with open(filepath, 'wb') as f:
+            f.write(BINARY_POSE_MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            f.write(''.join(blocks))
+
+    def readHeader(self):
+        '''
+        read the header only and return a poseDict stub holding the node data for
+        every key but none of the attr values, see readNodes
+        '''
+        with open(self.filepath, 'rb') as f:
+            if not f.read(len(BINARY_POSE_MAGIC)) == BINARY_POSE_MAGIC:
+                raise IOError('File is not a binary pose : %s' % self.filepath)
+            length = struct.unpack('<I', f.read(4))[0]
+            self.header = json.loads(f.read(length))
+        self._stat = self._fileStat()
+        self.dataStart = len(BINARY_POSE_MAGIC) + 4 + length
+        self.attrTable = self.header['attrTable']
+        self.nodes = {}
+        poseDict = {}
+        for key, nodeData, extras, offset, count, world in self.header['nodes']:
+            self.nodes[key] = (extras, offset, count, world)
+            poseDict[key] = dict(nodeData)
+        return poseDict
+
+    def _fileStat(self):
+        stat = os.stat(self.filepath)
+        return stat.st_mtime, stat.st_size
+
+    def _unpackNode(self, buf, key):
+        '''
+        return the (attrs, attrs_kWorld) for the node from its packed block
+        '''
+        extras, _, count, world = self.nodes[key]
+        indices = self._fromFile('I', buf[:count * 4])
+        kinds = buf[count * 4:count * 5]
+        values = self._fromFile('d', buf[count * 5:])
+        attrs = {}
+        for i, index in enumerate(indices):
+            attrs[self.attrTable[index]] = self._kinds[ord(kinds[i])](values[i])
+        kWorld = {}
+        if world:
+            kWorld = {'translation': list(values[count:count + 3]),
+                      'quaternion': list(values[count + 3:count + 7]),
+                      'euler': list(values[count + 7:count + 10])}
+        for attr, val in extras.items():
+            if attr == 'attrs_kWorld':
+                kWorld = val
+            else:
+                attrs[attr] = val
+        return attrs, kWorld
+
+    def _blockSize(self, key):
+        _, _, count, world = self.nodes[key]
+        return count * 13 + (self._worldSize * 8 if world else 0)
+
+    def readNodes(self, keys=None, poseDict=None):
+        '''
+        fill the attrs and attrs_kWorld blocks of the given keys into the poseDict.
+        Keys that already have an 'attrs' block are left alone, so this can be called
+        repeatedly as more nodes get matched.
+
+        :param keys: the poseDict keys to read, if None all nodes are read
+        :param poseDict: the poseDict to fill, if None a new one is built from the header
+        '''
+        if not self.header or not self._fileStat() == self._stat:
+            # no header yet, or the file has been re-written since it was read and the offsets are invalid
+            stub = self.readHeader()
+            if poseDict is None:
+                poseDict = stub
+        if poseDict is None:
+            poseDict = self.readHeader()
+        if keys is None:
+            keys = [key for key, _, _, _, _, _ in self.header['nodes']]
+        keys = [key for key in keys if key in self.nodes and 'attrs' not in poseDict.get(key, {})]
+        if not keys:
+            return poseDict
+
+        with open(self.filepath, 'rb') as f:
+            if len(keys) == len(self.nodes):
+                # reading everything, one read is faster than seeking per node
+                f.seek(self.dataStart)
+                buf = f.read()
+                reader = lambda key: buf[self.nodes[key][1]:self.nodes[key][1] + self._blockSize(key)]
+            else:
+                def reader(key):
+                    f.seek(self.dataStart + self.nodes[key][1])
+                    return f.read(self._blockSize(key))
+            for key in sorted(keys, key=lambda x: self.nodes[x][1]):
+                attrs, kWorld = self._unpackNode(reader(key), key)
+                if key not in poseDict:
+                    poseDict[key] = {}
+                poseDict[key]['attrs'] = attrs
+                if kWorld:
+                    poseDict[key]['attrs_kWorld'] = kWorld
+        return poseDict
+
+
 class DataMap(object):
     '''
     New base class for handling data storage and reloading with intelligence
@@ -90,8 +327,9 @@ class DataMap(object):
         self.filename = ''  # short name of the pose
         self._read_mute = False  # a back-door to prevent the _readPose() call happening, allowing us to modify cached data safely
 
-        self.dataformat = 'config'
+        self.dataformat = 'config'  # 'config', 'json' or 'binary'
         self._dataformat_resolved = None
+        self._binaryPose = None  # PoseBinaryFile left by a partial read, see _readPose_values
 
         self.mayaUpAxis = r9Setup.mayaUpAxis()
         self.thumbnailRes = [128, 128]
@@ -568,17 +806,17 @@ class DataMap(object):
 
                     tran_data = []
                     rot_data = self.poseDict[key]['attrs_kWorld']['quaternion']
-                    rot_data = [eval(rot_data[0]), eval(rot_data[1]), eval(rot_data[2]), eval(rot_data[3])]
+                    rot_data = [r9Core.decodeString(val) for val in rot_data]  # strings from ConfigObj, floats from json / binary
 
                     for attr in self.poseDict[key]['attrs_kWorld']['translation']:
                         if _conversion_needed and self.unitconversion:
                             # only unit convert linear attrs if the file supports it and it's needed!
                             _converted = r9Core.convertUnits_uiToInternal(r9Core.convertUnits_internalToUI(attr, _unitsfile), _sceneunits)
                             log.debug('node : %s : UnitConverted : val %s == %s' % (dest, attr, _converted))
-                            tran_data.append(eval(attr))
+                            tran_data.append(r9Core.decodeString(attr))
                         else:
                             log.debug('node : %s : val %s' % (dest, attr))
-                            tran_data.append(eval(attr))
+                            tran_data.append(r9Core.decodeString(attr))
 
                     trans = OpenMaya.MVector(tran_data[0], tran_data[1], tran_data[2])
                     rots = OpenMaya.MQuaternion(rot_data[0], rot_data[1], rot_data[2], rot_data[3])
@@ -615,16 +853,15 @@ class DataMap(object):
         # write to ConfigObject
         # =========================
         if self.dataformat == 'config':
-            ConfigObj = configobj.ConfigObj(indent_type='\t', encoding='utf-8')
-            ConfigObj['info'] = self.infoDict
-            ConfigObj['filterNode_settings'] = self.settings.__dict__
-            ConfigObj['poseData'] = self.poseDict
+            data = OrderedDict()
+            data['info'] = self.infoDict
+            data['filterNode_settings'] = self.settings.__dict__
+            data['poseData'] = self.poseDict
             if self.skeletonDict:
-                ConfigObj['skeletonDict'] = self.skeletonDict
+                data['skeletonDict'] = self.skeletonDict
             if self.hikDict:
-                ConfigObj['hikDict'] = self.hikDict
-            ConfigObj.filename = filepath
-            ConfigObj.write()
+                data['hikDict'] = self.hikDict
+            r9ConfigIO.write(filepath, data, encoding='utf-8')
             self._dataformat_resolved = 'config'
         # =========================
         # write to JSON format
@@ -640,14 +877,27 @@ class DataMap(object):
                 f.write(json.dumps(data, sort_keys=True, indent=4))
                 f.close()
             self._dataformat_resolved = 'json'
+        # =========================
+        # write to packed binary
+        # =========================
+        elif self.dataformat == 'binary':
+            PoseBinaryFile.write(filepath, self.poseDict,
+                                 infoDict=self.infoDict,
+                                 settings=self.settings.__dict__,
+                                 skeletonDict=self.skeletonDict,
+                                 hikDict=self.hikDict)
+            self._dataformat_resolved = 'binary'
 
     @r9General.Timer
-    def _readPose(self, filename=None, force=False):
+    def _readPose(self, filename=None, force=False, partial=False):
         '''
         Read the pose file and build up the internal poseDict
 
         :param filename: path to the file to read
         :param force: fore the read, ignoring the internal _read_mute var
+        :param partial: binary poses only, read just the header so the poseDict holds the
+            node data but no attr values. These are then read for the matched nodes only
+            via _readPose_values
         '''
         if self._read_mute and not force:
             return
@@ -655,6 +905,13 @@ class DataMap(object):
             filename = self.filepath
         if filename:
             if os.path.exists(filename):
+                self._binaryPose = None
+                # =========================
+                # read packed binary
+                # =========================
+                if PoseBinaryFile.isBinary(filename):
+                    self._readPose_binary(filename, partial)
+                    return
                 # =========================
                 # read JSON format
                 # =========================
@@ -674,15 +931,17 @@ class DataMap(object):
                 # =========================
                 # read ConfigObject
                 # =========================
-                if self._dataformat_resolved == 'config' or self.dataformat == 'config':
+                if self._dataformat_resolved == 'config' or self.dataformat in ['config', 'binary']:
                     # for key, val in configobj.ConfigObj(filename)['filterNode_settings'].items():
                     #    self.settings.__dict__[key]=decodeString(val)
-                    data = configobj.ConfigObj(filename, encoding='utf-8')
+                    data = r9ConfigIO.read(filename, encoding='utf-8')
                     self.poseDict = data['poseData']
                     if 'info' in data:
                         self.infoDict = data['info']
                     if 'skeletonDict' in data:
                         self.skeletonDict = data['skeletonDict']
+                    if 'hikDict' in data:
+                        self.hikDict = data['hikDict']
                     if 'filterNode_settings' in data:
                         self.settings_internal = r9Core.FilterNode_Settings()
                         self.settings_internal.setByDict(data['filterNode_settings'])
@@ -692,6 +951,40 @@ class DataMap(object):
         else:
             raise StandardError('No FilePath given to read the pose from')
 
+    def _readPose_binary(self, filename, partial=False):
+        '''
+        Read a binary pose into the internal poseDict, see PoseBinaryFile
+
+        :param filename: path to the file to read
+        :param partial: only read the header, values are pulled later via _readPose_values
+        '''
+        binary = PoseBinaryFile(filename)
+        self.poseDict = binary.readHeader()
+        if partial:
+            self._binaryPose = binary
+        else:
+            binary.readNodes(poseDict=self.poseDict)
+        self.infoDict = binary.header['info']
+        if 'skeletonDict' in binary.header:
+            self.skeletonDict = binary.header['skeletonDict']
+        if 'hikDict' in binary.header:
+            self.hikDict = binary.header['hikDict']
+        if binary.header['filterNode_settings']:
+            self.settings_internal = r9Core.FilterNode_Settings()
+            self.settings_internal.setByDict(binary.header['filterNode_settings'])
+        self._dataformat_resolved = 'binary'
+
+    def _readPose_values(self, keys):
+        '''
+        after a partial read of a binary pose, pull the attr values for the given
+        poseDict keys only. Does nothing for the other formats as the full poseDict
+        is already loaded.
+
+        :param keys: poseDict keys to read the values for
+        '''
+        if self._binaryPose:
+            self._binaryPose.readNodes(keys, self.poseDict)
+
     def processPoseFile(self, nodes):
         '''
         pre-loader function that processes all the nodes and data prior to
@@ -718,7 +1011,7 @@ class DataMap(object):
             raise StandardError('Nothing selected or returned by the filter to load the pose onto')
 
         if self.filepath:
-            self._readPose(self.filepath)
+            self._readPose(self.filepath, partial=True)
             log.debug('Pose Read Successfully from : %s' % self.filepath)
 
         if self.metaPose:
@@ -750,6 +1043,9 @@ class DataMap(object):
             if rematched:
                 self.matchedPairs.extend(rematched)
 
+        # binary poses are only partially read, now we know the matches pull the values
+        self._readPose_values([key for key, _ in self.matchedPairs])
+
         return self.nodesToLoad
 
     @r9General.Timer
@@ -1382,6 +1678,193 @@ class PoseData(DataMap):
         finally:
             self._post_load()
 
+class PoseBlendEngine(object):
+    '''
+    Precomputed blend between the current state of the matched nodes and a pose, used
+    by the PoseBlender so that slider drags don't go back through the poseDict and
+    cmds.getAttr / setAttr for every channel on every tick.
+
+    On construction the PoseData's matchedPairs are resolved once to a flat list of
+    MPlugs with the target values in flat arrays. Locked, non-numeric and driven
+    (connected to anything other than an animCurve) channels are skipped up front.
+    Each apply() is then a single lerp over the arrays and one MDGModifier write.
+
+    >>> pose.processPoseFile(nodes)
+    >>> engine = PoseBlendEngine(pose)
+    >>> engine.captureStart()
+    >>> engine.apply(25)  # drag, not undoable
+    >>> engine.apply(50)
+    >>> engine.commit(50)  # release, undoable
+
+    .. note::
+        like _applyData_attrs_complex, sceneUnit conversion of the stored values isn't done
+        for blending, values are in the current ui units.
+    '''
+    _double, _int, _bool = range(3)
+
+    def __init__(self, poseNode):
+        self.poseNode = poseNode
+        self.matchedPairs = list(poseNode.matchedPairs)
+        self.plugs = []  # MPlug per blended channel
+        self.channels = []  # 'node.attr' per channel, used by the undoable commit
+        self.kinds = array('B')
+        self.factors = array('d')  # ui to internal unit scale per channel
+        self.target = array('d')
+        self.start = array('d')
+        self._undoState = None  # internal values when the current undo chunk was opened
+        self._build()
+
+    def _channelType(self, plug):
+        '''
+        return the (kind, factor) for the plug where factor scales ui units to internal
+        '''
+        attr = plug.attribute()
+        if attr.hasFn(OpenMaya.MFn.kUnitAttribute):
+            unit = OpenMaya.MFnUnitAttribute(attr).unitType()
+            if unit == OpenMaya.MFnUnitAttribute.kAngle:
+                return self._double, OpenMaya.MAngle(1.0, OpenMaya.MAngle.uiUnit()).asRadians()
+            if unit == OpenMaya.MFnUnitAttribute.kDistance:
+                return self._double, OpenMaya.MDistance(1.0, OpenMaya.MDistance.uiUnit()).asCentimeters()
+            return self._double, 1.0
+        if attr.hasFn(OpenMaya.MFn.kEnumAttribute):
+            return self._int, 1.0
+        if attr.hasFn(OpenMaya.MFn.kNumericAttribute):
+            unit = OpenMaya.MFnNumericAttribute(attr).unitType()
+            if unit == OpenMaya.MFnNumericData.kBoolean:
+                return self._bool, 1.0
+            if unit in [OpenMaya.MFnNumericData.kShort, OpenMaya.MFnNumericData.kInt,
+                        OpenMaya.MFnNumericData.kLong, OpenMaya.MFnNumericData.kByte,
+                        OpenMaya.MFnNumericData.kChar]:
+                return self._int, 1.0
+            return self._double, 1.0
+        return None, None
+
+    def _isSettable(self, plug):
+        if plug.isLocked():
+            return False
+        if plug.isDestination():
+            # keyed channels are fine, anything else is driven
+            plugs = OpenMaya.MPlugArray()
+            plug.connectedTo(plugs, True, False)
+            if plugs.length() and not plugs[0].node().hasFn(OpenMaya.MFn.kAnimCurve):
+                return False
+        return True
+
+    def _build(self):
+        poseDict = self.poseNode.poseDict
+        skipAttrs = self.poseNode.skipAttrs
+        mirror = r9Anim.MirrorHierarchy()
+
+        for key, dest in self.matchedPairs:
+            if 'attrs' not in poseDict[key]:
+                continue
+            inverseAxis = []
+            if self.poseNode.mirrorInverse and 'mirrorID' in poseDict[key] and poseDict[key]['mirrorID']:
+                # mirrorInverse, ProPack finger systems, resolved once per node rather than per attr
+                if not poseDict[key]['mirrorID'].split('_')[0] == mirror.getMirrorSide(dest):
+                    inverseAxis = mirror.getMirrorAxis(dest) or []
+
+            for attr, val in poseDict[key]['attrs'].items():
+                if attr in skipAttrs:
+                    continue
+                val = r9Core.decodeString(val)  # strings from ConfigObj
+                if isinstance(val, bool):
+                    val = float(val)
+                if not isinstance(val, (int, long, float)):
+                    continue
+                channel = '%s.%s' % (dest, attr)
+                try:
+                    selList = OpenMaya.MSelectionList()
+                    selList.add(channel)
+                    plug = OpenMaya.MPlug()
+                    selList.getPlug(0, plug)
+                except RuntimeError:
+                    log.debug('Attr mismatch on destination : %s' % channel)
+                    continue
+                if not self._isSettable(plug):
+                    log.debug('Skipping locked or driven channel : %s' % channel)
+                    continue
+                kind, factor = self._channelType(plug)
+                if kind is None:
+                    continue
+                if attr in inverseAxis:
+                    val = 0 - val
+                self.plugs.append(plug)
+                self.channels.append(channel)
+                self.kinds.append(kind)
+                self.factors.append(factor)
+                self.target.append(val)
+
+    def _read(self):
+        '''
+        current values of all channels in internal units
+        '''
+        return array('d', [plug.asDouble() for plug in self.plugs])
+
+    def _write(self, values):
+        '''
+        batched, non-undoable write of internal unit values
+        '''
+        modifier = OpenMaya.MDGModifier()
+        for plug, kind, value in zip(self.plugs, self.kinds, values):
+            if kind == self._double:
+                modifier.newPlugValueDouble(plug, value)
+            elif kind == self._int:
+                modifier.newPlugValueInt(plug, int(round(value)))
+            else:
+                modifier.newPlugValueBool(plug, value >= 0.5)
+        modifier.doIt()
+
+    def _blend(self, percent):
+        '''
+        the lerp, returns internal unit values
+        '''
+        blend = percent / 100.0
+        return [(start + (target - start) * blend) * factor
+                for start, target, factor in zip(self.start, self.target, self.factors)]
+
+    def captureStart(self):
+        '''
+        cache the current values as the 0% state of the blend
+        '''
+        self._undoState = self._read()
+        self.start = array('d', [value / factor for value, factor in zip(self._undoState, self.factors)])
+
+    def apply(self, percent):
+        '''
+        interactive blend to the given percent of the pose, this is NOT undoable, see commit
+
+        :param percent: 0-100 percentage of the pose to apply
+        '''
+        if not self.start:
+            self.captureStart()
+        if self._undoState is None:
+            self._undoState = self._read()
+        self._write(self._blend(percent))
+
+    def commit(self, percent):
+        '''
+        push the final blend through cmds.setAttr so that it's undoable. The channels are
+        first restored to their state at the last commit so the undo returns there.
+
+        :param percent: 0-100 percentage of the pose to apply
+        '''
+        if not self.start:
+            self.captureStart()
+        values = self._blend(percent)
+        if self._undoState is not None:
+            self._write(self._undoState)
+        for channel, kind, value, factor in zip(self.channels, self.kinds, values, self.factors):
+            try:
+                if kind == self._double:
+                    cmds.setAttr(channel, value / factor)
+                else:
+                    cmds.setAttr(channel, int(round(value)))
+            except StandardError, err:
+                log.debug(err)
+        self._undoState = None
+
+
 class PoseBlender(object):
     '''
     simple wrap over the PoseLoad code to control the loading of the r9Pose through a poseBlender UI
@@ -1395,6 +1878,7 @@ class PoseBlender(object):
         self._poseBlendUndoChunkOpen = False
         self._poseSliderActive = None
         self._poseSliders = []
+        self._blendEngine = None  # PoseBlendEngine for the active slider
 
         # build the pose object up
         self.poseNode = PoseData(filterSettings)
@@ -1415,7 +1899,8 @@ class PoseBlender(object):
             if not slider == self._poseSliderActive:
                 self.poseNode.filepath = filepath
                 self.poseNode.processPoseFile(self.nodes)
-                self.poseNode._cacheCurrentNodeStates()
+                self._blendEngine = PoseBlendEngine(self.poseNode)
+                self._blendEngine.captureStart()
                 self._poseSliderActive = slider
 
                 # zero all other sliders for the cache to be consistent
@@ -1424,9 +1909,12 @@ class PoseBlender(object):
                         cmds.floatSliderGrp(_slider, e=True, value=0)
 
         # actual slider drag call
-        self.poseNode._applyData(percent=cmds.floatSliderGrp(slider, q=True, v=True))
+        self._blendEngine.apply(cmds.floatSliderGrp(slider, q=True, v=True))
 
     def _closeChunk(self, *args):
+        if self._poseBlendUndoChunkOpen and self._blendEngine:
+            # drags aren't undoable, push the final state through setAttr inside the chunk
+            self._blendEngine.commit(cmds.floatSliderGrp(self._poseSliderActive, q=True, v=True))
         cmds.undoInfo(closeChunk=True)
         self._poseBlendUndoChunkOpen = False
         log.debug('Closing Undo Chunk for PoseBlender')
@@ -1858,6 +2346,7 @@ class PoseCompare(object):
                 * 'infoDict'     = [info] block
         '''
         self.status = False
+        self.diff = {}
         self.compareDict = compareDict
         self.angularTolerance = angularTolerance
         self.angularAttrs = ['rotateX', 'rotateY', 'rotateZ', 'jointOrientX', 'jointOrientY', 'jointOrientZ']
@@ -1903,7 +2392,10 @@ class PoseCompare(object):
         '''
         Compare the 2 PoseData objects via their internal [key][attrs] blocks
         return a bool. After processing self.fails is a dict holding all the fails
-        for processing later if required
+        for processing later if required and self.diff the full r9PoseDiff report,
+        max / mean error per node and the out of tolerance attrs with their errors.
+
+        The values themselves are compared in bulk by r9PoseDiff.PoseDiff
         '''
         self.fails = {}
         logprint_keymismacth = ''
@@ -1917,103 +2409,58 @@ class PoseCompare(object):
         if not currentDic or not referenceDic:
             raise StandardError('missing pose section <<%s>> compare aborted' % self.compareDict)
 
-        for key, attrBlock in currentDic.items():
-            if self.filterMap and key not in self.filterMap:
-                log.debug('node not in filterMap - skipping key %s' % key)
-                continue
-            skip = False
-
-            # --------------------------------------------
-            # check that the key isn't in the ignoreStrings
-            # --------------------------------------------
-            if self.ignoreStrings:
-                for istr in self.ignoreStrings:
-                    if istr in key:
-                        skip = True
-                        break
-            if skip:
-                continue
-
-            # ---------------------------------------------
-            # "missingKeys" block - check that the key exists
-            # ---------------------------------------------
-
-            if key in referenceDic:
-                referenceAttrBlock = referenceDic[key]
+        poseDiff = r9PoseDiff.PoseDiff(currentDic, referenceDic,
+                                       angularTolerance=self.angularTolerance,
+                                       linearTolerance=self.linearTolerance,
+                                       compareDict=self.compareDict,
+                                       filterMap=self.filterMap,
+                                       ignoreStrings=self.ignoreStrings,
+                                       ignoreAttrs=self.ignoreAttrs,
+                                       longName=self.longName,
+                                       angularAttrs=self.angularAttrs)
+        poseDiff.compare()
+        self.diff = poseDiff.report
+
+        # ---------------------------------------------
+        # "missingKeys" block
+        # ---------------------------------------------
+        for key in self.diff['missingKeys']:
+            if 'missingKeys' not in self.ignoreBlocks:
+                logprint_keymismacth += 'ERROR: Key Mismatch : %s\n' % key
+                self.fails.setdefault('missingKeys', []).append(key)
             else:
-                if 'missingKeys' not in self.ignoreBlocks:
-                    logprint_keymismacth += 'ERROR: Key Mismatch : %s\n' % key
-                    if 'missingKeys' not in self.fails:
-                        self.fails['missingKeys'] = []
-                    self.fails['missingKeys'].append(key)
-                else:
-                    log.debug('missingKeys in ignoreblock : node is missing from data but being skipped "%s"' % key)
-                continue
-
-            # ---------------------------------------------
-            # "hierarchyMismatch" block - check full dagPaths
-            # ---------------------------------------------
-            try:
-                expectedDag = r9Core.removeNameSpace_fromDag(referenceAttrBlock['longName'])
-                currentDag = r9Core.removeNameSpace_fromDag(attrBlock['longName'])
-
-                if self.longName and not expectedDag == currentDag:
-                    if 'dagMismatch' not in self.ignoreBlocks:
-                        logprint_dagpath += 'ERROR: hierarchy Mismatch : \n\t\tcurrentValue=\t"%s" >> \n\t\texpectedValue=\t"%s"\n' % (currentDag, expectedDag)
-                        if 'dagMismatch' not in self.fails:
-                            self.fails['dagMismatch'] = []
-                        self.fails['dagMismatch'].append(key)
-                    else:
-                        log.debug('dagMismatch in ignoreblock : DagPath compare being skipped "%s"' % key)
-            except:
-                log.debug('Skipping DAGPATH compare as "longName" was not found in the reference pose : "%s"' % key)
-
-            # ---------------------------------------------
-            # "failedAttrs" block - compare attr values
-            # ---------------------------------------------
-
-            # check that this object actually has attr data in the pose
-            if 'attrs' not in attrBlock:
-                log.debug('%s node has no attrs block in the pose' % key)
-                continue
+                log.debug('missingKeys in ignoreblock : node is missing from data but being skipped "%s"' % key)
+
+        # ---------------------------------------------
+        # "hierarchyMismatch" block
+        # ---------------------------------------------
+        for key in self.diff['dagMismatch']:
+            if 'dagMismatch' not in self.ignoreBlocks:
+                logprint_dagpath += 'ERROR: hierarchy Mismatch : \n\t\tcurrentValue=\t"%s" >> \n\t\texpectedValue=\t"%s"\n' % \
+                    (r9Core.removeNameSpace_fromDag(currentDic[key]['longName']),
+                     r9Core.removeNameSpace_fromDag(referenceDic[key]['longName']))
+                self.fails.setdefault('dagMismatch', []).append(key)
             else:
-                if 'failedAttrs' in self.ignoreBlocks:
-                    log.debug('failedAttrs in ignoreblock : attr compare being skipped "%s"' % key)
-                    continue
-                # main compare block for attr values
-                for attr, value in attrBlock['attrs'].items():
-                    if attr in self.ignoreAttrs:
-                        continue
-                    # attr missing completely from the key
-                    if attr not in referenceAttrBlock['attrs']:
-                        if 'failedAttrs' not in self.fails:
-                            self.fails['failedAttrs'] = {}
-                        if key not in self.fails['failedAttrs']:
-                            self.fails['failedAttrs'][key] = {}
-                        if 'missingAttrs' not in self.fails['failedAttrs'][key]:
-                            self.fails['failedAttrs'][key]['missingAttrs'] = []
-                        self.fails['failedAttrs'][key]['missingAttrs'].append(attr)
-                        logprint_missingattr += 'ERROR: Missing attribute in data : "%s.%s"\n' % (key, attr)
-                        continue
-
-                    # test the attrs value matches
-                    value = r9Core.decodeString(value)  # decode as this may be a configObj
-                    refValue = r9Core.decodeString(referenceAttrBlock['attrs'][attr])  # decode as this may be a configObj
+                log.debug('dagMismatch in ignoreblock : DagPath compare being skipped "%s"' % key)
 
-                    if type(value) == float:
-                        matched = False
-                        if attr in self.angularAttrs:
-                            matched = r9Core.floatIsEqual(value, refValue, self.angularTolerance, allowGimbal=True)
-                        else:
-                            matched = r9Core.floatIsEqual(value, refValue, self.linearTolerance, allowGimbal=False)
-                        if not matched:
-                            self.__addFailedAttr(key, attr)
-                            logprint_missingfail += 'ERROR: AttrValue float mismatch : "%s.%s" currentValue=%s >> expectedValue=%s\n' % (key, attr, value, refValue)
-                            continue
-                    elif not value == refValue:
-                        self.__addFailedAttr(key, attr)
-                        logprint_missingfail += 'ERROR: AttrValue mismatch : "%s.%s" currentValue=%s >> expectedValue=%s\n' % (key, attr, value, refValue)
-                        continue
+        # ---------------------------------------------
+        # "failedAttrs" block
+        # ---------------------------------------------
+        if 'failedAttrs' in self.ignoreBlocks:
+            log.debug('failedAttrs in ignoreblock : attr compare being skipped')
+        else:
+            for key, attrs in sorted(self.diff['missingAttrs'].items()):
+                for attr in attrs:
+                    self.fails.setdefault('failedAttrs', {}).setdefault(key, {}).setdefault('missingAttrs', []).append(attr)
+                    logprint_missingattr += 'ERROR: Missing attribute in data : "%s.%s"\n' % (key, attr)
+            for failed in self.diff['failedAttrs']:
+                self.__addFailedAttr(failed['node'], failed['attr'])
+                if failed['error'] is not None:
+                    logprint_missingfail += 'ERROR: AttrValue float mismatch : "%s.%s" currentValue=%s >> expectedValue=%s : error=%s\n' % \
+                        (failed['node'], failed['attr'], failed['current'], failed['reference'], failed['error'])
+                else:
+                    logprint_missingfail += 'ERROR: AttrValue mismatch : "%s.%s" currentValue=%s >> expectedValue=%s\n' % \
+                        (failed['node'], failed['attr'], failed['current'], failed['reference'])
 
         if any(['missingKeys' in self.fails, 'failedAttrs' in self.fails, 'dagMismatch' in self.fails]):
             print('PoseCompare returns : "%s" ========================================\n' % self.compareDict)
@@ -2032,43 +2479,275 @@ class PoseCompare(object):
 
 
 def batchPatchPoses(posedir, config, poseroot, load=True, save=True, patchfunc=None,
-                    relativePose=False, relativeRots=False, relativeTrans=False):
+                    relativePose=False, relativeRots=False, relativeTrans=False,
+                    workers=0, rigFile=None, dryRun=False, reportPath=None, mayapy=None):
     '''
     whats this?? a fast method to run through all the poses in a given dictionary and update
     or patch them. If patchfunc isn't given it'll just run through and resave the pose - updating
     the systems if needed. If it is then it gets run between the load and save calls.
+
+    For big libraries the work can be split over a number of headless mayapy workers, each
+    opens the rigFile once and processes its share of the poses while the current session
+    is left free. Either way the per file results, failures and timings are gathered into
+    a JSON report.
+
     :param posedir: directory of poses to process
     :param config: hierarchy settings cfg to use to ID the nodes (hierarchy tab preset = filterSettings object)
     :param poseroot: root node to the filters - poseTab rootNode/MetaRig root
     :param patchfunc: optional function to run between the load and save call in processing, great for
-            fixing issues on mass with poses. Note we now pass pose file back into this func as an arg
+            fixing issues on mass with poses. Note we now pass pose file back into this func as an arg.
+            For workers this has to be the importable path to the func as a string, 'myTools.fixPose'
     :param load: should the batch load the pose
     :param save: should the batch resave the pose
+    :param workers: number of mayapy processes to split the poses over, 0 runs in this session
+    :param rigFile: the rig scene each worker opens, required for workers unless dryRun
+    :param dryRun: only read and validate the pose files, nothing is loaded, patched or saved
+    :param reportPath: where to write the JSON report, default is batchPatchPoses_report.json in the
+        temp dir, generated files are kept out of the pose library
+    :param mayapy: mayapy executable for the workers, default is the one in $MAYA_LOCATION
+    :return: the report dict
+    '''
+    start = time.time()
+    files = [os.path.join(posedir, f) for f in sorted(os.listdir(posedir)) if f.lower().endswith('.pose')]
+    job = {'config': config,
+           'poseroot': poseroot,
+           'load': load,
+           'save': save,
+           'patchfunc': patchfunc,
+           'relativePose': relativePose,
+           'relativeRots': relativeRots,
+           'relativeTrans': relativeTrans,
+           'rigFile': rigFile,
+           'dryRun': dryRun}
+    if workers and files:
+        if patchfunc and not isinstance(patchfunc, basestring):
+            raise StandardError('patchfunc must be given as an importable "module.func" string to run in workers')
+        if not rigFile and not dryRun:
+            raise StandardError('workers need a rigFile to open')
+        results = _batchPatchPosesParallel(files, job, workers, mayapy)
+    else:
+        results = _batchPatchPoseFiles(files, job)
+
+    failed = [result['file'] for result in results if not result['status'] == 'ok']
+    report = {'posedir': posedir,
+              'workers': workers,
+              'dryRun': dryRun,
+              'files': len(files),
+              'ok': len(files) - len(failed),
+              'failed': failed,
+              'time': time.time() - start,
+              'results': results}
+    if not reportPath:
+        reportPath = os.path.join(tempfile.gettempdir(), 'batchPatchPoses_report.json')
+    with open(reportPath, 'w') as f:
+        json.dump(report, f, indent=4)
+    log.info('batchPatchPoses : %i poses in %0.2fs, %i failed, report : %s' % (len(files), report['time'], len(failed), reportPath))
+    return report
+
+def validatePoseFile(filepath):
+    '''
+    read a pose file without loading it and check that the data is sane,
+    used by the batchPatchPoses dryRun
+
+    :return: result dict with the status, the resolved dataformat and the node / attr counts,
+        raises a StandardError if the file doesn't validate
+    '''
+    result = {'file': filepath, 'status': 'failed'}
+    mPose = PoseData()
+    if PoseBinaryFile.isBinary(filepath):
+        mPose.dataformat = 'binary'
+    else:
+        with open(filepath, 'r') as pose:
+            if pose.read(256).lstrip().startswith('{'):
+                mPose.dataformat = 'json'
+    mPose._readPose(filepath)
+    result['format'] = mPose._dataformat_resolved
+    if not mPose.poseDict:
+        raise StandardError('no poseData in the file')
+    attrs = 0
+    for key, data in mPose.poseDict.items():
+        for required in ['ID', 'longName']:
+            if required not in data:
+                raise StandardError('poseData["%s"] has no "%s"' % (key, required))
+        attrs += len(data.get('attrs', {}))
+    result['nodes'] = len(mPose.poseDict)
+    result['attrs'] = attrs
+    result['status'] = 'ok'
+    return result
+
+def _resolvePatchFunc(patchfunc):
     '''
+    the patchfunc passed to batchPatchPoses, importing it if given as a "module.func" string
+    '''
+    if isinstance(patchfunc, basestring):
+        module, func = patchfunc.rsplit('.', 1)
+        return getattr(__import__(module, fromlist=[func]), func)
+    return patchfunc
 
-    filterObj = r9Core.FilterNode_Settings()
-    filterObj.read(os.path.join(r9Setup.red9ModulePath(), 'presets', config))
-    mPose = PoseData(filterObj)
-    mPose.setMetaRig(poseroot)
-    files = os.listdir(posedir)
-    files.sort()
-    for f in files:
-        if f.lower().endswith('.pose'):
-            if load:
-                print('Loading Pose : %s' % os.path.join(posedir, f))
-                mPose.poseLoad(nodes=poseroot,
-                               filepath=os.path.join(posedir, f),
-                               useFilter=True,
-                               relativePose=relativePose,
-                               relativeRots=relativeRots,
-                               relativeTrans=relativeTrans)
-            if patchfunc:
-                print('Applying patch')
-                patchfunc(f)
-            if save:
-                print('Saving Pose : %s' % os.path.join(posedir, f))
-                mPose.poseSave(nodes=poseroot,
-                               filepath=os.path.join(posedir, f),
-                               useFilter=True,
-                               storeThumbnail=False)
-            log.info('Processed Pose File :  %s' % f)
+def _batchPatchPoseFiles(files, job, resultsFile=None):
+    '''
+    process the given pose files in this session, the body of batchPatchPoses and its workers
+
+    :param job: the batchPatchPoses args, see batchPatchPoses
+    :param resultsFile: optional file each result is appended to as a JSON line as soon as
+        it's done, so the parent still gets the results if a worker dies part way through
+    '''
+    results = []
+    mPose = None
+    patchfunc = None
+    if not job['dryRun']:
+        filterObj = r9Core.FilterNode_Settings()
+        filterObj.read(os.path.join(r9Setup.red9ModulePath(), 'presets', job['config']))
+        mPose = PoseData(filterObj)
+        mPose.setMetaRig(job['poseroot'])
+        patchfunc = _resolvePatchFunc(job['patchfunc'])
+
+    for filepath in files:
+        start = time.time()
+        result = {'file': filepath, 'status': 'failed', 'timings': {}}
+        try:
+            if job['dryRun']:
+                result.update(validatePoseFile(filepath))
+            else:
+                timings = result['timings']
+                if job['load']:
+                    print('Loading Pose : %s' % filepath)
+                    mPose.poseLoad(nodes=job['poseroot'],
+                                   filepath=filepath,
+                                   useFilter=True,
+                                   relativePose=job['relativePose'],
+                                   relativeRots=job['relativeRots'],
+                                   relativeTrans=job['relativeTrans'])
+                    timings['load'] = time.time() - start
+                if patchfunc:
+                    print('Applying patch')
+                    patchStart = time.time()
+                    patchfunc(os.path.basename(filepath))
+                    timings['patch'] = time.time() - patchStart
+                if job['save']:
+                    print('Saving Pose : %s' % filepath)
+                    saveStart = time.time()
+                    mPose.poseSave(nodes=job['poseroot'],
+                                   filepath=filepath,
+                                   useFilter=True,
+                                   storeThumbnail=False)
+                    timings['save'] = time.time() - saveStart
+                result['status'] = 'ok'
+            log.info('Processed Pose File :  %s' % os.path.basename(filepath))
+        except StandardError, err:
+            result['error'] = str(err)
+            log.warning('Failed to process Pose File : %s : %s' % (filepath, err))
+        result['time'] = time.time() - start
+        results.append(result)
+        if resultsFile:
+            with open(resultsFile, 'a') as f:
+                f.write(json.dumps(result) + '\n')
+    return results
+
+def _batchPatchPosesWorker(jobfile):
+    '''
+    mayapy worker entry point for batchPatchPoses, opens the rig once and processes
+    the poses listed in the jobfile
+    '''
+    with open(jobfile, 'r') as f:
+        job = json.load(f)
+    if not job['dryRun']:
+        cmds.file(job['rigFile'], o=True, f=True, ignoreVersion=True)
+    _batchPatchPoseFiles(job['files'], job, resultsFile=job['results'])
+
+def _batchPatchPosesParallel(files, job, workers, mayapy=None):
+    '''
+    split the files over the given number of mayapy workers, wait for them and gather
+    their results. Files a worker never reported on, because it died, are returned as
+    failed along with the tail of the worker's log
+    '''
+    import subprocess
+    if not mayapy:
+        if os.path.basename(sys.executable).lower().startswith('mayapy'):
+            mayapy = sys.executable
+        else:
+            mayapy = os.path.join(os.environ.get('MAYA_LOCATION', ''), 'bin', 'mayapy')
+            if sys.platform == 'win32':
+                mayapy += '.exe'
+    tempDir = tempfile.mkdtemp(prefix='r9PatchPoses_')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.normpath(r9Setup.red9ModulePath())),
+                                         env.get('PYTHONPATH', '')])
+    procs = []
+    for i in range(workers):
+        chunk = files[i::workers]  # interleaved so each worker gets a similar spread of the library
+        if not chunk:
+            continue
+        jobfile = os.path.join(tempDir, 'job_%i.json' % i)
+        resultsFile = os.path.join(tempDir, 'results_%i.jsonl' % i)
+        with open(jobfile, 'w') as f:
+            json.dump(dict(job, files=chunk, results=resultsFile), f)
+        logfile = open(os.path.join(tempDir, 'worker_%i.log' % i), 'w')
+        cmd = [mayapy, '-c', ("import maya.standalone;maya.standalone.initialize(name='python');"
+                              "import Red9.core.Red9_PoseSaver as r9Pose;r9Pose._batchPatchPosesWorker(%r)" % jobfile)]
+        procs.append((i, chunk, resultsFile, logfile,
+                      subprocess.Popen(cmd, stdout=logfile, stderr=subprocess.STDOUT, env=env)))
+    log.info('batchPatchPoses : %i poses split over %i workers, logs : %s' % (len(files), len(procs), tempDir))
+
+    results = []
+    for i, chunk, resultsFile, logfile, proc in procs:
+        proc.wait()
+        logfile.close()
+        done = {}
+        if os.path.exists(resultsFile):
+            with open(resultsFile, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        result = json.loads(line)
+                        result['worker'] = i
+                        done[result['file']] = result
+        if len(done) < len(chunk):
+            with open(logfile.name, 'r') as f:
+                tail = f.read()[-2000:]
+            log.warning('batchPatchPoses : worker %i exited with code %s before finishing' % (i, proc.returncode))
+            for filepath in chunk:
+                if filepath not in done:
+                    done[filepath] = {'file': filepath, 'status': 'failed', 'worker': i, 'timings': {},
+                                      'error': 'worker exited with code %s : %s' % (proc.returncode, tail)}
+        results.extend(done[filepath] for filepath in chunk)
+    results.sort(key=lambda result: result['file'])
+    return results
+
+
+def convertPoseFiles(posedir, dataformat='binary', recursive=False):
+    '''
+    convert an existing pose library to the given DataMap dataformat. Poses are re-written
+    in place so the filenames and thumbnails are unchanged, the format is detected when
+    the poses are read so a library can be part converted without breaking the UI's.
+
+    :param posedir: directory of poses to convert
+    :param dataformat: format to convert to, 'binary', 'json' or 'config'
+    :param recursive: also convert the poses in all sub-folders
+    :return: list of the converted pose filepaths
+    '''
+    converted = []
+    for root, dirs, files in os.walk(posedir):
+        if not recursive:
+            dirs[:] = []
+        for f in sorted(files):
+            if not f.lower().endswith('.pose'):
+                continue
+            filepath = os.path.join(root, f)
+            mPose = PoseData()
+            if PoseBinaryFile.isBinary(filepath):
+                mPose.dataformat = 'binary'
+            else:
+                with open(filepath, 'r') as pose:
+                    if pose.read(256).lstrip().startswith('{'):
+                        mPose.dataformat = 'json'
+            mPose._readPose(filepath)
+            if mPose._dataformat_resolved == dataformat:
+                log.debug('Pose already in format "%s" : %s' % (dataformat, filepath))
+                continue
+            if mPose.settings_internal:
+                mPose.settings = mPose.settings_internal
+            mPose.dataformat = dataformat
+            mPose._writePose(filepath)
+            converted.append(filepath)
+            log.info('Converted Pose File to "%s" :  %s' % (dataformat, filepath))
+    return converted
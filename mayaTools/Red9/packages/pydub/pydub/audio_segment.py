@@ -5,6 +5,7 @@ import subprocess
 from tempfile import TemporaryFile, NamedTemporaryFile
 import wave
 import sys
+import array
 from .logging_utils import log_conversion
 
 try:
@@ -17,6 +18,8 @@ from .utils import (
     db_to_float,
     ratio_to_db,
     get_encoder_name,
+    get_array_type,
+    raw_view,
     audioop,
 )
 from .exceptions import (
@@ -80,6 +83,11 @@ class AudioSegment(object):
         a = AudioSegment.from_mp3(mp3file)
         first_second = a[:1000] # get the first second of an mp3
         slice = a[5000:10000] # get a slice from 5 to 10 seconds of an mp3
+
+    Slices are zero-copy views over the sample data of the segment they were
+    cut from, _data only builds a new bytes object the first time it's read
+    from a view. Everything that goes through audioop works straight off the
+    view, see _raw, and get_array_of_samples gives the data as an array.
     """
     converter = get_encoder_name()  # either ffmpeg or avconv
 
@@ -100,7 +108,9 @@ class AudioSegment(object):
     def __init__(self, data=None, *args, **kwargs):
         if kwargs.get('metadata', False):
             # internal use only
-            self._data = data
+            if isinstance(data, array.array):
+                data = data.tostring() if sys.version_info < (3, 0) else data.tobytes()
+            self._raw = data
             for attr, val in kwargs.pop('metadata').items():
                 setattr(self, attr, val)
         else:
@@ -118,10 +128,40 @@ class AudioSegment(object):
 
             # the "or b''" base case is a work-around for a python 3.4
             # see https://github.com/jiaaro/pydub/pull/107
-            self._data = raw.readframes(float('inf')) or b''
+            self._raw = raw.readframes(float('inf')) or b''
 
         super(AudioSegment, self).__init__(*args, **kwargs)
 
+    @property
+    def _data(self):
+        """
+        the sample data as bytes. Segments sliced from another hold a view, _raw,
+        over the parent's data which is only copied out here, on first access
+        """
+        if not isinstance(self._raw, bytes):
+            self._raw = bytes(self._raw)
+        return self._raw
+
+    @_data.setter
+    def _data(self, data):
+        self._raw = data
+
+    @property
+    def array_type(self):
+        return get_array_type(self.sample_width * 8)
+
+    def get_array_of_samples(self):
+        """
+        returns the raw sample data as an array.array of array_type, channels
+        are interleaved. Note that 8bit wav data is unsigned
+        """
+        samples = array.array(self.array_type)
+        if sys.version_info >= (3, 0):
+            samples.frombytes(self._raw)
+        else:
+            samples.fromstring(self._raw)
+        return samples
+
     def __len__(self):
         """
         returns the length of this audio segment in milliseconds
@@ -154,7 +194,7 @@ class AudioSegment(object):
 
         start = self._parse_position(start) * self.frame_width
         end = self._parse_position(end) * self.frame_width
-        data = self._data[start:end]
+        data = raw_view(self._raw, start, min(end, len(self._raw)))
 
         # ensure the output is as long as the requester is expecting
         expected_length = end - start
@@ -167,7 +207,7 @@ class AudioSegment(object):
                     "missing frames: %s" % missing_frames)
             silence = audioop.mul(data[:self.frame_width],
                                   self.sample_width, 0)
-            data += (silence * missing_frames)
+            data = bytes(data) + (silence * missing_frames)
 
         return self._spawn(data)
 
@@ -193,7 +233,7 @@ class AudioSegment(object):
         start_i = bounded(start_sample, 0) * self.frame_width
         end_i = bounded(end_sample, max_val) * self.frame_width
 
-        data = self._data[start_i:end_i]
+        data = raw_view(self._raw, start_i, end_i)
         return self._spawn(data)
 
     def __add__(self, arg):
@@ -236,7 +276,11 @@ class AudioSegment(object):
         """
         # accept lists of data chunks
         if isinstance(data, list):
-            data = b''.join(data)
+            data = b''.join([bytes(chunk) for chunk in data])
+
+        # accept arrays of samples, see get_array_of_samples
+        if isinstance(data, array.array):
+            data = data.tostring() if sys.version_info < (3, 0) else data.tobytes()
 
         # accept file-like objects
         if hasattr(data, 'read'):
@@ -534,7 +578,7 @@ class AudioSegment(object):
     def get_frame(self, index):
         frame_start = index * self.frame_width
         frame_end = frame_start + self.frame_width
-        return self._data[frame_start:frame_end]
+        return bytes(self._raw[frame_start:frame_end])
 
     def frame_count(self, ms=None):
         """
@@ -544,13 +588,13 @@ class AudioSegment(object):
         if ms is not None:
             return ms * (self.frame_rate / 1000.0)
         else:
-            return float(len(self._data) // self.frame_width)
+            return float(len(self._raw) // self.frame_width)
 
     def set_sample_width(self, sample_width):
         if sample_width == self.sample_width:
             return self
 
-        data = self._data
+        data = self._raw
 
         if self.sample_width == 1:
             data = audioop.bias(data, 1, -128)
@@ -569,12 +613,12 @@ class AudioSegment(object):
         if frame_rate == self.frame_rate:
             return self
 
-        if self._data:
-            converted, _ = audioop.ratecv(self._data, self.sample_width,
+        if len(self._raw):
+            converted, _ = audioop.ratecv(self._raw, self.sample_width,
                                           self.channels, self.frame_rate,
                                           frame_rate, None)
         else:
-            converted = self._data
+            converted = self._raw
 
         return self._spawn(data=converted,
                            overrides={'frame_rate': frame_rate})
@@ -590,7 +634,7 @@ class AudioSegment(object):
             fn = audioop.tomono
             frame_width = self.frame_width // 2
 
-        converted = fn(self._data, self.sample_width, 1, 1)
+        converted = fn(self._raw, self.sample_width, 1, 1)
 
         return self._spawn(data=converted,
                            overrides={
@@ -601,8 +645,8 @@ class AudioSegment(object):
         if self.channels == 1:
             return [self]
 
-        left_channel = audioop.tomono(self._data, self.sample_width, 1, 0)
-        right_channel = audioop.tomono(self._data, self.sample_width, 0, 1)
+        left_channel = audioop.tomono(self._raw, self.sample_width, 1, 0)
+        right_channel = audioop.tomono(self._raw, self.sample_width, 0, 1)
 
         return [self._spawn(data=left_channel,
                             overrides={'channels': 1,
@@ -616,7 +660,7 @@ class AudioSegment(object):
         if self.sample_width == 1:
             return self.set_sample_width(2).rms
         else:
-            return audioop.rms(self._data, self.sample_width)
+            return audioop.rms(self._raw, self.sample_width)
 
     @property
     def dBFS(self):
@@ -627,7 +671,7 @@ class AudioSegment(object):
 
     @property
     def max(self):
-        return audioop.max(self._data, self.sample_width)
+        return audioop.max(self._raw, self.sample_width)
 
     @property
     def max_possible_amplitude(self):
@@ -646,7 +690,7 @@ class AudioSegment(object):
         return self.frame_rate and self.frame_count() / self.frame_rate or 0.0
 
     def apply_gain(self, volume_change):
-        return self._spawn(data=audioop.mul(self._data, self.sample_width,
+        return self._spawn(data=audioop.mul(self._raw, self.sample_width,
                                             db_to_float(float(volume_change))))
 
     def overlay(self, seg, position=0, loop=False, times=None):
@@ -687,11 +731,11 @@ class AudioSegment(object):
         sample_width = seg1.sample_width
         spawn = seg1._spawn
 
-        output.write(seg1[:position]._data)
+        output.write(seg1[:position]._raw)
 
         # drop down to the raw data
-        seg1 = seg1[position:]._data
-        seg2 = seg2._data
+        seg1 = seg1[position:]._raw
+        seg2 = seg2._raw
         pos = 0
         seg1_len = len(seg1)
         seg2_len = len(seg2)
@@ -704,14 +748,14 @@ class AudioSegment(object):
                 # is our last go-around
                 times = 1
 
-            output.write(audioop.add(seg1[pos:pos + seg2_len], seg2,
-                                     sample_width))
+            output.write(audioop.add(raw_view(seg1, pos, pos + seg2_len),
+                                     raw_view(seg2, 0, seg2_len), sample_width))
             pos += seg2_len
 
             # dec times to break our while loop (eventually)
             times -= 1
 
-        output.write(seg1[pos:])
+        output.write(raw_view(seg1, pos, len(seg1)))
 
         return spawn(data=output)
 
@@ -726,9 +770,9 @@ class AudioSegment(object):
 
         output = TemporaryFile()
 
-        output.write(seg1[:-crossfade]._data)
-        output.write(xf._data)
-        output.write(seg2[crossfade:]._data)
+        output.write(seg1[:-crossfade]._raw)
+        output.write(xf._raw)
+        output.write(seg2[crossfade:]._raw)
 
         output.seek(0)
         return seg1._spawn(data=output)
@@ -785,7 +829,7 @@ class AudioSegment(object):
         output = []
 
         # original data - up until the crossfade portion, as is
-        before_fade = self[:start]._data
+        before_fade = self[:start]._raw
         if from_gain != 0:
             before_fade = audioop.mul(before_fade,
                                       self.sample_width,
@@ -803,7 +847,7 @@ class AudioSegment(object):
             for i in range(duration):
                 volume_change = from_power + (scale_step * i)
                 chunk = self[start + i]
-                chunk = audioop.mul(chunk._data,
+                chunk = audioop.mul(chunk._raw,
                                     self.sample_width,
                                     volume_change)
 
@@ -816,13 +860,14 @@ class AudioSegment(object):
 
             for i in range(int(fade_frames)):
                 volume_change = from_power + (scale_step * i)
-                sample = self.get_frame(int(start_frame + i))
+                frame_start = int(start_frame + i) * self.frame_width
+                sample = raw_view(self._raw, frame_start, frame_start + self.frame_width)
                 sample = audioop.mul(sample, self.sample_width, volume_change)
 
                 output.append(sample)
 
         # original data after the crossfade portion, at the new volume
-        after_fade = self[end:]._data
+        after_fade = self[end:]._raw
         if to_gain != 0:
             after_fade = audioop.mul(after_fade,
                                      self.sample_width,
@@ -839,7 +884,7 @@ class AudioSegment(object):
 
     def reverse(self):
         return self._spawn(
-            data=audioop.reverse(self._data, self.sample_width)
+            data=audioop.reverse(self._raw, self.sample_width)
         )
 
 
@@ -1,6 +1,8 @@
 import sys
 import math
 import array
+from itertools import islice
+from operator import add, mul
 from .utils import (
     db_to_float,
     ratio_to_db,
@@ -8,7 +10,8 @@ from .utils import (
     make_chunks,
     audioop,
     get_array_type,
-    get_min_max_value
+    get_min_max_value,
+    raw_view,
 )
 from .silence import split_on_silence
 from .exceptions import TooManyMissingFrames, InvalidDuration
@@ -93,7 +96,7 @@ def strip_silence(seg, silence_len=1000, silence_thresh=-16, padding=100):
 
     seg = chunks[0]
     for chunk in chunks[1:]:
-        seg.append(chunk, crossfade=crossfade)
+        seg = seg.append(chunk, crossfade=crossfade)
 
     return seg
 
@@ -131,8 +134,6 @@ def compress_dynamic_range(seg, threshold=-20.0, ratio=4.0, attack=5.0, release=
     thresh_rms = seg.max_possible_amplitude * db_to_float(threshold)
     
     look_frames = int(seg.frame_count(ms=attack))
-    def rms_at(frame_i):
-        return seg.get_sample_slice(frame_i - look_frames, frame_i).rms
     def db_over_threshold(rms):
         if rms == 0: return 0.0
         db = ratio_to_db(rms / thresh_rms)
@@ -145,8 +146,12 @@ def compress_dynamic_range(seg, threshold=-20.0, ratio=4.0, attack=5.0, release=
     
     attack_frames = seg.frame_count(ms=attack)
     release_frames = seg.frame_count(ms=release)
-    for i in xrange(int(seg.frame_count())):
-        rms_now = rms_at(i)
+
+    # frames that aren't attenuated are copied across in runs, straight off the raw data
+    raw = seg._raw
+    frame_width = seg.frame_width
+    run_start = 0
+    for i, rms_now in enumerate(_lookback_rms(seg, look_frames)):
         
         # with a ratio of 4.0 this means the volume will exceed the threshold by
         # 1/4 the amount (of dB) that it would otherwise
@@ -162,22 +167,61 @@ def compress_dynamic_range(seg, threshold=-20.0, ratio=4.0, attack=5.0, release=
             attenuation -= attenuation_dec
             attenuation = max(attenuation, 0)
         
-        frame = seg.get_frame(i)
         if attenuation != 0.0:
-            frame = audioop.mul(frame,
-                                seg.sample_width,
-                                db_to_float(-attenuation))
-        
-        output.append(frame)
-    
-    return seg._spawn(data=b''.join(output))
+            frame_start = i * frame_width
+            output.append(raw_view(raw, run_start, frame_start))
+            output.append(audioop.mul(raw_view(raw, frame_start, frame_start + frame_width),
+                                      seg.sample_width,
+                                      db_to_float(-attenuation)))
+            run_start = frame_start + frame_width
+
+    output.append(raw_view(raw, run_start, int(seg.frame_count()) * frame_width))
+    return seg._spawn(data=output)
+
+
+def _lookback_rms(seg, look_frames):
+    """
+    yields, for every frame, the rms of the look_frames before it, the same value
+    as seg.get_sample_slice(i - look_frames, i).rms
+
+    rather than measuring every window the squared samples are summed per frame once
+    and the window sum kept running. For 8 and 16bit audio the sums are exact in a
+    float, as they are in audioop.rms, so the values match it exactly
+    """
+    frame_count = int(seg.frame_count())
+    channels = seg.channels
+    if seg.sample_width > 2:
+        raw = seg._raw
+        frame_width = seg.frame_width
+        for i in xrange(frame_count):
+            window = raw_view(raw, max(0, i - look_frames) * frame_width, i * frame_width)
+            yield audioop.rms(window, seg.sample_width)
+        return
+
+    # 8bit is measured at 16bit, as AudioSegment.rms does
+    samples = seg.set_sample_width(2).get_array_of_samples() if seg.sample_width == 1 \
+        else seg.get_array_of_samples()
+    squares = array.array('d', map(mul, samples, samples))
+    energy = squares[0:frame_count * channels:channels]
+    for j in range(1, channels):
+        energy = array.array('d', map(add, energy, squares[j:frame_count * channels:channels]))
+    del squares
+
+    window = 0.0
+    for i in xrange(frame_count):
+        if i:
+            window += energy[i - 1]
+            if i > look_frames:
+                window -= energy[i - 1 - look_frames]
+        count = (i - max(0, i - look_frames)) * channels
+        yield int(math.sqrt(window / count)) if count else 0
 
 
 # Invert the phase of the signal.
 
 @register_pydub_effect
 def invert_phase(seg):
-    inverted = audioop.mul(seg._data, seg.sample_width, -1.0)  
+    inverted = audioop.mul(seg._raw, seg.sample_width, -1.0)  
     return seg._spawn(data=inverted)
 
 
@@ -195,24 +239,24 @@ def low_pass_filter(seg, cutoff):
 
     alpha = dt / (RC + dt)
 
-    array_type = get_array_type(seg.sample_width * 8)
-    
-    original = array.array(array_type, seg._data)
-    filteredArray = array.array(array_type, original)
+    original = seg.get_array_of_samples()
+    filteredArray = array.array(seg.array_type, original)
     
     frame_count = int(seg.frame_count())
 
-    last_val = [0] * seg.channels
-    for i in range(seg.channels):
-        last_val[i] = filteredArray[i] = original[i]
-
-    for i in range(1, frame_count):
-        for j in range(seg.channels):
-            offset = (i * seg.channels) + j
-            last_val[j] = last_val[j] + (alpha * (original[offset] - last_val[j]))
-            filteredArray[offset] = int(last_val[j])
+    # each channel is filtered on its own, over a strided slice of the samples
+    channels = seg.channels
+    for j in range(channels):
+        samples = original[j:frame_count * channels:channels]
+        last_val = samples[0]
+        filtered = [last_val]
+        append = filtered.append
+        for val in islice(samples, 1, None):
+            last_val = last_val + (alpha * (val - last_val))
+            append(int(last_val))
+        filteredArray[j:frame_count * channels:channels] = array.array(seg.array_type, filtered)
     
-    return seg._spawn(data=filteredArray.tostring())
+    return seg._spawn(data=filteredArray)
 
 
 @register_pydub_effect
@@ -226,27 +270,27 @@ def high_pass_filter(seg, cutoff):
 
     alpha = RC / (RC + dt)
 
-    array_type = get_array_type(seg.sample_width * 8)
     minval, maxval = get_min_max_value(seg.sample_width * 8)
     
-    original = array.array(array_type, seg._data)
-    filteredArray = array.array(array_type, original)
+    original = seg.get_array_of_samples()
+    filteredArray = array.array(seg.array_type, original)
     
     frame_count = int(seg.frame_count())
 
-    last_val = [0] * seg.channels
-    for i in range(seg.channels):
-        last_val[i] = filteredArray[i] = original[i]
-
-    for i in range(1, frame_count):
-        for j in range(seg.channels):
-            offset = (i * seg.channels) + j
-            offset_minus_1 = ((i-1) * seg.channels) + j
-
-            last_val[j] = alpha * (last_val[j] + original[offset] - original[offset_minus_1])
-            filteredArray[offset] = int(min(max(last_val[j], minval), maxval))
+    # each channel is filtered on its own, over a strided slice of the samples
+    channels = seg.channels
+    for j in range(channels):
+        samples = original[j:frame_count * channels:channels]
+        last_val = prev_val = samples[0]
+        filtered = [last_val]
+        append = filtered.append
+        for val in islice(samples, 1, None):
+            last_val = alpha * (last_val + val - prev_val)
+            prev_val = val
+            append(int(min(max(last_val, minval), maxval)))
+        filteredArray[j:frame_count * channels:channels] = array.array(seg.array_type, filtered)
     
-    return seg._spawn(data=filteredArray.tostring())
+    return seg._spawn(data=filteredArray)
 
 
 @register_pydub_effect
@@ -297,10 +341,10 @@ def apply_gain_stereo(seg, left_gain=0.0, right_gain=0.0):
     l_mult_factor = db_to_float(left_gain)
     r_mult_factor = db_to_float(right_gain)
     
-    left_data = audioop.mul(left._data, left.sample_width, l_mult_factor)
+    left_data = audioop.mul(left._raw, left.sample_width, l_mult_factor)
     left_data = audioop.tostereo(left_data, left.sample_width, 1, 0)
     
-    right_data = audioop.mul(right._data, right.sample_width, r_mult_factor)
+    right_data = audioop.mul(right._raw, right.sample_width, r_mult_factor)
     right_data = audioop.tostereo(right_data, right.sample_width, 0, 1)
     
     output = audioop.add(left_data, right_data, seg.sample_width)
@@ -1,9 +1,91 @@
+import sys
+import math
+from array import array
+from itertools import islice
+from operator import mul
+
 from .utils import (
     db_to_float,
 )
 
 
+def _samples(audio_segment):
+    """
+    the samples of the segment as an array, 8bit data is widened to 16bit first,
+    as AudioSegment.rms does, and 24bit data is padded out to 32bit
+    """
+    if audio_segment.sample_width == 1:
+        audio_segment = audio_segment.set_sample_width(2)
+    if audio_segment.sample_width != 3:
+        samples = audio_segment.get_array_of_samples()
+        # wav data is little endian, the array reads it in the native order
+        if sys.byteorder == 'big':
+            samples.byteswap()
+        return samples
+
+    src = bytearray(audio_segment._raw)
+    count = len(src) // 3
+    padded = bytearray(count * 4)
+    padded[1::4] = src[0:count * 3:3]
+    padded[2::4] = src[1:count * 3:3]
+    padded[3::4] = src[2:count * 3:3]
+    samples = array('i')
+    try:
+        samples.frombytes(bytes(padded))
+    except AttributeError:
+        samples.fromstring(bytes(padded))
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    # undo the 8bit left shift of the padding
+    return array('i', [x >> 8 for x in samples])
+
+
+def ms_energy(audio_segment):
+    """
+    the sum of the squared samples for each millisecond of the segment, computed
+    in one pass over the data.
+
+    returns (energy, frame_starts) where energy[i] is the energy of millisecond i
+    and frame_starts[i] the index of its first frame, the same frame boundaries
+    AudioSegment slicing uses, so any run of milliseconds can be measured from
+    these without touching the data again.
+    """
+    seg_len = int(len(audio_segment))
+    samples = _samples(audio_segment)
+    channels = audio_segment.channels
+    ms_frames = audio_segment.frame_rate / 1000.0
+    frame_starts = [int(i * ms_frames) for i in range(seg_len + 1)]
+
+    energy = []
+    for i in range(seg_len):
+        chunk = samples[frame_starts[i] * channels:frame_starts[i + 1] * channels]
+        energy.append(sum(map(mul, chunk, chunk)))
+
+    # len() rounds, so the last millisecond can run past the data. Slicing pads the
+    # missing frames with 0x00 bytes, silent for signed data but full scale negative
+    # in unsigned 8bit, -32768 once widened, so that padding is counted here too
+    if audio_segment.sample_width == 1:
+        frame_count = len(samples) // channels
+        for i in range(seg_len):
+            missing = frame_starts[i + 1] - max(frame_starts[i], frame_count)
+            if missing > 0:
+                energy[i] += missing * channels * 32768 ** 2
+    return energy, frame_starts
+
+
 def detect_silence(audio_segment, min_silence_len=1000, silence_thresh=-16):
+    """
+    returns the [start, end] ranges, in ms, of the silences in the segment that
+    are at least min_silence_len long. A window is silent if its rms is below
+    silence_thresh dBFS.
+
+    the per millisecond energy is worked out once and the rms of each window comes
+    from a running sum of it, rather than slicing the segment and recomputing the
+    rms for every millisecond offset. The ranges are the same as the sliced version,
+    including the 0x00 padding slices get past the end of 8bit data: audioop.rms
+    truncates to an int, so int(rms) < thresh is tested as
+    sum_squares < ceil(thresh) ** 2 * samples
+    """
     seg_len = len(audio_segment)
 
     # you can't have a silent portion of a sound that is longer than the sound
@@ -12,16 +94,26 @@ def detect_silence(audio_segment, min_silence_len=1000, silence_thresh=-16):
 
     # convert silence threshold to a float value (so we can compare it to rms)
     silence_thresh = db_to_float(silence_thresh) * audio_segment.max_possible_amplitude
+    if silence_thresh <= 0:
+        return []
+    thresh_squared = int(math.ceil(silence_thresh)) ** 2
+
+    energy, frame_starts = ms_energy(audio_segment)
+    channels = audio_segment.channels
 
     # find silence and add start and end indicies to the to_cut list
     silence_starts = []
 
-    # check every (1 sec by default) chunk of sound for silence
-    slice_starts = seg_len - min_silence_len
+    # check every (1 sec by default) window of sound for silence
+    slice_starts = int(seg_len - min_silence_len)
 
+    window = sum(islice(energy, 0, min_silence_len))
     for i in range(slice_starts + 1):
-        audio_slice = audio_segment[i:i+min_silence_len]
-        if audio_slice.rms < silence_thresh:
+        if i:
+            window += energy[i + min_silence_len - 1] - energy[i - 1]
+        samples = (frame_starts[i + min_silence_len] - frame_starts[i]) * channels
+        # an empty window has an rms of 0
+        if not samples or window < thresh_squared * samples:
             silence_starts.append(i)
 
     # short circuit when there is no silence
@@ -17,6 +17,19 @@ except ImportError:
 if sys.version_info >= (3, 0):
     basestring = str
 
+    def raw_view(data, start, end):
+        """
+        zero-copy view of data[start:end], works with audioop and file writes
+        """
+        return memoryview(data)[start:end]
+else:
+    def raw_view(data, start, end):
+        """
+        zero-copy view of data[start:end], works with audioop and file writes
+        """
+        # buffer objects are the python 2 views that audioop accepts
+        return buffer(data, start, max(0, end - start))
+
 
 
 FRAME_WIDTHS = {
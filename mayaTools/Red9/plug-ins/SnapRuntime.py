@@ -175,6 +175,41 @@ class SnapTransforms(OpenMayaMPx.MPxCommand):
         return syntax
     
     
+
+class RedApiUndo(OpenMayaMPx.MPxCommand):
+    '''
+    Registers edits that have already been made through the API onto the
+    undoQueue. The caller pushes an (undoFunc, redoFunc) tuple onto
+    Red9_General.RED9_API_UNDO and then runs this command, see
+    Red9_General.apiUndoable()
+    '''
+    kPluginCmdName="RedApiUndo"
+
+    def __init__(self):
+        OpenMayaMPx.MPxCommand.__init__(self)
+        self.undoFunc=None
+        self.redoFunc=None
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, args):
+        import Red9.core.Red9_General as r9General
+        if r9General.RED9_API_UNDO:
+            self.undoFunc, self.redoFunc = r9General.RED9_API_UNDO.pop()
+
+    def redoIt(self):
+        if self.redoFunc:
+            self.redoFunc()
+
+    def undoIt(self):
+        if self.undoFunc:
+            self.undoFunc()
+
+    @classmethod
+    def cmdCreator(cls):
+        return OpenMayaMPx.asMPxPtr( RedApiUndo() )
+
     
 # Initialize the plug-in 
 def initializePlugin(mobject):
@@ -184,6 +219,11 @@ def initializePlugin(mobject):
     except:
         sys.stderr.write( "Failed to register command: %s\n" % SnapTransforms.kPluginCmdName )
         raise
+    try:
+        mplugin.registerCommand( RedApiUndo.kPluginCmdName, RedApiUndo.cmdCreator )
+    except:
+        sys.stderr.write( "Failed to register command: %s\n" % RedApiUndo.kPluginCmdName )
+        raise
 
 # Uninitialize the plug-in 
 def uninitializePlugin(mobject):
@@ -193,5 +233,10 @@ def uninitializePlugin(mobject):
     except:
         sys.stderr.write( "Failed to unregister command: %s\n" % SnapTransforms.kPluginCmdName )
         raise
+    try:
+        mplugin.deregisterCommand( RedApiUndo.kPluginCmdName )
+    except:
+        sys.stderr.write( "Failed to unregister command: %s\n" % RedApiUndo.kPluginCmdName )
+        raise
        
     
\ No newline at end of file
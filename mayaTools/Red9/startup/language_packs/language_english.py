@@ -539,6 +539,17 @@ class _CurveFilters_(object):
     single_process_ann = 'Single process using the value sliders above'
     reset_all = 'Reset All'
     toggle_buffers = 'ToggleBuffers'
+    curve_cleanup = 'Curve Cleanup'
+    reduce_tolerance = 'Value tolerance'
+    reduce_keys = 'Reduce Keys'
+    reduce_keys_ann = 'remove keys that can go without the curve moving more than the tolerance, the max error is reported per curve'
+    lowpass_cutoff = 'Cutoff (Hz)'
+    lowpass = 'Low-Pass'
+    lowpass_ann = 'Butterworth low-pass filter, designed for dense mocap curves, frequencies above the cutoff are removed'
+    despike_threshold = 'Spike threshold'
+    despike = 'Despike'
+    despike_ann = 'median filter, only keys further than the threshold from the median of their neighbours are changed'
+    despike_window_ann = 'number of keys in the median window, odd numbers only'
 
 class _Randomizer_(object):
 
@@ -20,6 +20,8 @@ import maya.standalone
 maya.standalone.initialize(name='python')
 
 import Red9.core.Red9_Audio as r9Audio
+import Red9.core.Red9_AudioMixer as r9AudioMixer
+import Red9.core.Red9_AudioCache as r9AudioCache
 import Red9.core.Red9_General as r9General
 import Red9.startup.setup as r9Setup
 import Red9.core.Red9_CoreUtils as r9Core
@@ -31,6 +33,11 @@ r9Setup.mayaUpAxis('y')
 
 import maya.cmds as cmds
 import os
+import math
+import wave
+import struct
+import tempfile
+import shutil
 
 
 class Test_AudioNode(object):
@@ -151,6 +158,361 @@ class Test_BwavHandler(object):
         assert self.audioNode.isCompiled
 
 
+def writeTone(filepath, seconds, freq, rate=44100, width=2, channels=1, amp=0.3):
+    '''
+    generate a sine tone wav test fixture
+    '''
+    full = (1 << (8 * width - 1)) - 1
+    frames = []
+    for i in range(int(seconds * rate)):
+        value = int(amp * full * math.sin(2 * math.pi * freq * i / float(rate)))
+        if width == 1:
+            sample = struct.pack('<B', value + 128)
+        else:
+            sample = struct.pack('<i', value)[:width]
+        frames.append(sample * channels)
+    writer = wave.open(filepath, 'wb')
+    writer.setnchannels(channels)
+    writer.setsampwidth(width)
+    writer.setframerate(rate)
+    writer.writeframes(''.join(frames))
+    writer.close()
+
+
+class Test_AudioMixer(object):
+    def setup(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.toneA = os.path.join(self.tempDir, 'toneA.wav')
+        self.toneB = os.path.join(self.tempDir, 'toneB.wav')
+        writeTone(self.toneA, 2.0, 440)
+        writeTone(self.toneB, 1.5, 660)
+
+    def teardown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_matches_overlay(self):
+        # the streamed mix must match the old pydub overlay mixdown exactly
+        from Red9.packages.pydub.pydub import audio_segment
+        output = os.path.join(self.tempDir, 'mix.wav')
+        mixer = r9AudioMixer.AudioMixer(blockSize=4096)
+        mixer.addTrack(self.toneA, position=0.5)
+        mixer.addTrack(self.toneB, position=1.0, sourceStart=0.25, sourceEnd=1.25)
+        assert mixer.mixdown(output, duration=3.0) == (44100, 1, 2)
+
+        baseTrack = audio_segment.AudioSegment.silent(3000)
+        baseTrack = baseTrack.overlay(audio_segment.AudioSegment.from_wav(self.toneA), position=500)
+        baseTrack = baseTrack.overlay(audio_segment.AudioSegment.from_wav(self.toneB)[250:1250], position=1000)
+        assert wave.open(output).readframes(1000000) == baseTrack._data
+
+    def test_8bit(self):
+        # 8bit sources still mix down to 16bit, as the pydub silent base track did
+        from Red9.packages.pydub.pydub import audio_segment
+        tone8 = os.path.join(self.tempDir, 'tone8.wav')
+        output = os.path.join(self.tempDir, 'mix8.wav')
+        writeTone(tone8, 1.0, 330, rate=22050, width=1)
+        mixer = r9AudioMixer.AudioMixer(blockSize=1000)
+        mixer.addTrack(tone8, position=0.5)
+        assert mixer.mixdown(output, duration=2.0) == (22050, 1, 2)
+
+        baseTrack = audio_segment.AudioSegment.silent(2000)
+        baseTrack = baseTrack.overlay(audio_segment.AudioSegment.from_wav(tone8), position=500)
+        assert baseTrack.sample_width == 2
+        assert wave.open(output).readframes(1000000) == baseTrack._data
+
+    def test_channels(self):
+        # mono mixes up into stereo, anything else has to match before any output is written
+        toneStereo = os.path.join(self.tempDir, 'toneStereo.wav')
+        tone6 = os.path.join(self.tempDir, 'tone6.wav')
+        output = os.path.join(self.tempDir, 'mixChannels.wav')
+        writeTone(toneStereo, 1.0, 220, channels=2)
+        writeTone(tone6, 1.0, 220, channels=6)
+        mixer = r9AudioMixer.AudioMixer()
+        mixer.addTrack(self.toneA)
+        mixer.addTrack(toneStereo)
+        try:
+            mixer.addTrack(tone6)
+            assert False, 'ValueError not raised'
+        except ValueError:
+            pass
+        assert len(mixer.tracks) == 2
+        assert mixer.mixdown(output) == (44100, 2, 2)
+
+        mixer.tracks.append(r9AudioMixer.MixTrack(tone6))
+        os.remove(output)
+        try:
+            mixer.mixdown(output)
+            assert False, 'ValueError not raised'
+        except ValueError:
+            pass
+        assert not os.path.exists(output)
+
+    def test_24bit(self):
+        tone24 = os.path.join(self.tempDir, 'tone24.wav')
+        output = os.path.join(self.tempDir, 'mix24.wav')
+        writeTone(tone24, 1.0, 220, rate=48000, width=3, channels=2)
+        mixer = r9AudioMixer.AudioMixer(blockSize=1000)
+        mixer.addTrack(tone24, position=-0.25)  # negative offset trims the head of the source
+        mixer.addTrack(self.toneA, position=0.2)
+        assert mixer.mixdown(output) == (48000, 2, 3)
+
+        header = r9AudioMixer.readWavHeader(output)
+        assert header['sampleWidth'] == 3
+        assert header['frames'] == int(2.2 * 48000)
+        # before toneA comes in the mix is the 24bit source, 0.25s in, untouched
+        with open(output, 'rb') as f:
+            f.seek(header['dataOffset'])
+            mixed = f.read(6 * 9600)
+        source = r9AudioMixer.readWavHeader(tone24)
+        with open(tone24, 'rb') as f:
+            f.seek(source['dataOffset'] + 6 * 12000)
+            assert f.read(6 * 9600) == mixed
+
+    def test_combineAudio(self):
+        cmds.file(new=True, f=True)
+        cmds.currentUnit(time='pal')
+        for path in [self.toneA, self.toneB]:
+            r9Audio.AudioNode(filepath=path).importAndActivate()
+        handler = r9Audio.AudioHandler()
+        handler.audioNodes[1].startFrame = -10
+        output = os.path.join(self.tempDir, 'combined.wav')
+        handler.combineAudio(output)
+        compiled = r9Audio.AudioNode(filepath=output)
+        assert compiled.isCompiled
+        assert compiled.startFrame == -10
+        # toneA runs 50 frames at pal, plus the 10 frame negative offset of toneB
+        assert r9AudioMixer.readWavHeader(output)['frames'] >= int((50 + 10) / 25.0 * 44100)
+
+
+class Test_AudioCache(object):
+    def setup(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.cache = r9AudioCache.AudioCache(os.path.join(self.tempDir, 'cache'))
+        self.bwavpath = os.path.join(r9Setup.red9ModulePath(), 'tests', 'testFiles', 'bwav_test.wav')
+        self.tone = os.path.join(self.tempDir, 'tone.wav')
+        writeTone(self.tone, 3.0, 440, channels=2)
+
+    def teardown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_header(self):
+        info = self.cache.info(self.bwavpath)
+        assert info.sampleRate == 44100
+        assert info.sampleWidth == 2
+        assert info.channels == 1
+        assert info.data['stats'] is None  # nothing read beyond the header yet
+        assert info.bwav['TimeReference'] == 227739993
+        assert info.bwav['Originator'] == 'Pro Tools'
+        assert info.bwav['OriginationDate'] == '2014-03-03'
+        assert info.timecodeMS == 5164172.1768707484
+        assert not self.cache.info(self.tone).bwav
+
+    def test_stats_match_pydub(self):
+        from Red9.packages.pydub.pydub import audio_segment
+        for path in [self.bwavpath, self.tone]:
+            info = self.cache.info(path)
+            segment = audio_segment.AudioSegment.from_wav(path)
+            assert info.duration == segment.duration_seconds
+            assert info.rms == segment.rms
+            assert info.peak == segment.max
+            assert abs(info.dBFS - segment.dBFS) < 1e-9
+            assert abs(info.max_dBFS - segment.max_dBFS) < 1e-9
+
+    def test_peaks(self):
+        info = self.cache.info(self.tone)
+        levels = info.peakLevels()
+        assert len(levels[0]) == 2 * int(math.ceil(3.0 * 44100 / r9AudioCache.PEAK_BASE_FRAMES))
+        assert len(levels[-1]) <= 2 * r9AudioCache.PEAK_MIN_BUCKETS
+        for level in levels:
+            assert max(level) == info.peak
+        bucketFrames, peaks = info.peaks(samplesPerPixel=1000)
+        assert bucketFrames == 512
+        assert peaks == levels[1]
+        assert info.peaks()[0] == r9AudioCache.PEAK_BASE_FRAMES
+
+    def test_persist_and_invalidate(self):
+        info = self.cache.info(self.tone)
+        rms = info.rms
+        # a new cache on the same dir restores the stats and the peaks from disk
+        cache = r9AudioCache.AudioCache(self.cache.cacheDir)
+        restored = cache.info(self.tone)
+        assert restored.data['stats']['rms'] == rms
+        assert restored.peakLevels() == info.peakLevels()
+        assert cache.info(self.tone) is restored
+
+        # rewriting the wav drops the cached data
+        writeTone(self.tone, 1.0, 440, channels=1)
+        os.utime(self.tone, (0, 0))
+        info = cache.info(self.tone)
+        assert info is not restored
+        assert info.channels == 1
+        assert info.data['stats'] is None
+        assert abs(info.duration - 1.0) < 1e-6
+
+    def test_latin1_bext(self):
+        # DAWs often write latin-1 into the bext text fields, these must still cache
+        bwav = os.path.join(self.tempDir, 'latin1.wav')
+        with open(self.tone, 'rb') as f:
+            data = f.read()
+        bext = struct.pack(r9AudioCache.BEXT_FORMAT, 'Caf\xe9 sc\xe8ne 12', 'Pro Tools', 'ref',
+                           '2014-03-03', '10:00:00', 48000, 0, 1)
+        chunk = 'bext' + struct.pack('<I', len(bext)) + bext
+        data = data[:12] + chunk + data[12:]
+        with open(bwav, 'wb') as f:
+            f.write('RIFF' + struct.pack('<I', len(data) - 8) + data[8:])
+        info = self.cache.info(bwav)
+        assert info.bwav['Description'] == u'Caf\xe9 sc\xe8ne 12'
+        assert info.bwav['TimeReference'] == 48000
+        assert info.duration == 3.0
+        # and restores from the saved cache
+        restored = r9AudioCache.AudioCache(self.cache.cacheDir).info(bwav)
+        assert restored.bwav['Description'] == u'Caf\xe9 sc\xe8ne 12'
+
+    def test_failed_write_is_a_warning(self):
+        cacheDir = os.path.join(self.tempDir, 'notADir')
+        with open(cacheDir, 'w') as f:
+            f.write('')
+        info = r9AudioCache.AudioCache(cacheDir).info(self.tone)
+        assert info.sampleRate == 44100
+        assert info.rms
+
+    def test_audioNode(self):
+        audioNode = r9Audio.AudioNode(filepath=self.bwavpath)
+        assert audioNode.audioInfo is r9AudioCache.getAudioInfo(self.bwavpath)
+        cmds.currentUnit(time='pal')
+        assert audioNode.getLengthFromWav() == audioNode.duration * 25
+
+
+class Test_SilenceDetection(object):
+    '''
+    the running sum silence detection against the original, slice per millisecond, version
+    '''
+    def setup(self):
+        from Red9.packages.pydub.pydub import audio_segment
+        self.tempDir = tempfile.mkdtemp()
+        tone = os.path.join(self.tempDir, 'tone.wav')
+        quiet = os.path.join(self.tempDir, 'quiet.wav')
+        writeTone(tone, 0.5, 440)
+        writeTone(quiet, 0.3, 440, amp=0.001)
+        tone = audio_segment.AudioSegment.from_wav(tone)
+        quiet = audio_segment.AudioSegment.from_wav(quiet)
+        silence = audio_segment.AudioSegment.silent(700)
+        self.segment = tone + silence + quiet + tone + silence[:250] + tone
+
+    def teardown(self):
+        shutil.rmtree(self.tempDir)
+
+    @staticmethod
+    def detect_silence_sliced(audio_segment, min_silence_len, silence_thresh):
+        from Red9.packages.pydub.pydub.utils import db_to_float
+        silence_thresh = db_to_float(silence_thresh) * audio_segment.max_possible_amplitude
+        return [i for i in range(len(audio_segment) - min_silence_len + 1)
+                if audio_segment[i:i + min_silence_len].rms < silence_thresh]
+
+    def test_matches_sliced(self):
+        from Red9.packages.pydub.pydub import silence
+        for min_silence_len, silence_thresh in [(200, -30), (100, -50), (300, -16), (50, -40), (1000, -16)]:
+            ranges = silence.detect_silence(self.segment, min_silence_len, silence_thresh)
+            starts = []
+            for start, end in ranges:
+                starts.extend(range(start, end - min_silence_len + 1))
+            assert starts == self.detect_silence_sliced(self.segment, min_silence_len, silence_thresh)
+
+    def test_8bit_tail(self):
+        # len() rounds 130.6ms up to 131, the sliced windows over the end are padded with
+        # 0x00, full scale in unsigned 8bit, so the last window isn't silent
+        from Red9.packages.pydub.pydub import audio_segment, silence
+        segment = audio_segment.AudioSegment(data='\x80' * 1440, metadata={'sample_width': 1, 'frame_rate': 11025,
+                                                                         'channels': 1, 'frame_width': 1})
+        assert len(segment) == 131
+        starts = self.detect_silence_sliced(segment, 10, -40)
+        assert starts[-1] < len(segment) - 10
+        assert silence.detect_silence(segment, 10, -40) == [[starts[0], starts[-1] + 10]]
+
+    def test_consumers(self):
+        from Red9.packages.pydub.pydub import silence
+        # the quiet block is well under -50dBFS so both gaps read as silence
+        assert silence.detect_nonsilent(self.segment, 200, -50) == [[0, 500], [1500, 2000], [2250, 2750]]
+        chunks = silence.split_on_silence(self.segment, 200, -50, keep_silence=0)
+        assert [len(chunk) for chunk in chunks] == [500, 500, 500]
+        assert len(self.segment.strip_silence(200, -50, padding=0)) == 1500
+
+    def test_longSegment(self):
+        from Red9.packages.pydub.pydub import silence
+        segment = self.segment * 4
+        sliced = self.detect_silence_sliced(segment, 500, -30)
+        ranges = silence.detect_silence(segment, 500, -30)
+        assert sum([end - start - 499 for start, end in ranges]) == len(sliced)
+
+
+class Test_PydubSampleViews(object):
+    '''
+    zero-copy slicing and the array based effects in the pydub AudioSegment
+    '''
+    def setup(self):
+        from Red9.packages.pydub.pydub import audio_segment
+        self.tempDir = tempfile.mkdtemp()
+        loud = os.path.join(self.tempDir, 'loud.wav')
+        quiet = os.path.join(self.tempDir, 'quiet.wav')
+        writeTone(loud, 0.2, 440, rate=22050, channels=2, amp=0.9)
+        writeTone(quiet, 0.2, 440, rate=22050, channels=2, amp=0.05)
+        loud = audio_segment.AudioSegment.from_wav(loud)
+        quiet = audio_segment.AudioSegment.from_wav(quiet)
+        self.segment = quiet + loud + quiet + loud
+
+    def teardown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_views(self):
+        sliced = self.segment[100:500][50:250]
+        assert not isinstance(sliced._raw, bytes)  # still a view over the parent's data
+        assert sliced.rms == self.segment[150:350].rms
+        assert len(sliced) == 200
+        data = sliced._data
+        assert isinstance(data, bytes) and sliced._raw is data
+        assert sliced == self.segment[150:350]
+
+        samples = self.segment.get_array_of_samples()
+        assert len(samples) == self.segment.frame_count() * self.segment.channels
+        assert self.segment._spawn(samples) == self.segment
+        # padding past the end still builds real data
+        assert len(self.segment[750:900]) == 50
+
+    def test_lookback_rms(self):
+        from Red9.packages.pydub.pydub import effects
+        segment = self.segment[180:230]
+        look_frames = int(segment.frame_count(ms=5))
+        rms = list(effects._lookback_rms(segment, look_frames))
+        assert rms == [segment.get_sample_slice(i - look_frames, i).rms
+                       for i in range(int(segment.frame_count()))]
+
+    def test_filters(self):
+        import array
+        import math
+        # the original per frame implementation of the low pass
+        segment = self.segment[150:450]
+        alpha = (1.0 / segment.frame_rate) / (1.0 / (800 * 2 * math.pi) + 1.0 / segment.frame_rate)
+        original = array.array('h', segment._data)
+        expected = array.array('h', original)
+        last_val = list(original[:segment.channels])
+        for i in range(1, int(segment.frame_count())):
+            for j in range(segment.channels):
+                offset = (i * segment.channels) + j
+                last_val[j] = last_val[j] + (alpha * (original[offset] - last_val[j]))
+                expected[offset] = int(last_val[j])
+        assert segment.low_pass_filter(800)._data == expected.tostring()
+
+        high = segment.high_pass_filter(2000)
+        assert high.rms < segment.rms
+        assert len(high) == len(segment)
+
+    def test_compress(self):
+        compressed = self.segment.compress_dynamic_range(threshold=-12.0, ratio=4.0)
+        assert len(compressed) == len(self.segment)
+        # the quiet sections are under the threshold and copied across untouched
+        assert compressed[:150] == self.segment[:150]
+        assert compressed[250:350].max < self.segment[250:350].max
+
+
 class Test_timecode_converts(object):
     def setup(self):
         cmds.file(new=True, f=True)
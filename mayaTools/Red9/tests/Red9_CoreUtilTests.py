@@ -20,8 +20,15 @@ maya.standalone.initialize(name='python')
 
 import maya.cmds as cmds
 import os
+import glob
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
 
 import Red9.core.Red9_CoreUtils as r9Core
+import Red9.core.Red9_ConfigIO as r9ConfigIO
+import Red9.packages.configobj as configobj
 import Red9.startup.setup as r9Setup
 # r9Setup.boot_client_projects(batchclients=['Testing'])
 
@@ -113,6 +120,90 @@ class Test_FilterSettings():
         assert self.filter.metaRig
 
 
+class Test_ConfigIO(object):
+    '''
+    the fast ConfigObj reader / writer must give the same data and bytes as ConfigObj itself
+    '''
+    def setup(self):
+        self.tempDir = tempfile.mkdtemp()
+        testFiles = os.path.join(os.path.dirname(__file__), 'testFiles')
+        self.files = [os.path.join(testFiles, 'mirrorData.mirrorMap')]
+        self.files.extend(glob.glob(os.path.join(testFiles, 'MetaRig_Poses', '*.pose')))
+        self.files.extend(glob.glob(os.path.join(testFiles, 'MetaRig_Poses', '*', '*.pose')))
+
+    def teardown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_read_matches_configobj(self):
+        for filepath in self.files:
+            for encoding in [None, 'utf-8']:
+                assert r9ConfigIO.read(filepath, encoding=encoding) == configobj.ConfigObj(filepath, encoding=encoding).dict()
+
+    def test_roundtrip_bytes(self):
+        # files written by ConfigObj come back out byte for byte
+        for filepath in self.files:
+            with open(filepath, 'rb') as f:
+                raw = f.read()
+            newline = '\r\n' if '\r\n' in raw else '\n'
+            data = r9ConfigIO.read(filepath, encoding='utf-8', dictType=OrderedDict)
+            assert r9ConfigIO.dumps(data, encoding='utf-8', newline=newline) == raw
+        # non-ASCII data written by ConfigObj, and a value only unicode splitlines would break
+        config = configobj.ConfigObj(indent_type='\t', encoding='utf-8')
+        config[u'info'] = {u'description': u'caf\xe9', u'sep': u'x\u2028', u'user': u'J\xfcrgen'}
+        config[u'poseData'] = {u'N\xf6de_Ctr': {u'attrs': {u'rotateX': u'1.5'}}}
+        config.filename = os.path.join(self.tempDir, 'unicode.cfg')
+        config.write()
+        with open(config.filename, 'rb') as f:
+            raw = f.read()
+        data = r9ConfigIO.read(config.filename, encoding='utf-8', dictType=OrderedDict)
+        assert data == configobj.ConfigObj(config.filename, encoding='utf-8').dict()
+        assert data['info']['sep'] == u'x\u2028'
+        assert r9ConfigIO.dumps(data, encoding='utf-8', newline=os.linesep) == raw
+
+    def test_write_matches_configobj(self):
+        data = OrderedDict()
+        data['info'] = {'author': 'Red9', 'date': 'Fri Feb 08 11:35:41 2019', 'empty': '',
+                        'padded': ' space ', 'comma': 'a,b', 'hash': 'x#y', 'quotes': 'say "hi"',
+                        'both': 'it\'s "both"', 'lines': 'one\ntwo', 'description': u'caf\xe9',
+                        u'\xfcser': u'J\xfcrgen, Z\xfcrich'}
+        data['poseData'] = {'|World_Ctrl|COG_Ctr': {'ID': 0, 'attrs': {'translateX': 0.123456789012345, 'rotateY': -90.0},
+                                                    'longName': '|World_Ctrl|COG_Ctr', 'enabled': True},
+                            'L_Wrist_Ctr': {'ID': 1, 'attrs': {}, 'parent': None},
+                            u'N\xf6de_Ctr': {'ID': 2, 'longName': u'|N\xf6de_Ctr'}}
+        data['lists'] = {'empty': [], 'single': ['a'], 'many': ['a', ' b', 'c,d', '', 1.5], 'tuple': (1, 2)}
+        r9ConfigIO.write(os.path.join(self.tempDir, 'fast.cfg'), data, encoding='utf-8')
+
+        config = configobj.ConfigObj(indent_type='\t', encoding='utf-8')
+        for key, value in data.items():
+            config[key] = value
+        config.filename = os.path.join(self.tempDir, 'configobj.cfg')
+        config.write()
+        with open(os.path.join(self.tempDir, 'fast.cfg'), 'rb') as f:
+            fast = f.read()
+        with open(config.filename, 'rb') as f:
+            assert f.read() == fast
+        assert r9ConfigIO.read(config.filename, encoding='utf-8') == configobj.ConfigObj(config.filename, encoding='utf-8').dict()
+        assert '\tdescription = caf\xc3\xa9' in fast
+        # utf-8 encoded str values are decoded before writing, as ConfigObj._decode_element
+        assert r9ConfigIO.dumps({'info': {'description': 'caf\xc3\xa9'}}, encoding='utf-8', newline='\n') == '[info]\n\tdescription = caf\xc3\xa9\n'
+
+    def test_lazy_sections(self):
+        filepath = os.path.join(os.path.dirname(__file__), 'testFiles', 'MetaRig_Poses', 'jump_f218.pose')
+        full = r9ConfigIO.read(filepath)
+        lazy = r9ConfigIO.read(filepath, sections=['filterNode_settings'])
+        assert lazy.keys() == ['filterNode_settings']
+        assert lazy['filterNode_settings'] == full['filterNode_settings']
+        assert r9ConfigIO.read(filepath, sections=[]) == {}
+
+    def test_errors(self):
+        for text in ['[a]\nkey = 1\nkey = 2', '[a]\n[a]', '[a]\n[[[b]]]', '[a]\nkey = "x" y', '[a]\nnot a key']:
+            try:
+                r9ConfigIO.parse(text)
+                assert False, 'expected a ConfigObjError : %s' % text
+            except configobj.ConfigObjError:
+                pass
+
+
 class Test_FilterNode():
 
     def setup(self):
@@ -295,6 +386,41 @@ class Test_FilterNode():
         self.filterNode.settings.searchPattern = ['Cube']
         assert self.filterNode.ProcessFilter() == ['|World_Root|pCube4_AttrMarked']
 
+    def test_compiledFilterPlan(self):
+        '''
+        the compiled FilterPlan must return exactly the same as the chained filter calls
+        '''
+        testSettings = [{'nodeTypes': ['joint']},
+                        {'nodeTypes': ['nurbsCurve', 'locator']},
+                        {'nodeTypes': ['joint', 'locator', 'mesh'], 'transformClamp': False},
+                        {'nodeTypes': ['joint', 'locator', 'mesh'], 'searchAttrs': ['MarkerAttr']},
+                        {'nodeTypes': ['nurbsCurve', 'locator'], 'searchPattern': ['Ctrl', 'NOT:Pole']},
+                        {'searchAttrs': ['MarkerAttr', 'NOT:Ignore']},
+                        {'searchPattern': ['NOT:Pole']},
+                        {'hierarchy': True},
+                        {'hierarchy': True, 'incRoots': False, 'transformClamp': False},
+                        {'hierarchy': True, 'nodeTypes': ['mesh'], 'searchPattern': 'Cube'},
+                        {'hierarchy': True, 'searchAttrs': ['MarkerAttr'],
+                         'filterPriority': ['R_Pole_AttrMarked_Ctrl', 'joint5_AttrMarked']}]
+
+        for settings in testSettings:
+            self.filterNode.settings.resetFilters()
+            self.filterNode.settings.setByDict(settings)
+            assert r9Core.FilterPlan.isSupported(self.filterNode)
+            compiled = self.filterNode.processFilter(compiled=True)
+            for key in self.filterNode.filterTimings.keys():
+                assert key in ['hierarchy', 'nodeTypes', 'searchAttrs', 'searchPattern', 'filterPriority']
+            assert compiled == self.filterNode.processFilter(compiled=False)
+
+        # unsupported roots and settings go through the chained calls
+        self.filterNode.settings.resetFilters()
+        self.filterNode.settings.nodeTypes = ['blendShape']
+        assert not r9Core.FilterPlan.isSupported(self.filterNode)
+        assert self.filterNode.ProcessFilter() == ['ffff']
+        self.filterNode.rootNodes = ['TestChSet']
+        self.filterNode.settings.hierarchy = True
+        assert not r9Core.FilterPlan.isSupported(self.filterNode)
+
     def test_WorldFilter(self):
         '''
         No rootNode so processing at World/Scene level
@@ -514,6 +640,43 @@ class Test_LockNodes(object):
                                                             'rotateX', 'rotateY', 'rotateZ',
                                                             'scaleX', 'scaleY', 'scaleZ']
 
+def bruteMatchNodeLists(nodeListA, nodeListB):
+    '''
+    the original nested loop stripPrefix matching that matchNodeLists replaced
+    '''
+    hierarchyB = list(nodeListB)
+    matchedData = []
+    for nodeA in nodeListA:
+        strippedA = r9Core.nodeNameStrip(nodeA).upper()
+        match = None
+        for nodeB in hierarchyB:
+            if strippedA == r9Core.nodeNameStrip(nodeB).upper():
+                match = nodeB
+                break
+        if not match:
+            for nodeB in hierarchyB:
+                strippedB = r9Core.nodeNameStrip(nodeB).upper()
+                if strippedA.endswith(strippedB) or strippedB.endswith(strippedA):
+                    match = nodeB
+                    break
+        if match:
+            matchedData.append((nodeA, match))
+            hierarchyB.remove(match)
+    return matchedData
+
+
+def matchNodeListsData(count):
+    '''
+    two shuffled hierarchies of count nodes that only match on stripPrefix
+    '''
+    import random
+    random.seed(count)
+    nodesA = ['|Root|Grp%i|REF:L_Jnt_%i' % (i / 100, i) for i in range(count)]
+    nodesB = ['Rig%i_L_Jnt_%i' % (i % 3, i) if i % 2 else 'ANIM:l_jnt_%i' % i for i in range(count)]
+    random.shuffle(nodesB)
+    return nodesA, nodesB
+
+
 class Test_Matching_CoreFuncs(object):
 
 #    def setup(self):
@@ -528,9 +691,66 @@ class Test_Matching_CoreFuncs(object):
         # TODO: Fill Test
         pass
     def test_matchNodeLists(self):
-        # TODO: Fill Test
-        pass  #
+        nodesA = ['|World_Root|Hips', '|World_Root|Hips|Spine', '|World_Root|Hips|L_Leg', 'Bob:R_Leg', 'Head', 'Unknown']
+        nodesB = ['Rig_Spine', 'Fred:Hips', 'Fred:Hips_Spine', 'R_Leg', 'Fred:L_Leg', 'Fred:Head', 'Fred:Neck']
+
+        assert r9Core.matchNodeLists(nodesA, nodesB, matchMethod='base', returnfails=True) == \
+                ([('|World_Root|Hips', 'Fred:Hips'),
+                  ('|World_Root|Hips|L_Leg', 'Fred:L_Leg'),
+                  ('Bob:R_Leg', 'R_Leg'),
+                  ('Head', 'Fred:Head')],
+                 ['|World_Root|Hips|Spine', 'Unknown'])
+
+        # stripPrefix : base matches take priority, then the first remaining B in order
+        assert r9Core.matchNodeLists(nodesA, nodesB, matchMethod='stripPrefix', returnfails=True) == \
+                ([('|World_Root|Hips', 'Fred:Hips'),
+                  ('|World_Root|Hips|Spine', 'Rig_Spine'),
+                  ('|World_Root|Hips|L_Leg', 'Fred:L_Leg'),
+                  ('Bob:R_Leg', 'R_Leg'),
+                  ('Head', 'Fred:Head')],
+                 ['Unknown'])
+
+        # prefix either side, and B nodes are only ever consumed once
+        assert r9Core.matchNodeLists(['Spine', 'Rig_X_Spine', 'Spine'], ['X_Spine', 'Spine', 'Spine_b'], matchMethod='stripPrefix',
+                                     returnfails=True) == ([('Spine', 'Spine'), ('Rig_X_Spine', 'X_Spine')], ['Spine'])
+
+        assert r9Core.matchNodeLists(['a', 'b'], ['c', 'd']) == []
+        assert r9Core.matchNodeLists(['a', 'b'], ['c', 'd'], matchMethod='index') == [('a', 'c'), ('b', 'd')]
+
+    def test_matchNodeLists_5k(self):
+        '''
+        equivalence against the original nested loop matching over 5k node hierarchies,
+        the timings are in Test_SpeedTesting
+        '''
+        nodesA, nodesB = matchNodeListsData(5000)
+        matched = r9Core.matchNodeLists(nodesA, nodesB, matchMethod='stripPrefix')
+        assert matched == bruteMatchNodeLists(nodesA, nodesB)
+        assert len(matched) == 5000
+
     def test_MatchedNodeInputs(self):
         # TODO: Fill Test
         pass  #
 
+
+class Test_SpeedTesting():
+    '''
+    These are all set to fail so that we get the capture output that we can bracktrack
+    '''
+    def test_matchNodeLists(self):
+        '''
+        indexed stripPrefix matchNodeLists against the original nested loop at 1k and 5k nodes
+        '''
+        for count in [1000, 5000]:
+            nodesA, nodesB = matchNodeListsData(count)
+
+            now = time.clock()
+            brute = bruteMatchNodeLists(nodesA, nodesB)
+            bruteTime = time.clock() - now
+
+            now = time.clock()
+            indexed = r9Core.matchNodeLists(nodesA, nodesB, matchMethod='stripPrefix')
+            indexTime = time.clock() - now
+
+            assert indexed == brute
+            print 'SPEED: matchNodeLists stripPrefix %i nodes : nested loop : %s : indexed : %s' % (count, bruteTime, indexTime)
+        assert False
@@ -107,6 +107,51 @@ class Test_MetaCache():
         assert r9Meta.RED9_META_NODECACHE[UUID] == a
         assert r9Meta.MetaClass(a.mNode).getUUID() == UUID
 
+    def test_cacheCallbacks(self):
+        '''
+        the cache is kept in sync by the nodeRemoved / nameChanged callbacks
+        rather than having to be cleaned
+        '''
+        a = r9Meta.MetaRig(name='rig')
+        UUID = a.getUUID()
+        assert UUID in r9Meta.RED9_META_NODECACHE
+        cmds.rename(a.mNode, 'renamedRig')
+        assert UUID in r9Meta.RED9_META_NODECACHE
+        assert r9Meta.getMetaFromCache('renamedRig') == a
+
+        cmds.lockNode(a.mNode, lock=False)
+        cmds.delete(a.mNode)
+        assert UUID not in r9Meta.RED9_META_NODECACHE
+        assert not r9Meta.RED9_META_NODECACHE._handles
+
+        # name keyed wrapped nodes get re-keyed on rename
+        cube = cmds.polyCube(name='cube1')[0]
+        n1 = r9Meta.MetaClass(cube)
+        r9Meta.RED9_META_NODECACHE['|cube1'] = n1
+        cmds.rename(cube, 'renamedCube1')
+        assert '|cube1' not in r9Meta.RED9_META_NODECACHE
+        assert r9Meta.RED9_META_NODECACHE['|renamedCube1'] == n1
+
+    def test_cacheStats_and_eviction(self):
+        r9Meta.RED9_META_NODECACHE.resetStats()
+        a = r9Meta.MetaClass(name='a')
+        assert r9Meta.MetaClass(a.mNode) == a
+        stats = r9Meta.getMetaCacheStats()
+        assert stats['hits'] == 1
+        assert stats['size'] == 1
+
+        maxSize = r9Meta.RED9_META_NODECACHE.maxSize
+        try:
+            r9Meta.setMetaCacheSize(2)
+            for i in range(4):
+                r9Meta.MetaClass(name='n%i' % i)  # unreferenced instances
+            assert len(r9Meta.RED9_META_NODECACHE) == 2
+            # 'a' is still referenced so must never be evicted
+            assert a.getUUID() in r9Meta.RED9_META_NODECACHE
+            assert r9Meta.getMetaCacheStats()['evictions'] == 3
+        finally:
+            r9Meta.setMetaCacheSize(maxSize)
+
     def test_wrappedMayaNodes(self):
         '''
         test how the cache handles non mClass nodes
@@ -824,6 +869,86 @@ class Test_MetaClass():
         mClass = r9Meta.getMetaNodes()[0]
         assert len(mClass.json_test)
 
+    def test_cachedReads(self):
+        '''
+        reads inside the cachedReads scope must match the standard cmds reads
+        '''
+        self.MClass.addAttr('boolTest', True)
+        self.MClass.addAttr('intTest', 3)
+        self.MClass.addAttr('floatTest', 1.5)
+        self.MClass.addAttr('stringTest', 'hello')
+        self.MClass.addAttr('jsonTest', {'a': 1, 'b': [1, 2]})
+        self.MClass.addAttr('vecTest', (1.0, 2.0, 3.0), attrType='double3')
+        self.MClass.addAttr('enumTest', enumName='A:B:C', attrType='enum')
+        attrs = ['boolTest', 'intTest', 'floatTest', 'stringTest', 'jsonTest', 'vecTest', 'enumTest', 'mClass']
+        expected = dict((attr, getattr(self.MClass, attr)) for attr in attrs)
+
+        with self.MClass.cachedReads() as readCache:
+            for attr in attrs:
+                assert getattr(self.MClass, attr) == expected[attr]
+            assert readCache.hits == len(attrs)
+
+            # returned complex data is a copy so can't corrupt the snapshot
+            data = self.MClass.jsonTest
+            data['a'] = 2
+            assert self.MClass.jsonTest == {'a': 1, 'b': [1, 2]}
+
+            # setting invalidates the snapshot entry
+            self.MClass.intTest = 10
+            assert 'intTest' not in readCache.data
+            assert self.MClass.intTest == 10
+        assert not self.MClass._readCache
+        assert self.MClass.intTest == 10
+
+        # module level, multiple nodes
+        other = r9Meta.MetaClass(name='other')
+        with r9Meta.cachedReads([self.MClass, other]):
+            assert other.mClass == 'MetaClass'
+            assert other._readCache.hits == 1
+
+    def test_attrCodecs(self):
+        '''
+        large complex data is pushed through the codec layer, small data stays as plain JSON
+        and existing JSON strings must still decode
+        '''
+        self.MClass.addAttr('smallData', {'a': 1})
+        assert cmds.getAttr('%s.smallData' % self.MClass.mNode) == '{"a": 1}'
+
+        weights = [float(i) / 7 for i in range(20000)]
+        vectors = [[1.5, 2.5, float(i)] for i in range(5000)]
+        data = {'weights': weights, 'vectors': vectors, 'name': 'test', 'ints': range(10000)}
+        self.MClass.addAttr('blockDat', data)
+        raw = cmds.getAttr('%s.blockDat' % self.MClass.mNode)
+        assert raw.startswith('r9ld:')
+        assert len(raw) < len(r9Meta.json.dumps(data))
+
+        # decoded as a plain dict by default
+        result = self.MClass.blockDat
+        assert type(result) == dict
+        assert result == data
+
+        # lazy mode, only the keys accessed are decoded and dict copies still get the values
+        r9Meta.RED9_META_LAZY_DECODE = True
+        try:
+            result = self.MClass.blockDat
+            assert isinstance(result, r9Meta.LazyDecodeDict)
+            assert set(result._pending) == set(['weights', 'vectors', 'name', 'ints'])
+            assert result['name'] == 'test'
+            assert set(result._pending) == set(['weights', 'vectors', 'ints'])
+            assert dict(result) == data
+            assert result == data
+        finally:
+            r9Meta.RED9_META_LAZY_DECODE = False
+
+        self.MClass.addAttr('weightList', weights)
+        assert cmds.getAttr('%s.weightList' % self.MClass.mNode).startswith('r9na:')
+        assert self.MClass.weightList == weights
+
+        # legacy JSON written directly is still read
+        cmds.addAttr(self.MClass.mNode, longName='legacy', dt='string')
+        cmds.setAttr('%s.legacy' % self.MClass.mNode, r9Meta.json.dumps(data), type='string')
+        assert self.MClass.legacy == data
+
     def test_castingStandardNode(self):
         mLambert = r9Meta.MetaClass('lambert1')
         # mLambert is just a Python MetaNode and doesn't exist as a MayaNode
@@ -964,6 +1089,21 @@ class Test_Generic_SearchCalls():
         # TODO: Fill Test
         pass
 
+    def test_metaNodeIndex(self):
+        '''
+        the bulk index must return exactly what the per-node isMetaNode calls do
+        '''
+        index = r9Meta.MetaNodeIndex()
+        nodes = cmds.ls(type=r9Meta.getMClassNodeTypes(), l=True)
+        assert index.query() == [n for n in nodes if r9Meta.isMetaNode(n)]
+        assert index.query(mTypes=['MetaRig', 'MetaFacialRig']) == \
+                [n for n in nodes if r9Meta.isMetaNode(n, mTypes=['MetaRig', 'MetaFacialRig'])]
+        assert index.query(mInstances=r9Meta.MetaRig) == \
+                [n for n in nodes if r9Meta.isMetaNodeInherited(n, r9Meta.MetaRig)]
+        assert index.query(mInstances='MetaRig', mClassGrps='MetaRig') == ['MetaRig_Test']
+        assert index.getData('MetaRig_Test')['mNodeID'] == 'MetaRig_Test'
+        assert r9Meta.getMetaNodes(dataType=None, mTypes=['MetaRig'], index=index) == ['MetaRig_Test']
+
 class Test_MetaRig():
 
     def setup(self):
@@ -1321,6 +1461,34 @@ class Test_SpeedTesting():
         print 'Timer should be around 8.5 secs on the Beast'
         assert False
 
+    def test_getMetaNodes_index(self):
+        '''
+        per-node isMetaNode / isMetaNodeInherited / isMetaNodeClassGrp calls
+        against the single pass MetaNodeIndex at 1k, 10k and 50k nodes
+        '''
+        created = 0
+        for count in [1000, 10000, 50000]:
+            for i in range(created, count):
+                if i % 2:
+                    cmds.createNode('network', name='plain%s' % i)
+                else:
+                    r9Meta.MetaRig(name='rig%s' % i, autofill=False)
+            created = count
+            r9Meta.resetCache()
+
+            now = time.clock()
+            legacy = [n for n in cmds.ls(type=r9Meta.getMClassNodeTypes(), l=True)
+                      if r9Meta.isMetaNodeInherited(n, 'MetaRig') and r9Meta.isMetaNodeClassGrp(n, 'MetaRig')]
+            legacyTime = time.clock() - now
+
+            now = time.clock()
+            indexed = r9Meta.getMetaNodes(mInstances='MetaRig', mClassGrps='MetaRig', dataType=None)
+            indexTime = time.clock() - now
+
+            assert indexed == legacy
+            print 'SPEED: getMetaNodes %i nodes : per-node : %s : MetaNodeIndex : %s' % (count, legacyTime, indexTime)
+        assert False
+
 
 
 
@@ -1391,6 +1559,27 @@ class Test_MetaNetworks():
         assert [node.mNodeID for node in nodes] == ['R_Arm_System', 'L_Arm_System']
 
 
+    def test_metaGraphWalker(self):
+        walker = r9Meta.MetaGraphWalker(source=False, destination=True)
+        cons = cmds.listConnections('MetaRig', type='network', s=False, d=True)
+        assert sorted(walker.connections('MetaRig')) == sorted(set(cons))
+
+        # depth limited and full walks
+        assert sorted(walker.walk('MetaRig', depth=1)) == sorted(set(cons))
+        assert sorted(walker.walk('C_Spine_System', depth=2)) == ['L_Arm_Support',
+                                                                  'L_Arm_System',
+                                                                  'L_other_System',
+                                                                  'R_Arm_Support',
+                                                                  'R_Arm_System',
+                                                                  'R_other_System']
+        assert sorted(walker.walk('MetaRig')) == sorted([n.mNode for n in self.mRig.getChildMetaNodes(walk=True)])
+
+        # filter as we go, stops the walk at the Arm systems
+        nodes = walker.walk('MetaRig', filterFunc=lambda w, n: 'Arm' not in n)
+        assert 'L_Arm_System' not in nodes
+        assert 'L_Fingers_System' not in nodes
+        assert 'L_Toes_System' in nodes
+
     def test_getParentSystems(self):
         assert r9Meta.getConnectedMetaSystemRoot('L_Fingers_System').mNode == 'MetaRig'
         assert r9Meta.getConnectedMetaSystemRoot('L_Toes_System').mNode == 'MetaRig'
@@ -22,6 +22,8 @@ import os
 import Red9.core.Red9_Meta as r9Meta
 import Red9.core.Red9_CoreUtils as r9Core
 import Red9.core.Red9_PoseSaver as r9Pose
+import Red9.core.Red9_PoseIndex as r9PoseIndex
+import Red9.core.Red9_PoseDiff as r9PoseDiff
 
 import Red9.startup.setup as r9Setup
 # r9Setup.start(Menu=False, loadclients=['Testing'])  # this gets called by the Maya boot sequence anyway!!!!
@@ -338,4 +340,353 @@ class Test_PoseData_loaders():
                                       compareDict='poseDict').compare()
         assert r9Pose.PoseCompare(self.poseData, os.path.join(self.poseFolder, 'jump_f9_absolute29.pose'), compareDict='poseDict').compare()
 
+    def test_poseBlendEngine(self):
+        self.poseData.matchMethod = 'stripPrefix'
+        cmds.currentTime(0)
+        filepath = os.path.join(self.poseFolder, 'jump_f218.pose')
+        self.poseData.filepath = filepath
+        self.poseData.processPoseFile(self.rootNode)
+        engine = r9Pose.PoseBlendEngine(self.poseData)
+        assert engine.plugs
+        assert len(engine.plugs) == len(engine.channels) == len(engine.target)
+        engine.captureStart()
+        start = [cmds.getAttr(channel) for channel in engine.channels]
+
+        engine.apply(50)
+        for channel, startVal, target in zip(engine.channels, start, engine.target):
+            assert r9Core.floatIsEqual(cmds.getAttr(channel), startVal + (target - startVal) * 0.5, 0.001)
+        engine.apply(0)
+        for channel, startVal in zip(engine.channels, start):
+            assert r9Core.floatIsEqual(cmds.getAttr(channel), startVal, 0.001)
+        engine.commit(100)
+        for channel, target in zip(engine.channels, engine.target):
+            assert r9Core.floatIsEqual(cmds.getAttr(channel), target, 0.001)
+
+        # locked channels are resolved out up front
+        cmds.setAttr(engine.channels[0], l=True)
+        assert engine.channels[0] not in r9Pose.PoseBlendEngine(self.poseData).channels
+        cmds.setAttr(engine.channels[0], l=False)
+
+
+class Test_PoseLibraryIndex():
+    '''
+    the on-disk pose index, run on a copy of the test pose library
+    '''
+    def setup(self):
+        import tempfile
+        import shutil
+        self.tempDir = tempfile.mkdtemp()
+        self.poseFolder = os.path.join(self.tempDir, 'MetaRig_Poses')
+        shutil.copytree(getPoseFolder(), self.poseFolder)
+        self.index = r9PoseIndex.PoseLibraryIndex(self.poseFolder)
+
+    def teardown(self):
+        import shutil
+        self.index.close()
+        for index in r9PoseIndex.RED9_POSE_INDEXES.values():
+            index.close()
+        shutil.rmtree(self.tempDir)
+
+    def test_update(self):
+        poses = [f for f in os.listdir(self.poseFolder) if f.endswith('.pose')]
+        report = self.index.update(recursive=False)
+        assert report['added'] == len(poses)
+        assert self.index.update(recursive=False) == {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': len(poses)}
+
+        # incremental, only the changed files are re-read
+        os.utime(os.path.join(self.poseFolder, 'jump_f9.pose'), (0, 0))
+        os.remove(os.path.join(self.poseFolder, 'T_Pose.pose'))
+        assert self.index.verify(recursive=False) == {'missing': [], 'stale': ['jump_f9.pose'], 'removed': ['T_Pose.pose']}
+        report = self.index.update(recursive=False)
+        assert report['updated'] == 1 and report['removed'] == 1
+        assert not any(self.index.verify(recursive=False).values())
+
+    def test_poseData(self):
+        self.index.update()
+        pose = self.index.getPose('jump_f218.pose')
+        assert pose['metaRigNode'] == 'RED_Rig'
+        assert pose['info']['author'] == 'Red9'
+        assert pose['thumbnail'] == 'jump_f218.bmp'
+        poseData = r9Pose.PoseData()
+        poseData._readPose(os.path.join(self.poseFolder, 'jump_f218.pose'))
+        assert sorted(pose['nodes']) == sorted(poseData.poseDict.keys())
+
+    def test_unicodeInfo(self):
+        # non-ASCII info is read back as unicode by the ConfigIO parser
+        from collections import OrderedDict
+        import Red9.core.Red9_ConfigIO as r9ConfigIO
+        data = r9ConfigIO.read(os.path.join(self.poseFolder, 'jump_f9.pose'), encoding='utf-8', dictType=OrderedDict)
+        data['info']['author'] = u'J\xfcrgen'
+        data['info']['description'] = u'caf\xe9'
+        r9ConfigIO.write(os.path.join(self.poseFolder, 'jump_f9.pose'), data, encoding='utf-8')
+        self.index.update()
+        pose = self.index.getPose('jump_f9.pose')
+        assert pose['author'] == u'J\xfcrgen'
+        assert pose['info']['description'] == u'caf\xe9'
+        assert r9PoseIndex.cachedIndexPath(os.path.join(self.tempDir, u'Libr\xe4ry')).endswith('.db')
+
+    def test_search(self):
+        self.index.update()
+        assert self.index.poseNames() == ['T_Pose', 'jump_f9', 'jump_f9_absolute29', 'jump_f218', 'jump_f218_projected']
+        assert self.index.poseNames(searchFilter='^jump_f2') == ['jump_f218', 'jump_f218_projected']
+        assert self.index.poseNames(searchFilter='absolute,T_') == ['T_Pose', 'jump_f9_absolute29']
+        assert [p['path'] for p in self.index.search(metaRig='RED_Rig', columns=['path'])]
+        assert r9PoseIndex.listPoses(self.poseFolder) == self.index.poseNames()
+        assert r9PoseIndex.searchPoses(self.poseFolder, '^jump_f2') == ['jump_f218', 'jump_f218_projected']
+        assert r9PoseIndex.isIndexFilter('^jump,T_Pose')
+        assert not r9PoseIndex.isIndexFilter('jump.*f9') and not r9PoseIndex.isIndexFilter('jump f9')
+
+    def test_userCache(self):
+        # browsing an un-indexed library never writes into the pose folders
+        import shutil
+        library = os.path.join(self.tempDir, 'Library')
+        shutil.copytree(getPoseFolder(), library)
+        os.mkdir(os.path.join(library, 'Hands'))
+        cached = r9PoseIndex.cachedIndexPath(library)
+        self.index.update()
+        try:
+            assert r9PoseIndex.listPoses(library) == self.index.poseNames()
+            assert not os.path.exists(os.path.join(library, r9PoseIndex.POSE_INDEX_FILENAME))
+            assert os.path.exists(cached)
+            index, folder = r9PoseIndex.getPoseIndex(os.path.join(library, 'Hands'))
+            assert index.indexPath == cached and folder == 'Hands'
+
+            # a shared index that can't be opened drops back to the users cache
+            index.close()
+            os.remove(cached)
+            shared = r9PoseIndex.PoseLibraryIndex(library, indexPath=os.path.join(self.tempDir, 'locked.db'))
+            os.mkdir(shared.indexPath)
+            shared.update()
+            assert shared.indexPath == cached
+            assert shared.poseNames() == self.index.poseNames()
+            shared.close()
+        finally:
+            if os.path.exists(cached):
+                os.remove(cached)
+
+
+
+class Test_PoseBinaryFormat():
+    '''
+    the packed binary dataformat, run on a copy of the test pose library
+    '''
+    def setup(self):
+        import tempfile
+        import shutil
+        cmds.file(os.path.join(r9Setup.red9ModulePath(), 'tests', 'testFiles', 'MetaRig_anim_jump.mb'), open=True, f=True)
+        self.rootNode = '|World_Ctrl'
+        self.tempDir = tempfile.mkdtemp()
+        self.poseFolder = os.path.join(self.tempDir, 'MetaRig_Poses')
+        shutil.copytree(getPoseFolder(), self.poseFolder)
+        cmds.currentUnit(time='ntscf')
 
+        filterNode = r9Core.FilterNode_Settings()
+        filterNode.nodeTypes = 'nurbsCurve'
+        filterNode.incRoots = False
+        self.poseData = r9Pose.PoseData(filterNode)
+        self.poseData.matchMethod = 'stripPrefix'
+
+    def teardown(self):
+        import shutil
+        shutil.rmtree(self.tempDir)
+
+    def test_convertPoseFiles(self):
+        poses = sorted([f for f in os.listdir(self.poseFolder) if f.endswith('.pose')])
+        converted = r9Pose.convertPoseFiles(self.poseFolder, dataformat='binary')
+        assert sorted([os.path.basename(f) for f in converted]) == poses
+        assert not r9Pose.convertPoseFiles(self.poseFolder, dataformat='binary')
+
+        for pose in poses:
+            assert r9Pose.PoseBinaryFile.isBinary(os.path.join(self.poseFolder, pose))
+            config = r9Pose.PoseData()
+            config._readPose(os.path.join(getPoseFolder(), pose))
+            binary = r9Pose.PoseData()
+            binary._readPose(os.path.join(self.poseFolder, pose))
+            assert binary._dataformat_resolved == 'binary'
+            assert sorted(binary.poseDict.keys()) == sorted(config.poseDict.keys())
+            assert binary.infoDict['author'] == config.infoDict['author']
+            assert sorted(binary.skeletonDict.keys()) == sorted(config.skeletonDict.keys())
+            for key, data in config.poseDict.items():
+                assert binary.poseDict[key]['longName'] == data['longName']
+                assert binary.poseDict[key].get('metaData') == data.get('metaData')
+                for attr, val in data['attrs'].items():
+                    assert binary.poseDict[key]['attrs'][attr] == r9Core.decodeString(val)
+
+        # and back again
+        assert len(r9Pose.convertPoseFiles(self.poseFolder, dataformat='config')) == len(poses)
+        assert not r9Pose.PoseBinaryFile.isBinary(os.path.join(self.poseFolder, poses[0]))
+
+    def test_partialLoad(self):
+        filepath = os.path.join(self.poseFolder, 'jump_f218.pose')
+        r9Pose.convertPoseFiles(self.poseFolder, dataformat='binary')
+        cmds.currentTime(0)
+        self.poseData.poseLoad(self.rootNode, filepath=filepath, useFilter=True)
+        assert r9Pose.PoseCompare(self.poseData, os.path.join(getPoseFolder(), 'jump_f218.pose')).compare()
+
+        # only the matched nodes have their values read from disk
+        matched = [key for key, _ in self.poseData.matchedPairs]
+        assert all(('attrs' in data) == (key in matched) for key, data in self.poseData.poseDict.items())
+
+    def test_poseSaveLoad(self):
+        filepath = os.path.join(self.tempDir, 'binary.pose')
+        self.poseData.dataformat = 'binary'
+        cmds.currentTime(218)
+        self.poseData.poseSave(self.rootNode, filepath=filepath, useFilter=True, storeThumbnail=False)
+        assert r9Pose.PoseBinaryFile.isBinary(filepath)
+
+        cmds.currentTime(0)
+        self.poseData.poseLoad(self.rootNode, filepath=filepath, useFilter=True)
+        assert r9Pose.PoseCompare(self.poseData, os.path.join(getPoseFolder(), 'jump_f218.pose')).compare()
+
+    def test_roundtrip500(self):
+        import random
+        poseData = r9Pose.PoseData()
+        for i in range(500):
+            key = 'FACE_Ctrl_%i' % i
+            poseData.poseDict[key] = {'ID': i, 'longName': '|Rig|Face|%s' % key, 'attrs': {}}
+            for attr in ['translateX', 'translateY', 'translateZ', 'rotateX', 'rotateY', 'rotateZ', 'scaleX', 'scaleY', 'scaleZ', 'blend']:
+                poseData.poseDict[key]['attrs'][attr] = random.uniform(-10, 10)
+        for dataformat in ['config', 'binary']:
+            filepath = os.path.join(self.tempDir, 'face_%s.pose' % dataformat)
+            poseData.dataformat = dataformat
+            poseData._writePose(filepath)
+            loaded = r9Pose.PoseData()
+            loaded._readPose(filepath)
+            assert sorted(loaded.poseDict.keys()) == sorted(poseData.poseDict.keys())
+        for key, data in poseData.poseDict.items():
+            assert loaded.poseDict[key]['attrs'] == data['attrs']
+
+
+class Test_PoseDiff():
+    '''
+    the array based compare behind PoseCompare
+    '''
+    def setup(self):
+        import tempfile
+        self.poseFolder = getPoseFolder()
+        self.tempDir = tempfile.mkdtemp()
+
+    def teardown(self):
+        import shutil
+        shutil.rmtree(self.tempDir)
+
+    def test_poseFiles(self):
+        f218 = os.path.join(self.poseFolder, 'jump_f218.pose')
+        f9 = os.path.join(self.poseFolder, 'jump_f9.pose')
+        diff = r9PoseDiff.PoseDiff(f218, f218)
+        assert diff.compare()
+        assert diff.report['compared']
+        assert diff.report['maxLinearError'] == 0 and diff.report['maxAngularError'] == 0
+
+        diff = r9PoseDiff.PoseDiff(f218, f9)
+        assert not diff.compare()
+        assert diff.report['failedAttrs']
+        failed = diff.report['failedAttrs'][0]
+        assert failed['error'] >= failed['tolerance']
+        assert diff.report['nodes'][failed['node']]['maxError'] >= failed['error']
+
+        # PoseCompare is now a wrapper, the fails must match the diff
+        compare = r9Pose.PoseCompare(f218, f9)
+        assert not compare.compare()
+        assert compare.diff['failedAttrs'] == diff.report['failedAttrs']
+        assert sorted(compare.fails['failedAttrs'].keys()) == \
+            sorted(set([f['node'] for f in diff.report['failedAttrs']]))
+        assert r9Pose.PoseCompare(f218, f218, compareDict='skeletonDict').compare()
+
+    def test_binaryMatchesConfig(self):
+        import shutil
+        binaryFolder = os.path.join(self.tempDir, 'MetaRig_Poses')
+        shutil.copytree(self.poseFolder, binaryFolder)
+        r9Pose.convertPoseFiles(binaryFolder, dataformat='binary')
+        for pose in ['jump_f218.pose', 'jump_f9.pose']:
+            for compareDict in ['poseDict', 'skeletonDict']:
+                diff = r9PoseDiff.PoseDiff(os.path.join(binaryFolder, pose), os.path.join(self.poseFolder, pose),
+                                           compareDict=compareDict)
+                assert diff.compare()
+                assert diff.report['compared']
+
+    def test_tolerances(self):
+        current = {'Ctrl': {'longName': '|Rig|ns:Ctrl', 'attrs': {'rotateX': 10.0, 'rotateY': 10.0, 'translateX': 1.0, 'visibility': True}}}
+        reference = {'Ctrl': {'longName': '|Rig|Ctrl', 'attrs': {'rotateX': '190.05', 'rotateY': 100.05, 'translateX': 1.005, 'visibility': 'True'}}}
+        diff = r9PoseDiff.PoseDiff(current, reference, longName=True)
+        assert diff.compare()  # gimbal flips pass, namespaces are stripped
+        assert diff.report['compared'] == 3
+
+        reference['Ctrl']['attrs']['translateX'] = 1.02
+        reference['Ctrl']['attrs']['visibility'] = False
+        reference['Extra'] = {'attrs': {}}
+        current['Missing'] = {'attrs': {'translateX': 0.0}}
+        diff = r9PoseDiff.PoseDiff(current, reference)
+        assert not diff.compare()
+        assert diff.report['missingKeys'] == ['Missing']
+        assert sorted([f['attr'] for f in diff.report['failedAttrs']]) == ['translateX', 'visibility']
+        assert r9Core.floatIsEqual(diff.report['maxLinearError'], 0.02, 0.0001)
+        assert r9PoseDiff.PoseDiff(current, reference, ignoreAttrs=['translateX', 'visibility'],
+                                   ignoreStrings=['Missing']).compare()
+
+    def test_decodeValue(self):
+        # must decode as r9Core.decodeString, which PoseCompare used before
+        for val in ['True', 'None', '12', '1.5', 'abc', '[1, 2.5]', '(1, "a")', "{'a': [1]}", '[]', '', '[pCube1]']:
+            assert r9PoseDiff.decodeValue(val) == r9Core.decodeString(val)
+        # container strings from a config pose match the native values of a live / json pose
+        current = {'Ctrl': {'attrs': {'enumList': [1, 2], 'data': {'a': 1.0}, 'pair': (0, 1)}}}
+        reference = {'Ctrl': {'attrs': {'enumList': '[1, 2]', 'data': "{'a': 1.0}", 'pair': '(0, 1)'}}}
+        assert r9PoseDiff.PoseDiff(current, reference).compare()
+        reference['Ctrl']['attrs']['enumList'] = '[1, 3]'
+        assert not r9PoseDiff.PoseDiff(current, reference).compare()
+
+
+class Test_BatchPatchPoses():
+    '''
+    batchPatchPoses run in this session, the mayapy workers run exactly the same file loop
+    '''
+    def setup(self):
+        import tempfile
+        import shutil
+        cmds.file(os.path.join(r9Setup.red9ModulePath(), 'tests', 'testFiles', 'MetaRig_anim_jump.mb'), open=True, f=True)
+        self.tempDir = tempfile.mkdtemp()
+        self.poseFolder = os.path.join(self.tempDir, 'MetaRig_Poses')
+        shutil.copytree(getPoseFolder(), self.poseFolder)
+        self.poses = sorted([f for f in os.listdir(self.poseFolder) if f.endswith('.pose')])
+        cmds.currentUnit(time='ntscf')
+
+    def teardown(self):
+        import shutil
+        shutil.rmtree(self.tempDir)
+
+    def test_dryRun(self):
+        import tempfile
+        broken = os.path.join(self.poseFolder, 'zz_broken.pose')
+        with open(broken, 'w') as f:
+            f.write('[info]\n')
+        report = r9Pose.batchPatchPoses(self.poseFolder, None, None, dryRun=True)
+        assert report['files'] == len(self.poses) + 1
+        assert report['failed'] == [broken]
+        # the report is written to the temp dir, not into the pose library
+        assert not os.path.exists(os.path.join(self.poseFolder, 'batchPatchPoses_report.json'))
+        assert os.path.exists(os.path.join(tempfile.gettempdir(), 'batchPatchPoses_report.json'))
+        for result in report['results'][:-1]:
+            assert result['status'] == 'ok'
+            assert result['format'] == 'config'
+            assert result['nodes'] > 0 and result['attrs'] > 0
+
+    def test_patchPoses(self):
+        patched = []
+        reportPath = os.path.join(self.tempDir, 'report.json')
+        report = r9Pose.batchPatchPoses(self.poseFolder, 'Red9_MetaRig_unitTest.cfg', 'L_Wrist_Ctrl',
+                                        patchfunc=patched.append, reportPath=reportPath)
+        assert report['ok'] == len(self.poses)
+        assert patched == self.poses
+        for result in report['results']:
+            assert sorted(result['timings'].keys()) == ['load', 'patch', 'save']
+        assert os.path.exists(reportPath)
+
+    def test_workerArgs(self):
+        # workers can't be handed a live function or run without a rig to open
+        raised = False
+        try:
+            r9Pose.batchPatchPoses(self.poseFolder, 'Red9_MetaRig_unitTest.cfg', 'L_Wrist_Ctrl', workers=2,
+                                   rigFile='rig.ma', patchfunc=lambda f: None)
+        except StandardError:
+            raised = True
+        assert raised
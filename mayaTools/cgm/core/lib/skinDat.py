@@ -27,6 +27,7 @@ __MAYALOCAL = 'SKINDAT'
 import copy
 import os
 import pprint
+from collections import OrderedDict
 
 #>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
 import logging
@@ -41,7 +42,7 @@ import maya.OpenMayaAnim as OMA
 
 # From Red9 =============================================================
 from Red9.core import Red9_Meta as r9Meta
-import Red9.packages.configobj as configobj
+from Red9.core import Red9_ConfigIO as r9ConfigIO
 
 # From cgm ==============================================================
 from cgm.core.classes import GuiFactory as cgmUI
@@ -297,15 +298,14 @@ class data(object):
         filepath = self.validateFilepath(filepath)
         self.updateSourceSkinData()
             
-        ConfigObj = configobj.ConfigObj(indent_type='\t')
-        ConfigObj['configType']= 'cgmSkinConfig'        
-        ConfigObj['source']=self.d_source
-        ConfigObj['general']=self.d_general
-        ConfigObj['skin']=self.d_sourceSkin
-        ConfigObj['influences']=self.d_sourceInfluences        
-        ConfigObj['weights']=self.d_weights
-        ConfigObj.filename = filepath
-        ConfigObj.write()
+        _d = OrderedDict()
+        _d['configType']= 'cgmSkinConfig'        
+        _d['source']=self.d_source
+        _d['general']=self.d_general
+        _d['skin']=self.d_sourceSkin
+        _d['influences']=self.d_sourceInfluences        
+        _d['weights']=self.d_weights
+        r9ConfigIO.write(filepath, _d)
         return True
     
         
@@ -317,7 +317,7 @@ class data(object):
         if not os.path.exists(filepath):            
             raise ValueError('Given filepath doesnt not exist : %s' % filepath)   
         
-        _config = configobj.ConfigObj(filepath)
+        _config = r9ConfigIO.read(filepath, sections = data._configToStored.keys())#...only the sections we store, the weights block is skipped
         if _config.get('configType') != 'cgmSkinConfig':
             raise ValueError,"This isn't a cgmSkinConfig config | {0}".format(filepath)
                 
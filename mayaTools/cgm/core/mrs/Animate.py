@@ -30,6 +30,7 @@ from Red9.core import Red9_Meta as r9Meta
 from Red9.core import Red9_AnimationUtils as r9Anim
 import Red9.core.Red9_CoreUtils as r9Core
 import Red9.core.Red9_PoseSaver as r9Pose
+import Red9.core.Red9_PoseIndex as r9PoseIndex
 import Red9.packages.configobj as configobj
 
 import Red9.startup.setup as r9Setup    
@@ -494,17 +495,9 @@ class ui(cgmUI.cgmGUI):
         if not CGMPATH.Path(self.posePath):#os.path.exists(self.posePath):
             log.debug('posePath is invalid')
             return self.poses
-        files = os.listdir(self.posePath) if os.path.exists(self.posePath) else []
-        if sortBy == 'name':
-            files = r9Core.sortNumerically(files)
-            # files.sort()
-        elif sortBy == 'date':
-            files.sort(key=lambda x: os.stat(os.path.join(self.posePath, x)).st_mtime)
-            files.reverse()
-
-        for f in files:
-            if f.lower().endswith('.pose'):
-                self.poses.append(f.split('.pose')[0])
+        if os.path.exists(self.posePath):
+            # listed from the on-disk pose library index, only changed files are re-read
+            self.poses = r9PoseIndex.listPoses(self.posePath, sortBy=sortBy)
         return self.poses
 
     def buildFilteredPoseList(self, searchFilter):